@@ -20,6 +20,10 @@ class SmallEnzoSuite:
         dd = self.ds.all_data()
         dd["gas", "density"]
 
+    def peakmem_gas_read(self):
+        dd = self.ds.all_data()
+        dd["gas", "density"]
+
     def time_gas_derived(self):
         dd = self.ds.all_data()
         dd["gas", "velocity_magnitude"]
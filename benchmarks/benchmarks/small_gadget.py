@@ -1,5 +1,6 @@
 import numpy as np
 import yt
+from yt.config import ytcfg
 
 class SmallGadgetSuite:
     dsname = "snapshot_033/snap_033.0.hdf5"
@@ -33,3 +34,37 @@ class SmallGadgetSuite:
         dd.quantities.extrema("particle_mass")
         dd.quantities.extrema("particle_velocity_magnitude")
         dd.quantities.extrema(["particle_velocity_%s" % ax for ax in 'xyz'])
+
+class SmallGadgetThreadsSuite:
+    # The deposition and smoothing operations pick up their number of
+    # threads from the configuration, so this shows how they scale.
+    dsname = "snapshot_033/snap_033.0.hdf5"
+    timeout = 360.0
+    params = [1, 2, 4, 8]
+    param_names = ["num_threads"]
+
+    def setup(self, num_threads):
+        ytcfg["yt", "numthreads"] = str(num_threads)
+        self.ds = yt.load(self.dsname)
+        self.ds.index
+
+    def teardown(self, num_threads):
+        ytcfg["yt", "numthreads"] = "-1"
+
+    def time_deposit_sum(self, num_threads):
+        dd = self.ds.all_data()
+        dd["deposit", "all_density"]
+
+    def time_deposit_cic(self, num_threads):
+        dd = self.ds.all_data()
+        dd["deposit", "all_cic"]
+
+    def time_deposit_cic_velocity(self, num_threads):
+        dd = self.ds.all_data()
+        dd["deposit", "all_cic_velocity_x"]
+
+    def time_smooth_temperature(self, num_threads):
+        # Otherwise repeats would reuse the neighbors found the first time.
+        self.ds.index.neighbor_cache.clear()
+        dd = self.ds.all_data()
+        dd["gas", "temperature"]
@@ -158,7 +158,8 @@ from yt.visualization.volume_rendering.api import \
     TransferFunctionHelper, TransferFunction, MultiVariateTransferFunction
 
 from yt.utilities.parallel_tools.parallel_analysis_interface import \
-    parallel_objects, enable_parallelism, communication_system
+    parallel_objects, enable_parallelism, enable_local_parallelism, \
+    communication_system
 
 from yt.convenience import \
     load, simulation
@@ -142,13 +142,7 @@ class AbsorptionSpectrum(object):
             field_data[field] = YTArray(input[field].value, field_units[field])
         input.close()
 
-        self.tau_field = np.zeros(self.lambda_bins.size)
-        self.spectrum_line_list = []
-
-        self._add_lines_to_spectrum(field_data, use_peculiar_velocity)
-        self._add_continua_to_spectrum(field_data, use_peculiar_velocity)
-
-        self.flux_field = np.exp(-self.tau_field)
+        self._make_spectrum(field_data, use_peculiar_velocity)
 
         if output_file.endswith('.h5'):
             self._write_spectrum_hdf5(output_file)
@@ -161,6 +155,71 @@ class AbsorptionSpectrum(object):
         del field_data
         return (self.lambda_bins, self.flux_field)
 
+    def make_spectra(self, ray_data, redshift=0.0, n_rays=None,
+                     use_peculiar_velocity=True):
+        """
+        Make a spectrum for each of a set of rays, such as those traced
+        by a :class:`~yt.analysis_modules.cosmological_observation.light_ray.ray_bundle.RayBundle`.
+
+        Parameters
+        ----------
+
+        ray_data : dict
+           columns of ray data, with a "ray_id" entry giving the ray that
+           each row belongs to, sorted by ray.  Besides the fields for the
+           lines and continua, this needs "dl", "temperature" and, when
+           using peculiar velocities, "velocity_los".
+        redshift : float
+           the redshift of every lixel, if ray_data has no "redshift" entry.
+        n_rays : int
+           the number of rays.  By default, one more than the largest
+           ray_id.
+        use_peculiar_velocity : bool
+           if True, include line of sight velocity for shifting lines.
+
+        Returns
+        -------
+        The wavelength bins and an (n_rays, n_lambda) array of fluxes.  The
+        spectral lines found along each ray are stored in a list of lists,
+        *spectra_line_list*.
+        """
+        ray_id = np.asarray(ray_data["ray_id"])
+        if n_rays is None:
+            n_rays = ray_id.max() + 1 if ray_id.size > 0 else 0
+        bounds = np.searchsorted(ray_id, np.arange(n_rays + 1))
+        fields = [field for field in ray_data if field != "ray_id"]
+        if "redshift" not in ray_data:
+            fields.append("redshift")
+        flux = np.ones((n_rays, self.lambda_bins.size), dtype="float64")
+        self.spectra_line_list = []
+        for i in range(n_rays):
+            start, end = bounds[i], bounds[i + 1]
+            field_data = {}
+            for field in fields:
+                if field == "redshift" and "redshift" not in ray_data:
+                    field_data[field] = YTArray(
+                        np.ones(end - start) * redshift, "")
+                else:
+                    field_data[field] = ray_data[field][start:end]
+                    if isinstance(field_data[field], YTArray):
+                        field_data[field] = field_data[field].in_cgs()
+            self._make_spectrum(field_data, use_peculiar_velocity)
+            flux[i] = self.flux_field
+            self.spectra_line_list.append(self.spectrum_line_list)
+        return (self.lambda_bins, flux)
+
+    def _make_spectrum(self, field_data, use_peculiar_velocity):
+        """
+        Fill the optical depth and flux for a single ray.
+        """
+        self.tau_field = np.zeros(self.lambda_bins.size)
+        self.spectrum_line_list = []
+
+        self._add_lines_to_spectrum(field_data, use_peculiar_velocity)
+        self._add_continua_to_spectrum(field_data, use_peculiar_velocity)
+
+        self.flux_field = np.exp(-self.tau_field)
+
     def _add_continua_to_spectrum(self, field_data, use_peculiar_velocity):
         """
         Add continuum features to the spectrum.
@@ -11,12 +11,16 @@ Unit test for the AbsorptionSpectrum analysis module
 #-----------------------------------------------------------------------------
 
 import numpy as np
+import h5py
 from yt.testing import \
-    assert_allclose_units, requires_file, requires_module
+    assert_allclose_units, assert_almost_equal, assert_equal, \
+    fake_random_ds, requires_file, requires_module
 from yt.analysis_modules.absorption_spectrum.absorption_line import \
     voigt_old, voigt_scipy
 from yt.analysis_modules.absorption_spectrum.api import AbsorptionSpectrum
 from yt.analysis_modules.cosmological_observation.api import LightRay
+from yt.analysis_modules.cosmological_observation.light_ray.api import \
+    RayBundle
 import tempfile
 import os
 import shutil
@@ -130,3 +134,54 @@ def test_voigt_profiles():
     a = 1.7e-4
     x = np.linspace(5.0, -3.6, 60)
     yield assert_allclose_units, voigt_old(a, x), voigt_scipy(a, x), 1e-8
+
+
+def test_absorption_spectra_bundle():
+    """
+    The spectra made together from a RayBundle should be the same as
+    those made from each of its rays on its own.
+    """
+
+    # Set up in a temp dir
+    tmpdir = tempfile.mkdtemp()
+    curdir = os.getcwd()
+    os.chdir(tmpdir)
+
+    np.random.seed(0x4d3d3d3)
+    fields = ("density", "temperature", "velocity_x", "velocity_y",
+              "velocity_z", "H_number_density")
+    units = ("g/cm**3", "K", "cm/s", "cm/s", "cm/s", "cm**-3")
+    ds = fake_random_ds(16, peak_value=1e4, fields=fields, units=units,
+                        nprocs=4, length_unit=1e14)
+    n_rays = 4
+    bundle = RayBundle(ds, np.random.random((n_rays, 3)),
+                       np.random.random((n_rays, 3)))
+    ray_data = bundle.get_data(["temperature", "H_number_density"],
+                               get_los_velocity=True)
+
+    sp = AbsorptionSpectrum(1200.0, 1230.0, 1000)
+    sp.add_line('HI Lya', 'H_number_density', 1215.6700, 4.164E-01,
+                6.265e+08, 1.00794)
+    wavelength, flux = sp.make_spectra(ray_data, redshift=0.0,
+                                       use_peculiar_velocity=True)
+    yield assert_equal, flux.shape, (n_rays, 1000)
+    yield assert_equal, (flux < 1.0).any(axis=1), [True] * n_rays
+
+    field_units = {"dl": "cm", "temperature": "K", "velocity_los": "cm/s",
+                   "H_number_density": "cm**-3"}
+    for i in range(n_rays):
+        mine = ray_data["ray_id"] == i
+        f = h5py.File('ray_%d.h5' % i, 'w')
+        for field, unit in field_units.items():
+            f.create_dataset(field, data=ray_data[field][mine].in_units(unit).d)
+        f.create_dataset('redshift', data=np.zeros(mine.sum()))
+        f.close()
+        ray_wavelength, ray_flux = \
+          sp.make_spectrum('ray_%d.h5' % i, output_file='spectrum.h5',
+                           line_list_file='lines.txt',
+                           use_peculiar_velocity=True)
+        yield assert_almost_equal, np.asarray(ray_flux), flux[i], 12
+
+    # clean up
+    os.chdir(curdir)
+    shutil.rmtree(tmpdir)
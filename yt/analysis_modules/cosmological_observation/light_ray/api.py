@@ -15,3 +15,6 @@ API for light_ray
 
 from .light_ray import \
     LightRay
+
+from .ray_bundle import \
+    RayBundle
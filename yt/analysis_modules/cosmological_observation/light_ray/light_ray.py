@@ -24,13 +24,16 @@ from yt.convenience import \
 from yt.funcs import \
     mylog
 from yt.units.yt_array import \
-    YTArray
+    uconcatenate
 from yt.utilities.cosmology import \
     Cosmology
 from yt.utilities.parallel_tools.parallel_analysis_interface import \
     parallel_objects, \
     parallel_root_only
 
+from .ray_bundle import \
+    RayBundle
+
 class LightRay(CosmologySplice):
     """
     LightRay(parameter_filename, simulation_type=None,
@@ -362,11 +365,7 @@ class LightRay(CosmologySplice):
         self._data = {}
         if fields is None: fields = []
         data_fields = fields[:]
-        all_fields = fields[:]
-        all_fields.extend(['dl', 'dredshift', 'redshift'])
         if get_los_velocity:
-            all_fields.extend(['velocity_x', 'velocity_y',
-                               'velocity_z', 'velocity_los'])
             data_fields.extend(['velocity_x', 'velocity_y', 'velocity_z'])
 
         all_ray_storage = {}
@@ -412,41 +411,22 @@ class LightRay(CosmologySplice):
                        (my_segment['redshift'], my_segment['start'],
                         my_segment['end']))
 
-            # Break periodic ray into non-periodic segments.
-            sub_segments = periodic_ray(my_segment['start'], my_segment['end'],
-                                        left=ds.domain_left_edge,
-                                        right=ds.domain_right_edge)
+            # Trace the periodic ray through the dataset, one non-periodic
+            # subsegment at a time.
+            bundle = RayBundle(ds, my_segment['start'], my_segment['end'],
+                               periodic=True)
+            ray_data = bundle.get_data(data_fields,
+                                       get_los_velocity=get_los_velocity)
 
             # Prepare data structure for subsegment.
             sub_data = {}
             sub_data['segment_redshift'] = my_segment['redshift']
-            for field in all_fields:
-                sub_data[field] = []
-
-            # Get data for all subsegments in segment.
-            for sub_segment in sub_segments:
-                mylog.info("Getting subsegment: %s to %s." %
-                           (list(sub_segment[0]), list(sub_segment[1])))
-                sub_ray = ds.ray(sub_segment[0], sub_segment[1])
-                asort = np.argsort(sub_ray["t"])
-                sub_data['dl'].extend(sub_ray['dts'][asort] *
-                                      vector_length(sub_ray.start_point,
-                                                    sub_ray.end_point))
-                for field in data_fields:
-                    sub_data[field].extend(sub_ray[field][asort])
-
-                if get_los_velocity:
-                    line_of_sight = sub_segment[1] - sub_segment[0]
-                    line_of_sight /= ((line_of_sight**2).sum())**0.5
-                    sub_vel = ds.arr([sub_ray['velocity_x'],
-                                      sub_ray['velocity_y'],
-                                      sub_ray['velocity_z']])
-                    sub_data['velocity_los'].extend((np.rollaxis(sub_vel, 1) *
-                                                     line_of_sight).sum(axis=1)[asort])
-                    del sub_vel
-
-                sub_ray.clear_data()
-                del sub_ray, asort
+            sub_data['dl'] = ray_data['dl']
+            for field in data_fields:
+                sub_data[field] = ray_data[field]
+            if get_los_velocity:
+                sub_data['velocity_los'] = ray_data['velocity_los']
+            del bundle, ray_data
 
             for key in sub_data:
                 sub_data[key] = ds.arr(sub_data[key]).in_cgs()
@@ -458,12 +438,6 @@ class LightRay(CosmologySplice):
             sub_data['redshift'] = my_segment['redshift'] - \
               sub_data['dredshift'].cumsum() + sub_data['dredshift']
 
-            # Remove empty lixels.
-            sub_dl_nonzero = sub_data['dl'].nonzero()
-            for field in all_fields:
-                sub_data[field] = sub_data[field][sub_dl_nonzero]
-            del sub_dl_nonzero
-
             # Add to storage.
             my_storage.result = sub_data
 
@@ -542,9 +516,9 @@ def _flatten_dict_list(data, exceptions=None):
                       if field not in exceptions]:
             if field not in new_data:
                 new_data[field] = []
-            new_data[field].extend(datum[field])
+            new_data[field].append(datum[field])
     for field in new_data:
-        new_data[field] = YTArray(new_data[field])
+        new_data[field] = uconcatenate(new_data[field])
     return new_data
 
 def vector_length(start, end):
@@ -0,0 +1,270 @@
+"""
+RayBundle class and member functions.
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+from yt.funcs import \
+    ensure_list, \
+    get_pbar, \
+    mylog
+from yt.units.yt_array import \
+    uconcatenate
+
+class RayBundle(object):
+    r"""
+    A set of rays traced through a dataset together.
+
+    Rather than creating and reading each ray separately, the bundle finds
+    the grids that each ray passes through and then reads each of those
+    grids once, picking out the cells crossed by every ray that passes
+    through it.  The cells crossed by a ray within a grid are found with the
+    same volume traversal used by :class:`~yt.data_objects.selection_data_containers.YTRayBase`.
+    The result is a set of columns, sorted by ray and then by position along
+    the ray, suitable for making many absorption spectra at once with
+    :meth:`~yt.analysis_modules.absorption_spectrum.absorption_spectrum.AbsorptionSpectrum.make_spectra`.
+
+    Parameters
+    ----------
+    ds : Dataset
+        The dataset to trace the rays through.
+    start_points : array_like
+        An (N, 3) array of the start points of the rays, in code units if
+        no units are given.
+    end_points : array_like
+        An (N, 3) array of the end points of the rays.
+    periodic : bool
+        If True, rays leaving the domain are wrapped around periodic
+        boundaries, as for a :class:`LightRay`.
+        Default: False.
+
+    Examples
+    --------
+
+    >>> import numpy as np
+    >>> import yt
+    >>> from yt.analysis_modules.cosmological_observation.light_ray.api import \
+    ...     RayBundle
+    >>> ds = yt.load("IsolatedGalaxy/galaxy0030/galaxy0030")
+    >>> start = np.random.random((1000, 3))
+    >>> end = np.random.random((1000, 3))
+    >>> bundle = RayBundle(ds, start, end)
+    >>> data = bundle.get_data(["density", "temperature"])
+    >>> print data["ray_id"], data["t"], data["dl"], data["density"]
+
+    """
+    def __init__(self, ds, start_points, end_points, periodic=False):
+        from .light_ray import periodic_ray, vector_length
+        self.ds = ds
+        start_points = ds.arr(np.atleast_2d(start_points), "code_length")
+        end_points = ds.arr(np.atleast_2d(end_points), "code_length")
+        if start_points.shape != end_points.shape:
+            raise RuntimeError("Start and end points must have the same shape.")
+        zero = np.where(((end_points - start_points).d**2).sum(axis=1) == 0)[0]
+        if zero.size > 0:
+            raise RuntimeError("Rays %s start and end at the same point." %
+                               zero.tolist())
+        self.start_points = start_points
+        self.end_points = end_points
+        self.n_rays = start_points.shape[0]
+        # Each ray is broken into segments that don't cross a boundary.  For
+        # each one, we keep the ray it belongs to, and where it starts along
+        # that ray and how much of the ray it covers, so that positions along
+        # the segment can be turned back into positions along the ray.
+        ray_id = []
+        segments = []
+        offsets = []
+        fractions = []
+        for i in range(self.n_rays):
+            start = start_points[i]
+            end = end_points[i]
+            if periodic:
+                sub_segments = periodic_ray(start, end,
+                                            left=ds.domain_left_edge,
+                                            right=ds.domain_right_edge)
+            else:
+                sub_segments = [[start, end]]
+            length = vector_length(start, end)
+            traveled = 0.0
+            for sub_start, sub_end in sub_segments:
+                sub_length = vector_length(sub_start, sub_end)
+                ray_id.append(i)
+                segments.append((ds.arr(sub_start, "code_length"),
+                                 ds.arr(sub_end, "code_length")))
+                offsets.append(float(traveled / length))
+                fractions.append(float(sub_length / length))
+                traveled += sub_length
+        self.ray_id = np.array(ray_id, dtype="int64")
+        self.segments = segments
+        self.offsets = np.array(offsets, dtype="float64")
+        self.fractions = np.array(fractions, dtype="float64")
+
+    def get_data(self, fields=None, get_los_velocity=False):
+        r"""
+        Trace the rays and return the cells they cross.
+
+        Parameters
+        ----------
+        fields : list
+            The fields to sample along the rays.
+        get_los_velocity : bool
+            If True, the velocity along each ray is stored as
+            "velocity_los", along with the three velocity components.
+            Default: False.
+
+        Returns
+        -------
+        A dictionary of arrays, all of the same length, with one entry per
+        cell crossed by a ray.  "ray_id" is the index of the ray, "t" is the
+        position of the cell along the ray, from 0 at its start to 1 at its
+        end, and "dl" is the path length through the cell.  The requested
+        fields are stored under their names.  Entries are sorted by ray, and
+        then by t.
+
+        """
+        if fields is None: fields = []
+        fields = ensure_list(fields)[:]
+        if get_los_velocity:
+            for field in ["velocity_x", "velocity_y", "velocity_z"]:
+                if field not in fields:
+                    fields.append(field)
+        rays = [self.ds.ray(start, end) for start, end in self.segments]
+        index = self.ds.index
+        if hasattr(index, "grids"):
+            seg_ids, dts, ts, data = self._trace_grids(rays, fields)
+        else:
+            seg_ids, dts, ts, data = self._trace_rays(rays, fields)
+        ray_id = self.ray_id[seg_ids]
+        lengths = np.array([(end - start).in_units("code_length").d
+                            for start, end in self.segments])
+        lengths = np.sqrt((lengths**2).sum(axis=1))
+        t = self.offsets[seg_ids] + self.fractions[seg_ids] * ts
+        dl = self.ds.arr(dts * lengths[seg_ids], "code_length")
+        keep = dl.d > 0
+        order = np.lexsort([t[keep], ray_id[keep]])
+        ray_data = {"ray_id": ray_id[keep][order],
+                    "t": t[keep][order],
+                    "dl": dl[keep][order]}
+        for field in fields:
+            ray_data[field] = data[field][keep][order]
+        if get_los_velocity:
+            line_of_sight = (self.end_points - self.start_points).d
+            line_of_sight /= np.sqrt((line_of_sight**2).sum(axis=1))[:, None]
+            line_of_sight = line_of_sight[ray_data["ray_id"]]
+            ray_data["velocity_los"] = \
+              ray_data["velocity_x"] * line_of_sight[:, 0] + \
+              ray_data["velocity_y"] * line_of_sight[:, 1] + \
+              ray_data["velocity_z"] * line_of_sight[:, 2]
+        return ray_data
+
+    def _trace_grids(self, rays, fields):
+        index = self.ds.index
+        # Find the grids each segment passes through, and then invert that to
+        # find the segments passing through each grid.
+        pairs = []
+        for i, ray in enumerate(rays):
+            gi = np.where(ray.selector.select_grids(index.grid_left_edge,
+                                                    index.grid_right_edge,
+                                                    index.grid_levels))[0]
+            pairs.append(np.array([gi, np.repeat(i, gi.size)]))
+        if len(pairs) > 0:
+            pairs = np.concatenate(pairs, axis=1)
+        else:
+            pairs = np.empty((2, 0), dtype="int64")
+        grid_ids = np.unique(pairs[0])
+        sort = np.argsort(pairs[0], kind="mergesort")
+        pairs = pairs[:, sort]
+        starts = np.searchsorted(pairs[0], grid_ids)
+        ends = np.append(starts[1:], pairs.shape[1])
+        grids = index.grids[grid_ids]
+        def _gsort(i):
+            g = grids[i]
+            if g.filename is None:
+                return g.id
+            return g.filename
+        # First find which cells each segment crosses in each grid, so that
+        # the output can be allocated once.
+        crossings = []
+        size = 0
+        for i in sorted(range(len(grids)), key=_gsort):
+            grid = grids[i]
+            for seg in pairs[1, starts[i]:ends[i]]:
+                selector = rays[seg].selector
+                mask = selector.fill_mask(grid)
+                if mask is None: continue
+                dt, t = selector.get_dt(grid)
+                crossings.append((i, seg, mask, dt, t))
+                size += dt.size
+        seg_ids = np.empty(size, dtype="int64")
+        dts = np.empty(size, dtype="float64")
+        ts = np.empty(size, dtype="float64")
+        data = {}
+        # Now read each grid once and copy out its cells for every segment.
+        pbar = get_pbar("Tracing %s rays" % self.n_rays, len(crossings))
+        ind = 0
+        last = None
+        for j, (i, seg, mask, dt, t) in enumerate(crossings):
+            grid = grids[i]
+            if i != last:
+                if last is not None:
+                    _release_fields(grids[last], kept)
+                # Fields that were already loaded belong to someone else, so
+                # only the ones read here are let go of afterwards.
+                kept = set(grid.field_data.keys())
+                values = dict((field, grid[field]) for field in fields)
+                last = i
+            seg_ids[ind:ind+dt.size] = seg
+            dts[ind:ind+dt.size] = dt
+            ts[ind:ind+dt.size] = t
+            for field in fields:
+                v = values[field]
+                if field not in data:
+                    data[field] = self.ds.arr(np.empty(size, dtype=v.dtype),
+                                              v.units)
+                data[field][ind:ind+dt.size] = v[mask]
+            ind += dt.size
+            pbar.update(j)
+        pbar.finish()
+        if last is not None:
+            _release_fields(grids[last], kept)
+        for field in fields:
+            if field not in data:
+                data[field] = self.ds.arr(np.empty(0, dtype="float64"),
+                                          self.ds._get_field_info(field).units)
+        return seg_ids, dts, ts, data
+
+    def _trace_rays(self, rays, fields):
+        # Datasets without grids fall back to reading each ray separately,
+        # but still build the columns with a single concatenation.
+        mylog.info("Tracing %s rays one at a time.", self.n_rays)
+        seg_ids = []
+        dts = []
+        ts = []
+        data = dict((field, []) for field in fields)
+        for i, ray in enumerate(rays):
+            dts.append(np.asarray(ray["dts"]))
+            ts.append(np.asarray(ray["t"]))
+            seg_ids.append(np.repeat(i, dts[-1].size))
+            for field in fields:
+                data[field].append(ray[field])
+            ray.clear_data()
+        for field in fields:
+            data[field] = uconcatenate(data[field])
+        return np.concatenate(seg_ids).astype("int64"), \
+          np.concatenate(dts), np.concatenate(ts), data
+
+def _release_fields(grid, kept):
+    for field in list(grid.field_data.keys()):
+        if field not in kept:
+            grid.field_data.pop(field)
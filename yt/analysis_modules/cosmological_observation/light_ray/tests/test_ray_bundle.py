@@ -0,0 +1,64 @@
+"""
+Tests for tracing bundles of rays
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from yt.testing import \
+    fake_random_ds, \
+    assert_equal, \
+    assert_rel_equal, \
+    assert_raises
+from yt.analysis_modules.cosmological_observation.light_ray.api import \
+    RayBundle
+
+def setup():
+    from yt.config import ytcfg
+    ytcfg["yt","__withintesting"] = "True"
+
+def test_ray_bundle():
+    np.random.seed(0x4d3d3d3)
+    for nprocs in [1, 2, 4]:
+        ds = fake_random_ds(32, nprocs=nprocs)
+        start = np.random.random((8, 3))
+        end = np.random.random((8, 3))
+        bundle = RayBundle(ds, start, end)
+        data = bundle.get_data(["density"])
+        yield assert_equal, np.all(np.diff(data["ray_id"]) >= 0), True
+        for i in range(8):
+            ray = ds.ray(start[i], end[i])
+            asort = np.argsort(ray["t"])
+            mine = data["ray_id"] == i
+            dl = ray["dts"][asort] * \
+              np.sqrt(((ray.end_point - ray.start_point)**2).sum())
+            yield assert_equal, data["t"][mine], ray["t"][asort]
+            yield assert_rel_equal, data["dl"][mine], dl, 12
+            yield assert_equal, data["density"][mine], ray["density"][asort]
+
+def test_ray_bundle_fields():
+    np.random.seed(0x4d3d3d3)
+    ds = fake_random_ds(32, nprocs=4)
+    # Fields loaded beforehand are left in place; those the bundle read are
+    # not.
+    for g in ds.index.grids:
+        g["velocity_x"]
+    bundle = RayBundle(ds, np.random.random((8, 3)), np.random.random((8, 3)))
+    bundle.get_data(["density"])
+    for g in ds.index.grids:
+        yield assert_equal, ("gas", "velocity_x") in g.field_data or \
+          ("stream", "velocity_x") in g.field_data, True
+        yield assert_equal, ("gas", "density") in g.field_data or \
+          ("stream", "density") in g.field_data, False
+    # Rays that go nowhere are refused.
+    yield assert_raises, RuntimeError, RayBundle, ds, \
+      [[0.1, 0.2, 0.3], [0.5, 0.5, 0.5]], [[0.2, 0.2, 0.3], [0.5, 0.5, 0.5]]
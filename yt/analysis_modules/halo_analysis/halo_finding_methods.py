@@ -65,6 +65,23 @@ def _fof_method(ds, **finder_kwargs):
     return halos_ds
 add_finding_method("fof", _fof_method)
 
+def _particle_fof_method(ds, **finder_kwargs):
+    r"""
+    Run the domain-decomposed FoF halo finding method.
+    """
+
+    from yt.analysis_modules.halo_finding.particle_fof import \
+     ParticleFOFHaloFinder
+
+    fof = ParticleFOFHaloFinder(ds, **finder_kwargs)
+    fof.run()
+    if fof.halos["particle_mass"].size == 0:
+        return None
+    filename = fof.save_catalog("particle_fof_halos/halos")
+
+    return HaloCatalogDataset(filename)
+add_finding_method("particle_fof", _particle_fof_method)
+
 def _rockstar_method(ds, **finder_kwargs):
     r"""
     Run the Rockstar halo finding method.
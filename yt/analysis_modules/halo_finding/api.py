@@ -32,3 +32,6 @@ from .halo_objects import \
     RockstarHalo, \
     RockstarHaloList, \
     LoadRockstarHalos
+
+from .particle_fof import \
+    ParticleFOFHaloFinder
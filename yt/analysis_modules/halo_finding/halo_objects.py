@@ -25,7 +25,6 @@ import os.path as path
 from functools import cmp_to_key
 from collections import defaultdict
 from yt.extern.six import add_metaclass
-from yt.extern.six.moves import zip as izip
 
 from yt.config import ytcfg
 from yt.funcs import mylog, ensure_dir_exists
@@ -266,7 +265,8 @@ class Halo(object):
         --------
         >>> radius = halos[0].maximum_radius()
         """
-        if self.max_radius is not None:
+        # A stored maximum radius is measured from the center of mass.
+        if center_of_mass and self.max_radius is not None:
             return self.max_radius
         if center_of_mass:
             center = self.center_of_mass()
@@ -440,23 +440,17 @@ class Halo(object):
         z = self.ds.current_redshift
         period = self.ds.domain_right_edge - \
             self.ds.domain_left_edge
-        thissize = self.get_size()
         rho_crit = rho_crit_g_cm3_h2 * h ** 2.0 * Om_matter  # g cm^-3
         Msun2g = mass_sun_cgs
         rho_crit = rho_crit * ((1.0 + z) ** 3.0)
         # Get some pertinent information about the halo.
         self.mass_bins = self.ds.arr(np.zeros(self.bin_count + 1,
                                               dtype='float64'),'Msun')
-        dist = np.empty(thissize, dtype='float64')
         cen = self.center_of_mass()
-        mark = 0
-        # Find the distances to the particles. I don't like this much, but I
-        # can't see a way to eliminate a loop like this, either here or in
-        # yt.math.
-        for pos in izip(self["particle_position_x"],
-                self["particle_position_y"], self["particle_position_z"]):
-            dist[mark] = periodic_dist(cen, pos, period)
-            mark += 1
+        # Find the distances to the particles.
+        pos = np.array([self["particle_position_%s" % ax] for ax in 'xyz'])
+        cen = np.repeat(np.array(cen)[:, None], pos.shape[1], axis=1)
+        dist = np.atleast_1d(periodic_dist(cen, pos, np.array(period)))
         # Set up the radial bins.
         # Multiply min and max to prevent issues with digitize below.
         self.radial_bins = np.logspace(math.log10(min(dist) * .99 + TINY),
@@ -466,12 +460,11 @@ class Halo(object):
         # mass to that bin.
         inds = np.digitize(dist, self.radial_bins) - 1
         if self["particle_position_x"].size > 1:
-            for index in np.unique(inds):
-                self.mass_bins[index] += \
-                np.sum(self["particle_mass"][inds == index]).in_units('Msun')
+            self.mass_bins += self.ds.arr(np.bincount(inds,
+                weights=self["particle_mass"].in_units('Msun'),
+                minlength=self.bin_count + 1), 'Msun')
         # Now forward sum the masses in the bins.
-        for i in range(self.bin_count):
-            self.mass_bins[i + 1] += self.mass_bins[i]
+        self.mass_bins = self.ds.arr(np.cumsum(self.mass_bins), 'Msun')
         # Calculate the over densities in the bins.
         self.overdensity = self.mass_bins * Msun2g / \
             (4./3. * math.pi * rho_crit * \
@@ -958,6 +951,109 @@ class TextHalo(LoadedHalo):
         return self["particle_position_x"].size
 
 
+halo_property_dtype = np.dtype([
+    ("id", "int64"),
+    ("size", "int64"),
+    ("total_mass", "float64"),
+    ("center_of_mass", "float64", (3,)),
+    ("bulk_velocity", "float64", (3,)),
+    ("maximum_radius", "float64"),
+    ("rms_velocity", "float64"),
+    ("maximum_density", "float64"),
+    ("maximum_density_location", "float64", (3,))])
+
+def compute_halo_properties(ids, starts, positions, masses, velocities,
+                            densities, domain_left_edge, domain_width):
+    r"""Compute the standard properties of many halos at once.
+
+    The particles must be sorted by halo, with those of halo *ids[i]*
+    starting at *starts[i]*.  The properties are computed the same way as
+    the methods of :class:`Halo`, with positions in code units and masses
+    in solar masses.  Returns a structured array of *halo_property_dtype*,
+    with one row per halo.
+    """
+    n_halos = ids.size
+    props = np.zeros(n_halos, dtype=halo_property_dtype)
+    if n_halos == 0:
+        return props
+    size = np.diff(np.append(starts, masses.size))
+    inverse = np.repeat(np.arange(n_halos), size)
+    total_mass = np.add.reduceat(masses, starts)
+    # Halos that are spread over more than half the box are taken to
+    # straddle the periodic boundary, so those particles close to the left
+    # edge are moved over to the right.
+    c = positions - domain_left_edge
+    extent = np.maximum.reduceat(c, starts) - np.minimum.reduceat(c, starts)
+    wrap = (extent >= domain_width / 2.0)[inverse] & (c <= domain_width / 2.0)
+    c = c + wrap * domain_width
+    com = np.add.reduceat(c * masses[:,None], starts) / total_mass[:,None]
+    com = com % domain_width + domain_left_edge
+    bulk = np.add.reduceat(velocities * masses[:,None], starts) / \
+      total_mass[:,None]
+    dv = (velocities - bulk[inverse]) * \
+      (masses / total_mass[inverse])[:,None]
+    rms = np.sqrt(np.add.reduceat((dv**2).sum(axis=1), starts) / size) * size
+    r = np.abs(positions - com[inverse])
+    r = np.minimum(r, domain_width - r)
+    max_radius = np.maximum.reduceat(np.sqrt((r**2).sum(axis=1)), starts)
+    max_dens = np.maximum.reduceat(densities, starts)
+    densest = np.where(densities == max_dens[inverse],
+                       np.arange(densities.size), densities.size)
+    densest = np.minimum.reduceat(densest, starts)
+    props["id"] = ids
+    props["size"] = size
+    props["total_mass"] = total_mass
+    props["center_of_mass"] = com
+    props["bulk_velocity"] = bulk
+    props["maximum_radius"] = max_radius
+    props["rms_velocity"] = rms
+    props["maximum_density"] = max_dens
+    props["maximum_density_location"] = positions[densest]
+    return props
+
+class HaloSequence(object):
+    r"""The halos of a :class:`HaloList`, built one at a time as they are
+    asked for from the properties computed for all of them together.
+    """
+    def __init__(self, halo_list, sort_indices, starts):
+        self.halo_list = halo_list
+        self.sort_indices = sort_indices
+        self.starts = starts
+        self._halos = {}
+
+    def __len__(self):
+        return self.starts.size
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError(key)
+        if key not in self._halos:
+            self._halos[key] = self._build_halo(key)
+        return self._halos[key]
+
+    def _build_halo(self, i):
+        hl = self.halo_list
+        ds = hl._data_source.ds
+        row = hl.halo_properties[i]
+        start = self.starts[i]
+        indices = self.sort_indices[start:start + row["size"]]
+        vunits = hl._velocity_units
+        return hl._halo_class(hl, int(row["id"]), indices,
+            size=int(row["size"]),
+            CoM=ds.arr(row["center_of_mass"], "code_length"),
+            group_total_mass=ds.quan(row["total_mass"], "Msun"),
+            max_radius=ds.quan(row["maximum_radius"], "code_length"),
+            bulk_vel=ds.arr(row["bulk_velocity"], vunits),
+            rms_vel=ds.quan(row["rms_velocity"], vunits))
+
 class HaloList(object):
 
     _fields = ["particle_position_%s" % ax for ax in 'xyz']
@@ -1010,26 +1106,41 @@ class HaloList(object):
             return slice(None)
 
     def _parse_output(self):
-        unique_ids = np.unique(self.tags)
-        counts = np.bincount(self.tags + 1)
-        sort_indices = np.argsort(self.tags)
-        grab_indices = np.indices(self.tags.shape).ravel()[sort_indices]
-        dens = self.densities[sort_indices]
-        cp = 0
-        for i in unique_ids:
-            cp_c = cp + counts[i + 1]
-            if i == -1:
-                cp += counts[i + 1]
-                continue
-            group_indices = grab_indices[cp:cp_c]
-            self._groups.append(self._halo_class(self, i, group_indices))
-            md_i = np.argmax(dens[cp:cp_c])
-            px, py, pz = \
-                [self.particle_fields['particle_position_%s' % ax][group_indices]
-                                            for ax in 'xyz']
-            self._max_dens[i] = (dens[cp:cp_c][md_i], px[md_i],
-                py[md_i], pz[md_i])
-            cp += counts[i + 1]
+        # Sort the particles by group once, and compute the properties of
+        # all of the groups together from the sorted arrays.  The halos
+        # themselves are only built when they are asked for.
+        sort_indices = np.argsort(self.tags, kind="mergesort")
+        tags = self.tags[sort_indices]
+        in_group = tags >= 0
+        sort_indices, tags = sort_indices[in_group], tags[in_group]
+        ids, starts = np.unique(tags, return_index=True)
+        pos = np.column_stack(
+            [self._get_particle_field("particle_position_%s" % ax,
+                 sort_indices).in_units("code_length") for ax in 'xyz'])
+        pm = self._get_particle_field("particle_mass", sort_indices)
+        pm = pm.in_units("Msun")
+        vel = [self._get_particle_field("particle_velocity_%s" % ax,
+                                        sort_indices) for ax in 'xyz']
+        self._velocity_units = str(vel[0].units)
+        vel = np.column_stack([v.in_units(self._velocity_units)
+                               for v in vel])
+        DLE = self._data_source.ds.domain_left_edge.in_units("code_length")
+        DW = self._data_source.ds.domain_width.in_units("code_length")
+        self.halo_properties = compute_halo_properties(
+            ids, starts, np.asarray(pos), np.asarray(pm), np.asarray(vel),
+            self.densities[sort_indices], np.asarray(DLE), np.asarray(DW))
+        for i, row in zip(ids.tolist(), self.halo_properties.tolist()):
+            self._max_dens[i] = (row[-2],) + tuple(row[-1])
+        self._groups = HaloSequence(self, sort_indices, starts)
+
+    def _get_particle_field(self, field, indices):
+        # The fields we kept hold only the particles we ran on, while those
+        # read from the data source hold all of them.
+        if field in self.particle_fields:
+            return self.particle_fields[field][indices]
+        values = self._data_source[field][self._base_indices[indices]]
+        del self._data_source[field]
+        return values
 
     def __len__(self):
         return len(self._groups)
@@ -1481,7 +1592,10 @@ class GenericHaloFinder(HaloList, ParallelAnalysisInterface):
                     threshold_adjustment
                 max_dens[hi] = [max_dens_temp] + \
                     list(self._max_dens[halo.id])[1:4]
-                groups.append(self._halo_class(self, hi))
+                groups.append(self._halo_class(self, hi, size=halo.size,
+                    CoM=halo.CoM, group_total_mass=halo.group_total_mass,
+                    max_radius=halo.max_radius, bulk_vel=halo.bulk_vel,
+                    rms_vel=halo.rms_vel))
                 groups[-1].indices = halo.indices
                 self.comm.claim_object(groups[-1])
                 hi += 1
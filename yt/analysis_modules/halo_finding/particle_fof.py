@@ -0,0 +1,383 @@
+"""
+A friends-of-friends halo finder that works on pieces of the domain
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import h5py
+import itertools
+import numpy as np
+
+from yt.funcs import \
+    mylog, \
+    ensure_dir_exists, \
+    ensure_tuple
+from yt.geometry.oct_container import _ORDER_MAX
+from yt.geometry.particle_oct_container import \
+    ParticleOctreeContainer
+from yt.geometry.selection_routines import AlwaysSelector
+from yt.utilities.lib.ContourFinding import ParticleContourTree
+from yt.utilities.lib.geometry_utils import compute_morton
+from yt.utilities.parallel_tools.parallel_analysis_interface import \
+    ParallelAnalysisInterface, \
+    parallel_objects
+
+class ParticleFOFHaloFinder(ParallelAnalysisInterface):
+    r"""Friends-of-friends halo finder that links particles one region of
+    the domain at a time.
+
+    The domain is cut into a grid of regions, and each is padded with ghost
+    particles from its neighbors out to one linking length.  The particles in
+    a padded region are linked on a particle octree by
+    :class:`~yt.utilities.lib.ContourFinding.ParticleContourTree`.  A ghost
+    particle carries the group it was linked into in one region over to the
+    region that owns it, so groups that reach across region boundaries are
+    joined with a union-find over these pairs.  Regions are handed out with
+    :func:`~yt.utilities.parallel_tools.parallel_analysis_interface.parallel_objects`,
+    so they are spread over MPI tasks, or over a pool of local processes
+    once :func:`~yt.utilities.parallel_tools.parallel_analysis_interface.enable_local_parallelism`
+    has been called.  Only the particles of one region need to be in memory
+    at a time.
+
+    Parameters
+    ----------
+    ds : `Dataset`
+        The dataset on which halo finding will be conducted.
+    ptype : string
+        The particle type to link.  Default = "all".
+    link : float
+        If positive, the linking length as a fraction of the mean
+        interparticle spacing.  If negative, the absolute value is taken to
+        be the linking length itself, in code units.  Default = 0.2.
+    minimum_count : int
+        Groups with fewer particles than this are not kept.  Default = 20.
+    num_regions : int or tuple of ints
+        The number of regions to cut the domain into along each axis.
+        Default = 4.
+    id_field : string
+        A field holding a unique integer identifier for each particle, used
+        to recognize ghost particles.  Default = "particle_index".
+
+    Examples
+    --------
+    >>> ds = load("snapshot_033/snap_033.0.hdf5")
+    >>> fof = ParticleFOFHaloFinder(ds, ptype="PartType1")
+    >>> fof.run()
+    >>> fn = fof.save_catalog("fof_halos/halos")
+    >>> halos_ds = load(fn)
+    """
+    def __init__(self, ds, ptype="all", link=0.2, minimum_count=20,
+                 num_regions=4, id_field="particle_index"):
+        ParallelAnalysisInterface.__init__(self)
+        self.ds = ds
+        self.ptype = ptype
+        self.link = link
+        self.minimum_count = minimum_count
+        num_regions = ensure_tuple(num_regions)
+        if len(num_regions) == 1:
+            num_regions = num_regions * 3
+        self.num_regions = np.array(num_regions, dtype="int64")
+        self.id_field = id_field
+        self.halos = None
+
+    def run(self):
+        r"""Find the halos.  Afterwards, their properties are in the
+        *halos* dict, sorted by decreasing mass.
+        """
+        DLE, DRE, DW = self._domain()
+        if self.link > 0.0:
+            n_parts = self._count_particles()
+            spacing = (np.prod(DW) / n_parts)**(1.0/3.0)
+            self.linking_length = self.link * spacing
+        else:
+            self.linking_length = np.abs(self.link)
+        mylog.info("Using a linking length of %0.3e", self.linking_length)
+        regions = list(itertools.product(*[range(n) for n in
+                                           self.num_regions]))
+        storage = {}
+        # Each region's groups are only sent back through storage, so the
+        # regions can be handed to the local pool.
+        for sto, ijk in parallel_objects(regions, storage = storage,
+                                         max_workers = 0):
+            ijk = np.array(ijk)
+            LE = DLE + DW * ijk / self.num_regions
+            RE = np.where(ijk + 1 == self.num_regions, DRE,
+                          DLE + DW * (ijk + 1) / self.num_regions)
+            sto.result = self._find_region_groups(LE, RE)
+        shells, partials = [], []
+        for i in sorted(storage):
+            shells.append(storage[i][0])
+            partials.append(storage[i][1])
+        self.halos = self._join_groups(shells, partials)
+        mylog.info("Found %s halos.", self.halos["particle_mass"].size)
+
+    def _domain(self):
+        DLE = np.asarray(self.ds.domain_left_edge.in_units("code_length"))
+        DRE = np.asarray(self.ds.domain_right_edge.in_units("code_length"))
+        return DLE, DRE, DRE - DLE
+
+    def _count_particles(self):
+        data_files = getattr(self.ds.index, "data_files", None)
+        if data_files is None:
+            dd = self.ds.all_data()
+            return dd[self.ptype, "particle_ones"].size
+        if self.ptype == "all":
+            ptypes = self.ds.particle_types_raw
+        else:
+            ptypes = [self.ptype]
+        return sum(data_file.total_particles.get(ptype, 0)
+                   for data_file in data_files for ptype in ptypes)
+
+    def _find_region_groups(self, LE, RE):
+        # Along an axis that is not cut and is periodic, the region wraps
+        # around onto itself, so it is linked periodically instead of padded.
+        ll = self.linking_length
+        DLE, DRE, DW = self._domain()
+        wrap = np.array(self.ds.periodicity) & (self.num_regions == 1)
+        pad = np.where(wrap, 0.0, ll)
+        pLE = LE - pad
+        pRE = RE + pad
+        for i in range(3):
+            if not self.ds.periodicity[i]:
+                pLE[i] = max(pLE[i], DLE[i])
+                pRE[i] = min(pRE[i], DRE[i])
+        reg = self.ds.region((pLE + pRE) / 2.0, pLE, pRE)
+        ptype = self.ptype
+        pos = np.column_stack(
+            [np.asarray(reg[ptype, "particle_position_%s" % ax].in_units(
+                "code_length")) for ax in "xyz"])
+        ids = np.asarray(reg[ptype, self.id_field]).astype("int64")
+        mass = np.asarray(reg[ptype, "particle_mass"].in_units("code_mass"))
+        vel = np.column_stack(
+            [np.asarray(reg[ptype, "particle_velocity_%s" % ax].in_units(
+                "code_velocity")) for ax in "xyz"])
+        # Move the particles that came from across a periodic boundary to
+        # be next to this region.
+        for i in range(3):
+            if wrap[i]:
+                pos[:,i] = DLE[i] + np.mod(pos[:,i] - DLE[i], DW[i])
+            elif self.ds.periodicity[i]:
+                pos[pos[:,i] < pLE[i], i] += DW[i]
+                pos[pos[:,i] >= pRE[i], i] -= DW[i]
+        labels = link_particles(pos, ids, ll, pLE, pRE, wrap)
+        # Particles sitting on the right edge of a non-periodic domain
+        # belong to the last region.
+        edge = (RE >= DRE) & ~np.array(self.ds.periodicity)
+        owned = np.all((pos >= LE) & ((pos < RE) | edge), axis=1)
+        # The ghost particles, and our own that are ghosts of a neighbor,
+        # are what tie our groups to those of our neighbors.
+        near = np.zeros(pos.shape[0], dtype="bool")
+        for i in range(3):
+            if wrap[i]: continue
+            near |= (pos[:,i] < LE[i] + ll) | (pos[:,i] >= RE[i] - ll)
+        shell = (near | ~owned) & (labels >= 0)
+        shell = (ids[shell], labels[shell])
+        partial = group_partial_sums(labels[owned], pos[owned],
+                                     mass[owned], vel[owned], DW,
+                                     self.ds.periodicity)
+        return shell, partial
+
+    def _join_groups(self, shells, partials):
+        ids = np.concatenate([s[0] for s in shells])
+        labels = np.concatenate([s[1] for s in shells])
+        # Each particle that was seen in more than one region joins the
+        # groups it was a part of in each.
+        order = np.argsort(ids, kind="mergesort")
+        ids, labels = ids[order], labels[order]
+        same = ids[1:] == ids[:-1]
+        keys, roots = join_labels(labels[:-1][same], labels[1:][same])
+        group = np.concatenate([p["label"] for p in partials])
+        ind = np.searchsorted(keys, group)
+        ind = np.clip(ind, 0, max(keys.size - 1, 0))
+        if keys.size > 0:
+            joined = (keys[ind] == group)
+            group[joined] = roots[ind[joined]]
+        DLE, DRE, DW = self._domain()
+        periodic = np.array(self.ds.periodicity)
+        halo_ids, first, inverse = np.unique(group, return_index=True,
+                                             return_inverse=True)
+        nh = halo_ids.size
+        count = np.zeros(nh, dtype="int64")
+        mass = np.zeros(nh, dtype="float64")
+        mpos = np.zeros((nh, 3), dtype="float64")
+        mvel = np.zeros((nh, 3), dtype="float64")
+        # The pieces of a halo were summed relative to different reference
+        # positions, so they are all moved to the first piece's.
+        pref = np.concatenate([p["ref"] for p in partials])
+        ref = pref[first]
+        pmass = np.concatenate([p["mass"] for p in partials])
+        shift = periodic_offset(pref - ref[inverse], DW, periodic)
+        np.add.at(count, inverse,
+                  np.concatenate([p["count"] for p in partials]))
+        np.add.at(mass, inverse, pmass)
+        np.add.at(mpos, inverse, np.concatenate(
+            [p["mpos"] for p in partials]) + pmass[:,None] * shift)
+        np.add.at(mvel, inverse, np.concatenate(
+            [p["mvel"] for p in partials]))
+        keep = count >= self.minimum_count
+        count, mass = count[keep], mass[keep]
+        pos = ref[keep] + mpos[keep] / mass[:,None]
+        vel = mvel[keep] / mass[:,None]
+        pos = np.where(periodic, DLE + np.mod(pos - DLE, DW), pos)
+        order = np.argsort(-mass, kind="mergesort")
+        halos = {}
+        halos["particle_identifier"] = np.arange(order.size, dtype="int64")
+        halos["particle_number"] = count[order]
+        halos["particle_mass"] = self.ds.arr(mass[order], "code_mass")
+        for i, ax in enumerate("xyz"):
+            halos["particle_position_%s" % ax] = \
+                self.ds.arr(pos[order, i], "code_length")
+            halos["particle_velocity_%s" % ax] = \
+                self.ds.arr(vel[order, i], "code_velocity")
+        return halos
+
+    def save_catalog(self, prefix):
+        r"""Write the halos out as a halo catalog, which can be loaded with
+        the halo_catalog frontend.
+
+        Parameters
+        ----------
+        prefix : string
+            The catalog is written to *prefix*.0.h5.
+
+        Returns
+        -------
+        The name of the file written.
+        """
+        filename = "%s.0.h5" % prefix
+        if self.comm.rank == 0:
+            self._write_catalog(filename)
+        # Nobody goes on to load the catalog before it has been written.
+        self.comm.barrier()
+        return filename
+
+    def _write_catalog(self, filename):
+        ensure_dir_exists(filename)
+        n_halos = self.halos["particle_mass"].size
+        mylog.info("Saving halo catalog (%d halos) to %s.", n_halos, filename)
+        with h5py.File(filename, "w") as f:
+            for attr in ["current_redshift", "current_time",
+                         "domain_dimensions",
+                         "cosmological_simulation", "omega_lambda",
+                         "omega_matter", "hubble_constant"]:
+                f.attrs[attr] = getattr(self.ds, attr)
+            for attr in ["domain_left_edge", "domain_right_edge"]:
+                f.attrs[attr] = getattr(self.ds, attr).in_cgs()
+            f.attrs["data_type"] = "halo_catalog"
+            f.attrs["num_halos"] = n_halos
+            f.attrs["linking_length"] = self.linking_length
+            if n_halos == 0:
+                return
+            for field, values in sorted(self.halos.items()):
+                if hasattr(values, "units"):
+                    values = values.in_cgs()
+                    units = str(values.units)
+                else:
+                    units = ""
+                dataset = f.create_dataset(field, data=np.asarray(values))
+                dataset.attrs["units"] = units
+
+def link_particles(pos, ids, linking_length, left_edge, right_edge,
+                   periodicity):
+    r"""Link particles into friends-of-friends groups.
+
+    Each particle gets the id of one of the particles in its group, or -1 if
+    it has no friends.  The particles must lie between *left_edge* and
+    *right_edge*, which are taken as the extent of the domain along the
+    *periodicity* axes.
+    """
+    left_edge = np.array(left_edge, dtype="float64")
+    right_edge = np.array(right_edge, dtype="float64")
+    # Leave room for particles on the right edge of a non-periodic extent.
+    right_edge += np.where(periodicity, 0.0,
+                           (right_edge - left_edge) * 1e-10)
+    labels = -np.ones(pos.shape[0], dtype="int64")
+    if pos.shape[0] == 0:
+        return labels
+    # Particles are only ever compared with those in neighboring octs, so
+    # no oct may be smaller than the linking length.  We build the octree
+    # from one point per cell of a grid that is at least that coarse, so
+    # it refines no further than that grid.
+    width = right_edge - left_edge
+    level = int(np.floor(np.log2((width / linking_length).min())))
+    level = min(max(level, 0), _ORDER_MAX)
+    dx = width / 2**level
+    cells = np.floor((pos - left_edge) / dx)
+    cells = np.clip(cells, 0, 2**level - 1)
+    centers = left_edge + (cells + 0.5) * dx
+    morton = compute_morton(centers[:,0], centers[:,1], centers[:,2],
+                            left_edge, right_edge)
+    morton = np.unique(morton)
+    octree = ParticleOctreeContainer((1, 1, 1), left_edge, right_edge)
+    octree.n_ref = 1
+    octree.add(morton)
+    octree.finalize()
+    dom_ind = octree.domain_ind(AlwaysSelector(None))
+    ct = ParticleContourTree(linking_length,
+                             periodicity = [bool(p) for p in periodicity],
+                             minimum_count = 1)
+    pos = np.ascontiguousarray(pos, dtype="float64")
+    return ct.identify_contours(octree, dom_ind, pos, ids, -1, 0)
+
+def group_partial_sums(labels, pos, mass, vel, domain_width, periodicity):
+    r"""Sum up the particles of each group, leaving out those that have no
+    group.  Positions are summed relative to the first particle of each
+    group, taking periodicity into account.
+    """
+    linked = labels >= 0
+    labels, pos, mass, vel = labels[linked], pos[linked], mass[linked], \
+                             vel[linked]
+    group, first, inverse = np.unique(labels, return_index=True,
+                                      return_inverse=True)
+    ng = group.size
+    ref = pos[first]
+    offset = periodic_offset(pos - ref[inverse], domain_width,
+                             np.array(periodicity))
+    partial = {"label": group, "ref": ref,
+               "count": np.bincount(inverse, minlength=ng),
+               "mass": np.bincount(inverse, weights=mass, minlength=ng)}
+    partial["mpos"] = np.column_stack(
+        [np.bincount(inverse, weights=mass*offset[:,i], minlength=ng)
+         for i in range(3)]).reshape((ng, 3))
+    partial["mvel"] = np.column_stack(
+        [np.bincount(inverse, weights=mass*vel[:,i], minlength=ng)
+         for i in range(3)]).reshape((ng, 3))
+    return partial
+
+def periodic_offset(offset, domain_width, periodicity):
+    r"""Wrap offsets along the periodic axes to the nearest image."""
+    wrapped = offset - domain_width * np.round(offset / domain_width)
+    return np.where(periodicity, wrapped, offset)
+
+def join_labels(a, b):
+    r"""Union-find over pairs of labels that belong to the same group.
+
+    Returns the sorted unique labels, and the smallest label in the group of
+    each.
+    """
+    keys, inverse = np.unique(np.concatenate([a, b]), return_inverse=True)
+    a, b = inverse[:a.size], inverse[a.size:]
+    parent = np.arange(keys.size)
+    while True:
+        # Hook the larger root of each pair onto the smaller one, then
+        # compress the paths until every label points at its root.
+        ra, rb = parent[a], parent[b]
+        low = np.minimum(ra, rb)
+        old = parent.copy()
+        np.minimum.at(parent, ra, low)
+        np.minimum.at(parent, rb, low)
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent): break
+            parent = jumped
+        if np.array_equal(parent, old): break
+    return keys, keys[parent]
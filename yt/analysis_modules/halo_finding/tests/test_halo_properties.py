@@ -0,0 +1,97 @@
+"""
+Tests for computing the properties of halos
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+from yt.analysis_modules.halo_finding.halo_objects import \
+    compute_halo_properties, \
+    Halo
+from yt.testing import \
+    fake_particle_ds, \
+    assert_equal, \
+    assert_rel_equal
+
+def _halo_properties_one_by_one(tags, pos, mass, vel, dens, DLE, DW):
+    props = []
+    for tag in np.unique(tags[tags >= 0]):
+        sel = tags == tag
+        pm = mass[sel]
+        c = pos[sel] - DLE
+        for i in range(3):
+            if c[:,i].max() - c[:,i].min() >= DW[i] / 2.0:
+                c[c[:,i] <= DW[i] / 2.0, i] += DW[i]
+        com = (c * pm[:,None]).sum(axis=0) / pm.sum() % DW + DLE
+        bv = (vel[sel] * pm[:,None]).sum(axis=0) / pm.sum()
+        dv = (vel[sel] - bv) * (pm / pm.sum())[:,None]
+        rms = np.sqrt((dv**2).sum(axis=1).mean()) * pm.size
+        r = np.abs(pos[sel] - com)
+        r = np.sqrt((np.minimum(r, DW - r)**2).sum(axis=1)).max()
+        props.append((pm.size, pm.sum(), com, bv, r, rms, dens[sel].max(),
+                      pos[sel][dens[sel].argmax()]))
+    return props
+
+def test_compute_halo_properties():
+    np.random.seed(0x4d3d3d3)
+    DLE = np.array([-1.0, 0.0, 0.0])
+    DW = np.array([2.0, 1.0, 1.0])
+    n_halos = 20
+    tags = np.random.randint(-1, n_halos, 5000)
+    centers = DLE + np.random.random((n_halos, 3)) * DW
+    # One halo straddles the periodic boundary.
+    centers[0] = [0.99, 0.999, 0.5]
+    pos = centers[np.maximum(tags, 0)] + \
+      np.random.normal(0.0, 0.02, (tags.size, 3))
+    pos = DLE + np.mod(pos - DLE, DW)
+    mass = np.random.random(tags.size) + 0.1
+    vel = np.random.normal(size=(tags.size, 3))
+    dens = np.random.random(tags.size)
+    order = np.argsort(tags, kind="mergesort")
+    order = order[tags[order] >= 0]
+    ids, starts = np.unique(tags[order], return_index=True)
+    props = compute_halo_properties(ids, starts, pos[order], mass[order],
+                                    vel[order], dens[order], DLE, DW)
+    yield assert_equal, props["id"], np.arange(n_halos)
+    fields = ["size", "total_mass", "center_of_mass", "bulk_velocity",
+              "maximum_radius", "rms_velocity", "maximum_density",
+              "maximum_density_location"]
+    ref = _halo_properties_one_by_one(tags, pos, mass, vel, dens, DLE, DW)
+    for i, field in enumerate(fields):
+        yield assert_rel_equal, props[field], \
+          np.array([r[i] for r in ref]), 10
+
+class _FakeHaloList(object):
+    _max_dens = {}
+    def __init__(self, data_source):
+        self._data_source = data_source
+        self._base_indices = np.arange(data_source["particle_mass"].size)
+
+def test_maximum_radius():
+    np.random.seed(0x4d3d3d3)
+    ds = fake_particle_ds(npart=100)
+    halo_list = _FakeHaloList(ds.all_data())
+    densest = ds.arr([1.0, 0.2, 0.3, 0.4], "code_length")
+    halo = Halo(halo_list, 0, indices=np.arange(100), max_radius=0.123,
+                max_dens_point=densest)
+    # The stored radius is from the center of mass, so the radius from the
+    # densest point is still measured from the particles.
+    yield assert_equal, halo.maximum_radius(), 0.123
+    pos = np.array([halo["particle_position_%s" % ax].in_units(
+        "code_length").d for ax in "xyz"]).T
+    r = np.abs(pos - densest.d[1:])
+    DW = (ds.domain_right_edge - ds.domain_left_edge).in_units(
+        "code_length").d
+    r = np.sqrt((np.minimum(r, DW - r)**2).sum(axis=1)).max()
+    yield assert_rel_equal, halo.maximum_radius(center_of_mass=False).d, \
+      r, 10
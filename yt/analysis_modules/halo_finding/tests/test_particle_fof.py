@@ -0,0 +1,102 @@
+"""
+Tests for the region-by-region friends-of-friends halo finder
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+from yt.analysis_modules.halo_finding.api import \
+    ParticleFOFHaloFinder
+from yt.frontends.stream.api import load_particles
+from yt.testing import \
+    assert_equal, \
+    assert_rel_equal
+
+_fields = ["particle_number", "particle_mass",
+           "particle_position_x", "particle_position_y",
+           "particle_position_z", "particle_velocity_x",
+           "particle_velocity_y", "particle_velocity_z"]
+
+def _clustered_particles(n_clusters, n_per_cluster):
+    np.random.seed(0x4d3d3d3)
+    centers = np.random.random((n_clusters, 3))
+    # One cluster straddles a corner of the periodic domain.
+    centers[0] = [0.995, 0.5, 0.002]
+    pos = centers.repeat(n_per_cluster, axis=0) + \
+      np.random.normal(0.0, 0.004, (n_clusters * n_per_cluster, 3))
+    pos = np.mod(pos, 1.0)
+    n_parts = pos.shape[0]
+    data = {"particle_mass": np.ones(n_parts),
+            "particle_index": np.arange(n_parts)}
+    for i, ax in enumerate("xyz"):
+        data["particle_position_%s" % ax] = pos[:,i]
+        data["particle_velocity_%s" % ax] = np.random.normal(size=n_parts)
+    bbox = np.array([[0.0, 1.0]] * 3)
+    return load_particles(data, 1.0, bbox = bbox)
+
+def _brute_force_groups(pos, linking_length):
+    # Every pair of particles in the periodic unit box is compared, and each
+    # particle takes the smallest label of its friends until nothing changes.
+    dx = pos[:,None,:] - pos[None,:,:]
+    dx -= np.rint(dx)
+    linked = (dx**2).sum(axis=2) <= linking_length**2
+    labels = np.arange(pos.shape[0])
+    while True:
+        new_labels = np.where(linked, labels[None,:], labels.size).min(axis=1)
+        if (new_labels == labels).all():
+            return labels
+        labels = new_labels
+
+def test_particle_fof():
+    n_clusters, n_per_cluster = 10, 200
+    ds = _clustered_particles(n_clusters, n_per_cluster)
+    halos = {}
+    for num_regions in [1, 2, (3, 1, 2)]:
+        fof = ParticleFOFHaloFinder(ds, ptype="io", link=-0.02,
+                                    minimum_count=20,
+                                    num_regions=num_regions)
+        fof.run()
+        halos[num_regions] = fof.halos
+    # Splitting the domain up must not change the groups that are found.
+    for num_regions in [2, (3, 1, 2)]:
+        for field in _fields:
+            yield assert_rel_equal, halos[1][field], \
+              halos[num_regions][field], 10
+    yield assert_equal, halos[1]["particle_number"].size, n_clusters
+    yield assert_equal, halos[1]["particle_number"].sum(), \
+      n_clusters * n_per_cluster
+
+def test_particle_fof_brute_force():
+    ds = _clustered_particles(6, 40)
+    fof = ParticleFOFHaloFinder(ds, ptype="io", link=-0.02,
+                                minimum_count=20, num_regions=2)
+    fof.run()
+    pos = ds.all_data()["io", "particle_position"].in_units("code_length").d
+    labels = _brute_force_groups(pos, 0.02)
+    counts = np.bincount(labels)
+    groups = np.nonzero(counts >= 20)[0]
+    centers = []
+    for group in groups:
+        # Centers of mass, unwrapped around one member of the group.
+        dx = pos[labels == group] - pos[group]
+        dx -= np.rint(dx)
+        centers.append(np.mod(pos[group] + dx.mean(axis=0), 1.0))
+    centers = np.array(centers).reshape((-1, 3))
+    yield assert_equal, np.sort(fof.halos["particle_number"]), \
+      np.sort(counts[groups])
+    order = np.argsort(fof.halos["particle_position_x"])
+    ref_order = np.argsort(centers[:,0])
+    for i, ax in enumerate("xyz"):
+        yield assert_rel_equal, \
+          fof.halos["particle_position_%s" % ax].d[order], \
+          centers[ref_order, i], 8
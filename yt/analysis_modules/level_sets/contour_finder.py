@@ -13,69 +13,199 @@ This module contains a routine to search for topologically connected sets
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+import atexit
+import os
+import shutil
+import tempfile
 from itertools import chain
 import numpy as np
 
+from yt.config import ytcfg
 from yt.funcs import *
 import yt.utilities.data_point_utilities as data_point_utilities
 from yt.utilities.lib.ContourFinding import \
-    ContourTree, TileContourTree, link_node_contours, \
-    update_joins
+    ContourTree, TileContourTree, link_node_contours
 from yt.utilities.lib.grid_traversal import \
     PartitionedGrid
+from yt.utilities.parallel_tools.parallel_analysis_interface import \
+    parallel_objects
 
 def identify_contours(data_source, field, min_val, max_val,
-                          cached_fields=None):
-    tree = ContourTree()
-    gct = TileContourTree(min_val, max_val)
-    total_contours = 0
-    contours = {}
+                          cached_fields=None, max_workers=None,
+                          memory_budget=None, spill_dir=None):
+    r"""Identify the topologically connected sets of cells in *data_source*
+    whose values of *field* lie between *min_val* and *max_val*.
+
+    Each tile of ``data_source.tiles`` is labelled independently, so tiles
+    are handed out with
+    :func:`~yt.utilities.parallel_tools.parallel_analysis_interface.parallel_objects`
+    and labelled in parallel, either under MPI or, with *max_workers*, in a
+    pool of local worker processes.  Only the contours touching the faces
+    of each tile are added to the tree of joins between tiles; contours
+    that lie entirely inside a tile cannot be joined to anything else.
+
+    If the contour ids of all the tiles would take up more than
+    *memory_budget* megabytes (by default the ``contour_memory_budget``
+    configuration option), they are written to disk in a temporary
+    directory inside *spill_dir* and memory-mapped back when needed.
+    Under MPI, *spill_dir* must be visible to all processes.  The returned
+    contour ids are then memory-mapped from that directory too, so it is
+    only removed when the Python process exits.
+
+    Returns the number of contours and a dict, keyed by grid id, of lists
+    of ``(slice, contour_ids)`` pairs covering the data source.
+    """
+    tiles = []
     node_ids = []
-    DLE = data_source.ds.domain_left_edge
-    selector = getattr(data_source, "base_object", data_source).selector
-    masks = dict((g.id, m) for g, m in data_source.blocks)
     for (g, node, (sl, dims, gi)) in data_source.tiles.slice_traverse():
         node.node_ind = len(node_ids)
-        nid = node.node_id
-        node_ids.append(nid)
+        node_ids.append(node.node_id)
+        tiles.append((g, node, sl, dims, gi))
+    node_ids = np.array(node_ids, dtype="int64")
+    if node_ids.size == 0:
+        return 0, {}
+    masks = dict((g.id, m) for g, m in data_source.blocks)
+    sizes = np.array([dims.prod() for g, node, sl, dims, gi in tiles],
+                     dtype="int64")
+    # Contour ids within a tile are numbered upwards from the number of
+    # cells in the tiles before it, so that they never collide and are in
+    # the same order as if the tiles had been labelled one after another.
+    offsets = np.zeros(sizes.size, dtype="int64")
+    offsets[1:] = np.cumsum(sizes)[:-1]
+    # A cell on a face of a tile can be matched against a cell several
+    # layers into a finer neighbor, so we keep that many layers.
+    dds = np.array([g.dds.in_units("code_length").ndarray_view()
+                    for g, node, sl, dims, gi in tiles])
+    width = int(0.5 * dds.max() / dds.min()) + 1
+    if memory_budget is None:
+        memory_budget = ytcfg.getint("yt", "contour_memory_budget")
+    spill = sizes.sum() * 8 > memory_budget * 1024**2
+    if spill:
+        spill_dir = tempfile.mkdtemp(prefix="contours_", dir=spill_dir)
+        mylog.info("Writing contour ids for %s tiles to %s.",
+                   len(tiles), spill_dir)
+    try:
+        rv = _identify_contours(data_source, field, min_val, max_val,
+                                tiles, node_ids, masks, offsets, width,
+                                max_workers, spill_dir if spill else None)
+    except:
+        if spill:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        raise
+    if spill:
+        atexit.register(shutil.rmtree, spill_dir, True)
+    return rv
+
+def _identify_contours(data_source, field, min_val, max_val, tiles,
+                       node_ids, masks, offsets, width, max_workers,
+                       spill_dir):
+    gct = TileContourTree(min_val, max_val)
+    labels = {}
+    for sto, i in parallel_objects(range(len(tiles)), storage=labels,
+                                   max_workers=max_workers):
+        g, node, sl, dims, gi = tiles[i]
         values = g[field][sl].astype("float64")
         contour_ids = np.zeros(dims, "int64") - 1
         mask = masks[g.id][sl].astype("uint8")
-        total_contours += gct.identify_contours(values, contour_ids,
-                                                mask, total_contours)
-        new_contours = tree.cull_candidates(contour_ids)
-        tree.add_contours(new_contours)
-        # Now we can create a partitioned grid with the contours.
+        gct.identify_contours(values, contour_ids, mask, offsets[i])
+        all_ids = np.unique(contour_ids)
+        all_ids = all_ids[all_ids > -1]
+        face_ids = _face_contours(contour_ids, width)
+        if spill_dir is not None:
+            fn = os.path.join(spill_dir, "tile_%08i.npy" % i)
+            np.save(fn, contour_ids)
+            contour_ids = fn
+            fn = os.path.join(spill_dir, "ids_%08i.npy" % i)
+            np.save(fn, all_ids)
+            all_ids = fn
+        sto.result = (contour_ids, all_ids, face_ids)
+    tree = ContourTree()
+    tree.add_contours(np.concatenate(
+        [labels[i][2] for i in range(len(tiles))]))
+    # The contour ids are only ever read through the partitioned grids, so
+    # they all share one mask of ones; masked cells carry an id of -1.
+    ones = np.ones(max(t[3].prod() for t in tiles), dtype="uint8")
+    DLE = data_source.ds.domain_left_edge
+    contours = {}
+    for i, (g, node, sl, dims, gi) in enumerate(tiles):
+        contour_ids = _load_contours(labels[i][0], "c")
         LE = (DLE + g.dds * gi).in_units("code_length").ndarray_view()
         RE = LE + (dims * g.dds).in_units("code_length").ndarray_view()
         pg = PartitionedGrid(g.id,
-            [contour_ids.view("float64")], mask,
+            [contour_ids.view("float64")], ones[:dims.prod()].reshape(dims),
             LE, RE, dims.astype("int64"))
-        contours[nid] = (g.Level, node.node_ind, pg, sl)
-    node_ids = np.array(node_ids)
-    if node_ids.size == 0:
-        return 0, {}
+        contours[node.node_id] = (g.Level, node.node_ind, pg, sl)
     trunk = data_source.tiles.tree.trunk
     mylog.info("Linking node (%s) contours.", len(contours))
     link_node_contours(trunk, contours, tree, node_ids)
     mylog.info("Linked.")
-    #joins = tree.cull_joins(bt)
-    #tree.add_joins(joins)
+    del contours
     joins = tree.export()
+    order = np.argsort(joins[:,0], kind="mergesort")
+    join_ids = joins[order,0]
+    join_roots = joins[order,1]
+    # The final contours are the roots of the contours of every tile.  These
+    # are gathered a few tiles at a time, merging whenever the pending roots
+    # outnumber those already merged, so at most about twice the final
+    # number of contours is held at once.
+    final_joins = np.zeros(0, dtype="int64")
+    pending, n_pending = [], 0
+    for i in range(len(tiles)):
+        all_ids = _load_contours(labels[i][1], "r")
+        pending.append(np.unique(_apply_joins(all_ids, join_ids, join_roots)))
+        n_pending += pending[-1].size
+        if n_pending > final_joins.size or i == len(tiles) - 1:
+            final_joins = np.unique(np.concatenate([final_joins] + pending))
+            pending, n_pending = [], 0
+    final_ids = {}
+    for sto, i in parallel_objects(range(len(tiles)), storage=final_ids,
+                                   max_workers=max_workers):
+        contour_ids = _load_contours(labels[i][0], "r+")
+        valid = contour_ids > -1
+        contour_ids[valid] = np.searchsorted(final_joins,
+            _apply_joins(contour_ids[valid], join_ids, join_roots)) + 1
+        if spill_dir is None:
+            sto.result = contour_ids
+        else:
+            contour_ids.flush()
+            sto.result = None
     contour_ids = defaultdict(list)
-    pbar = get_pbar("Updating joins ... ", len(contours))
-    final_joins = np.unique(joins[:,1])
-    for i, nid in enumerate(sorted(contours)):
-        level, node_ind, pg, sl = contours[nid]
-        ff = pg.my_data[0].view("int64")
-        update_joins(joins, ff, final_joins)
-        contour_ids[pg.parent_grid_id].append((sl, ff))
-        pbar.update(i)
-    pbar.finish()
+    for i in np.argsort(node_ids, kind="mergesort"):
+        g, node, sl, dims, gi = tiles[i]
+        if spill_dir is None:
+            ff = final_ids[i]
+        else:
+            ff = _load_contours(labels[i][0], "c")
+        contour_ids[g.id].append((sl, ff))
     rv = dict()
     rv.update(contour_ids)
-    # NOTE: Because joins can appear in both a "final join" and a subsequent
-    # "join", we can't know for sure how many unique joins there are without
-    # checking if no cells match or doing an expensive operation checking for
-    # the unique set of final join values.
     return final_joins.size, rv
+
+def _face_contours(contour_ids, width):
+    # These are the contours within *width* cells of the faces of a tile,
+    # which are the only ones that can be joined to other tiles.
+    faces = []
+    for ax in range(3):
+        w = min(width, contour_ids.shape[ax])
+        for sl in (slice(None, w), slice(contour_ids.shape[ax] - w, None)):
+            face = [slice(None)] * 3
+            face[ax] = sl
+            faces.append(contour_ids[tuple(face)].ravel())
+    faces = np.unique(np.concatenate(faces))
+    return faces[faces > -1]
+
+def _load_contours(contour_ids, mode):
+    if isinstance(contour_ids, np.ndarray):
+        return contour_ids
+    return np.load(contour_ids, mmap_mode=mode)
+
+def _apply_joins(ids, join_ids, join_roots):
+    # Replace each id by the root of the contour it has been joined to, if
+    # it was joined to any.
+    ids = ids.copy()
+    if join_ids.size == 0:
+        return ids
+    ind = np.searchsorted(join_ids, ids).clip(max=join_ids.size - 1)
+    joined = join_ids[ind] == ids
+    ids[joined] = join_roots[ind[joined]]
+    return ids
@@ -0,0 +1,96 @@
+"""
+Tests for finding topologically connected sets of cells
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from collections import defaultdict
+
+from yt.analysis_modules.level_sets.api import identify_contours
+from yt.testing import \
+    fake_random_ds, \
+    assert_equal
+from yt.utilities.lib.ContourFinding import \
+    ContourTree, TileContourTree, link_node_contours, \
+    update_joins
+from yt.utilities.lib.grid_traversal import \
+    PartitionedGrid
+
+def _serial_contours(data_source, field, min_val, max_val):
+    # The labelling as it was done before tiles were handled independently:
+    # every tile adds its contours to one tree as they are found, and the
+    # joins are applied to each cell with update_joins.
+    tree = ContourTree()
+    gct = TileContourTree(min_val, max_val)
+    total_contours = 0
+    contours = {}
+    node_ids = []
+    DLE = data_source.ds.domain_left_edge
+    masks = dict((g.id, m) for g, m in data_source.blocks)
+    for (g, node, (sl, dims, gi)) in data_source.tiles.slice_traverse():
+        node.node_ind = len(node_ids)
+        node_ids.append(node.node_id)
+        values = g[field][sl].astype("float64")
+        contour_ids = np.zeros(dims, "int64") - 1
+        mask = masks[g.id][sl].astype("uint8")
+        total_contours += gct.identify_contours(values, contour_ids,
+                                                mask, total_contours)
+        tree.add_contours(tree.cull_candidates(contour_ids))
+        LE = (DLE + g.dds * gi).in_units("code_length").ndarray_view()
+        RE = LE + (dims * g.dds).in_units("code_length").ndarray_view()
+        pg = PartitionedGrid(g.id, [contour_ids.view("float64")], mask,
+                             LE, RE, dims.astype("int64"))
+        contours[node.node_id] = (g.Level, node.node_ind, pg, sl)
+    link_node_contours(data_source.tiles.tree.trunk, contours, tree,
+                       np.array(node_ids))
+    joins = tree.export()
+    final_joins = np.unique(joins[:,1])
+    rv = defaultdict(list)
+    for nid in sorted(contours):
+        level, node_ind, pg, sl = contours[nid]
+        ff = pg.my_data[0].view("int64")
+        update_joins(joins, ff, final_joins)
+        rv[pg.parent_grid_id].append((sl, ff))
+    return rv
+
+def _cell_labels(cids):
+    return np.concatenate([ff.ravel() for gid in sorted(cids)
+                           for sl, ff in cids[gid]])
+
+def _same_sets(a, b):
+    # Two labellings pick out the same sets of cells if every label in one
+    # goes with exactly one label in the other.
+    valid = a > -1
+    if not (valid == (b > -1)).all():
+        return False
+    a, b = a[valid], b[valid]
+    pairs = np.unique(a * (b.max() + 1) + b)
+    return pairs.size == np.unique(a).size == np.unique(b).size
+
+def test_contour_finder():
+    np.random.seed(0x4d3d3d3)
+    ds = fake_random_ds(16, nprocs=8)
+    dd = ds.all_data()
+    old = _cell_labels(_serial_contours(dd, "density", 0.8, 1.0))
+    results = [identify_contours(dd, "density", 0.8, 1.0),
+               identify_contours(dd, "density", 0.8, 1.0, max_workers=2),
+               identify_contours(dd, "density", 0.8, 1.0, memory_budget=0)]
+    n_contours, cids = results[0]
+    labels = _cell_labels(cids)
+    yield assert_equal, _same_sets(labels, old), True
+    yield assert_equal, n_contours, np.unique(labels[labels > -1]).size
+    # Neither the local workers nor the spilled tiles change the labels,
+    # and the spilled ones can still be read after the call returns.
+    for nc, cids in results[1:]:
+        yield assert_equal, nc, n_contours
+        yield assert_equal, _cell_labels(cids), labels
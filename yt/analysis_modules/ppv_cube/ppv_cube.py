@@ -14,17 +14,14 @@ import numpy as np
 from yt.utilities.on_demand_imports import _astropy
 from yt.utilities.orientation import Orientation
 from yt.utilities.fits_image import FITSImageData, sanitize_fits_unit
-from yt.visualization.volume_rendering.camera import off_axis_projection
-from yt.funcs import get_pbar
 from yt.utilities.physical_constants import clight, mh
 import yt.units.dimensions as ytdims
 from yt.units.yt_array import YTQuantity
-from yt.funcs import iterable
+from yt.funcs import iterable, get_num_threads
 from yt.utilities.parallel_tools.parallel_analysis_interface import \
-    parallel_root_only, parallel_objects
+    parallel_root_only, parallel_objects, communication_system
 import re
 from . import ppv_utils
-from yt.funcs import is_root
 from yt.extern.six import string_types
 
 def create_vlos(normal, no_shifting):
@@ -98,7 +95,7 @@ class PPVCube(object):
             key of the unit: (width, 'unit').  If set to a float, code units
             are assumed. Only for off-axis cubes.
         depth_res : integer, optional
-            The resolution of integration along the line of sight for off-axis cubes. Default: 256
+            Ignored, as each cell is projected whole. Kept for compatibility.
         method : string, optional
             Set the projection method to be used.
             "integrate" : line of sight integration over the line element.
@@ -113,19 +110,22 @@ class PPVCube(object):
             the plane of projection. If not set, an arbitrary grid-aligned north_vector 
             is chosen. Ignored in the case of on-axis cubes.
         no_ghost: bool, optional
-            Optimization option for off-axis cases. If True, homogenized bricks will
-            extrapolate out from grid instead of interpolating from
-            ghost zones that have to first be calculated.  This can
-            lead to large speed improvements, but at a loss of
-            accuracy/smoothness in resulting image.  The effects are
-            less notable when the transfer function is smooth and
-            broad. Default: True
+            Ignored, as no ghost zones are needed. Kept for compatibility.
 
         Examples
         --------
         >>> i = 60*np.pi/180.
         >>> L = [0.0,np.sin(i),np.cos(i)]
         >>> cube = PPVCube(ds, L, "density", (-5.,4.,100,"km/s"), width=(10.,"kpc"))
+
+        Notes
+        -----
+        The cube is made in a single pass over the data: each chunk of
+        cells is read once, and every cell adds its emission to all of the
+        channels that its line profile reaches. On-axis cubes match
+        antialiased projections of each channel, and off-axis cubes match
+        ray-cast ones, except that weighted on-axis cubes average over
+        pixels before, rather than after, dividing by the weight.
         """
 
         self.ds = ds
@@ -166,51 +166,26 @@ class PPVCube(object):
         self.dv = self.vbins[1]-self.vbins[0]
         self.dv_cgs = self.dv.in_cgs().v
 
-        self.current_v = 0.0
-
         _vlos = create_vlos(normal, self.no_shifting)
         self.ds.add_field(("gas","v_los"), function=_vlos, units="cm/s")
 
-        _intensity = self._create_intensity()
-        self.ds.add_field(("gas","intensity"), function=_intensity, units=self.field_units)
-
         if method == "integrate" and weight_field is None:
             self.proj_units = str(ds.quan(1.0, self.field_units+"*cm").units)
-        elif method == "sum":
+        else:
             self.proj_units = self.field_units
 
-        storage = {}
-        pbar = get_pbar("Generating cube.", self.nv)
-        for sto, i in parallel_objects(range(self.nv), storage=storage):
-            self.current_v = self.vmid_cgs[i]
-            if isinstance(normal, string_types):
-                prj = ds.proj("intensity", ds.coordinates.axis_id[normal], method=method,
-                              weight_field=weight_field)
-                buf = prj.to_frb(width, self.nx, center=self.center)["intensity"]
-            else:
-                buf = off_axis_projection(ds, self.center, normal, width,
-                                          (self.nx, self.ny, depth_res), "intensity",
-                                          north_vector=north_vector, no_ghost=no_ghost,
-                                          method=method, weight=weight_field).swapaxes(0,1)
-            sto.result_id = i
-            sto.result = buf
-            pbar.update(i)
-        pbar.finish()
-
-        self.data = ds.arr(np.zeros((self.nx,self.ny,self.nv)), self.proj_units)
-        if is_root():
-            for i, buf in sorted(storage.items()):
-                self.data[:,:,i] = buf.transpose()
-
-        self.axis_type = "velocity"
-
         # Now fix the width
         if iterable(self.width):
             self.width = ds.quan(self.width[0], self.width[1])
         elif not isinstance(self.width, YTQuantity):
             self.width = ds.quan(self.width, "code_length")
 
-        self.ds.field_info.pop(("gas","intensity"))
+        self.data = ds.arr(self._make_cube(normal, width, north_vector,
+                                           method, weight_field),
+                           self.proj_units)
+
+        self.axis_type = "velocity"
+
         self.ds.field_info.pop(("gas","v_los"))
 
     def transform_spectral_axis(self, rest_value, units):
@@ -310,12 +285,90 @@ class PPVCube(object):
     def __getitem__(self, item):
         return self.data[item]
 
-    def _create_intensity(self):
-        def _intensity(field, data):
-            v = self.current_v-data["v_los"].in_cgs().v
-            T = (data["temperature"]).in_cgs().v
-            w = ppv_utils.compute_weight(self.thermal_broad, self.dv_cgs,
-                                         self.particle_mass, v.flatten(), T.flatten())
-            w[np.isnan(w)] = 0.0
-            return data[self.field]*w.reshape(v.shape)
-        return _intensity
+    def _make_cube(self, normal, width, north_vector, method, weight_field):
+        ds = self.ds
+        center = self.center.in_units("code_length").v
+        dle = ds.domain_left_edge.in_units("code_length").v
+        dre = ds.domain_right_edge.in_units("code_length").v
+        on_axis = isinstance(normal, string_types)
+        if on_axis:
+            axis = ds.coordinates.axis_id[normal]
+            xax = ds.coordinates.x_axis[axis]
+            yax = ds.coordinates.y_axis[axis]
+            w = self.width.in_units("code_length").v
+            bounds = (center[xax] - 0.5*w, center[xax] + 0.5*w,
+                      center[yax] - 0.5*w, center[yax] + 0.5*w)
+            le = dle.copy()
+            re = dre.copy()
+            le[xax] = max(le[xax], bounds[0])
+            re[xax] = min(re[xax], bounds[1])
+            le[yax] = max(le[yax], bounds[2])
+            re[yax] = min(re[yax], bounds[3])
+        else:
+            orienter = Orientation(normal, north_vector=north_vector)
+            uv = np.array(orienter.unit_vectors, dtype="float64")
+            w = np.array(width, dtype="float64")
+            back_center = center - 0.5*w[2]*uv[2]
+            corners = np.array([center + 0.5*(i*w[0]*uv[0] + j*w[1]*uv[1] +
+                                              k*w[2]*uv[2])
+                                for i in (-1, 1) for j in (-1, 1)
+                                for k in (-1, 1)])
+            le = np.maximum(corners.min(axis=0), dle)
+            re = np.minimum(corners.max(axis=0), dre)
+        source = ds.region(center, le, re)
+
+        cube = np.zeros((self.nx, self.ny, self.nv), dtype="float64")
+        wbuff = None
+        if weight_field is not None:
+            wbuff = np.zeros((self.nx, self.ny), dtype="float64")
+        num_threads = int(get_num_threads())
+        # The chunks add into the cube in place, which the local process
+        # pool could not hand back, so they are only split over MPI tasks.
+        for chunk in parallel_objects(source.chunks([], "io",
+                                                    local_only=True),
+                                      max_workers=1):
+            values = np.asarray(chunk[self.field], dtype="float64")
+            if values.size == 0: continue
+            v_los = np.asarray(chunk["v_los"].in_cgs(), dtype="float64")
+            if self.thermal_broad:
+                T = np.asarray(chunk["temperature"].in_cgs(), dtype="float64")
+            else:
+                T = np.zeros(values.shape)
+            weights = None
+            if weight_field is not None:
+                weights = np.asarray(chunk[weight_field], dtype="float64")
+                values = values*weights
+            fcoords = np.asarray(chunk.fcoords.in_units("code_length"),
+                                 dtype="float64")
+            fwidth = np.asarray(chunk.fwidth.in_units("code_length"),
+                                dtype="float64")
+            if on_axis:
+                if method == "integrate":
+                    dl = np.asarray(chunk.fwidth[:,axis].in_cgs(),
+                                    dtype="float64")
+                else:
+                    dl = np.ones(values.shape)
+                ppv_utils.deposit_cube(cube, fcoords[:,xax], fcoords[:,yax],
+                    0.5*fwidth[:,xax], 0.5*fwidth[:,yax], dl, values,
+                    v_los, T, self.vmid_cgs, bounds, self.thermal_broad,
+                    self.dv_cgs, self.particle_mass.in_cgs().v, weights,
+                    wbuff, num_threads)
+            else:
+                ppv_utils.deposit_cube_off_axis(cube, fcoords, fwidth,
+                    values, v_los, T, self.vmid_cgs, back_center, uv, w,
+                    self.thermal_broad, self.dv_cgs,
+                    self.particle_mass.in_cgs().v, weights, wbuff,
+                    num_threads)
+
+        comm = communication_system.communicators[-1]
+        cube = comm.mpi_allreduce(cube, op="sum")
+        if wbuff is not None:
+            wbuff = comm.mpi_allreduce(wbuff, op="sum")
+            # Pixels that no weighted cell reaches are left at zero.
+            filled = wbuff != 0.0
+            cube[filled] /= wbuff[filled][:,None]
+            cube[~filled] = 0.0
+        elif not on_axis and method == "integrate":
+            # Path lengths are in units of the depth of the projection.
+            cube *= ds.quan(w[2], "code_length").in_cgs().v
+        return cube
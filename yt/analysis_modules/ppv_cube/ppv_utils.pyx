@@ -1,15 +1,68 @@
 import numpy as np
 cimport numpy as np
 cimport cython
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+from cython.parallel cimport prange, parallel
+from yt.utilities.lib.fp_utils cimport fmin, fmax, fclip, imax
+from yt.utilities.lib.pixelization_routines cimport cell_chord
 from yt.utilities.physical_constants import kboltz
 
 cdef extern from "math.h":
     double exp(double x) nogil
     double fabs(double x) nogil
     double sqrt(double x) nogil
+    double floor(double x) nogil
+    double ceil(double x) nogil
 
 cdef double kb = kboltz.v
 cdef double pi = np.pi
+# Past this many thermal widths squared, exp(-x) is below 1e-17 and the
+# thermal profile is zero next to its peak.
+cdef double max_exponent = 40.0
+# The cubes are split into at most this many blocks of rows, which the
+# threads fill independently of each other.
+cdef int max_row_blocks = 64
+
+@cython.cdivision(True)
+cdef inline double line_weight(int thermal_broad, double dv, double m_part,
+                               double v, double T) nogil:
+    cdef double v2_th, x
+    if thermal_broad:
+        if T > 0.0:
+            v2_th = 2.*kb*T/m_part
+            return dv*exp(-v*v/v2_th)/sqrt(v2_th*pi)
+        return 0.0
+    x = 1.-fabs(v)/dv
+    if x > 0.0:
+        return x
+    return 0.0
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline int line_profile(double *spec, int *k0, np.float64_t[:] vmid,
+                             int thermal_broad, double dv, double m_part,
+                             double v_los, double T) nogil:
+    # Fill spec with the weights of the channels, starting from k0[0],
+    # that the line of a cell moving at v_los reaches, and return their
+    # number.
+    cdef int k, k1, nv = vmid.shape[0]
+    cdef double half, kc
+    if thermal_broad:
+        if not T > 0.0: return 0
+        half = sqrt(2.*kb*T*max_exponent/m_part)
+    else:
+        half = fabs(dv)
+    kc = (v_los - vmid[0])/dv
+    if not kc == kc: return 0
+    half = half/fabs(dv) + 1.0
+    k0[0] = <int> fclip(floor(kc - half), 0.0, nv)
+    k1 = <int> fclip(ceil(kc + half) + 1.0, 0.0, nv)
+    for k in range(k0[0], k1):
+        spec[k - k0[0]] = line_weight(thermal_broad, dv, m_part,
+                                      vmid[k] - v_los, T)
+    return k1 - k0[0]
 
 @cython.cdivision(True)
 @cython.boundscheck(False)
@@ -21,20 +74,221 @@ def compute_weight(np.uint8_t thermal_broad,
     		       np.ndarray[np.float64_t, ndim=1] T):
 
     cdef int i, n
-    cdef double v2_th, x
     cdef np.ndarray[np.float64_t, ndim=1] w
 
     n = v.shape[0]
     w = np.zeros(n)
 
     for i in range(n):
-        if thermal_broad:
-            if T[i] > 0.0:
-                v2_th = 2.*kb*T[i]/m_part
-                w[i] = dv*exp(-v[i]*v[i]/v2_th)/sqrt(v2_th*pi)
-        else:
-            x = 1.-fabs(v[i])/dv
-            if x > 0.0:
-                w[i] = x
-                
+        w[i] = line_weight(thermal_broad, dv, m_part, v[i], T[i])
+
     return w
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def deposit_cube(np.float64_t[:, :, :] cube,
+                 np.float64_t[:] px, np.float64_t[:] py,
+                 np.float64_t[:] pdx, np.float64_t[:] pdy,
+                 np.float64_t[:] dl, np.float64_t[:] values,
+                 np.float64_t[:] v_los, np.float64_t[:] T,
+                 np.float64_t[:] vmid, bounds,
+                 int thermal_broad, double dv, double m_part,
+                 np.float64_t[:] weights = None,
+                 np.float64_t[:, :] wbuff = None,
+                 int num_threads = 0):
+    r"""Add the line emission of each cell, projected on-axis, to a cube.
+
+    Each cell, centered at (*px*, *py*) with half-widths (*pdx*, *pdy*) in
+    the image plane, adds ``values * dl`` times its line profile,
+    evaluated at the channel centers *vmid*, to ``cube[i, j, :]`` for each
+    pixel it overlaps, in proportion to the overlap, as the projection and
+    an antialiased pixelization would do one channel at a time.  If
+    *weights* are given, ``weights * dl`` is added to *wbuff* in the same
+    way.  The cube is added to in place, so that it can be accumulated over
+    several chunks of cells.
+
+    The threads fill disjoint blocks of rows of the cube, so that it is
+    written to directly rather than through a copy per thread.
+    """
+    cdef int nx, ny, nv, i, j, k, nk, lc, rc, lr, rr
+    cdef int b, nb, i_lo, i_hi, use_weights
+    cdef np.int64_t p, n_cells
+    cdef double x_min, x_max, y_min, y_max, dpx, dpy, ox, oy, a
+    cdef int failed[1]
+    cdef int *k0
+    cdef double *spec
+    nx = cube.shape[0]
+    ny = cube.shape[1]
+    nv = cube.shape[2]
+    if nx == 0 or ny == 0 or nv == 0:
+        raise RuntimeError("Cannot deposit into an empty cube.")
+    if vmid.shape[0] != nv:
+        raise RuntimeError("There must be one velocity per channel.")
+    use_weights = weights is not None
+    if use_weights and wbuff is None:
+        raise RuntimeError("Weights need an image to go into.")
+    x_min, x_max, y_min, y_max = bounds
+    dpx = (x_max - x_min)/nx
+    dpy = (y_max - y_min)/ny
+    n_cells = px.shape[0]
+    nb = min(nx, max_row_blocks)
+    failed[0] = 0
+    with nogil, parallel(num_threads = num_threads):
+        k0 = <int *> malloc(sizeof(int))
+        spec = <double *> malloc(sizeof(double) * nv)
+        if k0 == NULL or spec == NULL:
+            failed[0] = 1
+        for b in prange(nb, schedule = "dynamic"):
+            if k0 == NULL or spec == NULL: continue
+            i_lo = b*nx/nb
+            i_hi = (b + 1)*nx/nb
+            for p in range(n_cells):
+                if px[p] + pdx[p] <= x_min + i_lo*dpx or \
+                   px[p] - pdx[p] >= x_min + i_hi*dpx or \
+                   py[p] + pdy[p] <= y_min or py[p] - pdy[p] >= y_max:
+                    continue
+                nk = line_profile(spec, k0, vmid, thermal_broad, dv, m_part,
+                                  v_los[p], T[p])
+                if nk == 0 and not use_weights: continue
+                lc = <int> fclip(floor((px[p] - pdx[p] - x_min)/dpx),
+                                 i_lo, i_hi)
+                rc = <int> fclip(ceil((px[p] + pdx[p] - x_min)/dpx),
+                                 i_lo, i_hi)
+                lr = <int> fclip(floor((py[p] - pdy[p] - y_min)/dpy), 0.0, ny)
+                rr = <int> fclip(ceil((py[p] + pdy[p] - y_min)/dpy), 0.0, ny)
+                for i in range(lc, rc):
+                    ox = (fmin(x_min + (i + 1)*dpx, px[p] + pdx[p])
+                        - fmax(x_min + i*dpx, px[p] - pdx[p]))/dpx
+                    if ox <= 0.0: continue
+                    for j in range(lr, rr):
+                        oy = (fmin(y_min + (j + 1)*dpy, py[p] + pdy[p])
+                            - fmax(y_min + j*dpy, py[p] - pdy[p]))/dpy
+                        if oy <= 0.0: continue
+                        a = ox*oy*dl[p]
+                        if use_weights:
+                            wbuff[i, j] += weights[p]*a
+                        for k in range(nk):
+                            cube[i, j, k0[0] + k] += values[p]*a*spec[k]
+        free(spec)
+        free(k0)
+    if failed[0]:
+        raise MemoryError()
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def deposit_cube_off_axis(np.float64_t[:, :, :] cube,
+                          np.float64_t[:, :] pos, np.float64_t[:, :] dds,
+                          np.float64_t[:] values,
+                          np.float64_t[:] v_los, np.float64_t[:] T,
+                          np.float64_t[:] vmid,
+                          np.float64_t[:] origin,
+                          np.float64_t[:, :] unit_vectors,
+                          np.float64_t[:] width,
+                          int thermal_broad, double dv, double m_part,
+                          np.float64_t[:] weights = None,
+                          np.float64_t[:, :] wbuff = None,
+                          int num_threads = 0):
+    r"""Add the line emission of each cell, projected off-axis, to a cube.
+
+    The geometry is that of
+    :func:`~yt.utilities.lib.pixelization_routines.pixelize_off_axis_projection`
+    without supersampling: rays through the pixel centers start on the
+    plane through *origin* spanned by the first two *unit_vectors* and run
+    along the third for ``width[2]``.  Each cell adds ``values`` times the
+    length of every ray through it, as a fraction of ``width[2]``, times
+    its line profile at the channel centers *vmid*, to ``cube[i, j, :]``.
+    If *weights* are given, they are added to *wbuff* in the same way.
+
+    As in :func:`deposit_cube`, the threads fill disjoint blocks of rows.
+    """
+    cdef int nx, ny, nv, i, j, k, nk, i0, i1, j0, j1
+    cdef int b, nb, i_lo, i_hi, use_weights
+    cdef np.int64_t c, n_cells
+    cdef double dpx, dpy, sx, sy, hu, hv, cu, cv, chord
+    cdef np.float64_t e[3]
+    cdef np.float64_t n[3]
+    cdef np.float64_t ray_dir[3]
+    cdef int failed[1]
+    cdef np.float64_t *ray_pos
+    cdef np.float64_t *cell_pos
+    cdef np.float64_t *cell_hw
+    cdef int *k0
+    cdef double *spec
+    nx = cube.shape[0]
+    ny = cube.shape[1]
+    nv = cube.shape[2]
+    if nx == 0 or ny == 0 or nv == 0:
+        raise RuntimeError("Cannot deposit into an empty cube.")
+    if vmid.shape[0] != nv:
+        raise RuntimeError("There must be one velocity per channel.")
+    use_weights = weights is not None
+    if use_weights and wbuff is None:
+        raise RuntimeError("Weights need an image to go into.")
+    dpx = width[0]/imax(nx - 1, 1)
+    dpy = width[1]/imax(ny - 1, 1)
+    for k in range(3):
+        e[k] = unit_vectors[0, k]
+        n[k] = unit_vectors[1, k]
+        ray_dir[k] = unit_vectors[2, k]*width[2]
+    n_cells = pos.shape[0]
+    nb = min(nx, max_row_blocks)
+    failed[0] = 0
+    with nogil, parallel(num_threads = num_threads):
+        ray_pos = <np.float64_t *> malloc(sizeof(np.float64_t) * 3)
+        cell_pos = <np.float64_t *> malloc(sizeof(np.float64_t) * 3)
+        cell_hw = <np.float64_t *> malloc(sizeof(np.float64_t) * 3)
+        k0 = <int *> malloc(sizeof(int))
+        spec = <double *> malloc(sizeof(double) * nv)
+        if ray_pos == NULL or cell_pos == NULL or cell_hw == NULL or \
+           k0 == NULL or spec == NULL:
+            failed[0] = 1
+        for b in prange(nb, schedule = "dynamic"):
+            if ray_pos == NULL or cell_pos == NULL or cell_hw == NULL or \
+               k0 == NULL or spec == NULL:
+                continue
+            i_lo = b*nx/nb
+            i_hi = (b + 1)*nx/nb
+            for c in range(n_cells):
+                cu = cv = hu = hv = 0.0
+                for k in range(3):
+                    cell_pos[k] = pos[c, k]
+                    cell_hw[k] = 0.5*dds[c, k]
+                    cu = cu + (cell_pos[k] - origin[k])*e[k]
+                    cv = cv + (cell_pos[k] - origin[k])*n[k]
+                    hu = hu + cell_hw[k]*fabs(e[k])
+                    hv = hv + cell_hw[k]*fabs(n[k])
+                i0 = <int> fclip(ceil((cu - hu + 0.5*width[0])/dpx - 0.5),
+                                 i_lo, nx)
+                i1 = <int> fclip(floor((cu + hu + 0.5*width[0])/dpx + 0.5),
+                                 -1.0, i_hi - 1)
+                if i0 > i1: continue
+                j0 = <int> fclip(ceil((cv - hv + 0.5*width[1])/dpy - 0.5),
+                                 0.0, ny)
+                j1 = <int> fclip(floor((cv + hv + 0.5*width[1])/dpy + 0.5),
+                                 -1.0, ny - 1)
+                if j0 > j1: continue
+                nk = line_profile(spec, k0, vmid, thermal_broad, dv, m_part,
+                                  v_los[c], T[c])
+                if nk == 0 and not use_weights: continue
+                for i in range(i0, i1 + 1):
+                    sx = i*dpx - 0.5*width[0]
+                    for j in range(j0, j1 + 1):
+                        sy = j*dpy - 0.5*width[1]
+                        for k in range(3):
+                            ray_pos[k] = origin[k] + sx*e[k] + sy*n[k]
+                        chord = cell_chord(ray_pos, ray_dir, cell_pos,
+                                           cell_hw)
+                        if chord == 0.0: continue
+                        if use_weights:
+                            wbuff[i, j] += weights[c]*chord
+                        for k in range(nk):
+                            cube[i, j, k0[0] + k] += values[c]*chord*spec[k]
+        free(spec)
+        free(k0)
+        free(cell_hw)
+        free(cell_pos)
+        free(ray_pos)
+    if failed[0]:
+        raise MemoryError()
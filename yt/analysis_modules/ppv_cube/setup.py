@@ -5,12 +5,36 @@ import sys
 import os.path
 
 
+def check_for_openmp():
+    # The check lives with the rest of the compiled utilities.  We load it
+    # directly from there, as yt itself can't be imported until it's built.
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, os.pardir, "utilities", "lib", "setup.py")
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:
+        import imp
+        lib_setup = imp.load_source("yt_lib_setup", path)
+    else:
+        spec = spec_from_file_location("yt_lib_setup", path)
+        lib_setup = module_from_spec(spec)
+        spec.loader.exec_module(lib_setup)
+    return lib_setup.check_for_openmp()
+
 def configuration(parent_package='', top_path=None):
     from numpy.distutils.misc_util import Configuration
     config = Configuration('ppv_cube', parent_package, top_path)
+    if check_for_openmp() == True:
+        omp_args = ['-fopenmp']
+    else:
+        omp_args = None
     config.add_extension("ppv_utils", 
                          ["yt/analysis_modules/ppv_cube/ppv_utils.pyx"],
-                         libraries=["m"])
+                         libraries=["m"],
+                         extra_compile_args=omp_args,
+                         extra_link_args=omp_args,
+                         depends=["yt/utilities/lib/fp_utils.pxd",
+                                  "yt/utilities/lib/pixelization_routines.pxd"])
     config.add_subpackage("tests")
     config.make_config_py()  # installs __config__.py
     #config.make_svn_version_py()
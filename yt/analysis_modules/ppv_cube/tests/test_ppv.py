@@ -12,6 +12,7 @@ Unit test the PPVCube analysis module.
 
 from yt.frontends.stream.api import load_uniform_grid
 from yt.analysis_modules.ppv_cube.api import PPVCube
+from yt.visualization.volume_rendering.camera import off_axis_projection
 import yt.units as u
 from yt.utilities.physical_constants import kboltz, mh, clight
 import numpy as np
@@ -59,3 +60,30 @@ def test_ppv():
     c = dE*np.exp(-((cube.vmid-E_shift)/delta_E)**2)/(np.sqrt(np.pi)*delta_E)
 
     yield assert_allclose_units, a, c, 1.0e-2
+
+def test_ppv_projections():
+
+    np.random.seed(seed=0x4d3d3d3)
+
+    # The velocities are tiny next to the channels, so summing over the
+    # channels should give back the plain projections.
+    ds = fake_random_ds(16, nprocs=8)
+
+    cube = PPVCube(ds, "z", "density", (-5., 5., 10, "km/s"), dims=16)
+    prj = ds.proj("density", "z").to_frb((1.0, "unitary"), 16)
+    yield assert_rel_equal, cube.data.sum(axis=2), prj["density"].T, 10
+
+    L = [0.3, 0.2, 0.9]
+    cube = PPVCube(ds, L, "density", (-5., 5., 10, "km/s"), dims=16,
+                   width=(0.8, "unitary"), depth=(1.0, "unitary"))
+    image = off_axis_projection(ds, cube.center, L, [0.8, 0.8, 1.0], 16,
+                                "density")
+    yield assert_rel_equal, cube.data.sum(axis=2), image, 10
+
+    # Pixels past the edge of the domain have no weight, and are empty
+    # rather than NaN.
+    cube = PPVCube(ds, L, "density", (-5., 5., 10, "km/s"), dims=16,
+                   width=(2.0, "unitary"), depth=(1.0, "unitary"),
+                   weight_field="density")
+    yield assert_equal, np.isnan(cube.data).any(), False
+    yield assert_equal, cube.data[0,0,:].sum(), 0.0
@@ -21,7 +21,6 @@ import math
 import itertools
 
 from yt.config import ytcfg
-from yt.extern.six.moves import zip as izip
 from yt.funcs import \
     get_pbar
 from yt.units import \
@@ -294,6 +293,12 @@ class SpectrumBuilder(object):
     model : String
         Choice of Initial Metalicity Function model, 'chabrier' or
         'salpeter'. Default = 'chabrier'.
+    time_now : YTQuantity, optional
+        The time at which the ages of the stars are taken.  Default: the
+        current time of the dataset.
+    star_filter : String, optional
+        The particle type, for instance one defined by a particle filter,
+        whose particles are the stars in the data source.
 
     Examples
     --------
@@ -350,7 +355,7 @@ class SpectrumBuilder(object):
                            star_creation_time=None,
                            star_metallicity_fraction=None,
                            star_metallicity_constant=None,
-                           min_age=YTQuantity(0.0, 'yr')):
+                           min_age=YTQuantity(0.0, 'yr'), chunked=False):
 
         r"""For the set of stars, calculate the collective spectrum.
         Attached to the output are several useful objects:
@@ -386,6 +391,11 @@ class SpectrumBuilder(object):
         min_age : Float
             Removes young stars younger than this number (in years)
             from the spectrum. Default: 0 (all stars).
+        chunked : Boolean
+            If True, read the stars from *data_source* one chunk at a time,
+            so that they are never all in memory at once.  The star_mass,
+            star_creation_time and star_metal arrays are not attached in
+            this case. Default: False.
 
         Examples
         --------
@@ -456,18 +466,19 @@ class SpectrumBuilder(object):
         else:
             # Get the data we need.
             if self.filter_provided:
-                ct = self._filter['creation_time']
-                # mass_stars = self._data_source[self._filter, "particle_mass"]
+                # The filter names the particle type holding the stars.
+                self.star_creation_time = self._data_source[
+                    self._filter, "creation_time"]
+                self.star_mass = self._data_source[
+                    self._filter, "particle_mass"].in_units('Msun')
                 if star_metallicity_constant is None:
                     self.star_metal = self._data_source[
                         self._filter, "metallicity_fraction"].in_units('Zsun')
                 else:
-                    self.star_metal = \
-                        self._ds.arr(np.ones_like(
-                            self._data_source[self._filter,
-                                              "metallicity_fraction"]) *
+                    self.star_metal = self._ds.arr(
+                        np.ones_like(self.star_mass) *
                         star_metallicity_constant, "Zsun")
-            else:
+            elif not chunked:
                 ct = self._data_source["creation_time"]
                 if ct is None:
                     errmsg = 'data source must have particle_age!'
@@ -489,64 +500,106 @@ class SpectrumBuilder(object):
                 else:
                     self.star_metal = self._data_source[
                         "metallicity_fraction"][mask].in_units('Zsun')
+        if data_source is None or self.filter_provided or not chunked:
+            self.star_mass, self.star_creation_time, self.star_metal = \
+                self._add_stars(self.star_mass, self.star_creation_time,
+                                self.star_metal)
+            self.total_mass = self.star_mass.sum()
+            self.avg_mass = self.star_mass.mean()
+            tot_metal = (self.star_metal * self.star_mass).sum()
+        else:
+            self.total_mass = YTQuantity(0.0, "Msun")
+            tot_metal = YTQuantity(0.0, "Msun*Zsun")
+            n_stars = 0
+            for chunk in self._data_source.chunks([], "io"):
+                ct = chunk["creation_time"]
+                mask = ct > 0
+                if not mask.any(): continue
+                mass = chunk["particle_mass"][mask].in_units("Msun")
+                if star_metallicity_constant is not None:
+                    metal = self._ds.arr(np.ones_like(mass) *
+                                         star_metallicity_constant, "Zsun")
+                else:
+                    metal = chunk["metallicity_fraction"][mask].in_units("Zsun")
+                mass, ct, metal = self._add_stars(mass, ct[mask], metal)
+                self.total_mass += mass.sum()
+                tot_metal += (metal * mass).sum()
+                n_stars += mass.size
+            if n_stars == 0:
+                errmsg = 'all particles have age < 0'
+                mylog.error(errmsg)
+                raise RuntimeError(errmsg)
+            self.avg_mass = self.total_mass / n_stars
+
+        # Normalize.
+        if tot_metal > 0:
+            self.avg_metal = math.log10(
+                (tot_metal / self.total_mass).in_units('Zsun'))
+        else:
+            self.avg_metal = -99
+
+    def _add_stars(self, star_mass, star_creation_time, star_metal):
+        # Add the flux of a set of stars to the total spectrum, returning the
+        # stars that were old enough to be included.
         # Age of star in years.
-        dt = (self.time_now - self.star_creation_time).in_units('yr')
+        dt = (self.time_now - star_creation_time).in_units('yr')
         dt[dt < 0.0] = 0.0
         # Remove young stars
         sub = dt >= self.min_age
-        if len(sub) == 0:
-            return
-        self.star_metal = self.star_metal[sub]
+        star_mass = star_mass[sub].in_units('Msun')
+        star_creation_time = star_creation_time[sub]
+        star_metal = star_metal[sub]
         dt = dt[sub]
-        self.star_creation_time = self.star_creation_time[sub]
+        if dt.size == 0:
+            return star_mass, star_creation_time, star_metal
         # Figure out which METALS bin the star goes into.
-        Mindex = np.digitize(self.star_metal.in_units('Zsun'), METALS)
-        # Replace the indices with strings.
-        Mname = MtoD[Mindex]
+        Mindex = np.digitize(star_metal.in_units('Zsun'), METALS)
         # Figure out which age bin this star goes into.
         Aindex = np.digitize(dt, self.age)
-        # Ratios used for the interpolation.
-        ratio1 = (dt - self.age[Aindex - 1]) / \
-            (self.age[Aindex] - self.age[Aindex - 1])
-        ratio2 = (self.age[Aindex] - dt) / \
-            (self.age[Aindex] - self.age[Aindex - 1])
-        # Sort the stars by metallicity and then by age, which should reduce
-        # memory access time by a little bit in the loop.
-        indexes = np.arange(self.star_metal.size)
-        sort = np.asarray([indexes[i]
-                           for i in np.lexsort([indexes, Aindex, Mname])])
-        Mname = Mname[sort]
+        # Ratio used for the interpolation.
+        ratio = ((dt - self.age[Aindex - 1]) /
+                 (self.age[Aindex] - self.age[Aindex - 1])).d
+        # Stars in the same metallicity and age bins with the same age have
+        # the same interpolated flux, so we add up their masses first.  Stars
+        # formed at the same time share an age, so this usually leaves far
+        # fewer distinct fluxes than there are stars.
+        sort = np.lexsort([ratio, Aindex, Mindex])
+        Mindex = Mindex[sort]
         Aindex = Aindex[sort]
-        ratio1 = ratio1[sort]
-        ratio2 = ratio2[sort]
-        self.star_mass = self.star_mass[sort]
-        self.star_creation_time = self.star_creation_time[sort]
-        self.star_metal = self.star_metal[sort]
-
-        # Interpolate the flux for each star, adding to the total by weight.
-        pbar = get_pbar("Calculating fluxes", len(self.star_mass))
-        for i, star in enumerate(izip(Mname, Aindex, ratio1, ratio2,
-                                      self.star_mass)):
-            # Pick the right age bin for the right flux array.
-            flux = self.flux[star[0]][star[1], :]
-            # Get the one just before the one above.
-            flux_1 = self.flux[star[0]][star[1] - 1, :]
-            # interpolate in log(flux), linear in time.
-            int_flux = star[3] * np.log10(flux_1) + star[2] * np.log10(flux)
-            # Add this flux to the total, weighted by mass.
-            self.final_spec += np.power(10., int_flux) * star[4]
+        ratio = ratio[sort]
+        new_bin = np.ones(sort.size, dtype="bool")
+        new_bin[1:] = (Mindex[1:] != Mindex[:-1]) | \
+            (Aindex[1:] != Aindex[:-1])
+        new_ratio = new_bin.copy()
+        new_ratio[1:] |= ratio[1:] != ratio[:-1]
+        starts = np.where(new_ratio)[0]
+        mass = np.add.reduceat(star_mass.d[sort], starts)
+        new_bin = new_bin[starts]
+        Mindex = Mindex[starts]
+        Aindex = Aindex[starts]
+        ratio = ratio[starts]
+
+        # Interpolate the flux for each of these, in blocks that bound the
+        # size of the intermediate arrays, and add to the total by weight.
+        bins = np.append(np.where(new_bin)[0], mass.size)
+        block = max(1, 2**22 // self.wavelength.size)
+        pbar = get_pbar("Calculating fluxes", bins.size - 1)
+        for i, (start, end) in enumerate(zip(bins[:-1], bins[1:])):
+            flux = self.flux[MtoD[Mindex[start]]]
+            # Pick the right age bin, and the one just before it.
+            log_flux = np.log10(flux[Aindex[start], :])
+            log_flux_1 = np.log10(flux[Aindex[start] - 1, :])
+            for b in range(start, end, block):
+                r = ratio[b:min(b + block, end)]
+                # interpolate in log(flux), linear in time.
+                int_flux = np.outer(1.0 - r, log_flux_1) + \
+                    np.outer(r, log_flux)
+                # Add this flux to the total, weighted by mass.
+                self.final_spec += np.dot(mass[b:min(b + block, end)],
+                                          np.power(10., int_flux))
             pbar.update(i)
         pbar.finish()
-
-        # Normalize.
-        self.total_mass = self.star_mass.sum()
-        self.avg_mass = self.star_mass.mean()
-        tot_metal = (self.star_metal * self.star_mass).sum()
-        if tot_metal > 0:
-            self.avg_metal = math.log10(
-                (tot_metal / self.total_mass).in_units('Zsun'))
-        else:
-            self.avg_metal = -99
+        return star_mass, star_creation_time, star_metal
 
     def write_out(self, name="sum_flux.out"):
         r"""Write out the summed flux to a file.
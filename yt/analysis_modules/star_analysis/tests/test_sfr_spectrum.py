@@ -0,0 +1,90 @@
+"""
+Tests for the summed spectra of star particles
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import h5py
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from yt.analysis_modules.star_analysis.sfr_spectrum import \
+    SpectrumBuilder, CHABRIER, METALS, MtoD
+from yt.frontends.stream.api import load_particles
+from yt.testing import \
+    assert_rel_equal
+
+def _fake_tables(bcdir, n_ages=20, n_waves=30):
+    # Random spectra on the age and wavelength bins of the real tables.
+    ages = np.logspace(5.0, 10.2, n_ages)
+    waves = np.linspace(1000.0, 10000.0, n_waves)
+    for fn in CHABRIER.values():
+        with h5py.File(os.path.join(bcdir, fn), "w") as f:
+            f["agebins"] = ages
+            f["wavebins"] = waves
+            f["flam"] = np.random.random((n_ages, n_waves)) + 0.1
+
+def _per_star_spectrum(spec, mass, age, metal):
+    # The spectrum as it was built before, one star at a time.
+    ages = spec.age.in_units("yr").d
+    total = np.zeros(spec.wavelength.size)
+    for m, t, z in zip(mass, age, metal):
+        flux = spec.flux[MtoD[np.digitize([z], METALS)[0]]]
+        a = np.digitize([t], ages)[0]
+        r = (t - ages[a - 1]) / (ages[a] - ages[a - 1])
+        total += m * np.power(10.0, (1.0 - r) * np.log10(flux[a - 1, :]) +
+                              r * np.log10(flux[a, :]))
+    return total
+
+def _stars(n_stars):
+    mass = np.random.random(n_stars) + 0.5
+    # Half of the stars form in bursts that share a creation time.
+    age = 10**np.random.uniform(6.0, 10.0, n_stars)
+    age[n_stars // 2:] = age[:n_stars // 4].repeat(2)[:n_stars - n_stars // 2]
+    metal = 10**np.random.uniform(-3.0, 0.5, n_stars)
+    return mass, age, metal
+
+def _cosmology(ds):
+    ds.hubble_constant = 0.7
+    ds.omega_matter = 0.3
+    ds.omega_lambda = 0.7
+
+def test_spectrum_builder():
+    np.random.seed(0x4d3d3d3)
+    bcdir = tempfile.mkdtemp()
+    try:
+        _fake_tables(bcdir)
+        n_stars = 100
+        mass, age, metal = _stars(n_stars)
+        data = {"particle_mass": (mass, "Msun"),
+                "creation_time": (1e10 - age, "yr"),
+                "metallicity_fraction": (metal, "Zsun")}
+        for ax in "xyz":
+            data["particle_position_%s" % ax] = np.random.random(n_stars)
+        ds = load_particles(data, 1.0)
+        _cosmology(ds)
+        time_now = ds.quan(1e10, "yr")
+        spec = SpectrumBuilder(ds, bcdir, time_now=time_now)
+        ref = _per_star_spectrum(spec, mass, age, metal)
+        spec.calculate_spectrum(star_mass=mass,
+            star_creation_time=ds.arr(1e10 - age, "yr"),
+            star_metallicity_fraction=ds.arr(metal, "Zsun"))
+        yield assert_rel_equal, spec.final_spec, ref, 10
+        # Reading the stars through a particle type gives the same answer.
+        spec = SpectrumBuilder(ds, bcdir, time_now=time_now,
+                               star_filter="io")
+        spec.calculate_spectrum(data_source=ds.all_data())
+        yield assert_rel_equal, spec.final_spec, ref, 10
+    finally:
+        shutil.rmtree(bcdir)
@@ -61,7 +61,11 @@ ytcfg_defaults = dict(
     sketchfab_api_key = 'None',
     thread_field_detection = 'False',
     ignore_invalid_unit_operation_errors = 'False',
-    chunk_size = '1000'
+    chunk_size = '1000',
+    field_memo_size = '512',
+    neighbor_cache_size = '512',
+    contour_memory_budget = '4096',
+    sph_kernel_scatter = 'False'
     )
 # Here is the upgrade.  We're actually going to parse the file in its entirety
 # here.  Then, if it has any of the Forbidden Sections, it will be rewritten
@@ -253,7 +253,12 @@ class YTQuadTreeProjBase(YTSelectionContainer2D):
         field = self._determine_fields(ensure_list(field))
 
         if not self.deserialize(field):
-            self.get_data(field)
+            # Fields that can be imaged straight from SPH particles are only
+            # projected onto the octree if they are asked for.
+            octree_fields = [f for f in field if
+                self.ds.coordinates.sph_pixelize_field(self, f) is None]
+            if len(octree_fields) > 0 or len(field) == 0:
+                self.get_data(octree_fields)
             self.serialize()
 
     @property
@@ -488,6 +493,7 @@ class YTCoveringGridBase(YTSelectionContainer3D):
                          ("index", "y"),
                          ("index", "z"))
     _base_grid = None
+    _ghost_zone_filler = None
     def __init__(self, level, left_edge, dims, fields = None,
                  ds = None, num_ghost_zones = 0, use_pbar = True,
                  field_parameters = None):
@@ -597,7 +603,10 @@ class YTCoveringGridBase(YTSelectionContainer3D):
         if len(fields_to_get) == 0: return
         fill, gen, part, alias = self._split_fields(fields_to_get)
         if len(part) > 0: self._fill_particles(part)
-        if len(fill) > 0: self._fill_fields(fill)
+        if len(fill) > 0 and self._ghost_zone_filler is not None:
+            self._fill_ghost_zones(fill)
+        elif len(fill) > 0:
+            self._fill_fields(fill)
         for a, f in sorted(alias.items()):
             self[a] = f(self)
             self.field_data[a].convert_to_units(f.output_units)
@@ -646,6 +655,15 @@ class YTCoveringGridBase(YTSelectionContainer3D):
             fi = self.ds._get_field_info(*name)
             self[name] = self.ds.arr(v, fi.units)
 
+    def _fill_ghost_zones(self, fields):
+        fields = [f for f in fields if f not in self.field_data]
+        if len(fields) == 0: return
+        output_fields = self._ghost_zone_filler.fill(
+            self._base_grid, self._num_ghost_zones, fields)
+        for name, v in zip(fields, output_fields):
+            fi = self.ds._get_field_info(*name)
+            self[name] = self.ds.arr(v, fi.units)
+
     def _generate_container_field(self, field):
         rv = self.ds.arr(np.ones(self.ActiveDimensions, dtype="float64"),
                              "")
@@ -682,13 +700,21 @@ class YTCoveringGridBase(YTSelectionContainer3D):
     def RightEdge(self):
         return self.right_edge
 
-    def deposit(self, positions, fields = None, method = None):
+    def deposit(self, positions, fields = None, method = None,
+                num_threads = None):
         cls = getattr(particle_deposit, "deposit_%s" % method, None)
         if cls is None:
             raise YTParticleDepositionNotImplemented(method)
         op = cls(self.ActiveDimensions.prod()) # We allocate number of zones, not number of octs
         op.initialize()
-        op.process_grid(self, positions, fields)
+        if num_threads is None: num_threads = int(get_num_threads())
+        located = None
+        if op.reach >= 0 and num_threads != 1:
+            located = self._batched_locations(positions, op.reach,
+                lambda: particle_deposit.locate_in_grid(self, positions,
+                                                        op.reach))
+        op.process_grid(self, positions, fields, num_threads = num_threads,
+                        located = located)
         vals = op.finalize()
         return vals.reshape(self.ActiveDimensions, order="C")
 
@@ -23,9 +23,11 @@ data_object_registry = {}
 import numpy as np
 import weakref
 import shelve
+from collections import OrderedDict
 from contextlib import contextmanager
 
 from yt.funcs import *
+from yt.config import ytcfg
 
 from yt.data_objects.particle_io import particle_handler_registry
 from yt.units.unit_object import UnitParseError
@@ -44,7 +46,8 @@ from yt.utilities.amr_kdtree.api import \
     AMRKDTree
 from .derived_quantities import DerivedQuantityCollection
 from yt.fields.field_exceptions import \
-    NeedsGridType
+    NeedsGridType, \
+    ValidationException
 import yt.geometry.selection_routines
 from yt.geometry.selection_routines import \
     compose_selector
@@ -80,6 +83,63 @@ class YTFieldData(dict):
     """
     pass
 
+class FieldMemo(object):
+    """
+    Holds fields that have been pruned from a data container's field_data so
+    that later consumers within the same chunk can reuse them rather than
+    reading or generating them again.
+
+    Fields that are known, from the dependency graph, to be needed by fields
+    still waiting to be generated are released as soon as the last of those
+    consumers has been generated.  All other fields are kept until the memo
+    grows beyond *max_bytes*, at which point the oldest are released first.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.data = OrderedDict()
+        self.refs = {}
+        self.pending = {}
+
+    def __contains__(self, field):
+        return field in self.data
+
+    def add_pending(self, field, dependencies):
+        self.pending[field] = set(dependencies)
+
+    def generated(self, field):
+        for dep in self.pending.pop(field, ()):
+            if self.refs.get(dep, 0) > 0:
+                self.refs[dep] -= 1
+                if self.refs[dep] == 0:
+                    self.release(dep)
+
+    def store(self, field, value):
+        nbytes = getattr(value, "nbytes", 0)
+        if nbytes > self.max_bytes: return
+        if field in self.data:
+            self.release(field)
+        self.data[field] = value
+        self.refs[field] = sum(1 for deps in self.pending.values()
+                               if field in deps)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            self.release(next(iter(self.data)))
+
+    def retrieve(self, field):
+        return self.data.get(field, None)
+
+    def release(self, field):
+        value = self.data.pop(field, None)
+        self.refs.pop(field, None)
+        self.nbytes -= getattr(value, "nbytes", 0)
+
+    def clear(self):
+        self.data.clear()
+        self.refs.clear()
+        self.pending.clear()
+        self.nbytes = 0
+
 class RegisteredDataContainer(type):
     def __init__(cls, name, b, d):
         type.__init__(cls, name, b, d)
@@ -99,6 +159,7 @@ class YTDataContainer(object):
     _skip_add = False
     _container_fields = ()
     _field_cache = None
+    _field_memo = None
     _index = None
 
     def __init__(self, ds, field_parameters):
@@ -207,6 +268,9 @@ class YTDataContainer(object):
         to derived fields.
         """
         self.field_parameters[name] = val
+        # Anything we have held on to may depend on the old value.
+        if self._field_memo is not None:
+            self._field_memo.clear()
 
     def has_field_parameter(self, name):
         """
@@ -311,33 +375,49 @@ class YTDataContainer(object):
         return rv
 
     def _generate_spatial_fluid(self, field, ngz):
+        if ngz == 0:
+            return self._generate_spatial_fluids([field])[field]
         finfo = self.ds._get_field_info(*field)
         if finfo.units is None:
             raise YTSpatialFieldUnitError(field)
         units = finfo.units
         rv = self.ds.arr(np.empty(self.ires.size, dtype="float64"), units)
         ind = 0
-        if ngz == 0:
-            deps = self._identify_dependencies([field], spatial = True)
-            deps = self._determine_fields(deps)
-            for io_chunk in self.chunks([], "io", cache = False):
-                for i,chunk in enumerate(self.chunks([], "spatial", ngz = 0,
-                                                    preload_fields = deps)):
-                    o = self._current_chunk.objs[0]
-                    with o._activate_cache():
-                        ind += o.select(self.selector, self[field], rv, ind)
-        else:
-            chunks = self.index._chunk(self, "spatial", ngz = ngz)
-            for i, chunk in enumerate(chunks):
-                with self._chunked_read(chunk):
-                    gz = self._current_chunk.objs[0]
-                    wogz = gz._base_grid
-                    ind += wogz.select(
-                        self.selector,
-                        gz[field][ngz:-ngz, ngz:-ngz, ngz:-ngz],
-                        rv, ind)
+        chunks = self.index._chunk(self, "spatial", ngz = ngz)
+        for i, chunk in enumerate(chunks):
+            with self._chunked_read(chunk):
+                gz = self._current_chunk.objs[0]
+                wogz = gz._base_grid
+                ind += wogz.select(
+                    self.selector,
+                    gz[field][ngz:-ngz, ngz:-ngz, ngz:-ngz],
+                    rv, ind)
         return rv
 
+    def _generate_spatial_fluids(self, fields):
+        # These fields need no ghost zones, so they are all generated in one
+        # pass over the spatial chunks.  That way work they share on a chunk,
+        # like locating the particles to deposit, only needs doing once.
+        rvs, inds = {}, {}
+        for field in fields:
+            finfo = self.ds._get_field_info(*field)
+            if finfo.units is None:
+                raise YTSpatialFieldUnitError(field)
+            rvs[field] = self.ds.arr(np.empty(self.ires.size, dtype="float64"),
+                                     finfo.units)
+            inds[field] = 0
+        deps = self._identify_dependencies(fields, spatial = True)
+        deps = self._determine_fields(deps)
+        for io_chunk in self.chunks([], "io", cache = False):
+            for i,chunk in enumerate(self.chunks([], "spatial", ngz = 0,
+                                                preload_fields = deps)):
+                o = self._current_chunk.objs[0]
+                with o._activate_cache(), o._batched_deposits():
+                    for field in fields:
+                        inds[field] += o.select(self.selector, self[field],
+                                                rvs[field], inds[field])
+        return rvs
+
     def _generate_particle_field(self, field):
         # First we check the validator
         ftype, fname = field
@@ -483,7 +563,10 @@ class YTDataContainer(object):
         new_field_parameters = field_parameters.copy()
         new_field_parameters.update(old_field_parameters)
         self.field_parameters = new_field_parameters
+        # Fields held from before may depend on the old parameters.
+        old_memo, self._field_memo = self._field_memo, None
         yield
+        self._field_memo = old_memo
         self.field_parameters = old_field_parameters
 
     @contextmanager
@@ -569,6 +652,7 @@ class GenerationInProgress(Exception):
 
 class YTSelectionContainer(YTDataContainer, ParallelAnalysisInterface):
     _locked = False
+    _deposit_locations = None
     _sort_by = None
     _selector = None
     _current_chunk = None
@@ -639,7 +723,17 @@ class YTSelectionContainer(YTDataContainer, ParallelAnalysisInterface):
             fields_to_get += deps
         return fields_to_get
 
+    def _field_dependencies(self, field):
+        fd = self.ds.field_dependencies.get(field, None) or \
+             self.ds.field_dependencies.get(field[1], None)
+        if fd is None: return []
+        return self._determine_fields(list(set(fd.requested)))
+
     def get_data(self, fields=None):
+        if self._field_memo is None:
+            # This is the outermost call, so the memo lives until it returns.
+            with self._memoized_fields():
+                return self.get_data(fields)
         if self._current_chunk is None:
             self.index._identify_base_chunk(self)
         if fields is None: return
@@ -668,6 +762,9 @@ class YTSelectionContainer(YTDataContainer, ParallelAnalysisInterface):
         fields_to_generate = []
         for field in self._determine_fields(fields):
             if field in self.field_data: continue
+            if field in self._field_memo:
+                self.field_data[field] = self._field_memo.retrieve(field)
+                continue
             finfo = self.ds._get_field_info(*field)
             try:
                 finfo.check_available(self)
@@ -702,23 +799,34 @@ class YTSelectionContainer(YTDataContainer, ParallelAnalysisInterface):
         read_fluids, gen_fluids = self.index._read_fluid_fields(
                                         fluids, self, self._current_chunk)
         for f, v in read_fluids.items():
-            self.field_data[f] = self.ds.arr(v, input_units = finfos[f].units)
-            self.field_data[f].convert_to_units(finfos[f].output_units)
+            self.field_data[f] = self._wrap_read_field(finfos[f], v)
 
         read_particles, gen_particles = self.index._read_particle_fields(
                                         particles, self, self._current_chunk)
         for f, v in read_particles.items():
-            self.field_data[f] = self.ds.arr(v, input_units = finfos[f].units)
-            self.field_data[f].convert_to_units(finfos[f].output_units)
+            self.field_data[f] = self._wrap_read_field(finfos[f], v)
 
         fields_to_generate += gen_fluids + gen_particles
+        for field in fields_to_generate:
+            self._field_memo.add_pending(field,
+                self._field_dependencies(field))
         self._generate_fields(fields_to_generate)
         for field in list(self.field_data.keys()):
             if field not in ofields:
-                self.field_data.pop(field)
+                self._field_memo.store(field, self.field_data.pop(field))
+
+    def _wrap_read_field(self, finfo, v):
+        # The buffer handed back by the IO handler is owned by us, so we
+        # view it as a YTArray rather than copying it and convert it to the
+        # output units in place.
+        if isinstance(v, np.ndarray) and not v.flags.writeable:
+            v = v.copy()
+        fd = self.ds.arr(v, input_units = finfo.units)
+        return fd.convert_to_units(finfo.output_units)
 
     def _generate_fields(self, fields_to_generate):
         index = 0
+        memo = self._field_memo
         with self._field_lock():
             # At this point, we assume that any fields that are necessary to
             # *generate* a field are in fact already available to us.  Note
@@ -726,13 +834,21 @@ class YTSelectionContainer(YTDataContainer, ParallelAnalysisInterface):
             # fields have a spatial requirement.  This will be checked inside
             # _generate_field, at which point additional dependencies may
             # actually be noted.
+            batched = self._generate_deposited_fields(fields_to_generate)
             while any(f not in self.field_data for f in fields_to_generate):
                 field = fields_to_generate[index % len(fields_to_generate)]
                 index += 1
                 if field in self.field_data: continue
+                if memo is not None and field in memo:
+                    self.field_data[field] = memo.retrieve(field)
+                    memo.generated(field)
+                    continue
                 fi = self.ds._get_field_info(*field)
                 try:
-                    fd = self._generate_field(field)
+                    if field in batched:
+                        fd = batched.pop(field)
+                    else:
+                        fd = self._generate_field(field)
                     if fd is None:
                         raise RuntimeError
                     if fi.units is None:
@@ -761,25 +877,66 @@ class YTSelectionContainer(YTDataContainer, ParallelAnalysisInterface):
                     except UnitParseError:
                         raise YTFieldUnitParseError(fi)
                     self.field_data[field] = fd
+                    if memo is not None:
+                        memo.generated(field)
                 except GenerationInProgress as gip:
                     for f in gip.fields:
                         if f not in fields_to_generate:
                             fields_to_generate.append(f)
 
+    def _generate_deposited_fields(self, fields):
+        # Deposited particle fields that are requested together are generated
+        # in a single pass over the spatial chunks, so the particles only
+        # have to be located on each chunk once.  This returns what it could
+        # generate; anything else is left to _generate_field.
+        if self._current_chunk is not None and \
+           self._current_chunk.chunk_type == "spatial":
+            return {}
+        memo = self._field_memo
+        batch = []
+        for field in fields:
+            if field[0] != "deposit" or field in self.field_data: continue
+            if memo is not None and field in memo: continue
+            finfo = self.ds._get_field_info(*field)
+            if finfo.particle_type: continue
+            try:
+                finfo.check_available(self)
+            except NeedsGridType as ngt_exception:
+                if ngt_exception.ghost_zones == 0:
+                    batch.append(field)
+            except ValidationException:
+                pass
+        if len(batch) < 2:
+            return {}
+        try:
+            return self._generate_spatial_fluids(batch)
+        except GenerationInProgress:
+            return {}
+
     @contextmanager
     def _field_lock(self):
         self._locked = True
         yield
         self._locked = False
 
+    @contextmanager
+    def _memoized_fields(self):
+        max_bytes = ytcfg.getint("yt", "field_memo_size") * 1024**2
+        old_memo, self._field_memo = self._field_memo, FieldMemo(max_bytes)
+        try:
+            yield
+        finally:
+            self._field_memo = old_memo
+
     @contextmanager
     def _chunked_read(self, chunk):
         # There are several items that need to be swapped out
-        # field_data, size, shape
+        # field_data, size, shape, and the memo of pruned fields
         old_field_data, self.field_data = self.field_data, YTFieldData()
         old_chunk, self._current_chunk = self._current_chunk, chunk
         old_locked, self._locked = self._locked, False
-        yield
+        with self._memoized_fields():
+            yield
         self.field_data = old_field_data
         self._current_chunk = old_chunk
         self._locked = old_locked
@@ -798,6 +955,32 @@ class YTSelectionContainer(YTDataContainer, ParallelAnalysisInterface):
                 self.field_data[field] = old_fields.pop(field)
         self._field_cache = None
 
+    @contextmanager
+    def _batched_deposits(self):
+        # While this is active, deposit operations remember where they found
+        # each set of particles on the mesh, so that depositing several
+        # fields of the same particles only locates them once.
+        if self._deposit_locations is not None:
+            yield
+            return
+        self._deposit_locations = []
+        try:
+            yield
+        finally:
+            self._deposit_locations = None
+
+    def _batched_locations(self, positions, key, locate):
+        # The positions are kept alongside what was found for them, so they
+        # can be matched by identity.
+        if self._deposit_locations is None:
+            return None
+        for pos, k, located in self._deposit_locations:
+            if pos is positions and k == key:
+                return located
+        located = locate()
+        self._deposit_locations.append((positions, key, located))
+        return located
+
     def _initialize_cache(self, cache):
         # Wipe out what came before
         self._field_cache = {}
@@ -1194,7 +1377,8 @@ class YTSelectionContainer3D(YTSelectionContainer):
                     ff, mask, grid.LeftEdge, grid.dds)
 
     def extract_connected_sets(self, field, num_levels, min_val, max_val,
-                               log_space=True, cumulative=True):
+                               log_space=True, cumulative=True,
+                               max_workers=None, memory_budget=None):
         """
         This function will create a set of contour objects, defined
         by having connected cell structures, which can then be
@@ -1203,6 +1387,11 @@ class YTSelectionContainer3D(YTSelectionContainer):
 
         Note that this function *can* return a connected set object that has no
         member values.
+
+        *max_workers* and *memory_budget* (in megabytes) are passed on to
+        :func:`~yt.analysis_modules.level_sets.contour_finder.identify_contours`
+        to label the tiles in parallel and to write the contour ids to disk
+        when they would not fit in memory.
         """
         if log_space:
             cons = np.logspace(np.log10(min_val),np.log10(max_val),
@@ -1219,7 +1408,9 @@ class YTSelectionContainer3D(YTSelectionContainer):
             from yt.analysis_modules.level_sets.api import identify_contours
             from yt.analysis_modules.level_sets.clump_handling import \
                 add_contour_field
-            nj, cids = identify_contours(self, field, cons[level], mv)
+            nj, cids = identify_contours(self, field, cons[level], mv,
+                                         max_workers=max_workers,
+                                         memory_budget=memory_budget)
             unique_contours = set([])
             for sl_list in cids.values():
                 for sl, ff in sl_list:
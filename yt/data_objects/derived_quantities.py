@@ -54,7 +54,10 @@ class DerivedQuantity(ParallelAnalysisInterface):
         self.count_values(*args, **kwargs)
         chunks = self.data_source.chunks([], chunking_style="io")
         storage = {}
-        for sto, ds in parallel_objects(chunks, -1, storage = storage):
+        # The chunks are one object that changes as it is iterated over, so
+        # they can't be handed out to local workers.
+        for sto, ds in parallel_objects(chunks, -1, storage = storage,
+                                        max_workers = 1):
             sto.result = self.process_chunk(ds, *args, **kwargs)
         # Now storage will have everything, and will be done via pickling, so
         # the units will be preserved.  (Credit to Nathan for this
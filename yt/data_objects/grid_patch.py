@@ -244,7 +244,7 @@ class AMRGridPatch(YTSelectionContainer):
         args = (level, new_left_edge, new_right_edge)
         kwargs = {'dims': self.ActiveDimensions + 2*n_zones,
                   'num_ghost_zones':n_zones,
-                  'use_pbar':False, 'fields':fields}
+                  'use_pbar':False}
         # This should update the arguments to set the field parameters to be
         # those of this grid.
         field_parameters = {}
@@ -259,6 +259,17 @@ class AMRGridPatch(YTSelectionContainer):
                 field_parameters = field_parameters,
                 **kwargs)
         cube._base_grid = self
+        # If the ghost zones lie entirely within grids on this level, they
+        # can be copied directly from those grids rather than interpolated.
+        filler = getattr(self.index, "ghost_zone_filler", None)
+        if not all_levels and filler is not None and \
+           filler.sources(self, n_zones) is not None:
+            cube._ghost_zone_filler = filler
+        cube.get_data(fields)
+        # Cubes filled later on are part of a walk over the grids, which
+        # clears the cache when it is done; otherwise we clear it now.
+        if len(ensure_list(fields)) > 0 and filler is not None:
+            filler.clear()
         return cube
 
     def get_vertex_centered_data(self, field, smoothed=True, no_ghost=False):
@@ -330,18 +341,33 @@ class AMRGridPatch(YTSelectionContainer):
     def particle_operation(self, *args, **kwargs):
         raise NotImplementedError
 
-    def deposit(self, positions, fields = None, method = None):
+    def deposit(self, positions, fields = None, method = None,
+                num_threads = None):
         # Here we perform our particle deposition.
         cls = getattr(particle_deposit, "deposit_%s" % method, None)
         if cls is None:
             raise YTParticleDepositionNotImplemented(method)
         op = cls(self.ActiveDimensions.prod()) # We allocate number of zones, not number of octs
         op.initialize()
-        op.process_grid(self, positions, fields)
+        if num_threads is None: num_threads = int(get_num_threads())
+        located = None
+        if op.reach >= 0 and num_threads != 1:
+            located = self._batched_locations(positions, op.reach,
+                lambda: particle_deposit.locate_in_grid(self, positions,
+                                                        op.reach))
+        op.process_grid(self, positions, fields, num_threads = num_threads,
+                        located = located)
         vals = op.finalize()
         if vals is None: return
         return vals.reshape(self.ActiveDimensions, order="C")
 
+    def deposit_many(self, positions, operations, num_threads = None):
+        # Each of the operations is a (method, fields) pair, as for deposit.
+        # The particles are sorted for the parallel deposition only once.
+        with self._batched_deposits():
+            return [self.deposit(positions, fields, method, num_threads)
+                    for method, fields in operations]
+
     def select_blocks(self, selector):
         mask = self._get_selector_mask(selector)
         yield self, mask
@@ -141,7 +141,8 @@ class OctreeSubset(YTSelectionContainer):
             self._domain_ind = di
         return self._domain_ind
 
-    def deposit(self, positions, fields = None, method = None):
+    def deposit(self, positions, fields = None, method = None,
+                num_threads = None):
         r"""Operate on the mesh, in a particle-against-mesh fashion, with
         exclusively local input.
 
@@ -164,6 +165,10 @@ class OctreeSubset(YTSelectionContainer):
             `particle_deposit` namespace as `methodname_deposit`.  Current
             methods include `count`, `simple_smooth`, `sum`, `std`, `cic`,
             `weighted_mean`, `mesh_id`, and `nearest`.
+        num_threads : int, optional
+            The number of OpenMP threads to deposit with.  By default, this
+            is taken from the ``numthreads`` configuration option, and 0
+            means one per core.
 
         Returns
         -------
@@ -185,14 +190,44 @@ class OctreeSubset(YTSelectionContainer):
         # We should not need the following if we know in advance all our fields
         # need no casting.
         fields = [np.asarray(f, dtype="float64") for f in fields]
+        if num_threads is None: num_threads = int(get_num_threads())
+        located = self._batched_locations(positions, None,
+            lambda: particle_deposit.locate_in_octree(self.oct_handler,
+                self.domain_ind, pos, self.domain_id, self._domain_offset,
+                num_threads))
         op.process_octree(self.oct_handler, self.domain_ind, pos, fields,
-            self.domain_id, self._domain_offset)
+            self.domain_id, self._domain_offset, num_threads = num_threads,
+            located = located)
         vals = op.finalize()
         if vals is None: return
         return np.asfortranarray(vals)
 
+    def deposit_many(self, positions, operations, num_threads = None):
+        r"""Perform several deposition operations on the same particles,
+        locating each particle in the octree only once.
+
+        Parameters
+        ----------
+        positions : array_like (Nx3)
+            The positions of all of the particles to be examined.
+        operations : list of (method, fields) tuples
+            The operations to perform, each of which is as for the *method*
+            and *fields* arguments of `deposit`.
+        num_threads : int, optional
+            The number of OpenMP threads to deposit with.  By default, this
+            is taken from the ``numthreads`` configuration option.
+
+        Returns
+        -------
+        List of fortran-ordered, mesh-like arrays, one for each operation.
+        """
+        with self._batched_deposits():
+            return [self.deposit(positions, fields, method, num_threads)
+                    for method, fields in operations]
+
     def smooth(self, positions, fields = None, index_fields = None,
-               method = None, create_octree = False, nneighbors = 64):
+               method = None, create_octree = False, nneighbors = 64,
+               ptype = None, num_threads = None):
         r"""Operate on the mesh, in a particle-against-mesh fashion, with
         non-local input.
 
@@ -225,6 +260,14 @@ class OctreeSubset(YTSelectionContainer):
             we are able to find and identify all relevant particles.
         nneighbors : int, default 64
             The number of neighbors to examine during the process.
+        ptype : string, optional
+            The particle type the positions belong to.  If given, the
+            neighbors found for each cell are kept in the index's
+            neighbor cache, and later calls for the same particles and cells
+            reuse them rather than searching again.
+        num_threads : int, optional
+            The number of OpenMP threads to smooth with, as for
+            :meth:`deposit`.
 
         Returns
         -------
@@ -232,24 +275,6 @@ class OctreeSubset(YTSelectionContainer):
         """
         # Here we perform our particle deposition.
         positions.convert_to_units("code_length")
-        if create_octree:
-            morton = compute_morton(
-                positions[:,0], positions[:,1], positions[:,2],
-                self.ds.domain_left_edge,
-                self.ds.domain_right_edge)
-            morton.sort()
-            particle_octree = ParticleOctreeContainer([1, 1, 1],
-                self.ds.domain_left_edge,
-                self.ds.domain_right_edge,
-                over_refine = self._oref)
-            # This should ensure we get everything within one neighbor of home.
-            particle_octree.n_ref = nneighbors * 2
-            particle_octree.add(morton)
-            particle_octree.finalize()
-            pdom_ind = particle_octree.domain_ind(self.selector)
-        else:
-            particle_octree = self.oct_handler
-            pdom_ind = self.domain_ind
         if fields is None: fields = []
         if index_fields is None: index_fields = []
         cls = getattr(particle_smooth, "%s_smooth" % method, None)
@@ -260,12 +285,21 @@ class OctreeSubset(YTSelectionContainer):
         nvals = (nz, nz, nz, (mdom_ind >= 0).sum())
         op = cls(nvals, len(fields), nneighbors)
         op.initialize()
-        mylog.debug("Smoothing %s particles into %s Octs",
-            positions.shape[0], nvals[-1])
-        op.process_octree(self.oct_handler, mdom_ind, positions, 
-            self.fcoords, fields,
-            self.domain_id, self._domain_offset, self.ds.periodicity,
-            index_fields, particle_octree, pdom_ind, self.ds.geometry)
+        if num_threads is None: num_threads = int(get_num_threads())
+        key = self._neighbor_cache_key(positions, ptype, nneighbors,
+                                       "mesh", create_octree)
+        neighbor_lists = None
+        if key is not None:
+            neighbor_lists = self._index.neighbor_cache.get(key,
+                                                            positions.d)
+        if neighbor_lists is not None:
+            mylog.debug("Smoothing into %s Octs with cached neighbors",
+                nvals[-1])
+            op.process_neighbor_lists(neighbor_lists, fields, index_fields,
+                                      num_threads = num_threads)
+        else:
+            self._smooth_octree(op, positions, fields, index_fields,
+                                create_octree, nneighbors, key, num_threads)
         # If there are 0s in the smoothing field this will not throw an error, 
         # but silently return nans for vals where dividing by 0
         # Same as what is currently occurring, but suppressing the div by zero
@@ -279,8 +313,58 @@ class OctreeSubset(YTSelectionContainer):
             vals = np.asfortranarray(vals)
         return vals
 
+    def _neighbor_cache_key(self, positions, ptype, nneighbors, *args):
+        # Neighbor lists index the particles by position in the arrays they
+        # were found for.  The key pins down where the particles come from
+        # and the points (cells or particles) they were found for; the
+        # cache also checks the positions themselves before handing an
+        # entry back.
+        if ptype is None:
+            return None
+        data_files = getattr(self, "data_files", None)
+        if data_files is None:
+            files = None
+        else:
+            files = tuple(df.filename for df in data_files)
+        return (files, self.domain_id, hash(self.selector), ptype,
+                nneighbors, positions.shape[0]) + args
+
+    def _smooth_octree(self, op, positions, fields, index_fields,
+                       create_octree, nneighbors, key, num_threads):
+        if create_octree:
+            morton = compute_morton(
+                positions[:,0], positions[:,1], positions[:,2],
+                self.ds.domain_left_edge,
+                self.ds.domain_right_edge)
+            morton.sort()
+            particle_octree = ParticleOctreeContainer([1, 1, 1],
+                self.ds.domain_left_edge,
+                self.ds.domain_right_edge,
+                over_refine = self._oref)
+            # This should ensure we get everything within one neighbor of home.
+            particle_octree.n_ref = nneighbors * 2
+            particle_octree.add(morton)
+            particle_octree.finalize()
+            pdom_ind = particle_octree.domain_ind(self.selector)
+        else:
+            particle_octree = self.oct_handler
+            pdom_ind = self.domain_ind
+        mylog.debug("Smoothing %s particles into %s Octs",
+            positions.shape[0], op.nvals[-1])
+        if key is not None:
+            op.record_neighbor_lists()
+        op.process_octree(self.oct_handler, self.domain_ind, positions, 
+            self.fcoords, fields,
+            self.domain_id, self._domain_offset, self.ds.periodicity,
+            index_fields, particle_octree, pdom_ind, self.ds.geometry,
+            num_threads = num_threads)
+        if key is not None:
+            self._index.neighbor_cache.store(key, op.get_neighbor_lists(),
+                                             positions.d)
+
     def particle_operation(self, positions, fields = None,
-            method = None, nneighbors = 64):
+            method = None, nneighbors = 64, ptype = None,
+            num_threads = None):
         r"""Operate on particles, in a particle-against-particle fashion.
 
         This uses the octree indexing system to call a "smoothing" operation
@@ -307,6 +391,12 @@ class OctreeSubset(YTSelectionContainer):
             `particle_smooth` namespace as `methodname_smooth`.
         nneighbors : int, default 64
             The number of neighbors to examine during the process.
+        ptype : string, optional
+            The particle type the positions belong to.  If given, the
+            neighbors found for each particle are cached, as for
+            :meth:`smooth`.
+        num_threads : int, optional
+            The number of OpenMP threads to use, as for :meth:`deposit`.
 
         Returns
         -------
@@ -315,19 +405,6 @@ class OctreeSubset(YTSelectionContainer):
         """
         # Here we perform our particle deposition.
         positions.convert_to_units("code_length")
-        morton = compute_morton(
-            positions[:,0], positions[:,1], positions[:,2],
-            self.ds.domain_left_edge,
-            self.ds.domain_right_edge)
-        morton.sort()
-        particle_octree = ParticleOctreeContainer([1, 1, 1],
-            self.ds.domain_left_edge,
-            self.ds.domain_right_edge,
-            over_refine = 1)
-        particle_octree.n_ref = nneighbors * 2
-        particle_octree.add(morton)
-        particle_octree.finalize()
-        pdom_ind = particle_octree.domain_ind(self.selector)
         if fields is None: fields = []
         cls = getattr(particle_smooth, "%s_smooth" % method, None)
         if cls is None:
@@ -337,11 +414,21 @@ class OctreeSubset(YTSelectionContainer):
         nvals = (nz, nz, nz, (mdom_ind >= 0).sum())
         op = cls(nvals, len(fields), nneighbors)
         op.initialize()
-        mylog.debug("Smoothing %s particles into %s Octs",
-            positions.shape[0], nvals[-1])
-        op.process_particles(particle_octree, pdom_ind, positions, 
-            fields, self.domain_id, self._domain_offset, self.ds.periodicity,
-            self.ds.geometry)
+        if num_threads is None: num_threads = int(get_num_threads())
+        key = self._neighbor_cache_key(positions, ptype, nneighbors,
+                                       "particles")
+        neighbor_lists = None
+        if key is not None:
+            neighbor_lists = self._index.neighbor_cache.get(key,
+                                                            positions.d)
+        if neighbor_lists is not None:
+            mylog.debug("Smoothing %s particles with cached neighbors",
+                positions.shape[0])
+            op.process_neighbor_lists(neighbor_lists, fields,
+                                      num_threads = num_threads)
+        else:
+            self._smooth_particles(op, positions, fields, nneighbors, key,
+                                   num_threads)
         vals = op.finalize()
         if vals is None: return
         if isinstance(vals, list):
@@ -350,6 +437,32 @@ class OctreeSubset(YTSelectionContainer):
             vals = np.asfortranarray(vals)
         return vals
 
+    def _smooth_particles(self, op, positions, fields, nneighbors, key,
+                          num_threads):
+        morton = compute_morton(
+            positions[:,0], positions[:,1], positions[:,2],
+            self.ds.domain_left_edge,
+            self.ds.domain_right_edge)
+        morton.sort()
+        particle_octree = ParticleOctreeContainer([1, 1, 1],
+            self.ds.domain_left_edge,
+            self.ds.domain_right_edge,
+            over_refine = 1)
+        particle_octree.n_ref = nneighbors * 2
+        particle_octree.add(morton)
+        particle_octree.finalize()
+        pdom_ind = particle_octree.domain_ind(self.selector)
+        mylog.debug("Smoothing %s particles into %s Octs",
+            positions.shape[0], op.nvals[-1])
+        if key is not None:
+            op.record_neighbor_lists()
+        op.process_particles(particle_octree, pdom_ind, positions, 
+            fields, self.domain_id, self._domain_offset, self.ds.periodicity,
+            self.ds.geometry, num_threads = num_threads)
+        if key is not None:
+            self._index.neighbor_cache.store(key, op.get_neighbor_lists(),
+                                             positions.d)
+
     @cell_count_cache
     def select_icoords(self, dobj):
         return self.oct_handler.icoords(dobj.selector, domain_id = self.domain_id,
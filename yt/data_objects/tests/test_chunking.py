@@ -34,3 +34,44 @@ def test_chunking():
             yield assert_equal, coords['f']['io'], coords['f']['spatial']
             yield assert_equal, coords['i']['io'], coords['i']['all']
             yield assert_equal, coords['i']['io'], coords['i']['spatial']
+
+def test_field_memo():
+    from yt.fields.field_detector import FieldDetector
+    ds = fake_random_ds(16)
+    calls = []
+    def _double_density(field, data):
+        if not isinstance(data, FieldDetector):
+            calls.append(field.name)
+        return 2 * data["gas", "density"]
+    def _quad_density(field, data):
+        return 2 * data["gas", "double_density"]
+    def _oct_density(field, data):
+        return 2 * data["gas", "quad_density"]
+    for name, func in [("double_density", _double_density),
+                       ("quad_density", _quad_density),
+                       ("oct_density", _oct_density)]:
+        ds.add_field(("gas", name), function=func, units="g/cm**3")
+    ad = ds.all_data()
+    yield assert_equal, ad["gas", "oct_density"], 8 * ad["gas", "density"]
+    # The intermediate is pruned by the nested call for quad_density, but
+    # should be reused rather than generated a second time.
+    yield assert_equal, len(calls), 1
+    yield assert_equal, ("gas", "double_density") in ad.field_data, False
+
+def test_field_memo_release():
+    from yt.data_objects.data_containers import FieldMemo
+    memo = FieldMemo(1024)
+    memo.add_pending("b", ["a"])
+    memo.add_pending("c", ["a"])
+    memo.store("a", np.ones(8))
+    memo.store("d", np.ones(8))
+    yield assert_equal, memo.refs["a"], 2
+    memo.generated("b")
+    yield assert_equal, "a" in memo, True
+    memo.generated("c")
+    yield assert_equal, "a" in memo, False
+    # Fields without known consumers are only released under pressure
+    yield assert_equal, "d" in memo, True
+    memo.store("e", np.ones(127))
+    yield assert_equal, "d" in memo, False
+    yield assert_equal, memo.nbytes, 127 * 8
@@ -0,0 +1,103 @@
+"""
+Tests for DatasetSeries iteration
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import threading
+
+from yt.testing import \
+    fake_random_ds, assert_equal, assert_raises, requires_module
+from yt.data_objects.time_series import DatasetSeries
+from yt.utilities.exceptions import YTOutputNotIdentified
+from yt.utilities.grid_data_format.writer import write_to_gdf
+
+def setup():
+    from yt.config import ytcfg
+    ytcfg["yt","__withintesting"] = "True"
+
+def _write_outputs(tmpdir, n):
+    fns = []
+    for i in range(n):
+        fn = os.path.join(tmpdir, "output_%04i.h5" % i)
+        write_to_gdf(fake_random_ds(8), fn)
+        fns.append(fn)
+    return fns
+
+@requires_module("h5py")
+def test_prefetch():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fns = _write_outputs(tmpdir, 5)
+        for prefetch in [0, 1, 3, 10]:
+            setup_threads = []
+            def _setup(ds):
+                setup_threads.append(threading.current_thread())
+            ts = DatasetSeries(fns, prefetch = prefetch,
+                               setup_function = _setup)
+            names = []
+            indexed = []
+            for ds in ts:
+                names.append(ds.parameter_filename)
+                indexed.append(ds._instantiated_index is not None)
+            yield assert_equal, names, fns
+            # The loader builds the index before handing a dataset out, but
+            # setup_function still runs in the calling thread.
+            if prefetch > 0:
+                yield assert_equal, indexed, [True] * len(fns)
+            yield assert_equal, setup_threads, \
+                [threading.current_thread()] * len(fns)
+    finally:
+        shutil.rmtree(tmpdir)
+
+@requires_module("h5py")
+def test_prefetch_load_error():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fns = _write_outputs(tmpdir, 4)
+        junk = os.path.join(tmpdir, "junk.txt")
+        with open(junk, "w") as f:
+            f.write("This is not a dataset.\n")
+        outputs = fns[:2] + [junk] + fns[2:]
+        for prefetch in [1, 3, 10]:
+            nthreads = threading.active_count()
+            ts = DatasetSeries(outputs, prefetch = prefetch)
+            names = []
+            def _iterate():
+                for ds in ts:
+                    names.append(ds.parameter_filename)
+            # The error is raised where the bad output would have come out,
+            # after the outputs before it have been handed out.
+            assert_raises(YTOutputNotIdentified, _iterate)
+            yield assert_equal, names, fns[:2]
+            yield assert_equal, threading.active_count(), nthreads
+    finally:
+        shutil.rmtree(tmpdir)
+
+@requires_module("h5py")
+def test_prefetch_break():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fns = _write_outputs(tmpdir, 5)
+        for prefetch in [1, 3, 10]:
+            nthreads = threading.active_count()
+            ts = DatasetSeries(fns, prefetch = prefetch)
+            for ds in ts:
+                break
+            yield assert_equal, ds.parameter_filename, fns[0]
+            # Breaking out of the loop has to stop the background loader.
+            yield assert_equal, threading.active_count(), nthreads
+    finally:
+        shutil.rmtree(tmpdir)
@@ -13,10 +13,11 @@ Time series analysis functions.
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
-import inspect, functools, weakref, glob, types, os
+import inspect, functools, weakref, glob, types, os, sys, threading, copy
 
 from yt.funcs import *
-from yt.extern.six import add_metaclass, string_types
+from yt.extern.six import add_metaclass, string_types, reraise
+from yt.extern.six.moves import queue
 from yt.convenience import load
 from yt.config import ytcfg
 from .data_containers import data_object_registry
@@ -107,6 +108,11 @@ class DatasetSeries(object):
         file provided to the loop.
     setup_function : callable, accepts a ds
         This function will be called whenever a dataset is loaded.
+    prefetch : int
+        If greater than zero, iterating over the DatasetSeries will load and
+        index up to this many of the upcoming datasets in a background thread
+        while the current one is being analyzed.  This is not done by
+        .piter() when running in parallel under MPI.
 
     Examples
     --------
@@ -138,7 +144,7 @@ class DatasetSeries(object):
         return ret
 
     def __init__(self, outputs, parallel = True, setup_function = None,
-                 **kwargs):
+                 prefetch = 0, **kwargs):
         # This is needed to properly set _pre_outputs for Simulation subclasses.
         if iterable(outputs) and not isinstance(outputs, string_types):
             self._pre_outputs = outputs[:]
@@ -151,9 +157,14 @@ class DatasetSeries(object):
             setattr(self, type_name, functools.partial(
                 DatasetSeriesObject, self, type_name))
         self.parallel = parallel
+        self.prefetch = prefetch
         self.kwargs = kwargs
 
     def __iter__(self):
+        if self.prefetch > 0:
+            for ds in self._prefetch_iter():
+                yield ds
+            return
         # We can make this fancier, but this works
         for o in self._pre_outputs:
             if isinstance(o, str):
@@ -163,12 +174,52 @@ class DatasetSeries(object):
             else:
                 yield o
 
+    def _prefetch_iter(self):
+        # A single background thread loads the outputs in order.  It may run
+        # at most self.prefetch datasets ahead of the one that was last
+        # handed out, and we keep no reference to a dataset once it has been
+        # yielded, so finished datasets can be freed as soon as the caller
+        # lets go of them.
+        slots = threading.Semaphore(self.prefetch)
+        ready = queue.Queue()
+        stop = threading.Event()
+        def _load_outputs():
+            for o in self._pre_outputs:
+                slots.acquire()
+                if stop.is_set(): return
+                try:
+                    if isinstance(o, str):
+                        o = load(o, **self.kwargs)
+                        o.index
+                except:
+                    ready.put((None, sys.exc_info()))
+                    return
+                ready.put((o, None))
+        loader = threading.Thread(target = _load_outputs)
+        loader.daemon = True
+        loader.start()
+        try:
+            for o in self._pre_outputs:
+                ds, exc_info = ready.get()
+                slots.release()
+                if exc_info is not None:
+                    reraise(*exc_info)
+                if isinstance(o, str):
+                    self._setup_function(ds)
+                yield ds
+                del ds
+        finally:
+            stop.set()
+            slots.release()
+            loader.join()
+
     def __getitem__(self, key):
         if isinstance(key, slice):
             if isinstance(key.start, float):
                 return self.get_range(key.start, key.stop)
             # This will return a sliced up object!
-            return DatasetSeries(self._pre_outputs[key], self.parallel)
+            return DatasetSeries(self._pre_outputs[key], self.parallel,
+                                 prefetch = self.prefetch)
         o = self._pre_outputs[key]
         if isinstance(o, str):
             o = load(o, **self.kwargs)
@@ -182,7 +233,7 @@ class DatasetSeries(object):
     def outputs(self):
         return self._pre_outputs
 
-    def piter(self, storage = None):
+    def piter(self, storage = None, max_workers = None):
         r"""Iterate over time series components in parallel.
 
         This allows you to iterate over a time series while dispatching
@@ -210,6 +261,11 @@ class DatasetSeries(object):
             course of the iteration.  The keys will be the dataset
             indices and the values will be whatever is assigned to the *result*
             attribute on the storage during iteration.
+        max_workers : int
+            If yt is not running under MPI, load and process the datasets in
+            a pool of at most this many worker processes on the local
+            machine.  See
+            :func:`~yt.utilities.parallel_tools.parallel_analysis_interface.enable_local_parallelism`.
 
         Examples
         --------
@@ -246,6 +302,12 @@ class DatasetSeries(object):
         ...     ProjectionPlot(ds, "x", "Density").save()
         ...
 
+        Without MPI, this runs the same analysis in eight local processes:
+
+        >>> for sto, ds in ts.piter(storage=my_storage, max_workers=8):
+        ...     sto.result = ds.find_max("density")
+        ...
+
         """
         dynamic = False
         if self.parallel == False:
@@ -253,8 +315,17 @@ class DatasetSeries(object):
         else:
             if self.parallel == True: njobs = -1
             else: njobs = self.parallel
-        return parallel_objects(self, njobs=njobs, storage=storage,
-                                dynamic=dynamic)
+        objects = self
+        if self.prefetch > 0 and ytcfg.getboolean("yt", "__parallel"):
+            # Under MPI, parallel_objects walks the whole series on every
+            # processor and skips the outputs the others take, so the
+            # prefetching loader would load and index every output on every
+            # processor.  Only the outputs a processor keeps get indexed
+            # without it.
+            objects = copy.copy(self)
+            objects.prefetch = 0
+        return parallel_objects(objects, njobs=njobs, storage=storage,
+                                dynamic=dynamic, max_workers=max_workers)
 
     def eval(self, tasks, obj=None):
         tasks = ensure_list(tasks)
@@ -16,7 +16,7 @@ Unstructured mesh base container.
 import weakref
 import numpy as np
 
-from yt.funcs import mylog
+from yt.funcs import mylog, get_num_threads
 from yt.utilities.exceptions import \
     YTParticleDepositionNotImplemented
 from yt.utilities.lib.mesh_utilities import \
@@ -67,6 +67,22 @@ class UnstructuredMesh(YTSelectionContainer):
     def __repr__(self):
         return "UnstructuredMesh_%04i" % (self.mesh_id)
 
+    _bvh = None
+    @property
+    def bvh(self):
+        """
+        The bounding volume hierarchy over the elements of this mesh, which
+        is built the first time it is needed.
+        """
+        if self._bvh is None:
+            self._bvh = self._index._get_mesh_bvh(self)
+        return self._bvh
+
+    def _get_blocks(self, max_elements):
+        # Meshes are only split up into blocks when they can select their
+        # elements through the hierarchy.
+        return [self]
+
     def get_global_startindex(self):
         """
         Return the integer starting index for each dimension at the current
@@ -189,11 +205,27 @@ class SemiStructuredMesh(UnstructuredMesh):
         dt, t = dobj.selector.get_dt_mesh(self, mask.sum(), self._index_offset)
         return dt, t
 
+    def _get_blocks(self, max_elements):
+        if self.connectivity_indices.shape[0] <= max_elements:
+            return [self]
+        return [SemiStructuredMeshBlock(self, node)
+                for node in self.bvh.block_nodes(max_elements)]
+
+    def _fill_cell_mask(self, selector):
+        bvh = self.bvh
+        mask = bvh.fill_cell_mask(selector,
+                                  num_threads=int(get_num_threads()))
+        if mask is None: return None
+        # The hierarchy has the elements in its own order.
+        cell_mask = np.empty(mask.size, dtype="bool")
+        cell_mask[bvh.element_order] = mask
+        return cell_mask
+
     def _get_selector_mask(self, selector):
         if hash(selector) == self._last_selector_id:
             mask = self._last_mask
         else:
-            self._last_mask = mask = selector.fill_mesh_cell_mask(self)
+            self._last_mask = mask = self._fill_cell_mask(selector)
             self._last_selector_id = hash(selector)
             if mask is None:
                 self._last_count = 0
@@ -201,3 +233,61 @@ class SemiStructuredMesh(UnstructuredMesh):
                 self._last_count = mask.sum()
         return mask
 
+class SemiStructuredMeshBlock(SemiStructuredMesh):
+    """
+    A spatially coherent block of the elements of a SemiStructuredMesh,
+    made of those under one node of the mesh's bounding volume hierarchy.
+    Blocks share the coordinates and field data of the whole mesh, and
+    keep the elements in the order of the mesh.
+    """
+    _type_name = 'semi_structured_mesh_block'
+
+    def __init__(self, mesh, node):
+        self.field_data = YTFieldData()
+        self.field_parameters = {}
+        self.mesh = mesh
+        self.mesh_id = mesh.mesh_id
+        self.filename = mesh.filename
+        self.node = node
+        self._connectivity_length = mesh._connectivity_length
+        self._index_offset = mesh._index_offset
+        start, end = mesh.bvh.node_range[node]
+        elements = mesh.bvh.element_order[start:end]
+        self._order = np.argsort(elements, kind="mergesort")
+        self.elements = elements[self._order]
+        self.connectivity_coords = mesh.connectivity_coords
+        self.ds = mesh.ds
+        self._index = mesh._index
+        self._last_mask = None
+        self._last_count = -1
+        self._last_selector_id = None
+        self._current_particle_type = 'all'
+        self._current_fluid_type = self.ds.default_fluid_type
+
+    def __repr__(self):
+        return "SemiStructuredMeshBlock_%04i_%08i" % (self.mesh_id, self.node)
+
+    @property
+    def connectivity_indices(self):
+        return self.mesh.connectivity_indices[self.elements]
+
+    @property
+    def bvh(self):
+        return self.mesh.bvh
+
+    def _get_blocks(self, max_elements):
+        return [self]
+
+    def _fill_cell_mask(self, selector):
+        mask = self.mesh.bvh.fill_cell_mask(
+            selector, self.node, num_threads=int(get_num_threads()))
+        if mask is None: return None
+        return mask[self._order]
+
+    def select(self, selector, source, dest, offset):
+        # The source is the field for the whole mesh.
+        mask = self._get_selector_mask(selector)
+        count = self.count(selector)
+        if count == 0: return 0
+        dest[offset:offset+count] = source.flat[self.elements[mask]]
+        return count
@@ -57,6 +57,9 @@ class FieldInfoContainer(dict):
         self.field_list = field_list
         self.slice_info = slice_info
         self.field_aliases = {}
+        # Smoothed fields that can also be made directly from SPH particles,
+        # keyed by the smoothed field name, with the particle type and field.
+        self.sph_smoothed_fields = {}
         self.species_names = []
         self.setup_fluid_aliases()
 	#self.setup_particle_aliases()
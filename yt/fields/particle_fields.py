@@ -789,7 +789,7 @@ def add_volume_weighted_smoothed_field(ptype, coord_name, mass_name,
         # volume_weighted smooth operations return lists of length 1.
         rv = data.smooth(pos, [mass, hsml, dens, quan],
                          method="volume_weighted",
-                         create_octree=True)[0]
+                         create_octree=True, ptype=ptype)[0]
         rv[np.isnan(rv)] = 0.0
         # Now some quick unit conversions.
         rv = data.apply_units(rv, field_units)
@@ -797,6 +797,9 @@ def add_volume_weighted_smoothed_field(ptype, coord_name, mass_name,
     registry.add_field(field_name, function = _vol_weight,
                        validators = [ValidateSpatial(0)],
                        units = field_units)
+    if smoothing_length_name is not None and \
+       hasattr(registry, "sph_smoothed_fields"):
+        registry.sph_smoothed_fields[field_name] = (ptype, smoothed_field)
     return [field_name]
 
 def add_nearest_neighbor_field(ptype, coord_name, registry, nneighbors = 64):
@@ -807,7 +810,7 @@ def add_nearest_neighbor_field(ptype, coord_name, registry, nneighbors = 64):
         distances = 0.0 * pos[:,0]
         data.particle_operation(pos, [distances],
                          method="nth_neighbor",
-                         nneighbors = nneighbors)
+                         nneighbors = nneighbors, ptype = ptype)
         # Now some quick unit conversions.
         return distances
     registry.add_field(field_name, function = _nth_neighbor,
@@ -827,7 +830,7 @@ def add_density_kernel(ptype, coord_name, mass_name, registry, nneighbors = 64):
         densities = mass * 0.0
         data.particle_operation(pos, [mass, densities],
                          method="density",
-                         nneighbors = nneighbors)
+                         nneighbors = nneighbors, ptype = ptype)
         ones = pos.prod(axis=1) # Get us in code_length**3
         ones[:] = 1.0
         densities /= ones
@@ -194,6 +194,24 @@ def test_add_deposited_particle_field():
     ret = ad[fn]
     assert_equal(ret.sum(), ad['particle_ones'].sum())
 
+def test_deposited_fields_together():
+    fields = [("deposit", "all_count"), ("deposit", "all_density"),
+              ("deposit", "all_cic"), ("deposit", "all_cic_velocity_x")]
+    for ds in [fake_random_ds(16, particles=16**3),
+               fake_particle_ds(npart=16**3)]:
+        ad = ds.all_data()
+        ad.get_data(fields)
+        for field in fields:
+            ad2 = ds.all_data()
+            yield assert_equal, ad[field], ad2[field]
+        # Either a grid or an octree subset.
+        g = ad._current_chunk.objs[0]
+        pos = g["all", "particle_position"]
+        mass = g["all", "particle_mass"]
+        together = g.deposit_many(pos, [("count", []), ("sum", [mass])])
+        yield assert_equal, together[0], g.deposit(pos, [], "count")
+        yield assert_equal, together[1], g.deposit(pos, [mass], "sum")
+
 def test_add_gradient_fields():
     gfields = base_ds.add_gradient_fields(("gas","density"))
     gfields += base_ds.add_gradient_fields(("index", "ones"))
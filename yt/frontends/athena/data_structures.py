@@ -17,6 +17,8 @@ import h5py
 import numpy as np
 import weakref
 import glob #ST 9/12
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from yt.funcs import *
 from yt.data_objects.grid_patch import \
            AMRGridPatch
@@ -138,6 +140,66 @@ def parse_line(line, grid):
         time_index = splitup.index(chk23("time"))
         grid['time'] = float(str23(splitup[time_index+1]))
 
+_header_dtype = np.dtype([("level", "int32"),
+                          ("left_edge", "float64", (3,)),
+                          ("dds", "float64", (3,)),
+                          ("dimensions", "int64", (3,)),
+                          ("read_table_offset", "int64")])
+
+def read_grid_header(filename):
+    """
+    Read the ASCII header of a single VTK file, returning the level, left
+    edge, cell widths and dimensions of the grid it holds, along with the
+    offset of the start of its field data.
+    """
+    f = open(filename,'rb')
+    gridread = {}
+    gridread['read_field'] = None
+    gridread['read_type'] = None
+    gridread['read_table_offset'] = -1
+    after_cell_data = False
+    line = f.readline()
+    while gridread['read_field'] is None:
+        if after_cell_data:
+            # The field data is addressed from the end of the line following
+            # CELL_DATA or POINT_DATA.
+            gridread['read_table_offset'] = f.tell()
+            after_cell_data = False
+        parse_line(line, gridread)
+        splitup = line.strip().split()
+        if chk23('X_COORDINATES') in splitup:
+            gridread['left_edge'] = np.zeros(3)
+            gridread['dds'] = np.zeros(3)
+            v = np.fromfile(f, dtype='>f8', count=2)
+            gridread['left_edge'][0] = v[0]-0.5*(v[1]-v[0])
+            gridread['dds'][0] = v[1]-v[0]
+        if chk23('Y_COORDINATES') in splitup:
+            v = np.fromfile(f, dtype='>f8', count=2)
+            gridread['left_edge'][1] = v[0]-0.5*(v[1]-v[0])
+            gridread['dds'][1] = v[1]-v[0]
+        if chk23('Z_COORDINATES') in splitup:
+            v = np.fromfile(f, dtype='>f8', count=2)
+            gridread['left_edge'][2] = v[0]-0.5*(v[1]-v[0])
+            gridread['dds'][2] = v[1]-v[0]
+        if chk23("CELL_DATA") in splitup or chk23("POINT_DATA") in splitup:
+            after_cell_data = True
+        if check_break(line): break
+        line = f.readline()
+    f.close()
+    # It seems some datasets have a mismatch between ncells and
+    # the actual grid dimensions.
+    if np.prod(gridread['dimensions']) != gridread['ncells']:
+        gridread['dimensions'] -= 1
+        gridread['dimensions'][gridread['dimensions']==0]=1
+    if np.prod(gridread['dimensions']) != gridread['ncells']:
+        mylog.error('product of dimensions %i not equal to number of cells %i' %
+              (np.prod(gridread['dimensions']), gridread['ncells']))
+        raise TypeError
+    # Setting dds=1 for non-active dimensions in 1D/2D datasets
+    gridread['dds'][gridread['dimensions']==1] = 1.
+    return (gridread.get('level', 0), gridread['left_edge'], gridread['dds'],
+            gridread['dimensions'], gridread['read_table_offset'])
+
 class AthenaHierarchy(GridIndex):
 
     grid = AthenaGrid
@@ -259,60 +321,14 @@ class AthenaHierarchy(GridIndex):
         gridlistread = [fn for fn in gridlistread if os.path.basename(fn).count(".") == ndots]
         self.num_grids = len(gridlistread)
         dxs=[]
-        levels = np.zeros(self.num_grids, dtype='int32')
-        glis = np.empty((self.num_grids,3), dtype='float64')
-        gdds = np.empty((self.num_grids,3), dtype='float64')
-        gdims = np.ones_like(glis)
-        j = 0
         self.grid_filenames = gridlistread
-        while j < (self.num_grids):
-            f = open(gridlistread[j],'rb')
-            gridread = {}
-            gridread['read_field'] = None
-            gridread['read_type'] = None
-            table_read=False
-            line = f.readline()
-            while gridread['read_field'] is None:
-                parse_line(line, gridread)
-                splitup = line.strip().split()
-                if chk23('X_COORDINATES') in splitup:
-                    gridread['left_edge'] = np.zeros(3)
-                    gridread['dds'] = np.zeros(3)
-                    v = np.fromfile(f, dtype='>f8', count=2)
-                    gridread['left_edge'][0] = v[0]-0.5*(v[1]-v[0])
-                    gridread['dds'][0] = v[1]-v[0]
-                if chk23('Y_COORDINATES') in splitup:
-                    v = np.fromfile(f, dtype='>f8', count=2)
-                    gridread['left_edge'][1] = v[0]-0.5*(v[1]-v[0])
-                    gridread['dds'][1] = v[1]-v[0]
-                if chk23('Z_COORDINATES') in splitup:
-                    v = np.fromfile(f, dtype='>f8', count=2)
-                    gridread['left_edge'][2] = v[0]-0.5*(v[1]-v[0])
-                    gridread['dds'][2] = v[1]-v[0]
-                if check_break(line): break
-                line = f.readline()
-            f.close()
-            levels[j] = gridread.get('level', 0)
-            glis[j,0] = gridread['left_edge'][0]
-            glis[j,1] = gridread['left_edge'][1]
-            glis[j,2] = gridread['left_edge'][2]
-            # It seems some datasets have a mismatch between ncells and
-            # the actual grid dimensions.
-            if np.prod(gridread['dimensions']) != gridread['ncells']:
-                gridread['dimensions'] -= 1
-                gridread['dimensions'][gridread['dimensions']==0]=1
-            if np.prod(gridread['dimensions']) != gridread['ncells']:
-                mylog.error('product of dimensions %i not equal to number of cells %i' %
-                      (np.prod(gridread['dimensions']), gridread['ncells']))
-                raise TypeError
-            gdims[j,0] = gridread['dimensions'][0]
-            gdims[j,1] = gridread['dimensions'][1]
-            gdims[j,2] = gridread['dimensions'][2]
-            # Setting dds=1 for non-active dimensions in 1D/2D datasets
-            gridread['dds'][gridread['dimensions']==1] = 1.
-            gdds[j,:] = gridread['dds']
-
-            j=j+1
+        headers = self._read_grid_headers(dataset_dir, gridlistread)
+        levels = headers["level"].astype("int32")
+        glis = headers["left_edge"].astype("float64")
+        gdds = headers["dds"].astype("float64")
+        gdims = headers["dimensions"].astype("float64")
+        self._read_table_offsets = \
+            dict(zip(gridlistread, headers["read_table_offset"]))
 
         gres = glis + gdims*gdds
         # Now we convert the glis, which were left edges (floats), to indices
@@ -405,6 +421,47 @@ class AthenaHierarchy(GridIndex):
             self.grid_right_edge[:,1:] = dre[1:]
         self.grid_particle_count = np.zeros([self.num_grids, 1], dtype='int64')
 
+    def _read_grid_headers(self, dataset_dir, filenames):
+        # The header table is stored in the .yt file alongside the dataset,
+        # if there is one, keyed by the file names relative to the dataset
+        # directory.  The modification time and size of each file are
+        # stored too, so that headers of files that have since been
+        # rewritten are read again.
+        keys = np.array([os.path.relpath(fn, dataset_dir)
+                         for fn in filenames], dtype="S")
+        stats = np.array([(st.st_mtime, st.st_size) for st in
+                          (os.stat(fn) for fn in filenames)],
+                         dtype="float64").reshape((-1, 2))
+        stored_keys = self.get_data("/", "AthenaGridFiles")
+        stored_stats = self.get_data("/", "AthenaGridStats")
+        if stored_keys is not None and stored_keys.shape == keys.shape \
+           and (stored_keys == keys).all() and stored_stats is not None \
+           and stored_stats.shape == stats.shape \
+           and (stored_stats == stats).all():
+            headers = self.get_data("/", "AthenaGridHeaders")
+            if headers is not None:
+                mylog.debug("Reusing stored headers for %s grids",
+                            len(filenames))
+                return headers.astype(_header_dtype)
+        # Reading the headers is bound by the file system, so we use threads
+        # rather than processes to read many of them concurrently.
+        nthreads = int(get_num_threads()) or multiprocessing.cpu_count()
+        nthreads = min(nthreads, len(filenames))
+        mylog.debug("Reading %s grid headers with %s threads",
+                    len(filenames), nthreads)
+        if nthreads > 1:
+            pool = ThreadPool(nthreads)
+            rows = pool.map(read_grid_header, filenames)
+            pool.close()
+            pool.join()
+        else:
+            rows = [read_grid_header(fn) for fn in filenames]
+        headers = np.array(rows, dtype=_header_dtype)
+        self.save_data(keys, "/", "AthenaGridFiles", force=True)
+        self.save_data(stats, "/", "AthenaGridStats", force=True)
+        self.save_data(headers, "/", "AthenaGridHeaders", force=True)
+        return headers
+
     def _populate_grid_objects(self):
         for g in self.grids:
             g._prepare_grid()
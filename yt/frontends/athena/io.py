@@ -16,7 +16,6 @@ from yt.utilities.io_handler import \
            BaseIOHandler
 import numpy as np
 from yt.funcs import mylog, defaultdict
-from .data_structures import chk23
 
 float_size = {"float":np.dtype(">f4").itemsize,
               "double":np.dtype(">f8").itemsize}
@@ -49,7 +48,7 @@ class IOHandlerAthena(BaseIOHandler):
             read_dims = grid.read_dims.astype("int64")
             grid_ncells = np.prod(read_dims)
             grid0_ncells = np.prod(grid.index.grids[0].read_dims)
-            read_table_offset = get_read_table_offset(f)
+            read_table_offset = grid.index._read_table_offsets[grid.filename]
             for field in fields:
                 ftype, offsetr, dtype = grid.index._field_map[field]
                 if grid_ncells != grid0_ncells:
@@ -109,18 +108,3 @@ class IOHandlerAthena(BaseIOHandler):
                 ind += nd
                 data.pop(g.id)
         return rv
-
-def get_read_table_offset(f):
-    line = f.readline()
-    while True:
-        splitup = line.strip().split()
-        chkc = chk23('CELL_DATA')
-        chkp = chk23('POINT_DATA')
-        if chkc in splitup or chkp in splitup:
-            f.readline()
-            read_table_offset = f.tell()
-            break
-        line = f.readline()
-    return read_table_offset
-
-
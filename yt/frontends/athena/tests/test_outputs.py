@@ -13,6 +13,10 @@ Athena frontend tests
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+import os
+import shutil
+import tempfile
+
 from yt.testing import *
 from yt.utilities.answer_testing.framework import \
     requires_ds, \
@@ -89,3 +93,27 @@ def test_nprocs():
 @requires_file(cloud)
 def test_AthenaDataset():
     assert isinstance(data_dir_load(cloud), AthenaDataset)
+
+@requires_file(cloud)
+def test_grid_header_cache():
+    ytcfg["yt","skip_dataset_cache"] = "True"
+    ytcfg["yt","serialize"] = "True"
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fn = os.path.join(tmpdir, "Cloud.0050.yt")
+        ds1 = load(cloud, storage_filename=fn)
+        ds1.index
+        # The second load takes its grid headers from the .yt file.
+        ds2 = load(cloud, storage_filename=fn)
+        yield assert_equal, \
+          ds2.index.get_data("/", "AthenaGridHeaders") is not None, True
+        for attr in ["grid_left_edge", "grid_right_edge",
+                     "grid_dimensions", "grid_levels"]:
+            yield assert_equal, getattr(ds1.index, attr), \
+              getattr(ds2.index, attr)
+        for g1, g2 in zip(ds1.index.grids, ds2.index.grids):
+            yield assert_equal, g1["density"], g2["density"]
+    finally:
+        ytcfg["yt","skip_dataset_cache"] = "False"
+        ytcfg["yt","serialize"] = "False"
+        shutil.rmtree(tmpdir)
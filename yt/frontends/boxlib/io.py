@@ -14,20 +14,25 @@ Orion data-file handling functions
 #-----------------------------------------------------------------------------
 
 import os
+import mmap
 import numpy as np
 from yt.utilities.lib.fortran_reader import \
     read_castro_particles
 from yt.utilities.io_handler import \
            BaseIOHandler
 from yt.funcs import mylog, defaultdict
-from yt.frontends.chombo.io import parse_orion_sinks
+from yt.frontends.chombo.io import OrionSinkTable
 
 class IOHandlerBoxlib(BaseIOHandler):
 
     _dataset_type = "boxlib_native"
+    # If True, the memory maps of the Cell_D files are held open between
+    # chunks rather than being released once each chunk has been read.
+    keep_mmaps = False
 
     def __init__(self, ds, *args, **kwargs):
         self.ds = ds
+        self._mmaps = {}
 
     def _read_fluid_selection(self, chunks, selector, fields, size):
         chunks = list(chunks)
@@ -41,7 +46,7 @@ class IOHandlerBoxlib(BaseIOHandler):
                     size, [f2 for f1, f2 in fields], ng)
         ind = 0
         for chunk in chunks:
-            data = self._read_chunk_data(chunk, fields)
+            data = self._read_chunk_data(chunk, fields, views=True)
             for g in chunk.objs:
                 for field in fields:
                     ds = data[g.id].pop(field)
@@ -50,7 +55,32 @@ class IOHandlerBoxlib(BaseIOHandler):
                 data.pop(g.id)
         return rv
 
-    def _read_chunk_data(self, chunk, fields):
+    def _get_mmap(self, filename):
+        mm = self._mmaps.get(filename, None)
+        if mm is None:
+            with open(filename, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.keep_mmaps:
+                self._mmaps[filename] = mm
+        return mm
+
+    def close_mmaps(self):
+        # Any arrays still viewing the maps keep them alive until they are
+        # garbage collected, so we only drop our references here.
+        self._mmaps.clear()
+
+    def _get_data_offset(self, grid, mm):
+        # Each FAB is preceded by a single line of ASCII header; the data
+        # begins immediately after its newline.
+        if grid._offset == -1:
+            grid._offset = mm.find(b"\n", grid._base_offset) + 1
+        return grid._offset
+
+    def _read_chunk_data(self, chunk, fields, views=False):
+        # This computes the byte range of every (grid, field) pair in the
+        # chunk up front, hints the coalesced ranges to the kernel, and then
+        # hands back arrays that view the memory maps directly.  If views is
+        # False the arrays are copied out, so they may be cached and modified.
         data = {}
         grids_by_file = defaultdict(list)
         if len(chunk.objs) == 0: return data
@@ -60,27 +90,54 @@ class IOHandlerBoxlib(BaseIOHandler):
             grids_by_file[g.filename].append(g)
         dtype = self.ds.index._dtype
         bpr = dtype.itemsize
+        slots = [(i, field) for i, field in
+                 enumerate(self.ds.index.field_order) if field in fields]
         for filename in grids_by_file:
             grids = grids_by_file[filename]
-            grids.sort(key = lambda a: a._offset)
-            f = open(filename, "rb")
+            grids.sort(key = lambda a: a._base_offset)
+            mm = self._get_mmap(filename)
+            ranges = []
             for grid in grids:
                 data[grid.id] = {}
-                local_offset = grid._get_offset(f) - f.tell()
+                offset = self._get_data_offset(grid, mm)
                 count = grid.ActiveDimensions.prod()
                 size = count * bpr
-                for field in self.ds.index.field_order:
-                    if field in fields:
-                        # We read it ...
-                        f.seek(local_offset, os.SEEK_CUR)
-                        v = np.fromfile(f, dtype=dtype, count=count)
-                        v = v.reshape(grid.ActiveDimensions, order='F')
-                        data[grid.id][field] = v
-                        local_offset = 0
-                    else:
-                        local_offset += size
+                for i, field in slots:
+                    start = offset + i * size
+                    ranges.append((grid, field, start, count))
+            _advise_ranges(mm, [(start, start + count * bpr)
+                                for grid, field, start, count in ranges])
+            for grid, field, start, count in ranges:
+                v = np.frombuffer(mm, dtype=dtype, count=count, offset=start)
+                v = v.reshape(grid.ActiveDimensions, order='F')
+                if not views:
+                    v = v.copy(order='F')
+                data[grid.id][field] = v
         return data
 
+def _coalesce_ranges(ranges, max_gap = 0):
+    """
+    Merge sorted (start, stop) byte ranges that are separated by no more than
+    *max_gap* bytes into a list of larger, non-overlapping ranges.
+    """
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start - merged[-1][1] <= max_gap:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    return [tuple(r) for r in merged]
+
+def _advise_ranges(mm, ranges):
+    # mmap.madvise is only available on Python 3.8 and newer.
+    madvise = getattr(mm, "madvise", None)
+    if madvise is None or not hasattr(mmap, "MADV_WILLNEED"):
+        return
+    page = mmap.ALLOCATIONGRANULARITY
+    for start, stop in _coalesce_ranges(ranges, page):
+        aligned = start - (start % page)
+        madvise(mmap.MADV_WILLNEED, aligned, stop - aligned)
+
 class IOHandlerOrion(IOHandlerBoxlib):
     _dataset_type = "orion_native"
 
@@ -93,14 +150,16 @@ class IOHandlerOrion(IOHandlerBoxlib):
         self._particle_filename = fn
         return self._particle_filename
 
-    _particle_field_index = None
+    _sink_table = None
     @property
-    def particle_field_index(self):
+    def sink_table(self):
+        if self._sink_table is None:
+            self._sink_table = OrionSinkTable(self.particle_filename)
+        return self._sink_table
 
-        index = parse_orion_sinks(self.particle_filename)
-
-        self._particle_field_index = index
-        return self._particle_field_index
+    @property
+    def particle_field_index(self):
+        return self.sink_table.field_index
 
     def _read_particle_selection(self, chunks, selector, fields):
         rv = {}
@@ -131,31 +190,9 @@ class IOHandlerOrion(IOHandlerBoxlib):
         parses the Orion Star Particle text files
 
         """
-
-        particles = []
-
         if grid.NumberOfParticles == 0:
-            return np.array(particles)
-
-        def read(line, field):
-            entry = line.strip().split(' ')[self.particle_field_index[field]]
-            return np.float(entry)
-
-        try:
-            lines = self._cached_lines
-            for num in grid._particle_line_numbers:
-                line = lines[num]
-                particles.append(read(line, field))
-            return np.array(particles)
-        except AttributeError:
-            fn = self.particle_filename
-            with open(fn, 'r') as f:
-                lines = f.readlines()
-                self._cached_lines = lines
-                for num in grid._particle_line_numbers:
-                    line = lines[num]
-                    particles.append(read(line, field))
-            return np.array(particles)
+            return np.array([])
+        return self.sink_table.read(grid, field)
 
 
 class IOHandlerCastro(IOHandlerBoxlib):
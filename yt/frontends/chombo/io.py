@@ -261,47 +261,54 @@ def parse_orion_sinks(fn):
     return index
 
 
+class OrionSinkTable(object):
+    """
+    The contents of an Orion sink or star particle file, parsed once into a
+    single array with one row per particle and one column per entry.  The
+    rows belonging to each grid are gathered from its
+    ``_particle_line_numbers`` the first time they are needed.
+    """
+    def __init__(self, fn):
+        self.filename = fn
+        self.field_index = parse_orion_sinks(fn)
+        if len(self.field_index) == 0:
+            self.data = np.empty((0, 0), dtype="float64")
+        else:
+            with open(fn, 'r') as f:
+                # the first line only holds the number of particles
+                f.readline()
+                self.data = np.loadtxt(f, dtype="float64", ndmin=2)
+        self._grid_rows = {}
+
+    def read(self, grid, field):
+        rows = self._grid_rows.get(grid.id, None)
+        if rows is None:
+            # line n of the file is row n - 1 of the table
+            rows = np.array(grid._particle_line_numbers, dtype="int64") - 1
+            self._grid_rows[grid.id] = rows
+        return self.data[rows, self.field_index[field]]
+
+
 class IOHandlerOrion2HDF5(IOHandlerChomboHDF5):
     _dataset_type = "orion_chombo_native"
 
-    _particle_field_index = None
+    _sink_table = None
     @property
-    def particle_field_index(self):
-
-        fn = self.ds.fullplotdir[:-4] + "sink"
-
-        index = parse_orion_sinks(fn)
+    def sink_table(self):
+        if self._sink_table is None:
+            fn = self.ds.fullplotdir[:-4] + "sink"
+            self._sink_table = OrionSinkTable(fn)
+        return self._sink_table
 
-        self._particle_field_index = index
-        return self._particle_field_index
+    @property
+    def particle_field_index(self):
+        return self.sink_table.field_index
 
     def _read_particles(self, grid, field):
         """
         parses the Orion Star Particle text files
 
         """
-
-        particles = []
-
         if grid.NumberOfParticles == 0:
-            return np.array(particles)
-
-        def read(line, field):
-            entry = line.strip().split(' ')[self.particle_field_index[field]]
-            return np.float(entry)
-
-        try:
-            lines = self._cached_lines
-            for num in grid._particle_line_numbers:
-                line = lines[num]
-                particles.append(read(line, field))
-            return np.array(particles)
-        except AttributeError:
-            fn = grid.ds.fullplotdir[:-4] + "sink"
-            with open(fn, 'r') as f:
-                lines = f.readlines()
-                self._cached_lines = lines
-                for num in grid._particle_line_numbers:
-                    line = lines[num]
-                    particles.append(read(line, field))
-            return np.array(particles)
+            return np.array([])
+        return self.sink_table.read(grid, field)
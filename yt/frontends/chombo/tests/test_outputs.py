@@ -13,6 +13,11 @@ Chombo frontend tests
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+import os
+import shutil
+import tempfile
+import numpy as np
+
 from yt.testing import \
     requires_file, \
     assert_equal, \
@@ -25,6 +30,8 @@ from yt.frontends.chombo.api import \
     ChomboDataset, \
     Orion2Dataset, \
     PlutoDataset
+from yt.frontends.chombo.io import \
+    OrionSinkTable
 
 _fields = ("density", "velocity_magnitude",  # "velocity_divergence",
            "magnetic_field_x")
@@ -104,3 +111,24 @@ def test_units_override_gc():
 def test_units_override_kho():
     for test in units_override_check(kho):
         yield test
+
+class FakeGrid(object):
+    def __init__(self, id, line_numbers):
+        self.id = id
+        self._particle_line_numbers = line_numbers
+
+def test_orion_sink_table():
+    tmpdir = tempfile.mkdtemp()
+    fn = os.path.join(tmpdir, "data.0000.3d.sink")
+    vals = np.arange(33, dtype="float64").reshape(3, 11)
+    with open(fn, "w") as f:
+        f.write("3 0\n")
+        for row in vals:
+            f.write(" ".join("%0.8e" % v for v in row) + "\n")
+    table = OrionSinkTable(fn)
+    grid = FakeGrid(0, [3, 1])
+    yield assert_equal, table.read(grid, "particle_mass"), vals[[2, 0], 0]
+    yield assert_equal, table.read(grid, "particle_position_y"), \
+        vals[[2, 0], 2]
+    yield assert_equal, table.read(grid, "particle_id"), vals[[2, 0], -1]
+    shutil.rmtree(tmpdir)
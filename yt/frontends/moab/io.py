@@ -29,7 +29,6 @@ class IOHandlerMoabH5MHex8(BaseIOHandler):
 
     def _read_fluid_selection(self, chunks, selector, fields, size):
         chunks = list(chunks)
-        assert(len(chunks) == 1)
         fhandle = self._handle
         rv = {}
         for field in fields:
@@ -52,7 +51,6 @@ class IOHandlerMoabPyneHex8(BaseIOHandler):
 
     def _read_fluid_selection(self, chunks, selector, fields, size):
         chunks = list(chunks)
-        assert(len(chunks) == 1)
         tags = {}
         rv = {}
         pyne_mesh = self.ds.pyne_mesh
@@ -213,8 +213,6 @@ class IOHandlerStreamHexahedral(BaseIOHandler):
 
     def _read_fluid_selection(self, chunks, selector, fields, size):
         chunks = list(chunks)
-        assert(len(chunks) == 1)
-        chunk = chunks[0]
         rv = {}
         for field in fields:
             ftype, fname = field
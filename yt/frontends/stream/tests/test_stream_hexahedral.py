@@ -54,3 +54,25 @@ def test_stream_hexahedral() :
     yield assert_almost_equal, dd["dx"].to_ndarray(), 1.0/Nx
     yield assert_almost_equal, dd["dy"].to_ndarray(), 1.0/Ny
     yield assert_almost_equal, dd["dz"].to_ndarray(), 1.0/Nz
+
+def test_stream_hexahedral_blocks():
+    np.random.seed(0x4d3d3d3)
+    Nx, Ny, Nz = 32, 18, 24
+    cell_x = np.linspace(0.0, 1.0, Nx+1)
+    cell_y = np.linspace(0.0, 1.0, Ny+1)
+    cell_z = np.linspace(0.0, 1.0, Nz+1)
+    coords, conn = hexahedral_connectivity(cell_x, cell_y, cell_z)
+    data = {'random_field': np.random.random(Nx*Ny*Nz)}
+    bbox = np.array([ [0.0, 1.0], [0.0, 1.0], [0.0, 1.0] ])
+    values = {}
+    for max_elements in (None, 1000):
+        ds = load_hexahedral_mesh(data.copy(), conn, coords, bbox=bbox)
+        if max_elements is not None:
+            ds.index._max_block_elements = max_elements
+        sp = ds.sphere([0.3, 0.6, 0.4], 0.25)
+        order = np.lexsort([sp[ax] for ax in 'zyx'])
+        values[max_elements] = [sp[f][order]
+                                for f in ('x', 'y', 'z', 'random_field')]
+    yield assert_equal, len(ds.index.mesh_blocks) > 1, True
+    for v1, v2 in zip(values[None], values[1000]):
+        yield assert_equal, v1, v2
@@ -19,6 +19,12 @@ from .coordinate_handler import \
     CoordinateHandler, \
     _unknown_coord, \
     _get_coord_fields
+from yt.funcs import get_num_threads
+from yt.config import ytcfg
+from yt.utilities.lib.pixelization_routines import \
+    pixelize_cartesian_multi, \
+    pixelize_sph_kernel_projection, \
+    pixelize_sph_kernel_slice
 import yt.visualization._MPL as _MPL
 
 class CartesianCoordinateHandler(CoordinateHandler):
@@ -52,6 +58,9 @@ class CartesianCoordinateHandler(CoordinateHandler):
 
     def pixelize(self, dimension, data_source, field, bounds, size,
                  antialias = True, periodic = True):
+        if self.sph_pixelize_field(data_source, field) is not None:
+            return self.sph_pixelize(data_source, field, bounds, size,
+                                     periodic)
         if dimension < 3:
             return self._ortho_pixelize(data_source, field, bounds, size,
                                         antialias, dimension, periodic)
@@ -59,14 +68,45 @@ class CartesianCoordinateHandler(CoordinateHandler):
             return self._oblique_pixelize(data_source, field, bounds, size,
                                           antialias)
 
-    def _ortho_pixelize(self, data_source, field, bounds, size, antialias,
-                        dim, periodic):
-        # We should be using fcoords
+    def pixelize_many(self, dimension, data_source, fields, bounds, size,
+                      antialias = True, periodic = True):
+        """
+        Pixelize several fields of *data_source* at once, returning a list
+        of images in the same order as *fields*.  On-axis fields that are
+        not scattered from SPH particles are all deposited in one pass over
+        the cells.
+        """
+        buffs = {}
+        ortho = []
+        for field in fields:
+            if field in buffs or field in ortho:
+                continue
+            if dimension < 3 and \
+               self.sph_pixelize_field(data_source, field) is None:
+                ortho.append(field)
+            else:
+                buffs[field] = self.pixelize(dimension, data_source, field,
+                                             bounds, size, antialias,
+                                             periodic)
+        if len(ortho) > 0:
+            images = self._ortho_pixelize_many(data_source, ortho, bounds,
+                                               size, antialias, dimension,
+                                               periodic)
+            buffs.update(zip(ortho, images))
+        return [buffs[field] for field in fields]
+
+    def _ortho_period(self, dim):
         period = self.period[:2].copy() # dummy here
         period[0] = self.period[self.x_axis[dim]]
         period[1] = self.period[self.y_axis[dim]]
         if hasattr(period, 'in_units'):
             period = period.in_units("code_length").d
+        return period
+
+    def _ortho_pixelize(self, data_source, field, bounds, size, antialias,
+                        dim, periodic):
+        # We should be using fcoords
+        period = self._ortho_period(dim)
         buff = _MPL.Pixelize(data_source['px'], data_source['py'],
                              data_source['pdx'], data_source['pdy'],
                              data_source[field], size[0], size[1],
@@ -74,6 +114,20 @@ class CartesianCoordinateHandler(CoordinateHandler):
                              period, int(periodic)).transpose()
         return buff
 
+    def _ortho_pixelize_many(self, data_source, fields, bounds, size,
+                             antialias, dim, periodic):
+        period = self._ortho_period(dim)
+        data = np.array([data_source[field] for field in fields],
+                        dtype="float64")
+        px, py, pdx, pdy = [np.asarray(data_source[ax], dtype="float64")
+                            for ax in ('px', 'py', 'pdx', 'pdy')]
+        buffs = pixelize_cartesian_multi(px, py, pdx, pdy, data,
+                                         size[0], size[1], bounds,
+                                         int(antialias), period,
+                                         int(periodic),
+                                         int(get_num_threads()))
+        return [buff.transpose() for buff in buffs]
+
     def _oblique_pixelize(self, data_source, field, bounds, size, antialias):
         indices = np.argsort(data_source['dx'])[::-1]
         buff = _MPL.CPixelize(data_source['x'], data_source['y'],
@@ -84,6 +138,186 @@ class CartesianCoordinateHandler(CoordinateHandler):
                               data_source[field], size[0], size[1], bounds).transpose()
         return buff
 
+    def sph_pixelize_field(self, data_source, field):
+        """
+        If *field* can be imaged for *data_source* by scattering SPH particles
+        straight into the image, return the particle type and particle field
+        to scatter.  Otherwise, return None.  This is only done if the
+        ``sph_kernel_scatter`` configuration option is set; by default, SPH
+        fields are smoothed onto the octree and pixelized like other fields.
+        """
+        if not ytcfg.getboolean("yt", "sph_kernel_scatter"):
+            return None
+        field_info = self.ds.field_info
+        field = data_source._determine_fields(field)[0]
+        field = field_info.field_aliases.get(field, field)
+        if field not in field_info.sph_smoothed_fields:
+            return None
+        ptype, pfield = field_info.sph_smoothed_fields[field]
+        if data_source._type_name == "proj":
+            if data_source.method != "integrate" or \
+               getattr(data_source, "_sum_only", False):
+                return None
+            weight = data_source.weight_field
+            if weight is not None and \
+               self._sph_weight_field(data_source, ptype, weight) is None:
+                return None
+        elif data_source._type_name not in ("slice", "cutting"):
+            return None
+        return ptype, pfield
+
+    def _sph_weight_field(self, data_source, ptype, weight):
+        field_info = self.ds.field_info
+        weight = data_source._determine_fields(weight)[0]
+        weight = field_info.field_aliases.get(weight, weight)
+        if weight in field_info.sph_smoothed_fields:
+            wtype, wfield = field_info.sph_smoothed_fields[weight]
+            if wtype == ptype:
+                return wfield
+        elif weight[0] == ptype:
+            return weight[1]
+        return None
+
+    def _sph_particle_source(self, data_source):
+        # The particles that can reach the image: those of the projection's
+        # data source, or of the region a slice, cutting plane or off-axis
+        # projection is restricted to.
+        if data_source._type_name == "proj" and data_source.axis < 3:
+            return data_source.data_source
+        source = getattr(data_source, "_data_source", None)
+        if source is not None:
+            return source
+        le = getattr(data_source, "le", None)
+        re = getattr(data_source, "re", None)
+        if le is not None and re is not None:
+            return self.ds.region(data_source.center, le, re)
+        return self.ds.all_data()
+
+    def sph_pixelize(self, data_source, field, bounds, size, periodic = True,
+                     depth = None):
+        r"""Make an image of an SPH field by scattering particles into it.
+
+        Rather than smoothing the particles onto the octree and then
+        pixelizing the result, each particle's kernel is added straight into
+        the image: integrated along the line of sight for projections, and
+        evaluated in the plane for slices and cutting planes.  Particles are
+        read a chunk (for SPH frontends, a data file) at a time, and each
+        chunk is scattered using OpenMP threads.
+
+        Parameters
+        ----------
+        data_source : data container
+            A projection, slice, cutting plane or off-axis projection.  For
+            on-axis projections, the particles are read from the projection's
+            data source; otherwise, from the region the slice, cutting plane
+            or off-axis projection is restricted to, if any, and from the
+            whole domain if not.
+        field : string or tuple
+            A smoothed SPH field, for which :meth:`sph_pixelize_field` is not
+            None.
+        bounds : sequence of floats
+            The (x_min, x_max, y_min, y_max) extent of the image, in code
+            units.  For cutting planes and off-axis projections, this is
+            relative to the center of the data source.
+        size : sequence of ints
+            The number of pixels in x and y.
+        periodic : bool
+            For on-axis images, whether particles wrap around periodic
+            boundaries.
+        depth : float
+            For off-axis projections, the depth of the projected region, in
+            code units, centered on the data source's center.
+
+        Returns
+        -------
+        A (ny, nx) YTArray, in the same units as the projection or slice of
+        *field* would have.
+        """
+        ds = self.ds
+        ptype, pfield = self.sph_pixelize_field(data_source, field)
+        field = data_source._determine_fields(field)[0]
+        units = ds._get_field_info(*field).units
+        projection = data_source._type_name == "proj"
+        weight = None
+        if projection and data_source.weight_field is not None:
+            weight = self._sph_weight_field(data_source, ptype,
+                                            data_source.weight_field)
+        if data_source.axis < 3:
+            axis = data_source.axis
+            xax = self.x_axis[axis]
+            yax = self.y_axis[axis]
+            vectors = np.eye(3)[[xax, yax, axis]]
+            center = np.zeros(3, dtype="float64")
+            if not projection:
+                coord = data_source.coord
+                if hasattr(coord, "in_units"):
+                    coord = coord.in_units("code_length").d
+                center[axis] = coord
+            period = np.zeros(3, dtype="float64")
+            if periodic:
+                periodicity = np.array(ds.periodicity, dtype="bool")
+                DW = ds.domain_width.in_units("code_length").d
+                period[periodicity] = DW[periodicity]
+            period = period[[xax, yax, axis]]
+        else:
+            if projection:
+                vectors = data_source.orienter.unit_vectors
+            else:
+                vectors = [data_source._x_vec, data_source._y_vec,
+                           data_source._norm_vec]
+            vectors = np.array(vectors, dtype="float64")
+            center = data_source.center
+            period = np.zeros(3, dtype="float64")
+        if hasattr(center, "in_units"):
+            center = center.in_units("code_length").d
+        source = self._sph_particle_source(data_source)
+        num_threads = int(get_num_threads())
+        buff = np.zeros((size[1], size[0]), dtype="float64")
+        if weight is not None:
+            wbuff = np.zeros((size[1], size[0]), dtype="float64")
+        for chunk in source.chunks([], "io"):
+            pos = chunk[ptype, "particle_position"].in_units("code_length").d
+            if pos.shape[0] == 0: continue
+            pos = np.dot(pos - center, vectors.T)
+            if projection and depth is not None:
+                mask = np.abs(pos[:,2]) < depth / 2.0
+            elif not projection and period[2] > 0:
+                # Slices see the nearest periodic image of each particle.
+                pos[:,2] -= period[2] * np.rint(pos[:,2] / period[2])
+                mask = slice(None)
+            else:
+                mask = slice(None)
+            px = np.ascontiguousarray(pos[mask,0])
+            py = np.ascontiguousarray(pos[mask,1])
+            hsml = chunk[ptype, "smoothing_length"]
+            hsml = hsml.in_units("code_length").d[mask]
+            mass = chunk[ptype, "particle_mass"].in_units("code_mass").d[mask]
+            dens = chunk[ptype, "density"]
+            dens = dens.in_units("code_mass/code_length**3").d[mask]
+            quantity = chunk[ptype, pfield].in_units(units).d[mask]
+            if weight is not None:
+                wdata = chunk[ptype, weight].d[mask]
+                pixelize_sph_kernel_projection(wbuff, px, py, hsml, mass,
+                    dens, wdata, bounds, period[:2], num_threads)
+                quantity = quantity * wdata
+            if projection:
+                pixelize_sph_kernel_projection(buff, px, py, hsml, mass,
+                    dens, quantity, bounds, period[:2], num_threads)
+            else:
+                pz = np.ascontiguousarray(pos[mask,2])
+                pixelize_sph_kernel_slice(buff, px, py, pz, hsml, mass,
+                    dens, quantity, bounds, period[:2], num_threads)
+        if weight is not None:
+            with np.errstate(invalid='ignore'):
+                buff /= wbuff
+            return ds.arr(buff, units)
+        buff = ds.arr(buff, units)
+        if projection:
+            # The columns are in units of code_length, but projections are
+            # integrated in cm.
+            buff = buff * ds.quan(1.0, "code_length").in_cgs()
+        return buff
+
     def convert_from_cartesian(self, coord):
         return coord
 
@@ -78,11 +78,23 @@ class CoordinateHandler(object):
         # This should return field definitions for x, y, z, r, theta, phi
         raise NotImplementedError
 
-    def pixelize(self, dimension, data_source, field, bounds, size, antialias = True):
+    def pixelize(self, dimension, data_source, field, bounds, size,
+                 antialias = True, periodic = True):
         # This should *actually* be a pixelize call, not just returning the
         # pixelizer
         raise NotImplementedError
 
+    def pixelize_many(self, dimension, data_source, fields, bounds, size,
+                      antialias = True, periodic = True):
+        # Coordinate systems that can pixelize several fields at once
+        # override this.
+        return [self.pixelize(dimension, data_source, field, bounds, size,
+                              antialias, periodic) for field in fields]
+
+    def sph_pixelize_field(self, data_source, field):
+        # Only Cartesian coordinates can scatter SPH particles into images.
+        return None
+
     def distance(self, start, end):
         p1 = self.convert_to_cartesian(start)
         p2 = self.convert_to_cartesian(end)
@@ -31,6 +31,7 @@ from yt.fields.field_info_container import \
 from yt.fields.particle_fields import \
     particle_deposition_functions, \
     particle_scalar_functions
+from yt.geometry.neighbor_lists import NeighborListCache
 from yt.utilities.io_handler import io_registry
 from yt.utilities.logger import ytLogger as mylog
 from yt.utilities.parallel_tools.parallel_analysis_interface import \
@@ -68,6 +69,16 @@ class Index(ParallelAnalysisInterface):
         if self._data_file is not None:
             self._data_file.close()
 
+    _neighbor_cache = None
+    @property
+    def neighbor_cache(self):
+        # Neighbor lists found while smoothing particle fields, for reuse by
+        # later smoothing operations on the same particles.
+        if self._neighbor_cache is None:
+            max_bytes = ytcfg.getint("yt", "neighbor_cache_size") * 1024**2
+            self._neighbor_cache = NeighborListCache(max_bytes)
+        return self._neighbor_cache
+
     def _initialize_state_variables(self):
         self._parallel_locking = False
         self._data_file = None
@@ -0,0 +1,130 @@
+"""
+Filling grid ghost zones directly from neighboring grids
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import itertools
+import numpy as np
+from collections import OrderedDict
+
+class GhostZoneFiller(object):
+    """
+    Fills the ghost zones of a grid by copying directly from the grids on the
+    same level that overlap its halo, including periodic images.
+
+    The integer extents of every grid on a level are computed once from the
+    index, and the list of (grid, source slice, destination slice) triples
+    for each grid is cached the first time it is requested.  If the halo of a
+    grid is not completely covered by grids on its own level, or it extends
+    past a non-periodic boundary, no sources are returned and the caller
+    should fall back to interpolating with a smoothed covering grid.
+
+    Field values read from neighboring grids are held in a small
+    least-recently-used cache, so that walking through the grids in order
+    reads each one only a handful of times.  The cache only lasts for one
+    walk over the grids, or one call to ``retrieve_ghost_zones`` asking for
+    fields, after which it is cleared.
+    """
+    def __init__(self, index, max_cached = 128):
+        self.index = index
+        self.max_cached = max_cached
+        self._level_boxes = {}
+        self._sources = {}
+        self._cache = OrderedDict()
+
+    def clear(self):
+        self._cache.clear()
+
+    def level_boxes(self, level):
+        if level not in self._level_boxes:
+            index = self.index
+            ds = index.ds
+            dims = ds.domain_dimensions.astype("int64") \
+                 * ds.relative_refinement(0, level)
+            dds = ds.domain_width.d / dims
+            sel = np.where(index.grid_levels.ravel() == level)[0]
+            starts = np.rint((index.grid_left_edge.d[sel] -
+                              ds.domain_left_edge.d) / dds).astype("int64")
+            ends = starts + index.grid_dimensions[sel]
+            self._level_boxes[level] = (index.grids[sel], starts, ends)
+        return self._level_boxes[level]
+
+    def sources(self, grid, n_zones):
+        key = (grid.id, n_zones)
+        if key not in self._sources:
+            self._sources[key] = self._find_sources(grid, n_zones)
+        return self._sources[key]
+
+    def _find_sources(self, grid, n_zones):
+        ds = self.index.ds
+        if ds.dimensionality < 3: return None
+        level = grid.Level
+        dims = ds.domain_dimensions.astype("int64") \
+             * ds.relative_refinement(0, level)
+        left = np.asarray(grid.get_global_startindex(), dtype="int64") \
+             - n_zones
+        right = left + grid.ActiveDimensions + 2 * n_zones
+        shifts = []
+        for ax in range(3):
+            ax_shifts = [0]
+            if left[ax] < 0 or right[ax] > dims[ax]:
+                if not ds.periodicity[ax]: return None
+                if left[ax] < 0: ax_shifts.append(-dims[ax])
+                if right[ax] > dims[ax]: ax_shifts.append(dims[ax])
+            shifts.append(ax_shifts)
+        grids, starts, ends = self.level_boxes(level)
+        covered = np.zeros(right - left, dtype="bool")
+        sources = []
+        for shift in itertools.product(*shifts):
+            shift = np.array(shift, dtype="int64")
+            lo = np.maximum(starts + shift, left)
+            hi = np.minimum(ends + shift, right)
+            for i in np.where(np.all(hi > lo, axis=1))[0]:
+                dst = tuple(slice(l - left[ax], h - left[ax])
+                            for ax, (l, h) in enumerate(zip(lo[i], hi[i])))
+                origin = starts[i] + shift
+                src = tuple(slice(l - o, h - o)
+                            for l, h, o in zip(lo[i], hi[i], origin))
+                sources.append((grids[i], src, dst))
+                covered[dst] = True
+        if not covered.all(): return None
+        return sources
+
+    def _read(self, grid, field):
+        key = (grid.id, field)
+        v = self._cache.pop(key, None)
+        if v is None:
+            # We don't want to leave the data hanging off the neighbor once
+            # we're done with it, unless it was already there.
+            had_field = field in grid.field_data
+            v = np.asarray(grid[field])
+            if not had_field:
+                grid.field_data.pop(field, None)
+        self._cache[key] = v
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last = False)
+        return v
+
+    def fill(self, grid, n_zones, fields):
+        """
+        Return a list of arrays, one per field, holding the values of *grid*
+        with *n_zones* ghost zones on each side.  The grid must have sources,
+        as returned by :meth:`sources`.
+        """
+        sources = self.sources(grid, n_zones)
+        dims = grid.ActiveDimensions + 2 * n_zones
+        output = [np.empty(dims, dtype="float64") for field in fields]
+        for sgrid, src, dst in sources:
+            for field, out in zip(fields, output):
+                out[dst] = self._read(sgrid, field)[src]
+        return output
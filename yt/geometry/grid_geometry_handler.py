@@ -37,6 +37,8 @@ from yt.utilities.parallel_tools.parallel_analysis_interface import \
     ParallelAnalysisInterface
 from .grid_container import \
     GridTree, MatchPointsToGrids
+from .ghost_zones import \
+    GhostZoneFiller
 
 from yt.data_objects.data_containers import data_object_registry
 
@@ -120,6 +122,15 @@ class GridIndex(Index):
         """
         for g in self.grids: g.clear_data()
         self.io.queue.clear()
+        if self._ghost_zone_filler is not None:
+            self._ghost_zone_filler.clear()
+
+    _ghost_zone_filler = None
+    @property
+    def ghost_zone_filler(self):
+        if self._ghost_zone_filler is None:
+            self._ghost_zone_filler = GhostZoneFiller(self)
+        return self._ghost_zone_filler
 
     def get_smallest_dx(self):
         """
@@ -331,16 +342,22 @@ class GridIndex(Index):
         preload_fields, _ = self._split_fields(preload_fields)
         if self._preload_implemented and len(preload_fields) > 0 and ngz == 0:
             giter = ChunkDataCache(list(giter), preload_fields, self)
-        for i, og in enumerate(giter):
-            if ngz > 0:
-                g = og.retrieve_ghost_zones(ngz, [], smoothed=True)
-            else:
-                g = og
-            size = self._count_selection(dobj, [og])
-            if size == 0: continue
-            # We don't want to cache any of the masks or icoords or fcoords for
-            # individual grids.
-            yield YTDataChunk(dobj, "spatial", [g], size, cache = False)
+        try:
+            for i, og in enumerate(giter):
+                if ngz > 0:
+                    g = og.retrieve_ghost_zones(ngz, [], smoothed=True)
+                else:
+                    g = og
+                size = self._count_selection(dobj, [og])
+                if size == 0: continue
+                # We don't want to cache any of the masks or icoords or fcoords
+                # for individual grids.
+                yield YTDataChunk(dobj, "spatial", [g], size, cache = False)
+        finally:
+            # Neighboring grids are only read several times over within one
+            # walk, so their cached values go once it is over.
+            if ngz > 0 and self._ghost_zone_filler is not None:
+                self._ghost_zone_filler.clear()
 
     _grid_chunksize = 1000
     def _chunk_io(self, dobj, cache=True, local_only=False,
@@ -0,0 +1,83 @@
+"""
+Caching neighbor lists between particle smoothing operations
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from collections import OrderedDict
+
+from yt.utilities.logger import ytLogger as mylog
+
+class NeighborListCache(object):
+    """
+    Holds the neighbor lists found by particle smoothing operations, so that
+    smoothing several fields over the same particles only searches for the
+    neighbors of each point once.
+
+    Entries are the dictionaries of CSR-style arrays returned by
+    ``ParticleSmoothOperation.get_neighbor_lists``, keyed by whatever
+    identifies the particles and points they were found for (see
+    :meth:`~yt.data_objects.octree_subset.OctreeSubset.smooth`).  If the
+    positions of the particles are given, a copy is stored with the entry and
+    it is only returned for exactly the same positions.  The least recently
+    used entries are dropped once the total size of the arrays goes over
+    *max_bytes*; an entry larger than that is never stored.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def clear(self):
+        self._cache.clear()
+        self.nbytes = 0
+
+    def get(self, key, positions = None):
+        neighbor_lists = self._cache.pop(key, None)
+        if neighbor_lists is None:
+            self.misses += 1
+            return None
+        self._cache[key] = neighbor_lists
+        if positions is not None and not \
+          np.array_equal(neighbor_lists.get("positions"), positions):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return neighbor_lists
+
+    def store(self, key, neighbor_lists, positions = None):
+        if positions is not None:
+            neighbor_lists["positions"] = np.array(positions)
+        size = _neighbor_lists_size(neighbor_lists)
+        if size > self.max_bytes:
+            mylog.debug("Not caching %0.3e bytes of neighbor lists.", size)
+            return
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self.nbytes -= _neighbor_lists_size(old)
+        self._cache[key] = neighbor_lists
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, old = self._cache.popitem(last = False)
+            self.nbytes -= _neighbor_lists_size(old)
+
+def _neighbor_lists_size(neighbor_lists):
+    return sum(v.nbytes for v in neighbor_lists.values()
+               if hasattr(v, "nbytes"))
@@ -60,7 +60,7 @@ cdef oct_visitor_function count_by_domain
 cdef oct_visitor_function store_octree
 cdef oct_visitor_function load_octree
 
-cdef inline int cind(int i, int j, int k):
+cdef inline int cind(int i, int j, int k) nogil:
     # THIS ONLY WORKS FOR CHILDREN.  It is not general for zones.
     return (((i*2)+j)*2+k)
 
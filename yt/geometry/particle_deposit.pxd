@@ -26,7 +26,7 @@ from .oct_container cimport Oct, OctAllocationContainer, OctreeContainer
 cdef extern from "platform_dep.h":
     void *alloca(int)
     
-cdef inline int gind(int i, int j, int k, int dims[3]):
+cdef inline int gind(int i, int j, int k, int dims[3]) nogil:
     # The ordering is such that we want i to vary the slowest in this instance,
     # even though in other instances it varies the fastest.  To see this in
     # action, try looking at the results of an n_ref=256 particle CIC plot,
@@ -52,7 +52,10 @@ cdef class ParticleDepositOperation:
     # We assume each will allocate and define their own temporary storage
     cdef public object nvals
     cdef public int update_values
+    # How many cells away from its own a particle can deposit into, or -1 if
+    # there is no limit.  This decides how the work can be split up.
+    cdef public int reach
     cdef void process(self, int dim[3], np.float64_t left_edge[3],
                       np.float64_t dds[3], np.int64_t offset,
                       np.float64_t ppos[3], np.float64_t *fields,
-                      np.int64_t domain_ind)
+                      np.int64_t domain_ind) nogil
@@ -20,6 +20,8 @@ from libc.stdlib cimport malloc, free
 cimport cython
 from libc.math cimport sqrt
 
+from cython.parallel cimport prange, parallel
+
 from fp_utils cimport *
 from oct_container cimport Oct, OctAllocationContainer, \
     OctreeContainer, OctInfo
@@ -28,6 +30,7 @@ cdef class ParticleDepositOperation:
     def __init__(self, nvals):
         self.nvals = nvals
         self.update_values = 0 # This is the default
+        self.reach = -1 # Unless an operation says otherwise
 
     def initialize(self, *args):
         raise NotImplementedError
@@ -41,7 +44,13 @@ cdef class ParticleDepositOperation:
                      np.ndarray[np.int64_t, ndim=1] dom_ind,
                      np.ndarray[np.float64_t, ndim=2] positions,
                      fields = None, int domain_id = -1,
-                     int domain_offset = 0):
+                     int domain_offset = 0, int num_threads = 0,
+                     located = None):
+        if num_threads != 1 or located is not None:
+            self.process_octree_parallel(octree, dom_ind, positions, fields,
+                                         domain_id, domain_offset,
+                                         num_threads, located)
+            return
         cdef int nf, i, j
         if fields is None:
             fields = []
@@ -98,11 +107,81 @@ cdef class ParticleDepositOperation:
                 for j in range(nf):
                     field_pointers[j][i] = field_vals[j]
 
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def process_octree_parallel(self, OctreeContainer octree,
+                     np.ndarray[np.int64_t, ndim=1] dom_ind,
+                     np.ndarray[np.float64_t, ndim=2] positions,
+                     fields = None, int domain_id = -1,
+                     int domain_offset = 0, int num_threads = 0,
+                     located = None):
+        # A particle only ever deposits into the cells of the oct it lives
+        # in.  So, once the particles have been sorted by oct, each oct can be
+        # handled by a different thread without any two of them writing to
+        # the same cell.  Within an oct the particles are visited in their
+        # original order, so the result is the same as from process_octree.
+        # The sorting can be handed in, from locate_in_octree, if it has
+        # already been done for these particles.
+        cdef int nf, i
+        cdef np.int64_t p, n, o, j, noct, moff
+        if fields is None:
+            fields = []
+        nf = len(fields)
+        cdef np.float64_t **field_pointers
+        cdef np.float64_t *field_vals
+        cdef np.ndarray[np.float64_t, ndim=1] tarr
+        field_pointers = <np.float64_t**> alloca(sizeof(np.float64_t *) * nf)
+        for i in range(nf):
+            tarr = fields[i]
+            field_pointers[i] = <np.float64_t *> tarr.data
+        cdef int dims[3]
+        dims[0] = dims[1] = dims[2] = (1 << octree.oref)
+        cdef int nz = dims[0] * dims[1] * dims[2]
+        cdef int update_values = self.update_values
+        cdef OctInfo *oi
+        positions = np.ascontiguousarray(positions)
+        cdef np.float64_t *ppos = <np.float64_t *> positions.data
+        noct = dom_ind.shape[0]
+        moff = octree.get_domain_offset(domain_id + domain_offset)
+        cdef np.int64_t *dom_inds = <np.int64_t *> dom_ind.data
+        if located is None:
+            located = locate_in_octree(octree, dom_ind, positions, domain_id,
+                                       domain_offset, num_threads)
+        ostart, order = located
+        if ostart.shape[0] != noct + 1:
+            raise RuntimeError("Particles were located in a different set "
+                               "of octs.")
+        cdef np.int64_t *ostarts = <np.int64_t *> (<np.ndarray> ostart).data
+        cdef np.int64_t *orders = <np.int64_t *> (<np.ndarray> order).data
+        with nogil, parallel(num_threads = num_threads):
+            oi = <OctInfo *> malloc(sizeof(OctInfo))
+            field_vals = <np.float64_t *> malloc(sizeof(np.float64_t) * nf)
+            for o in prange(noct, schedule = "dynamic"):
+                if ostarts[o] == ostarts[o + 1]: continue
+                # Every particle here is in the same oct, so we only need to
+                # look up where it is once.
+                octree.get(&ppos[3*orders[ostarts[o]]], oi)
+                for n in range(ostarts[o], ostarts[o + 1]):
+                    p = orders[n]
+                    for j in range(nf):
+                        field_vals[j] = field_pointers[j][p]
+                    self.process(dims, oi.left_edge, oi.dds, dom_inds[o] * nz,
+                                 &ppos[3*p], field_vals, o + moff)
+                    if update_values == 1:
+                        for j in range(nf):
+                            field_pointers[j][p] = field_vals[j]
+            free(oi)
+            free(field_vals)
+
     @cython.boundscheck(False)
     @cython.wraparound(False)
     def process_grid(self, gobj,
                      np.ndarray[np.float64_t, ndim=2] positions,
-                     fields = None):
+                     fields = None, int num_threads = 0, located = None):
+        if self.reach >= 0 and (num_threads != 1 or located is not None):
+            self.process_grid_parallel(gobj, positions, fields, num_threads,
+                                       located)
+            return
         cdef int nf, i, j
         if fields is None:
             fields = []
@@ -135,17 +214,156 @@ cdef class ParticleDepositOperation:
                 for j in range(nf):
                     field_pointers[j][i] = field_vals[j]
 
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    @cython.cdivision(True)
+    def process_grid_parallel(self, gobj,
+                     np.ndarray[np.float64_t, ndim=2] positions,
+                     fields = None, int num_threads = 0,
+                     located = None):
+        # The particles are split into slabs along the first axis, each wide
+        # enough that particles in every other slab can't deposit into the
+        # same cells.  The even slabs are then processed in parallel, followed
+        # by the odd ones.  This needs the operation to tell us how far from
+        # its own cell a particle can reach.  The slabs can be handed in, from
+        # locate_in_grid, if they have already been found for this reach.
+        cdef int nf, i, color
+        cdef np.int64_t p, n, s, j, nslab
+        if fields is None:
+            fields = []
+        nf = len(fields)
+        cdef np.float64_t **field_pointers
+        cdef np.float64_t *field_vals
+        cdef np.ndarray[np.float64_t, ndim=1] tarr
+        field_pointers = <np.float64_t**> alloca(sizeof(np.float64_t *) * nf)
+        for i in range(nf):
+            tarr = fields[i]
+            field_pointers[i] = <np.float64_t *> tarr.data
+        cdef np.int64_t gid = getattr(gobj, "id", -1)
+        cdef np.float64_t dds[3]
+        cdef np.float64_t left_edge[3]
+        cdef int dims[3]
+        for i in range(3):
+            dds[i] = gobj.dds[i]
+            left_edge[i] = gobj.LeftEdge[i]
+            dims[i] = gobj.ActiveDimensions[i]
+        cdef int update_values = self.update_values
+        positions = np.ascontiguousarray(positions)
+        cdef np.float64_t *ppos = <np.float64_t *> positions.data
+        if located is None:
+            located = locate_in_grid(gobj, positions, self.reach)
+        sstart, order = located
+        nslab = sstart.shape[0] - 1
+        if nslab != num_slabs(dims[0], self.reach):
+            raise RuntimeError("Particles were located for a different "
+                               "reach.")
+        cdef np.int64_t *sstarts = <np.int64_t *> (<np.ndarray> sstart).data
+        cdef np.int64_t *orders = <np.int64_t *> (<np.ndarray> order).data
+        for color in range(2):
+            with nogil, parallel(num_threads = num_threads):
+                field_vals = <np.float64_t *> malloc(sizeof(np.float64_t) * nf)
+                for s in prange(color, nslab, 2, schedule = "dynamic"):
+                    for n in range(sstarts[s], sstarts[s + 1]):
+                        p = orders[n]
+                        for j in range(nf):
+                            field_vals[j] = field_pointers[j][p]
+                        self.process(dims, left_edge, dds, 0, &ppos[3*p],
+                                     field_vals, gid)
+                        if update_values == 1:
+                            for j in range(nf):
+                                field_pointers[j][p] = field_vals[j]
+                free(field_vals)
+
     cdef void process(self, int dim[3], np.float64_t left_edge[3],
                       np.float64_t dds[3], np.int64_t offset,
                       np.float64_t ppos[3], np.float64_t *fields,
-                      np.int64_t domain_ind):
-        raise NotImplementedError
+                      np.int64_t domain_ind) nogil:
+        with gil:
+            raise NotImplementedError
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def locate_in_octree(OctreeContainer octree,
+                     np.ndarray[np.int64_t, ndim=1] dom_ind,
+                     np.ndarray[np.float64_t, ndim=2] positions,
+                     int domain_id = -1, int domain_offset = 0,
+                     int num_threads = 0):
+    # This finds the oct of every particle and sorts the particles by it,
+    # returning where each oct starts in the ordering and the ordering.  Those
+    # outside of our octs are dropped, as in process_octree.
+    cdef np.int64_t p, o, numpart, noct, moff
+    cdef Oct *oct
+    positions = np.ascontiguousarray(positions)
+    cdef np.float64_t *ppos = <np.float64_t *> positions.data
+    numpart = positions.shape[0]
+    noct = dom_ind.shape[0]
+    moff = octree.get_domain_offset(domain_id + domain_offset)
+    cdef np.int64_t *dom_inds = <np.int64_t *> dom_ind.data
+    cdef np.ndarray[np.int64_t, ndim=1] poct
+    poct = np.empty(numpart, dtype="int64")
+    cdef np.int64_t *pocts = <np.int64_t *> poct.data
+    for p in prange(numpart, nogil = True, num_threads = num_threads,
+                    schedule = "static"):
+        pocts[p] = -1
+        oct = octree.get(&ppos[3*p])
+        if oct == NULL or (domain_id > 0 and oct.domain != domain_id):
+            continue
+        o = oct.domain_ind - moff
+        if dom_inds[o] < 0: continue
+        pocts[p] = o
+    return sort_into_bins(poct, noct)
+
+cdef inline np.int64_t num_slabs(int dim, int reach):
+    cdef int width = max(2 * reach, 1)
+    return (dim + width - 1) // width
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def locate_in_grid(gobj, np.ndarray[np.float64_t, ndim=2] positions,
+                   int reach):
+    # This sorts the particles into the slabs used by process_grid_parallel
+    # for an operation with this reach, returning where each slab starts in
+    # the ordering and the ordering.
+    cdef int ix, dim = gobj.ActiveDimensions[0]
+    cdef int width = max(2 * reach, 1)
+    cdef np.float64_t left_edge = gobj.LeftEdge[0]
+    cdef np.float64_t dds = gobj.dds[0]
+    cdef np.int64_t p
+    cdef np.ndarray[np.int64_t, ndim=1] pslab
+    pslab = np.empty(positions.shape[0], dtype="int64")
+    for p in range(positions.shape[0]):
+        ix = <int> ((positions[p, 0] - left_edge) / dds)
+        pslab[p] = iclip(ix, 0, dim - 1) // width
+    return sort_into_bins(pslab, num_slabs(dim, reach))
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef sort_into_bins(np.ndarray[np.int64_t, ndim=1] pbin, np.int64_t nbins):
+    # A counting sort of the particles by bin, leaving out any in bin -1.
+    # This returns where each bin starts in the ordering, and the ordering.
+    cdef np.int64_t p, b
+    cdef np.ndarray[np.int64_t, ndim=1] start, cursor, order
+    start = np.zeros(nbins + 1, dtype="int64")
+    for p in range(pbin.shape[0]):
+        if pbin[p] >= 0: start[pbin[p] + 1] += 1
+    for b in range(nbins):
+        start[b + 1] += start[b]
+    cursor = start.copy()
+    order = np.empty(start[nbins], dtype="int64")
+    for p in range(pbin.shape[0]):
+        b = pbin[p]
+        if b < 0: continue
+        order[cursor[b]] = p
+        cursor[b] += 1
+    return start, order
 
 cdef class CountParticles(ParticleDepositOperation):
     cdef np.int64_t *count # float, for ease
     cdef public object ocount
     def initialize(self):
         # Create a numpy array accessible to python
+        self.reach = 0
         self.ocount = np.zeros(self.nvals, dtype="int64", order='F')
         cdef np.ndarray arr = self.ocount
         # alias the C-view for use in cython
@@ -159,7 +377,7 @@ cdef class CountParticles(ParticleDepositOperation):
                       np.float64_t ppos[3], # this particle's position
                       np.float64_t *fields,
                       np.int64_t domain_ind
-                      ):
+                      ) nogil:
         # here we do our thing; this is the kernel
         cdef int ii[3]
         cdef int i
@@ -197,7 +415,7 @@ cdef class SimpleSmooth(ParticleDepositOperation):
                       np.float64_t ppos[3],
                       np.float64_t *fields,
                       np.int64_t domain_ind
-                      ):
+                      ) nogil:
         cdef int ii[3]
         cdef int ib0[3]
         cdef int ib1[3]
@@ -245,6 +463,7 @@ cdef class SumParticleField(ParticleDepositOperation):
     cdef np.float64_t *sum
     cdef public object osum
     def initialize(self):
+        self.reach = 0
         self.osum = np.zeros(self.nvals, dtype="float64", order='F')
         cdef np.ndarray arr = self.osum
         self.sum = <np.float64_t*> arr.data
@@ -257,7 +476,7 @@ cdef class SumParticleField(ParticleDepositOperation):
                       np.float64_t ppos[3],
                       np.float64_t *fields,
                       np.int64_t domain_ind
-                      ):
+                      ) nogil:
         cdef int ii[3]
         cdef int i
         for i in range(3):
@@ -281,6 +500,7 @@ cdef class StdParticleField(ParticleDepositOperation):
     cdef public object oqk
     cdef public object oi
     def initialize(self):
+        self.reach = 0
         # we do this in a single pass, but need two scalar
         # per cell, M_k, and Q_k and also the number of particles
         # deposited into each one
@@ -305,7 +525,7 @@ cdef class StdParticleField(ParticleDepositOperation):
                       np.float64_t ppos[3],
                       np.float64_t *fields,
                       np.int64_t domain_ind
-                      ):
+                      ) nogil:
         cdef int ii[3]
         cdef int i, cell_index
         cdef float k, mk, qk
@@ -337,6 +557,8 @@ cdef class CICDeposit(ParticleDepositOperation):
     cdef np.float64_t *field
     cdef public object ofield
     def initialize(self):
+        # The eight cells we deposit into can be one cell away.
+        self.reach = 1
         self.ofield = np.zeros(self.nvals, dtype="float64", order='F')
         cdef np.ndarray arr = self.ofield
         self.field = <np.float64_t *> arr.data
@@ -349,7 +571,7 @@ cdef class CICDeposit(ParticleDepositOperation):
                       np.float64_t ppos[3], # this particle's position
                       np.float64_t *fields,
                       np.int64_t domain_ind
-                      ):
+                      ) nogil:
 
         cdef int i, j, k
         cdef np.uint64_t ii
@@ -388,6 +610,7 @@ cdef class WeightedMeanParticleField(ParticleDepositOperation):
     cdef np.float64_t *w
     cdef public object ow
     def initialize(self):
+        self.reach = 0
         self.owf = np.zeros(self.nvals, dtype='float64', order='F')
         cdef np.ndarray wfarr = self.owf
         self.wf = <np.float64_t*> wfarr.data
@@ -404,7 +627,7 @@ cdef class WeightedMeanParticleField(ParticleDepositOperation):
                       np.float64_t ppos[3],
                       np.float64_t *fields,
                       np.int64_t domain_ind
-                      ):
+                      ) nogil:
         cdef int ii[3]
         cdef int i
         for i in range(3):
@@ -423,6 +646,7 @@ cdef class MeshIdentifier(ParticleDepositOperation):
     # given particle resides in
     def initialize(self):
         self.update_values = 1
+        self.reach = 0
 
     @cython.cdivision(True)
     cdef void process(self, int dim[3],
@@ -432,7 +656,7 @@ cdef class MeshIdentifier(ParticleDepositOperation):
                       np.float64_t ppos[3],
                       np.float64_t *fields,
                       np.int64_t domain_ind
-                      ):
+                      ) nogil:
         fields[0] = domain_ind
 
     def finalize(self):
@@ -463,7 +687,7 @@ cdef class NNParticleField(ParticleDepositOperation):
                       np.float64_t ppos[3],
                       np.float64_t *fields,
                       np.int64_t domain_ind
-                      ):
+                      ) nogil:
         # This one is a bit slow.  Every grid cell is going to be iterated
         # over, and we're going to deposit particles in it.
         cdef int i, j, k
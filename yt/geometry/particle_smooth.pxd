@@ -32,52 +32,46 @@ cdef struct NeighborList:
     np.int64_t pn       # Particle number
     np.float64_t r2     # radius**2
 
+# The neighbors found for a set of points, kept so that the points can be
+# processed again without searching.
+cdef struct NeighborRecord:
+    int dim
+    np.int64_t nq, nq_size, nn, nn_size
+    np.int64_t *q_count
+    np.int64_t *q_offset
+    np.int32_t *q_ijk
+    np.float64_t *q_pos
+    np.int64_t *nn_pn
+    np.float64_t *nn_r2
+
 cdef class ParticleSmoothOperation:
     # We assume each will allocate and define their own temporary storage
     cdef public object nvals
     cdef np.float64_t DW[3]
     cdef int nfields
     cdef int maxn
-    cdef int curn
     cdef bint periodicity[3]
-    cdef np.int64_t *doffs
-    cdef np.int64_t *pinds
-    cdef np.int64_t *pcounts
-    cdef np.float64_t *ppos
-    # Note that we are preallocating here, so this is *not* threadsafe.
-    cdef NeighborList *neighbors
-    cdef void (*pos_setup)(np.float64_t ipos[3], np.float64_t opos[3])
-    cdef void neighbor_process(self, int dim[3], np.float64_t left_edge[3],
-                               np.float64_t dds[3], np.float64_t *ppos,
-                               np.float64_t **fields, 
-                               np.int64_t *doffs, np.int64_t **nind, 
-                               np.int64_t *pinds, np.int64_t *pcounts,
-                               np.int64_t offset, np.float64_t **index_fields,
-                               OctreeContainer octree, np.int64_t domain_id,
-                               int *nsize)
-    cdef int neighbor_search(self, np.float64_t pos[3], OctreeContainer octree,
-                             np.int64_t **nind, int *nsize, 
-                             np.int64_t nneighbors, np.int64_t domain_id, Oct **oct = ?)
-    cdef void neighbor_process_particle(self, np.float64_t cpos[3],
-                               np.float64_t *ppos,
-                               np.float64_t **fields, 
-                               np.int64_t *doffs, np.int64_t **nind, 
-                               np.int64_t *pinds, np.int64_t *pcounts,
-                               np.int64_t offset,
-                               np.float64_t **index_fields,
-                               OctreeContainer octree, np.int64_t domain_id,
-                               int *nsize)
-    cdef void neighbor_eval(self, np.int64_t pn, np.float64_t ppos[3],
-                            np.float64_t cpos[3])
-    cdef void neighbor_reset(self)
-    cdef void neighbor_find(self,
-                            np.int64_t nneighbors,
-                            np.int64_t *nind,
-                            np.int64_t *doffs,
-                            np.int64_t *pcounts,
-                            np.int64_t *pinds,
-                            np.float64_t *ppos,
-                            np.float64_t cpos[3])
+    # Points are processed by several threads at once, so each keeps its own
+    # list of neighbors, and hands it to process.
+    # When recording, the neighbors of every point processed are stored, so
+    # that later operations on the same points can skip the search.
+    cdef bint recording
+    cdef NeighborRecord record
+    cdef void (*pos_setup)(np.float64_t ipos[3], np.float64_t opos[3]) nogil
+    cdef void neighbor_reset(self, NeighborList *neighbors) nogil
+    cdef int neighbor_eval(self, np.int64_t pn, np.float64_t ppos[3],
+                           np.float64_t cpos[3], NeighborList *neighbors,
+                           int curn) nogil
+    cdef int neighbor_find(self,
+                           np.int64_t nneighbors,
+                           np.int64_t *nind,
+                           np.int64_t *doffs,
+                           np.int64_t *pcounts,
+                           np.int64_t *pinds,
+                           np.float64_t *ppos,
+                           np.float64_t cpos[3],
+                           NeighborList *neighbors) nogil
     cdef void process(self, np.int64_t offset, int i, int j, int k,
                       int dim[3], np.float64_t cpos[3], np.float64_t **fields,
-                      np.float64_t **index_fields)
+                      np.float64_t **index_fields, NeighborList *neighbors,
+                      int curn) nogil
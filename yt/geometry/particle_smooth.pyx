@@ -17,8 +17,9 @@ Particle smoothing in cells
 cimport numpy as np
 import numpy as np
 from libc.stdlib cimport malloc, free, realloc
-from libc.string cimport memmove
+from libc.string cimport memmove, memcpy
 cimport cython
+from cython.parallel cimport prange, parallel
 from libc.math cimport sqrt, fabs, sin, cos
 
 from fp_utils cimport *
@@ -46,7 +47,7 @@ cdef np.float64_t r2dist(np.float64_t ppos[3],
                          np.float64_t cpos[3],
                          np.float64_t DW[3],
                          bint periodicity[3],
-                         np.float64_t max_dist2):
+                         np.float64_t max_dist2) nogil:
     cdef int i
     cdef np.float64_t r2, DR
     r2 = 0.0
@@ -63,16 +64,195 @@ cdef np.float64_t r2dist(np.float64_t ppos[3],
             return -1.0
     return r2
 
-cdef void spherical_coord_setup(np.float64_t ipos[3], np.float64_t opos[3]):
+cdef void spherical_coord_setup(np.float64_t ipos[3],
+                                np.float64_t opos[3]) nogil:
     opos[0] = ipos[0] * sin(ipos[1]) * cos(ipos[2])
     opos[1] = ipos[0] * sin(ipos[1]) * sin(ipos[2])
     opos[2] = ipos[0] * cos(ipos[1])
 
-cdef void cart_coord_setup(np.float64_t ipos[3], np.float64_t opos[3]):
+cdef void cart_coord_setup(np.float64_t ipos[3], np.float64_t opos[3]) nogil:
     opos[0] = ipos[0]
     opos[1] = ipos[1]
     opos[2] = ipos[2]
 
+cdef void record_init(NeighborRecord *rec, int dim) nogil:
+    rec.dim = dim
+    rec.nq = rec.nq_size = rec.nn = rec.nn_size = 0
+    rec.q_count = rec.q_offset = NULL
+    rec.q_ijk = NULL
+    rec.q_pos = NULL
+    rec.nn_pn = NULL
+    rec.nn_r2 = NULL
+
+cdef void record_free(NeighborRecord *rec) nogil:
+    free(rec.q_count)
+    free(rec.q_offset)
+    free(rec.q_ijk)
+    free(rec.q_pos)
+    free(rec.nn_pn)
+    free(rec.nn_r2)
+    record_init(rec, 0)
+
+cdef int record_reserve(NeighborRecord *rec, np.int64_t nq,
+                        np.int64_t nn) nogil:
+    # Make room for at least nq points and nn neighbors in total.  If an
+    # allocation fails, this returns -1 and the record keeps the buffers it
+    # has, so that record_free still releases all of them.
+    cdef np.int64_t size
+    cdef void *tmp
+    if nq > rec.nq_size:
+        size = max(2 * rec.nq_size, nq, 1024)
+        tmp = realloc(rec.q_count, sizeof(np.int64_t) * size)
+        if tmp == NULL: return -1
+        rec.q_count = <np.int64_t *> tmp
+        tmp = realloc(rec.q_offset, sizeof(np.int64_t) * size)
+        if tmp == NULL: return -1
+        rec.q_offset = <np.int64_t *> tmp
+        tmp = realloc(rec.q_ijk, sizeof(np.int32_t) * 3 * size)
+        if tmp == NULL: return -1
+        rec.q_ijk = <np.int32_t *> tmp
+        tmp = realloc(rec.q_pos, sizeof(np.float64_t) * 3 * size)
+        if tmp == NULL: return -1
+        rec.q_pos = <np.float64_t *> tmp
+        rec.nq_size = size
+    if nn > rec.nn_size:
+        size = max(2 * rec.nn_size, nn, 16384)
+        tmp = realloc(rec.nn_pn, sizeof(np.int64_t) * size)
+        if tmp == NULL: return -1
+        rec.nn_pn = <np.int64_t *> tmp
+        tmp = realloc(rec.nn_r2, sizeof(np.float64_t) * size)
+        if tmp == NULL: return -1
+        rec.nn_r2 = <np.float64_t *> tmp
+        rec.nn_size = size
+    return 0
+
+cdef int record_neighbors(NeighborRecord *rec, np.int64_t offset,
+                          int i, int j, int k, np.float64_t cpos[3],
+                          NeighborList *neighbors, int curn) nogil:
+    cdef int n
+    if record_reserve(rec, rec.nq + 1, rec.nn + curn) < 0:
+        return -1
+    rec.q_count[rec.nq] = curn
+    rec.q_offset[rec.nq] = offset
+    rec.q_ijk[3 * rec.nq + 0] = i
+    rec.q_ijk[3 * rec.nq + 1] = j
+    rec.q_ijk[3 * rec.nq + 2] = k
+    for n in range(3):
+        rec.q_pos[3 * rec.nq + n] = cpos[n]
+    for n in range(curn):
+        rec.nn_pn[rec.nn + n] = neighbors[n].pn
+        rec.nn_r2[rec.nn + n] = neighbors[n].r2
+    rec.nq += 1
+    rec.nn += curn
+    return 0
+
+cdef int record_merge(NeighborRecord *rec, NeighborRecord *other) nogil:
+    # Every point is processed independently of the others, so the order in
+    # which the records of different threads are put together doesn't matter.
+    if other.nq == 0: return 0
+    if record_reserve(rec, rec.nq + other.nq, rec.nn + other.nn) < 0:
+        return -1
+    memcpy(rec.q_count + rec.nq, other.q_count,
+           sizeof(np.int64_t) * other.nq)
+    memcpy(rec.q_offset + rec.nq, other.q_offset,
+           sizeof(np.int64_t) * other.nq)
+    memcpy(rec.q_ijk + 3 * rec.nq, other.q_ijk,
+           sizeof(np.int32_t) * 3 * other.nq)
+    memcpy(rec.q_pos + 3 * rec.nq, other.q_pos,
+           sizeof(np.float64_t) * 3 * other.nq)
+    memcpy(rec.nn_pn + rec.nn, other.nn_pn, sizeof(np.int64_t) * other.nn)
+    memcpy(rec.nn_r2 + rec.nn, other.nn_r2, sizeof(np.float64_t) * other.nn)
+    rec.dim = other.dim
+    rec.nq += other.nq
+    rec.nn += other.nn
+    return 0
+
+cdef class NeighborSets:
+    # This finds the octs neighboring a series of positions, keeping each
+    # distinct set of octs once.  Neighboring positions usually share a set,
+    # so we only search again when a position is in a different oct than the
+    # last one.
+    cdef OctreeContainer octree
+    cdef np.int64_t domain_id
+    cdef bint periodicity[3]
+    cdef Oct *last
+    cdef np.int64_t nsets, nind, nsets_size, nind_size
+    cdef np.int64_t *set_start
+    cdef np.int64_t *set_ind
+
+    def __cinit__(self):
+        self.set_start = self.set_ind = NULL
+
+    def __init__(self, OctreeContainer octree, np.int64_t domain_id,
+                 periodicity):
+        cdef int i
+        self.octree = octree
+        self.domain_id = domain_id
+        for i in range(3):
+            self.periodicity[i] = periodicity[i]
+        self.last = NULL
+        self.nsets = self.nind = 0
+        self.nsets_size = 1024
+        self.nind_size = 27 * self.nsets_size
+        self.set_start = <np.int64_t *> malloc(
+            sizeof(np.int64_t) * (self.nsets_size + 1))
+        self.set_ind = <np.int64_t *> malloc(
+            sizeof(np.int64_t) * self.nind_size)
+        if self.set_start == NULL or self.set_ind == NULL:
+            raise MemoryError()
+        self.set_start[0] = 0
+
+    def __dealloc__(self):
+        free(self.set_start)
+        free(self.set_ind)
+
+    cdef np.int64_t find(self, np.float64_t pos[3]) except -1:
+        # Returns the index of the set of octs neighboring pos; its local oct
+        # indices, with -1 for any to skip, are set_ind[set_start[s]] up to
+        # set_ind[set_start[s + 1]].
+        cdef OctInfo oi
+        cdef Oct *ooct
+        cdef Oct **neighbors
+        cdef void *tmp
+        cdef np.int64_t j, n, nneighbors, size
+        cdef np.int64_t moff = self.octree.get_domain_offset(self.domain_id)
+        ooct = self.octree.get(pos, &oi)
+        if self.nsets > 0 and ooct == self.last:
+            return self.nsets - 1
+        self.last = ooct
+        neighbors = self.octree.neighbors(&oi, &nneighbors, ooct,
+                                          self.periodicity)
+        if self.nsets == self.nsets_size:
+            size = 2 * self.nsets_size
+            tmp = realloc(self.set_start, sizeof(np.int64_t) * (size + 1))
+            if tmp == NULL:
+                free(neighbors)
+                raise MemoryError()
+            self.set_start = <np.int64_t *> tmp
+            self.nsets_size = size
+        if self.nind + nneighbors > self.nind_size:
+            size = max(2 * self.nind_size, self.nind + nneighbors)
+            tmp = realloc(self.set_ind, sizeof(np.int64_t) * size)
+            if tmp == NULL:
+                free(neighbors)
+                raise MemoryError()
+            self.set_ind = <np.int64_t *> tmp
+            self.nind_size = size
+        cdef np.int64_t *nind = self.set_ind + self.nind
+        for j in range(nneighbors):
+            # Particle octree neighbor indices
+            nind[j] = neighbors[j].domain_ind - moff
+            for n in range(j):
+                if nind[j] == nind[n]:
+                    nind[j] = -1
+                break
+        # This is allocated by the neighbors function, so we deallocate it.
+        free(neighbors)
+        self.nind += nneighbors
+        self.nsets += 1
+        self.set_start[self.nsets] = self.nind
+        return self.nsets - 1
+
 cdef class ParticleSmoothOperation:
     def __init__(self, nvals, nfields, max_neighbors):
         # This is the set of cells, in grids, blocks or octs, we are handling.
@@ -80,9 +260,11 @@ cdef class ParticleSmoothOperation:
         self.nvals = nvals
         self.nfields = nfields
         self.maxn = max_neighbors
-        self.neighbors = <NeighborList *> malloc(
-            sizeof(NeighborList) * self.maxn)
-        self.neighbor_reset()
+        self.recording = 0
+        record_init(&self.record, 0)
+
+    def __dealloc__(self):
+        record_free(&self.record)
 
     def initialize(self, *args):
         raise NotImplementedError
@@ -90,6 +272,122 @@ cdef class ParticleSmoothOperation:
     def finalize(self, *args):
         raise NotImplementedError
 
+    def record_neighbor_lists(self):
+        """
+        Start storing the neighbors found for every point processed by
+        process_octree or process_particles, to be collected afterwards with
+        get_neighbor_lists.
+        """
+        record_free(&self.record)
+        self.recording = 1
+
+    def get_neighbor_lists(self):
+        """
+        Return the neighbor lists stored since record_neighbor_lists was
+        called, and stop recording.  These are returned as a dictionary of
+        arrays: the neighbors of point q are ``pn[indptr[q]:indptr[q+1]]``,
+        at squared distances ``r2[indptr[q]:indptr[q+1]]``, and ``offset``,
+        ``ijk`` and ``pos`` hold what is needed to process each point again.
+        """
+        cdef np.int64_t q, n
+        cdef np.ndarray[np.int64_t, ndim=1] indptr, pn, offset
+        cdef np.ndarray[np.int32_t, ndim=2] ijk
+        cdef np.ndarray[np.float64_t, ndim=1] r2
+        cdef np.ndarray[np.float64_t, ndim=2] pos
+        cdef NeighborRecord *rec = &self.record
+        indptr = np.empty(rec.nq + 1, dtype="int64")
+        offset = np.empty(rec.nq, dtype="int64")
+        ijk = np.empty((rec.nq, 3), dtype="int32")
+        pos = np.empty((rec.nq, 3), dtype="float64")
+        pn = np.empty(rec.nn, dtype="int64")
+        r2 = np.empty(rec.nn, dtype="float64")
+        indptr[0] = 0
+        for q in range(rec.nq):
+            indptr[q + 1] = indptr[q] + rec.q_count[q]
+            offset[q] = rec.q_offset[q]
+            for n in range(3):
+                ijk[q, n] = rec.q_ijk[3 * q + n]
+                pos[q, n] = rec.q_pos[3 * q + n]
+        for n in range(rec.nn):
+            pn[n] = rec.nn_pn[n]
+            r2[n] = rec.nn_r2[n]
+        rv = dict(indptr = indptr, pn = pn, r2 = r2, offset = offset,
+                  ijk = ijk, pos = pos, dim = rec.dim,
+                  max_neighbors = self.maxn)
+        record_free(rec)
+        self.recording = 0
+        return rv
+
+    @cython.cdivision(True)
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def process_neighbor_lists(self, neighbor_lists, fields = None,
+                               index_fields = None, int num_threads = 0):
+        """
+        Process every point in a set of neighbor lists returned by
+        get_neighbor_lists, with the same neighbors as when they were found,
+        but without searching for them again.  The fields must be in the
+        same order as the positions used then.
+        """
+        cdef int nf, i, n, curn
+        cdef int dims[3]
+        cdef np.int64_t q, start
+        cdef np.float64_t **field_pointers
+        cdef np.float64_t **index_field_pointers
+        cdef NeighborList *neighbors
+        cdef int failed[1]
+        cdef np.ndarray[np.float64_t, ndim=1] tarr
+        cdef np.ndarray[np.float64_t, ndim=4] iarr
+        cdef np.ndarray[np.int64_t, ndim=1] indptr = neighbor_lists["indptr"]
+        cdef np.ndarray[np.int64_t, ndim=1] pn = neighbor_lists["pn"]
+        cdef np.ndarray[np.float64_t, ndim=1] r2 = neighbor_lists["r2"]
+        cdef np.ndarray[np.int64_t, ndim=1] offset = neighbor_lists["offset"]
+        cdef np.ndarray[np.int32_t, ndim=2] ijk = neighbor_lists["ijk"]
+        cdef np.ndarray[np.float64_t, ndim=2] pos = neighbor_lists["pos"]
+        if neighbor_lists["max_neighbors"] != self.maxn:
+            raise RuntimeError("Neighbor lists were found for %s neighbors, "
+                               "not %s." % (neighbor_lists["max_neighbors"],
+                                            self.maxn))
+        dims[0] = dims[1] = dims[2] = neighbor_lists["dim"]
+        if fields is None:
+            fields = []
+        nf = len(fields)
+        field_pointers = <np.float64_t**> alloca(sizeof(np.float64_t *) * nf)
+        for i in range(nf):
+            tarr = fields[i]
+            field_pointers[i] = <np.float64_t *> tarr.data
+        if index_fields is None:
+            index_fields = []
+        nf = len(index_fields)
+        index_field_pointers = <np.float64_t**> alloca(
+            sizeof(np.float64_t *) * nf)
+        for i in range(nf):
+            iarr = index_fields[i]
+            index_field_pointers[i] = <np.float64_t *> iarr.data
+        pos = np.ascontiguousarray(pos)
+        cdef np.float64_t *qpos = <np.float64_t *> pos.data
+        # Each point writes only to its own cell or particle, so they can be
+        # shared out between threads in any way.
+        failed[0] = 0
+        with nogil, parallel(num_threads = num_threads):
+            neighbors = <NeighborList *> malloc(
+                sizeof(NeighborList) * self.maxn)
+            if neighbors == NULL:
+                failed[0] = 1
+            for q in prange(offset.shape[0], schedule = "static"):
+                if neighbors == NULL: continue
+                start = indptr[q]
+                curn = indptr[q + 1] - start
+                for n in range(curn):
+                    neighbors[n].pn = pn[start + n]
+                    neighbors[n].r2 = r2[start + n]
+                self.process(offset[q], ijk[q, 0], ijk[q, 1], ijk[q, 2], dims,
+                             &qpos[3*q], field_pointers, index_field_pointers,
+                             neighbors, curn)
+            free(neighbors)
+        if failed[0]:
+            raise MemoryError()
+
     @cython.cdivision(True)
     @cython.boundscheck(False)
     @cython.wraparound(False)
@@ -103,7 +401,7 @@ cdef class ParticleSmoothOperation:
                      index_fields = None,
                      OctreeContainer particle_octree = None,
                      np.ndarray[np.int64_t, ndim=1] pdom_ind = None,
-                     geometry = "cartesian"):
+                     geometry = "cartesian", int num_threads = 0):
         # This will be a several-step operation.
         #
         # We first take all of our particles and assign them to Octs.  If they
@@ -115,14 +413,16 @@ cdef class ParticleSmoothOperation:
         # overhead, but reduces complexity as we will now be able to use
         # argsort.
         #
-        # After the particles have been assigned to Octs, we process each Oct
-        # individually.  We will do this by calling "get" for the *first*
-        # particle in each set of Octs in the sorted list.  After this, we get
-        # neighbors for each Oct.
+        # After the particles have been assigned to Octs, we find the mesh
+        # Octs we are going to process, and for every cell in them, the
+        # particle Octs neighboring it.  All of this walks the octrees, and so
+        # is done up front, in serial.
         #
-        # Now, with the set of neighbors (and thus their indices) we allocate
-        # an array of particles and their fields, fill these in, and call our
-        # process function.
+        # Now, with the set of neighbors (and thus their indices) for each
+        # cell, the mesh Octs are handed out to threads.  Each thread finds
+        # the nearest particles to each cell in its Octs, and calls our
+        # process function.  Because no two Octs share a cell, the threads
+        # never write to the same place.
         #
         # This is not terribly efficient -- for starters, the neighbor function
         # is not the most efficient yet.  We will also need to handle some
@@ -131,28 +431,24 @@ cdef class ParticleSmoothOperation:
         if particle_octree is None:
             particle_octree = mesh_octree
             pdom_ind = mdom_ind
-        cdef int nf, i, j, n
+        cdef int nf, i, j, k, curn
         cdef int dims[3]
         cdef np.float64_t **field_pointers
-        cdef np.float64_t *field_vals
         cdef np.float64_t pos[3]
-        cdef np.float64_t *ppos
-        cdef np.float64_t dds[3]
-        cdef np.float64_t **octree_field_pointers
-        cdef int nsize = 0
-        cdef np.int64_t *nind = NULL
-        cdef OctInfo moi, poi
+        cdef np.float64_t opos[3]
+        cdef np.float64_t *cpos
+        cdef np.float64_t **index_field_pointers
+        cdef OctInfo moi
         cdef Oct *oct
-        cdef np.int64_t numpart, offset, local_ind, poff
-        cdef np.int64_t moff_p, moff_m
-        cdef np.int64_t *doffs
-        cdef np.int64_t *pinds
-        cdef np.int64_t *pcounts
-        cdef np.ndarray[np.int64_t, ndim=1] pind, doff, pdoms, pcount
-        cdef np.ndarray[np.int64_t, ndim=2] doff_m
+        cdef np.int64_t offset, g, ng, q, s
+        cdef np.int64_t moff_m
+        cdef np.ndarray[np.int64_t, ndim=1] pind, doff, pcount
         cdef np.ndarray[np.float64_t, ndim=1] tarr
         cdef np.ndarray[np.float64_t, ndim=4] iarr
         cdef np.ndarray[np.float64_t, ndim=2] cart_positions
+        cdef NeighborList *neighbors
+        cdef NeighborRecord *rec
+        cdef int failed[1]
         if geometry == "cartesian":
             self.pos_setup = cart_coord_setup
             cart_positions = positions
@@ -173,20 +469,10 @@ cdef class ParticleSmoothOperation:
             raise NotImplementedError
         dims[0] = dims[1] = dims[2] = (1 << mesh_octree.oref)
         cdef int nz = dims[0] * dims[1] * dims[2]
-        numpart = positions.shape[0]
-        # pcount is the number of particles per oct.
-        pcount = np.zeros_like(pdom_ind)
-        # doff is the offset to a given oct in the sorted particles.
-        doff = np.zeros_like(pdom_ind) - 1
-        doff_m = np.zeros((mdom_ind.shape[0], 2), dtype="int64")
-        moff_p = particle_octree.get_domain_offset(domain_id + domain_offset)
         moff_m = mesh_octree.get_domain_offset(domain_id + domain_offset)
-        # pdoms points particles at their octs.  So the value in this array, for
-        # a given index, is the local oct index.
-        pdoms = np.zeros(positions.shape[0], dtype="int64") - 1
-        nf = len(fields)
         if fields is None:
             fields = []
+        nf = len(fields)
         field_pointers = <np.float64_t**> alloca(sizeof(np.float64_t *) * nf)
         for i in range(nf):
             tarr = fields[i]
@@ -201,49 +487,23 @@ cdef class ParticleSmoothOperation:
         for i in range(3):
             self.DW[i] = (mesh_octree.DRE[i] - mesh_octree.DLE[i])
             self.periodicity[i] = periodicity[i]
-        for i in range(positions.shape[0]):
-            for j in range(3):
-                pos[j] = positions[i, j]
-            oct = particle_octree.get(pos)
-            if oct == NULL or (domain_id > 0 and oct.domain != domain_id):
-                continue
-            # Note that this has to be our local index, not our in-file index.
-            # This is the particle count, which we'll use once we have sorted
-            # the particles to calculate the offsets into each oct's particles.
-            offset = oct.domain_ind - moff_p
-            pcount[offset] += 1
-            pdoms[i] = offset # We store the *actual* offset.
-            oct = mesh_octree.get(pos)
-            offset = oct.domain_ind - moff_m
-        # Now we have oct assignments.  Let's sort them.
-        # Note that what we will be providing to our processing functions will
-        # actually be indirectly-sorted fields.  This preserves memory at the
-        # expense of additional pointer lookups.
-        pind = np.argsort(pdoms)
-        pind = np.asarray(pind, dtype='int64', order='C')
-        # So what this means is that we now have all the oct-0 particle indices
-        # in order, then the oct-1, etc etc.
-        # This now gives us the indices to the particles for each domain.
-        for i in range(positions.shape[0]):
-            # This value, poff, is the index of the particle in the *unsorted*
-            # arrays.
-            poff = pind[i]
-            offset = pdoms[poff]
-            # If we have yet to assign the starting index to this oct, we do so
-            # now.
-            if doff[offset] < 0: doff[offset] = i
-        #print domain_id, domain_offset, moff_p, moff_m
-        #raise RuntimeError
-        # Now doff is full of offsets to the first entry in the pind that
-        # refers to that oct's particles.
-        ppos = <np.float64_t *> positions.data
-        cart_pos = <np.float64_t *> cart_positions.data
-        doffs = <np.int64_t*> doff.data
-        pinds = <np.int64_t*> pind.data
-        pcounts = <np.int64_t*> pcount.data
+        pind, doff, pcount = self.assign_particles(particle_octree, pdom_ind,
+            positions, domain_id, domain_offset)
+        cart_positions = np.ascontiguousarray(cart_positions)
+        cdef np.float64_t *cart_pos = <np.float64_t *> cart_positions.data
+        cdef np.int64_t *doffs = <np.int64_t*> doff.data
+        cdef np.int64_t *pinds = <np.int64_t*> pind.data
+        cdef np.int64_t *pcounts = <np.int64_t*> pcount.data
+        # Now we find the mesh octs we will process, along with where they
+        # are and where their values go.
         cdef np.ndarray[np.uint8_t, ndim=1] visited
         visited = np.zeros(mdom_ind.shape[0], dtype="uint8")
-        cdef int nproc = 0
+        cdef np.ndarray[np.float64_t, ndim=2] oct_left, oct_dds
+        cdef np.ndarray[np.int64_t, ndim=1] oct_offset
+        oct_left = np.empty((oct_positions.shape[0], 3), dtype="float64")
+        oct_dds = np.empty((oct_positions.shape[0], 3), dtype="float64")
+        oct_offset = np.empty(oct_positions.shape[0], dtype="int64")
+        ng = 0
         for i in range(oct_positions.shape[0]):
             for j in range(3):
                 pos[j] = oct_positions[i, j]
@@ -252,15 +512,84 @@ cdef class ParticleSmoothOperation:
             if visited[oct.domain_ind - moff_m] == 1: continue
             visited[oct.domain_ind - moff_m] = 1
             if offset < 0: continue
-            nproc += 1
-            self.neighbor_process(dims, moi.left_edge, moi.dds,
-                         cart_pos, field_pointers, doffs, &nind,
-                         pinds, pcounts, offset, index_field_pointers,
-                         particle_octree, domain_id, &nsize)
-        #print "VISITED", visited.sum(), visited.size,
-        #print 100.0*float(visited.sum())/visited.size
-        if nind != NULL:
-            free(nind)
+            for j in range(3):
+                oct_left[ng, j] = moi.left_edge[j]
+                oct_dds[ng, j] = moi.dds[j]
+            oct_offset[ng] = offset
+            ng += 1
+        # And the particle octs neighboring every one of their cells, in the
+        # same order as we will process them.
+        cdef np.ndarray[np.int64_t, ndim=1] qset
+        qset = np.empty(ng * nz, dtype="int64")
+        cdef NeighborSets sets = NeighborSets(particle_octree, domain_id,
+                                              self.periodicity)
+        q = 0
+        for g in range(ng):
+            for i in range(dims[0]):
+                pos[0] = oct_left[g, 0] + (i + 0.5) * oct_dds[g, 0]
+                for j in range(dims[1]):
+                    pos[1] = oct_left[g, 1] + (j + 0.5) * oct_dds[g, 1]
+                    for k in range(dims[2]):
+                        pos[2] = oct_left[g, 2] + (k + 0.5) * oct_dds[g, 2]
+                        self.pos_setup(pos, opos)
+                        qset[q] = sets.find(opos)
+                        q += 1
+        cdef np.int64_t *set_start = sets.set_start
+        cdef np.int64_t *set_ind = sets.set_ind
+        cdef np.float64_t *left = <np.float64_t *> oct_left.data
+        cdef np.float64_t *width = <np.float64_t *> oct_dds.data
+        cdef np.int64_t *offsets = <np.int64_t *> oct_offset.data
+        cdef np.int64_t *qsets = <np.int64_t *> qset.data
+        cdef bint recording = self.recording
+        failed[0] = 0
+        with nogil, parallel(num_threads = num_threads):
+            neighbors = <NeighborList *> malloc(
+                sizeof(NeighborList) * self.maxn)
+            cpos = <np.float64_t *> malloc(sizeof(np.float64_t) * 6)
+            rec = NULL
+            if recording:
+                rec = <NeighborRecord *> malloc(sizeof(NeighborRecord))
+                if rec != NULL:
+                    record_init(rec, dims[0])
+            if neighbors == NULL or cpos == NULL or (recording and rec == NULL):
+                failed[0] = 1
+            for g in prange(ng, schedule = "dynamic"):
+                if neighbors == NULL or cpos == NULL: continue
+                for i in range(dims[0]):
+                    for j in range(dims[1]):
+                        for k in range(dims[2]):
+                            cpos[0] = left[3*g + 0] + (i + 0.5) * width[3*g + 0]
+                            cpos[1] = left[3*g + 1] + (j + 0.5) * width[3*g + 1]
+                            cpos[2] = left[3*g + 2] + (k + 0.5) * width[3*g + 2]
+                            self.pos_setup(cpos, &cpos[3])
+                            s = qsets[((g * dims[0] + i) * dims[1] + j)
+                                      * dims[2] + k]
+                            curn = self.neighbor_find(
+                                set_start[s + 1] - set_start[s],
+                                &set_ind[set_start[s]], doffs, pcounts,
+                                pinds, cart_pos, &cpos[3], neighbors)
+                            if rec != NULL and not failed[0]:
+                                if record_neighbors(rec, offsets[g], i, j, k,
+                                        &cpos[3], neighbors, curn) < 0:
+                                    failed[0] = 1
+                            self.process(offsets[g], i, j, k, dims, &cpos[3],
+                                         field_pointers, index_field_pointers,
+                                         neighbors, curn)
+            if rec != NULL:
+                with gil:
+                    if not failed[0] and \
+                       record_merge(&self.record, rec) < 0:
+                        failed[0] = 1
+                record_free(rec)
+                free(rec)
+            free(cpos)
+            free(neighbors)
+        if failed[0]:
+            # Whatever was recorded is incomplete, so none of it is kept.
+            if recording:
+                record_free(&self.record)
+                self.recording = 0
+            raise MemoryError()
 
     @cython.cdivision(True)
     @cython.boundscheck(False)
@@ -271,7 +600,7 @@ cdef class ParticleSmoothOperation:
                      fields = None, int domain_id = -1,
                      int domain_offset = 0,
                      periodicity = (True, True, True),
-                     geometry = "cartesian"):
+                     geometry = "cartesian", int num_threads = 0):
         # The other functions in this base class process particles in a way
         # that results in a modification to the *mesh*.  This function is
         # designed to process neighboring particles in such a way that a new
@@ -279,27 +608,23 @@ cdef class ParticleSmoothOperation:
         # attributes (*not* mesh attributes) can be created that rely on the
         # values of nearby particles.  For instance, a smoothing kernel, or a
         # nearest-neighbor field.
-        cdef int nf, i, j, k, n
+        #
+        # As in process_octree, the neighboring octs are found up front, and
+        # then the particle octs are handed out to threads.  Each particle
+        # only writes its own values, so the threads never collide.
+        cdef int nf, i, j, curn
         cdef int dims[3]
         cdef np.float64_t **field_pointers
-        cdef np.float64_t *field_vals
-        cdef np.float64_t *ppos
-        cdef np.float64_t dds[3]
         cdef np.float64_t pos[3]
-        cdef np.float64_t **octree_field_pointers
-        cdef int nsize = 0
-        cdef np.int64_t *nind = NULL
-        cdef OctInfo moi, poi
-        cdef Oct *oct
-        cdef Oct **neighbors = NULL
-        cdef np.int64_t nneighbors, numpart, offset, local_ind
-        cdef np.int64_t moff_p, moff_m, pind0, poff
-        cdef np.int64_t *doffs
-        cdef np.int64_t *pinds
-        cdef np.int64_t *pcounts
-        cdef np.ndarray[np.int64_t, ndim=1] pind, doff, pdoms, pcount
+        cdef np.float64_t opos[3]
+        cdef np.float64_t *cpos
+        cdef np.int64_t o, n, p, q, s, noct
+        cdef np.ndarray[np.int64_t, ndim=1] pind, doff, pcount
         cdef np.ndarray[np.float64_t, ndim=1] tarr
         cdef np.ndarray[np.float64_t, ndim=2] cart_positions
+        cdef NeighborList *neighbors
+        cdef NeighborRecord *rec
+        cdef int failed[1]
         if geometry == "cartesian":
             self.pos_setup = cart_coord_setup
             cart_positions = positions
@@ -318,14 +643,11 @@ cdef class ParticleSmoothOperation:
             periodicity = (False, False, False)
         else:
             raise NotImplementedError
-        numpart = positions.shape[0]
-        pcount = np.zeros_like(pdom_ind)
-        doff = np.zeros_like(pdom_ind) - 1
-        moff_p = particle_octree.get_domain_offset(domain_id + domain_offset)
-        pdoms = np.zeros(positions.shape[0], dtype="int64") - 1
-        nf = len(fields)
+        # Each particle is its own cell.
+        dims[0] = dims[1] = dims[2] = 1
         if fields is None:
             fields = []
+        nf = len(fields)
         field_pointers = <np.float64_t**> alloca(sizeof(np.float64_t *) * nf)
         for i in range(nf):
             tarr = fields[i]
@@ -333,6 +655,103 @@ cdef class ParticleSmoothOperation:
         for i in range(3):
             self.DW[i] = (particle_octree.DRE[i] - particle_octree.DLE[i])
             self.periodicity[i] = periodicity[i]
+        pind, doff, pcount = self.assign_particles(particle_octree, pdom_ind,
+            positions, domain_id, domain_offset)
+        positions = np.ascontiguousarray(positions)
+        cart_positions = np.ascontiguousarray(cart_positions)
+        cdef np.float64_t *ppos = <np.float64_t *> positions.data
+        cdef np.float64_t *cart_pos = <np.float64_t *> cart_positions.data
+        cdef np.int64_t *doffs = <np.int64_t*> doff.data
+        cdef np.int64_t *pinds = <np.int64_t*> pind.data
+        cdef np.int64_t *pcounts = <np.int64_t*> pcount.data
+        noct = doff.shape[0]
+        # Find the octs neighboring every particle, in the order the
+        # particles are sorted in.
+        cdef np.ndarray[np.int64_t, ndim=1] qset
+        qset = np.empty(pind.shape[0], dtype="int64")
+        cdef NeighborSets sets = NeighborSets(particle_octree, domain_id,
+                                              self.periodicity)
+        for o in range(noct):
+            if doff[o] < 0: continue
+            for n in range(pcount[o]):
+                p = pind[doff[o] + n]
+                for j in range(3):
+                    pos[j] = positions[p, j]
+                self.pos_setup(pos, opos)
+                qset[doff[o] + n] = sets.find(opos)
+        cdef np.int64_t *set_start = sets.set_start
+        cdef np.int64_t *set_ind = sets.set_ind
+        cdef np.int64_t *qsets = <np.int64_t *> qset.data
+        cdef bint recording = self.recording
+        failed[0] = 0
+        with nogil, parallel(num_threads = num_threads):
+            neighbors = <NeighborList *> malloc(
+                sizeof(NeighborList) * self.maxn)
+            cpos = <np.float64_t *> malloc(sizeof(np.float64_t) * 3)
+            rec = NULL
+            if recording:
+                rec = <NeighborRecord *> malloc(sizeof(NeighborRecord))
+                if rec != NULL:
+                    record_init(rec, 1)
+            if neighbors == NULL or cpos == NULL or (recording and rec == NULL):
+                failed[0] = 1
+            for o in prange(noct, schedule = "dynamic"):
+                if neighbors == NULL or cpos == NULL: continue
+                if doffs[o] < 0: continue
+                for n in range(pcounts[o]):
+                    q = doffs[o] + n
+                    p = pinds[q]
+                    self.pos_setup(&ppos[3*p], cpos)
+                    s = qsets[q]
+                    curn = self.neighbor_find(
+                        set_start[s + 1] - set_start[s],
+                        &set_ind[set_start[s]], doffs, pcounts,
+                        pinds, cart_pos, cpos, neighbors)
+                    if rec != NULL and not failed[0]:
+                        if record_neighbors(rec, p, 0, 0, 0, cpos,
+                                            neighbors, curn) < 0:
+                            failed[0] = 1
+                    self.process(p, 0, 0, 0, dims, cpos, field_pointers,
+                                 NULL, neighbors, curn)
+            if rec != NULL:
+                with gil:
+                    if not failed[0] and \
+                       record_merge(&self.record, rec) < 0:
+                        failed[0] = 1
+                record_free(rec)
+                free(rec)
+            free(cpos)
+            free(neighbors)
+        if failed[0]:
+            # Whatever was recorded is incomplete, so none of it is kept.
+            if recording:
+                record_free(&self.record)
+                self.recording = 0
+            raise MemoryError()
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def assign_particles(self, OctreeContainer particle_octree,
+                         np.ndarray[np.int64_t, ndim=1] pdom_ind,
+                         np.ndarray[np.float64_t, ndim=2] positions,
+                         int domain_id = -1, int domain_offset = 0):
+        # This sorts the particles by the oct they are in, and returns the
+        # sorted indices, the offset of the first particle of each oct into
+        # them (or -1, for octs with no particles) and the number of
+        # particles in each oct.
+        cdef int j
+        cdef np.int64_t i, offset, poff, moff_p
+        cdef np.float64_t pos[3]
+        cdef Oct *oct
+        cdef np.ndarray[np.int64_t, ndim=1] pind, doff, pdoms, pcount
+        # pcount is the number of particles per oct.
+        pcount = np.zeros_like(pdom_ind)
+        # doff is the offset to a given oct in the sorted particles.
+        doff = np.zeros_like(pdom_ind) - 1
+        moff_p = particle_octree.get_domain_offset(domain_id + domain_offset)
+        # pdoms points particles at their octs.  So the value in this array, for
+        # a given index, is the local oct index.
+        pdoms = np.zeros(positions.shape[0], dtype="int64") - 1
         for i in range(positions.shape[0]):
             for j in range(3):
                 pos[j] = positions[i, j]
@@ -361,69 +780,10 @@ cdef class ParticleSmoothOperation:
             offset = pdoms[poff]
             # If we have yet to assign the starting index to this oct, we do so
             # now.
-            if doff[offset] < 0: doff[offset] = i
-        #print domain_id, domain_offset, moff_p, moff_m
-        #raise RuntimeError
+            if offset >= 0 and doff[offset] < 0: doff[offset] = i
         # Now doff is full of offsets to the first entry in the pind that
         # refers to that oct's particles.
-        ppos = <np.float64_t *> positions.data
-        cart_pos = <np.float64_t *> cart_positions.data
-        doffs = <np.int64_t*> doff.data
-        pinds = <np.int64_t*> pind.data
-        pcounts = <np.int64_t*> pcount.data
-        cdef int maxnei = 0
-        cdef int nproc = 0
-        for i in range(doff.shape[0]):
-            if doff[i] < 0: continue
-            offset = pind[doff[i]]
-            for j in range(3):
-                pos[j] = positions[offset, j]
-            for j in range(pcount[i]):
-                pind0 = pind[doff[i] + j]
-                for k in range(3):
-                    pos[k] = positions[pind0, k]
-                self.neighbor_process_particle(pos, cart_pos, field_pointers,
-                            doffs, &nind, pinds, pcounts, pind0,
-                            NULL, particle_octree, domain_id, &nsize)
-        #print "VISITED", visited.sum(), visited.size,
-        #print 100.0*float(visited.sum())/visited.size
-        if nind != NULL:
-            free(nind)
-
-    cdef int neighbor_search(self, np.float64_t pos[3], OctreeContainer octree,
-                             np.int64_t **nind, int *nsize,
-                             np.int64_t nneighbors, np.int64_t domain_id,
-                             Oct **oct = NULL):
-        cdef OctInfo oi
-        cdef Oct *ooct
-        cdef Oct **neighbors
-        cdef int j
-        cdef np.int64_t moff = octree.get_domain_offset(domain_id)
-        ooct = octree.get(pos, &oi)
-        if oct != NULL and ooct == oct[0]:
-            return nneighbors
-        oct[0] = ooct
-        if nind[0] == NULL:
-            nsize[0] = 27
-            nind[0] = <np.int64_t *> malloc(sizeof(np.int64_t)*nsize[0])
-        neighbors = octree.neighbors(&oi, &nneighbors, ooct, self.periodicity)
-        # Now we have all our neighbors.  And, we should be set for what
-        # else we need to do.
-        if nneighbors > nsize[0]:
-            nind[0] = <np.int64_t *> realloc(
-                nind[0], sizeof(np.int64_t)*nneighbors)
-            nsize[0] = nneighbors
-
-        for j in range(nneighbors):
-            # Particle octree neighbor indices
-            nind[0][j] = neighbors[j].domain_ind - moff
-            for n in range(j):
-                if nind[0][j] == nind[0][n]:
-                    nind[0][j] = -1
-                break
-        # This is allocated by the neighbors function, so we deallocate it.
-        free(neighbors)
-        return nneighbors
+        return pind, doff, pcount
 
     @cython.cdivision(True)
     @cython.boundscheck(False)
@@ -435,70 +795,77 @@ cdef class ParticleSmoothOperation:
 
     cdef void process(self, np.int64_t offset, int i, int j, int k,
                       int dim[3], np.float64_t cpos[3], np.float64_t **fields,
-                      np.float64_t **ifields):
-        raise NotImplementedError
+                      np.float64_t **ifields, NeighborList *neighbors,
+                      int curn) nogil:
+        with gil:
+            raise NotImplementedError
 
-    cdef void neighbor_reset(self):
-        self.curn = 0
+    cdef void neighbor_reset(self, NeighborList *neighbors) nogil:
+        cdef int i
         for i in range(self.maxn):
-            self.neighbors[i].pn = -1
-            self.neighbors[i].r2 = 1e300
+            neighbors[i].pn = -1
+            neighbors[i].r2 = 1e300
 
-    cdef void neighbor_eval(self, np.int64_t pn, np.float64_t ppos[3],
-                            np.float64_t cpos[3]):
+    cdef int neighbor_eval(self, np.int64_t pn, np.float64_t ppos[3],
+                           np.float64_t cpos[3], NeighborList *neighbors,
+                           int curn) nogil:
         # Here's a python+numpy simulator of this:
         # http://paste.yt-project.org/show/5445/
+        # This returns the new number of neighbors in the list.
         cdef int i, di
         cdef np.float64_t r2, r2_trunc
-        if self.curn == self.maxn:
+        if curn == self.maxn:
             # Truncate calculation if it's bigger than this in any dimension
-            r2_trunc = self.neighbors[self.curn - 1].r2
+            r2_trunc = neighbors[curn - 1].r2
         else:
             # Don't truncate our calculation
             r2_trunc = -1
         r2 = r2dist(ppos, cpos, self.DW, self.periodicity, r2_trunc)
         if r2 == -1:
-            return
-        if self.curn == 0:
-            self.neighbors[0].r2 = r2
-            self.neighbors[0].pn = pn
-            self.curn += 1
-            return
+            return curn
+        if curn == 0:
+            neighbors[0].r2 = r2
+            neighbors[0].pn = pn
+            return 1
         # Now insert in a sorted way
         di = -1
-        for i in range(self.curn - 1, -1, -1):
+        for i in range(curn - 1, -1, -1):
             # We are checking if i is less than us, to see if we should insert
             # to the right (i.e., i+1).
-            if self.neighbors[i].r2 < r2:
+            if neighbors[i].r2 < r2:
                 di = i
                 break
         # The outermost one is already too small.
         if di == self.maxn - 1:
-            return
+            return curn
         if (self.maxn - (di + 2)) > 0:
-            memmove(<void *> (self.neighbors + di + 2),
-                    <void *> (self.neighbors + di + 1),
+            memmove(<void *> (neighbors + di + 2),
+                    <void *> (neighbors + di + 1),
                     sizeof(NeighborList) * (self.maxn - (di + 2)))
-        self.neighbors[di + 1].r2 = r2
-        self.neighbors[di + 1].pn = pn
-        if self.curn < self.maxn:
-            self.curn += 1
-
-    cdef void neighbor_find(self,
-                            np.int64_t nneighbors,
-                            np.int64_t *nind,
-                            np.int64_t *doffs,
-                            np.int64_t *pcounts,
-                            np.int64_t *pinds,
-                            np.float64_t *ppos,
-                            np.float64_t cpos[3]
-                            ):
+        neighbors[di + 1].r2 = r2
+        neighbors[di + 1].pn = pn
+        if curn < self.maxn:
+            curn += 1
+        return curn
+
+    cdef int neighbor_find(self,
+                           np.int64_t nneighbors,
+                           np.int64_t *nind,
+                           np.int64_t *doffs,
+                           np.int64_t *pcounts,
+                           np.int64_t *pinds,
+                           np.float64_t *ppos,
+                           np.float64_t cpos[3],
+                           NeighborList *neighbors
+                           ) nogil:
         # We are now given the number of neighbors, the indices into the
-        # domains for them, and the number of particles for each.
-        cdef int ni, i, j
+        # domains for them, and the number of particles for each.  This fills
+        # in the neighbor list, and returns how many neighbors are in it.
+        cdef int ni, i, j, curn
         cdef np.int64_t offset, pn, pc
         cdef np.float64_t pos[3]
-        self.neighbor_reset()
+        self.neighbor_reset(neighbors)
+        curn = 0
         for ni in range(nneighbors):
             if nind[ni] == -1: continue
             offset = doffs[nind[ni]]
@@ -507,73 +874,8 @@ cdef class ParticleSmoothOperation:
                 pn = pinds[offset + i]
                 for j in range(3):
                     pos[j] = ppos[pn * 3 + j]
-                self.neighbor_eval(pn, pos, cpos)
-
-    cdef void neighbor_process(self, int dim[3], np.float64_t left_edge[3],
-                               np.float64_t dds[3], np.float64_t *ppos,
-                               np.float64_t **fields,
-                               np.int64_t *doffs, np.int64_t **nind,
-                               np.int64_t *pinds, np.int64_t *pcounts,
-                               np.int64_t offset,
-                               np.float64_t **index_fields,
-                               OctreeContainer octree, np.int64_t domain_id,
-                               int *nsize):
-        # Note that we assume that fields[0] == smoothing length in the native
-        # units supplied.  We can now iterate over every cell in the block and
-        # every particle to find the nearest.  We will use a priority heap.
-        cdef int i, j, k, ntot, nntot, m, nneighbors
-        cdef np.float64_t cpos[3]
-        cdef np.float64_t opos[3]
-        cdef Oct* oct = NULL
-        cpos[0] = left_edge[0] + 0.5*dds[0]
-        for i in range(dim[0]):
-            cpos[1] = left_edge[1] + 0.5*dds[1]
-            for j in range(dim[1]):
-                cpos[2] = left_edge[2] + 0.5*dds[2]
-                for k in range(dim[2]):
-                    self.pos_setup(cpos, opos)
-                    nneighbors = self.neighbor_search(opos, octree,
-                                    nind, nsize, nneighbors, domain_id, &oct)
-                    self.neighbor_find(nneighbors, nind[0], doffs, pcounts,
-                        pinds, ppos, opos)
-                    # Now we have all our neighbors in our neighbor list.
-                    if self.curn <-1*self.maxn:
-                        ntot = nntot = 0
-                        for m in range(nneighbors):
-                            if nind[0][m] < 0: continue
-                            nntot += 1
-                            ntot += pcounts[nind[0][m]]
-                        print "SOMETHING WRONG", self.curn, nneighbors, ntot, nntot
-                    self.process(offset, i, j, k, dim, opos, fields,
-                                 index_fields)
-                    cpos[2] += dds[2]
-                cpos[1] += dds[1]
-            cpos[0] += dds[0]
-
-    cdef void neighbor_process_particle(self, np.float64_t cpos[3],
-                               np.float64_t *ppos,
-                               np.float64_t **fields,
-                               np.int64_t *doffs, np.int64_t **nind,
-                               np.int64_t *pinds, np.int64_t *pcounts,
-                               np.int64_t offset,
-                               np.float64_t **index_fields,
-                               OctreeContainer octree,
-                               np.int64_t domain_id, int *nsize):
-        # Note that we assume that fields[0] == smoothing length in the native
-        # units supplied.  We can now iterate over every cell in the block and
-        # every particle to find the nearest.  We will use a priority heap.
-        cdef int i, j, k, ntot, nntot, m
-        cdef int dim[3]
-        cdef Oct *oct = NULL
-        cdef np.int64_t nneighbors = 0
-        i = j = k = 0
-        dim[0] = dim[1] = dim[2] = 1
-        cdef np.float64_t opos[3]
-        self.pos_setup(cpos, opos)
-        nneighbors = self.neighbor_search(opos, octree,
-                        nind, nsize, nneighbors, domain_id, &oct)
-        self.neighbor_find(nneighbors, nind[0], doffs, pcounts, pinds, ppos, opos)
-        self.process(offset, i, j, k, dim, opos, fields, index_fields)
+                curn = self.neighbor_eval(pn, pos, cpos, neighbors, curn)
+        return curn
 
 cdef class VolumeWeightedSmooth(ParticleSmoothOperation):
     cdef np.float64_t **fp
@@ -606,7 +908,8 @@ cdef class VolumeWeightedSmooth(ParticleSmoothOperation):
     @cython.wraparound(False)
     cdef void process(self, np.int64_t offset, int i, int j, int k,
                       int dim[3], np.float64_t cpos[3], np.float64_t **fields,
-                      np.float64_t **index_fields):
+                      np.float64_t **index_fields, NeighborList *neighbors,
+                      int curn) nogil:
         # We have our i, j, k for our cell, as well as the cell position.
         # We also have a list of neighboring particles with particle numbers.
         cdef int n, fi
@@ -615,12 +918,12 @@ cdef class VolumeWeightedSmooth(ParticleSmoothOperation):
         cdef np.int64_t pn
         # We get back our mass
         # rho_i = sum(j = 1 .. n) m_j * W_ij
-        max_r = sqrt(self.neighbors[self.curn-1].r2)
-        for n in range(self.curn):
+        max_r = sqrt(neighbors[curn-1].r2)
+        for n in range(curn):
             # No normalization for the moment.
             # fields[0] is the smoothing length.
-            r2 = self.neighbors[n].r2
-            pn = self.neighbors[n].pn
+            r2 = neighbors[n].r2
+            pn = neighbors[n].pn
             # Smoothing kernel weight function
             mass = fields[0][pn]
             hsml = fields[1][pn]
@@ -658,15 +961,16 @@ cdef class NearestNeighborSmooth(ParticleSmoothOperation):
     @cython.wraparound(False)
     cdef void process(self, np.int64_t offset, int i, int j, int k,
                       int dim[3], np.float64_t cpos[3], np.float64_t **fields,
-                      np.float64_t **index_fields):
+                      np.float64_t **index_fields, NeighborList *neighbors,
+                      int curn) nogil:
         # We have our i, j, k for our cell, as well as the cell position.
         # We also have a list of neighboring particles with particle numbers.
         cdef np.int64_t pn
         # We get back our mass
         # rho_i = sum(j = 1 .. n) m_j * W_ij
-        pn = self.neighbors[0].pn
+        pn = neighbors[0].pn
         self.fp[gind(i,j,k,dim) + offset] = fields[0][pn]
-        #self.fp[gind(i,j,k,dim) + offset] = self.neighbors[0].r2
+        #self.fp[gind(i,j,k,dim) + offset] = neighbors[0].r2
         return
 
 nearest_smooth = NearestNeighborSmooth
@@ -691,18 +995,19 @@ cdef class IDWInterpolationSmooth(ParticleSmoothOperation):
     @cython.wraparound(False)
     cdef void process(self, np.int64_t offset, int i, int j, int k,
                       int dim[3], np.float64_t cpos[3], np.float64_t **fields,
-                      np.float64_t **index_fields):
+                      np.float64_t **index_fields, NeighborList *neighbors,
+                      int curn) nogil:
         # We have our i, j, k for our cell, as well as the cell position.
         # We also have a list of neighboring particles with particle numbers.
         cdef np.int64_t pn, ni, di
         cdef np.float64_t total_weight = 0.0, total_value = 0.0, r2, val, w
         # We're going to do a very simple IDW average
-        if self.neighbors[0].r2 == 0.0:
-            pn = self.neighbors[0].pn
+        if neighbors[0].r2 == 0.0:
+            pn = neighbors[0].pn
             self.fp[gind(i,j,k,dim) + offset] = fields[0][pn]
-        for ni in range(self.curn):
-            r2 = self.neighbors[ni].r2
-            val = fields[0][self.neighbors[ni].pn]
+        for ni in range(curn):
+            r2 = neighbors[ni].r2
+            val = fields[0][neighbors[ni].pn]
             w = r2
             for di in range(self.p2 - 1):
                 w *= r2
@@ -726,10 +1031,11 @@ cdef class NthNeighborDistanceSmooth(ParticleSmoothOperation):
     @cython.wraparound(False)
     cdef void process(self, np.int64_t offset, int i, int j, int k,
                       int dim[3], np.float64_t cpos[3], np.float64_t **fields,
-                      np.float64_t **index_fields):
+                      np.float64_t **index_fields, NeighborList *neighbors,
+                      int curn) nogil:
         cdef np.float64_t max_r
         # We assume "offset" here is the particle index.
-        max_r = sqrt(self.neighbors[self.curn-1].r2)
+        max_r = sqrt(neighbors[curn-1].r2)
         fields[0][offset] = max_r
 
 nth_neighbor_smooth = NthNeighborDistanceSmooth
@@ -746,16 +1052,17 @@ cdef class SmoothedDensityEstimate(ParticleSmoothOperation):
     @cython.wraparound(False)
     cdef void process(self, np.int64_t offset, int i, int j, int k,
                       int dim[3], np.float64_t cpos[3], np.float64_t **fields,
-                      np.float64_t **index_fields):
+                      np.float64_t **index_fields, NeighborList *neighbors,
+                      int curn) nogil:
         cdef np.float64_t r2, hsml, dens, mass, weight, lw
         cdef int pn
         # We assume "offset" here is the particle index.
-        hsml = sqrt(self.neighbors[self.curn-1].r2)
+        hsml = sqrt(neighbors[curn-1].r2)
         dens = 0.0
         weight = 0.0
-        for pn in range(self.curn):
-            mass = fields[0][self.neighbors[pn].pn]
-            r2 = self.neighbors[pn].r2
+        for pn in range(curn):
+            mass = fields[0][neighbors[pn].pn]
+            r2 = neighbors[pn].r2
             lw = sph_kernel(sqrt(r2) / hsml)
             dens += mass * lw
         weight = (4.0/3.0) * 3.1415926 * hsml**3
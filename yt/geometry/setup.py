@@ -4,9 +4,29 @@ import os, sys, os.path
 
 import os.path
 
+def check_for_openmp():
+    # The check lives with the rest of the compiled utilities.  We load it
+    # directly from there, as yt itself can't be imported until it's built.
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, "utilities", "lib", "setup.py")
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:
+        import imp
+        lib_setup = imp.load_source("yt_lib_setup", path)
+    else:
+        spec = spec_from_file_location("yt_lib_setup", path)
+        lib_setup = module_from_spec(spec)
+        spec.loader.exec_module(lib_setup)
+    return lib_setup.check_for_openmp()
+
 def configuration(parent_package='',top_path=None):
     from numpy.distutils.misc_util import Configuration
     config = Configuration('geometry',parent_package,top_path)
+    if check_for_openmp() == True:
+        omp_args = ['-fopenmp']
+    else:
+        omp_args = None
     config.add_subpackage('coordinates')
     config.add_extension("grid_visitors", 
                 ["yt/geometry/grid_visitors.pyx"],
@@ -55,6 +75,8 @@ def configuration(parent_package='',top_path=None):
     config.add_extension("particle_deposit", 
                 ["yt/geometry/particle_deposit.pyx"],
                 include_dirs=["yt/utilities/lib/"],
+                extra_compile_args=omp_args,
+                extra_link_args=omp_args,
                 libraries=["m"],
                 depends=["yt/utilities/lib/fp_utils.pxd",
                          "yt/geometry/oct_container.pxd",
@@ -63,6 +85,8 @@ def configuration(parent_package='',top_path=None):
     config.add_extension("particle_smooth", 
                 ["yt/geometry/particle_smooth.pyx"],
                 include_dirs=["yt/utilities/lib/"],
+                extra_compile_args=omp_args,
+                extra_link_args=omp_args,
                 libraries=["m"],
                 depends=["yt/utilities/lib/fp_utils.pxd",
                          "yt/geometry/oct_container.pxd",
@@ -0,0 +1,49 @@
+"""
+Tests for filling ghost zones from neighboring grids
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+from yt.testing import \
+    fake_random_ds, \
+    assert_equal
+
+def test_ghost_zone_filler():
+    for nprocs in [1, 8]:
+        ds = fake_random_ds(16, nprocs = nprocs)
+        filler = ds.index.ghost_zone_filler
+        for g in ds.index.grids:
+            yield assert_equal, filler.sources(g, 1) is None, False
+            cube = g.retrieve_ghost_zones(1, "density", smoothed = True)
+            yield assert_equal, cube._ghost_zone_filler is filler, True
+            # The same region interpolated the slow way
+            ref = ds.smoothed_covering_grid(g.Level, cube.left_edge,
+                dims = cube.ActiveDimensions, num_ghost_zones = 1,
+                fields = ["density"])
+            yield assert_equal, cube["density"], ref["density"]
+            yield assert_equal, cube["density"][1:-1,1:-1,1:-1], g["density"]
+
+def test_ghost_zone_filler_cache():
+    ds = fake_random_ds(16, nprocs = 8)
+    filler = ds.index.ghost_zone_filler
+    g = ds.index.grids[0]
+    g.retrieve_ghost_zones(1, "density", smoothed = True)
+    yield assert_equal, len(filler._cache), 0
+    # Within a walk over the grids the neighbors stay cached, and they are
+    # let go of once it is over.
+    dd = ds.all_data()
+    sizes = []
+    for chunk in dd.chunks([], "spatial", ngz = 1):
+        chunk["density"]
+        sizes.append(len(filler._cache))
+    yield assert_equal, max(sizes) > 0, True
+    yield assert_equal, len(filler._cache), 0
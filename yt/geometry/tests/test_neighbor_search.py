@@ -36,3 +36,61 @@ def test_neighbor_search():
         #dd.field_data.pop(("all", "particle_radius"))
     yield assert_equal, (min_in == 63).sum(), min_in.size
     yield assert_array_almost_equal, nearest_neighbors, all_neighbors
+
+def test_neighbor_cache():
+    np.random.seed(0x4d3d3d3)
+    ds = fake_particle_ds(npart = 16**3)
+    ds.periodicity = (True, True, True)
+    ds.index
+    cache = ds.index.neighbor_cache
+    fn, = add_nearest_neighbor_field("all", "particle_position", ds)
+    dd = ds.all_data()
+    searched = dd[fn].copy()
+    yield assert_equal, len(cache) > 0, True
+    # Asking again reuses the neighbor lists, and gets the same answer.
+    hits = cache.hits
+    dd.field_data.pop(fn)
+    yield assert_equal, dd[fn], searched
+    yield assert_equal, cache.hits > hits, True
+    # With too small a budget nothing is kept, but the answer is the same.
+    cache.clear()
+    cache.max_bytes = 1
+    dd.field_data.pop(fn)
+    yield assert_equal, dd[fn], searched
+    yield assert_equal, len(cache), 0
+
+def test_neighbor_cache_positions():
+    from yt.geometry.neighbor_lists import NeighborListCache
+    cache = NeighborListCache(1024**2)
+    pos = np.random.random((8, 3))
+    cache.store("key", {"pn": np.arange(8)}, pos)
+    yield assert_equal, cache.get("key", pos)["pn"], np.arange(8)
+    # Particles with the same count and the same sum of positions under
+    # the same key are not mistaken for the cached ones.
+    moved = pos.copy()
+    moved[0,0] += 0.1
+    moved[1,0] -= 0.1
+    yield assert_equal, cache.get("key", moved), None
+    yield assert_equal, cache.misses, 1
+
+def test_threaded_particle_operations():
+    from yt.config import ytcfg
+    np.random.seed(0x4d3d3d3)
+    fields = [("deposit", "all_count"), ("deposit", "all_density"),
+              ("deposit", "all_cic"), ("deposit", "all_mass")]
+    values = []
+    for num_threads in ["1", "4"]:
+        ytcfg["yt", "numthreads"] = num_threads
+        try:
+            ds = fake_particle_ds(npart = 16**3)
+            ds.periodicity = (True, True, True)
+            ds.index
+            fn, = add_nearest_neighbor_field("all", "particle_position", ds)
+            dd = ds.all_data()
+            values.append([dd[f] for f in fields + [fn]])
+        finally:
+            ytcfg["yt", "numthreads"] = "-1"
+    # Each particle is handled by exactly one thread, so splitting the work
+    # up must not change the answer.
+    for serial, threaded in zip(*values):
+        yield assert_equal, serial, threaded
@@ -20,11 +20,17 @@ from yt.funcs import *
 from yt.utilities.logger import ytLogger as mylog
 from yt.geometry.geometry_handler import Index, YTDataChunk
 from yt.utilities.lib.mesh_utilities import smallest_fwidth
+from yt.utilities.lib.mesh_bvh import MeshBVH
 
 class UnstructuredIndex(Index):
     """The Index subclass for unstructured and hexahedral mesh datasets. """
     _global_mesh = False
     _unsupported_objects = ('proj', 'covering_grid', 'smoothed_covering_grid')
+    # Meshes with more elements than this are chunked in blocks of at most
+    # this many elements, each a subtree of the mesh's hierarchy.
+    _max_block_elements = 2**20
+    _bvh_leaf_size = 32
+    _mesh_blocks = None
 
     def __init__(self, ds, dataset_type):
         self.dataset_type = dataset_type
@@ -54,9 +60,44 @@ class UnstructuredIndex(Index):
     def _initialize_mesh(self):
         raise NotImplementedError
 
+    def _get_mesh_bvh(self, mesh):
+        # Sorting the elements is the costly part of building a hierarchy,
+        # so we keep their order in the .yt file, if there is one.
+        name = "MeshBVHOrder_%04i" % mesh.mesh_id
+        order = self.get_data("/", name)
+        if order is not None and \
+           order.shape[0] != mesh.connectivity_indices.shape[0]:
+            order = None
+        mylog.debug("%s the hierarchy over the %s elements of %s",
+                    "Rebuilding" if order is not None else "Building",
+                    mesh.connectivity_indices.shape[0], mesh)
+        coords = mesh.connectivity_coords
+        if hasattr(coords, "in_units"):
+            coords = coords.in_units("code_length").d
+        bvh = MeshBVH(coords,
+                      mesh.connectivity_indices, mesh._index_offset,
+                      self._bvh_leaf_size, order,
+                      num_threads=int(get_num_threads()))
+        if order is None:
+            self.save_data(bvh.element_order, "/", name, force=True)
+        return bvh
+
+    @property
+    def mesh_blocks(self):
+        """
+        The meshes, with the large ones split up into spatially coherent
+        blocks of elements.
+        """
+        if self._mesh_blocks is None:
+            self._mesh_blocks = []
+            for mesh in self.meshes:
+                self._mesh_blocks.extend(
+                    mesh._get_blocks(self._max_block_elements))
+        return self._mesh_blocks
+
     def _identify_base_chunk(self, dobj):
         if getattr(dobj, "_chunk_info", None) is None:
-            dobj._chunk_info = self.meshes
+            dobj._chunk_info = self.mesh_blocks
         if getattr(dobj, "size", None) is None:
             dobj.size = self._count_selection(dobj)
         dobj._current_chunk = list(self._chunk_all(dobj))[0]
@@ -89,5 +130,6 @@ class UnstructuredIndex(Index):
     def _chunk_io(self, dobj, cache = True, local_only = False):
         oobjs = getattr(dobj._current_chunk, "objs", dobj._chunk_info)
         for subset in oobjs:
-            s = self._count_selection(dobj, oobjs)
+            s = self._count_selection(dobj, [subset])
+            if s == 0: continue
             yield YTDataChunk(dobj, "io", [subset], s, cache = cache)
@@ -399,7 +399,9 @@ class YTArray(np.ndarray):
         (conversion_factor, offset) = self.units.get_conversion_factor(new_units)
 
         self.units = new_units
-        self *= conversion_factor
+        # Skip the pass over the data entirely if the values are unchanged.
+        if conversion_factor != 1.0:
+            self *= conversion_factor
 
         if offset:
             np.subtract(self, offset*self.uq, self)
@@ -16,6 +16,7 @@ from __future__ import print_function
 
 import functools
 import numpy as np
+from collections import OrderedDict
 
 from yt.units import dimensions
 from yt.units.unit_registry import \
@@ -103,8 +104,10 @@ class Cosmology(object):
         >>> print co.comoving_radial_distance(0., 1.).in_units("Mpccm")
         
         """
+        table = self.table
         return (self.hubble_distance() *
-                trapzint(self.inverse_expansion_factor, z_i, z_f)).in_cgs()
+                (table.evaluate("comoving", z_f) -
+                 table.evaluate("comoving", z_i))).in_cgs()
 
     def comoving_transverse_distance(self, z_i, z_f):
         r"""
@@ -277,7 +280,8 @@ class Cosmology(object):
         >>> print co.lookback_time(0., 1.).in_units("Gyr")
 
         """
-        return (trapzint(self.age_integrand, z_i, z_f) / \
+        table = self.table
+        return ((table.evaluate("age", z_f) - table.evaluate("age", z_i)) /
                 self.hubble_constant).in_cgs()
     
     def hubble_time(self, z, z_inf=1e6):
@@ -304,7 +308,8 @@ class Cosmology(object):
         t_from_z
 
         """
-        return (trapzint(self.age_integrand, z, z_inf) /
+        table = self.table
+        return ((table.evaluate("age", z_inf) - table.evaluate("age", z)) /
                 self.hubble_constant).in_cgs()
 
     def critical_density(self, z):
@@ -371,17 +376,36 @@ class Cosmology(object):
         return ((1 + z)**2) * self.inverse_expansion_factor(z)
 
     def path_length(self, z_i, z_f):
-        return trapzint(self.path_length_function, z_i, z_f)
+        table = self.table
+        return table.evaluate("path_length", z_f) - \
+          table.evaluate("path_length", z_i)
+
+    @property
+    def table(self):
+        r"""
+        The :class:`CosmologyTable` of cumulative distance and time integrals
+        for this cosmology.  Tables are shared between all Cosmology objects
+        with the same density parameters.
+        """
+        key = (float(self.omega_matter), float(self.omega_lambda),
+               float(self.omega_curvature))
+        if key in _cosmology_tables:
+            _cosmology_tables[key] = _cosmology_tables.pop(key)
+        else:
+            _cosmology_tables[key] = CosmologyTable(self.expansion_factor)
+            while len(_cosmology_tables) > _max_cosmology_tables:
+                _cosmology_tables.popitem(last = False)
+        return _cosmology_tables[key]
 
     def z_from_t(self, my_time):
         """
-        Compute the redshift from time after the big bang.  This is based on
-        Enzo's CosmologyComputeExpansionFactor.C, but altered to use physical
-        units.
+        Compute the redshift from time after the big bang.  This inverts
+        t_from_z, starting from the tabulated ages and refining with a few
+        Newton iterations, so it accepts arrays of times.
 
         Parameters
         ----------
-        my_time : float
+        my_time : float or array
             Age of the Universe in seconds.
 
         Examples
@@ -392,87 +416,47 @@ class Cosmology(object):
 
         """
 
-        omega_curvature = 1.0 - self.omega_matter - self.omega_lambda
-
-        OMEGA_TOLERANCE = 1e-5
-        ETA_TOLERANCE = 1.0e-10
-
         # Convert the time to Time * H0.
 
         if not isinstance(my_time, YTArray):
-            my_time = self.quan(my_time, "s")
-
-        t0 = (my_time.in_units("s") *
-              self.hubble_constant.in_units("1/s")).to_ndarray()
- 
-        # 1) For a flat universe with omega_matter = 1, it's easy.
- 
-        if ((np.fabs(self.omega_matter-1) < OMEGA_TOLERANCE) and
-            (self.omega_lambda < OMEGA_TOLERANCE)):
-            a = np.power(my_time/self.initial_time, 2.0/3.0)
- 
-        # 2) For omega_matter < 1 and omega_lambda == 0 see
-        #    Peebles 1993, eq. 13-3, 13-10.
-        #    Actually, this is a little tricky since we must solve an equation
-        #    of the form eta - np.sinh(eta) + x = 0..
- 
-        if ((self.omega_matter < 1) and 
-            (self.omega_lambda < OMEGA_TOLERANCE)):
-            x = 2*t0*np.power(1.0 - self.omega_matter, 1.5) / \
-                self.omega_matter;
- 
-            # Compute eta in a three step process, first from a third-order
-            # Taylor expansion of the formula above, then use that in a fifth-order
-            # approximation.  Then finally, iterate on the formula itself, solving for
-            # eta.  This works well because parts 1 & 2 are an excellent approximation
-            # when x is small and part 3 converges quickly when x is large. 
- 
-            eta = np.power(6*x, 1.0/3.0)                # part 1
-            eta = np.power(120*x/(20+eta*eta), 1.0/3.0) # part 2
-            for i in range(40):                      # part 3
-                eta_old = eta
-                eta = np.arcsinh(eta + x)
-                if (np.fabs(eta-eta_old) < ETA_TOLERANCE): 
-                    break
-                if (i == 39):
-                    print("No convergence after %d iterations." % i)
- 
-            # Now use eta to compute the expansion factor (eq. 13-10, part 2).
- 
-            a = self.omega_matter/(2.0*(1.0 - self.omega_matter))*\
-                (np.cosh(eta) - 1.0)
-
-        # 3) For omega_matter > 1 and omega_lambda == 0, use sin/cos.
-        #    Easy, but skip it for now.
- 
-        if ((self.omega_matter > 1) and 
-            (self.omega_lambda < OMEGA_TOLERANCE)):
-            print("Never implemented in Enzo, not implemented here.")
-            return 0
- 
-        # 4) For flat universe, with non-zero omega_lambda, see eq. 13-20.
- 
-        if ((np.fabs(omega_curvature) < OMEGA_TOLERANCE) and
-            (self.omega_lambda > OMEGA_TOLERANCE)):
-            a = np.power(self.omega_matter / 
-                         (1 - self.omega_matter), 1.0/3.0) * \
-                np.power(np.sinh(1.5 * np.sqrt(1.0 - self.omega_matter)*\
-                                     t0), 2.0/3.0)
-
-
-        redshift = (1.0/a) - 1.0
-
+            if np.ndim(my_time) == 0:
+                my_time = self.quan(my_time, "s")
+            else:
+                my_time = self.arr(my_time, "s")
+
+        t0 = np.asarray((my_time.in_units("s") *
+                         self.hubble_constant.in_units("1/s")).to_ndarray(),
+                        dtype="float64")
+
+        # Age decreases roughly as a power of 1+z at both ends of the table,
+        # so we work with the log of the age as a function of log(1+z).
+
+        log_t0 = np.log(t0)
+        x = self.table.log1pz_from_age(t0)
+        for i in range(20):
+            z = np.expm1(x)
+            age = self._age(z)
+            dx = (np.log(age) - log_t0) * self.expansion_factor(z) * age
+            x = x + dx
+            # Newton's method converges quadratically, so this step has
+            # already brought us to within roundoff.
+            if np.all(np.abs(dx) < 1e-7): break
+
+        redshift = np.expm1(x)
+        if redshift.ndim == 0:
+            redshift = redshift[()]
         return redshift
 
     def t_from_z(self, z):
         """
         Compute the age of the Universe from redshift.  This is based on Enzo's
         CosmologyComputeTimeFromRedshift.C, but altered to use physical units.  
-        Similar to hubble_time, but using an analytical function.
+        Similar to hubble_time, but using an analytical function where one
+        exists for this cosmology.  Otherwise, the tabulated age is used.
 
         Parameters
         ----------
-        z : float
+        z : float or array
             Redshift.
 
         Examples
@@ -487,6 +471,16 @@ class Cosmology(object):
         hubble_time
         
         """
+        my_time = self._age(z) / self.hubble_constant
+
+        return my_time.in_cgs()
+
+    def _age(self, z):
+        # The age of the Universe in units of 1 / H0.  We use the analytic
+        # solutions where one exists, and the table otherwise.
+        if np.ndim(z) > 0:
+            z = np.asarray(z, dtype="float64")
+        t0 = None
         omega_curvature = 1.0 - self.omega_matter - self.omega_lambda
  
         # 1) For a flat universe with omega_matter = 1, things are easy.
@@ -518,11 +512,9 @@ class Cosmology(object):
                 np.arcsinh(np.sqrt((1-self.omega_matter)/self.omega_matter)/ \
                                np.power(1+z, 1.5))
   
-        # Now convert from Time * H0 to time.
-  
-        my_time = t0 / self.hubble_constant
-    
-        return my_time.in_cgs()
+        if t0 is None:
+            t0 = self.table.age(z)
+        return t0
 
     _arr = None
     @property
@@ -541,6 +533,199 @@ class Cosmology(object):
                 registry = self.unit_registry)
         return self._quan
 
+# The most recently used tables, keyed by the density parameters.
+_cosmology_tables = OrderedDict()
+_max_cosmology_tables = 16
+
+class CosmologyTable(object):
+    r"""
+    Cumulative distance and time integrals for a cosmology, tabulated once
+    so that they can be evaluated for arrays of redshifts.
+
+    The integrals are tabulated on a grid uniform in x = ln(1+z), with each
+    interval integrated by Gauss-Legendre quadrature, and are interpolated
+    with cubic Hermite splines using the exact value of the integrand at the
+    grid points as the derivative.  The largest interpolation error over the
+    table, relative to the value of each integral, is estimated at the
+    interval midpoints and stored in *error*.  Redshifts outside of the table
+    are integrated directly from its nearest edge.
+
+    The age of the Universe is tabulated separately, integrating down from
+    infinite redshift so that small ages keep their precision, along with
+    its inverse on a grid uniform in the log of the age.
+
+    In closed or recollapsing cosmologies the expansion factor is imaginary
+    over some range of redshifts, which the Universe never passes through.
+    The table then starts above the highest redshift at which that happens,
+    and the integrals are NaN below it.
+
+    Parameters
+    ----------
+    expansion_factor : callable
+        The ratio of the Hubble parameter at a given redshift to its value at
+        redshift zero.
+    z_min, z_max : float
+        The range of redshifts covered by the table.
+    n_bins : int
+        The number of intervals in the table.
+    """
+    _gauss_points = 4
+
+    def __init__(self, expansion_factor, z_min = -0.99, z_max = 1e6,
+                 n_bins = 4096):
+        self.expansion_factor = expansion_factor
+        x = np.linspace(np.log1p(z_min), np.log1p(z_max), n_bins + 1)
+        with np.errstate(invalid = "ignore"):
+            bad = ~(expansion_factor(np.expm1(x)) > 0)
+        if bad[-1]:
+            raise RuntimeError(
+                "The expansion factor is not real at redshift %s." % z_max)
+        if bad.any():
+            x_min = x[np.nonzero(bad)[0][-1] + 1]
+            x = np.linspace(x_min, x[-1], n_bins + 1)
+        self.x = x
+        self.dx = self.x[1] - self.x[0]
+        self.integrands = dict(comoving = self._comoving,
+                               age = self._age,
+                               path_length = self._path_length)
+        self.values = {}
+        self.splines = {}
+        self.error = {}
+        xm = 0.5 * (self.x[:-1] + self.x[1:])
+        for name, f in self.integrands.items():
+            dv = self._integrate(f, self.x[:-1], self.x[1:])
+            self.values[name] = np.concatenate([[0.0], np.cumsum(dv)])
+            self.splines[name] = self._hermite_spline(
+                self.values[name], f(self.x), self.dx)
+            exact = self.values[name][:-1] + self._integrate(f, self.x[:-1], xm)
+            self.error[name] = self._relative_error(
+                self._hermite(self.splines[name], self.x[0], self.dx, xm),
+                exact)
+        # The age at the upper edge of the table is integrated over
+        # u = ((1+z_max)/(1+z))**1.5, in which the integrand is smooth
+        # whenever matter dominates at high redshift.
+        dv = self._integrate(self._age, self.x[:-1], self.x[1:])
+        u = np.linspace(0.0, 1.0, 17)
+        age_edge = self._integrate(self._age_tail, u[:-1], u[1:]).sum()
+        self.ages = np.concatenate(
+            [np.cumsum(dv[::-1])[::-1], [0.0]]) + age_edge
+        self.age_spline = self._hermite_spline(
+            self.ages, -self._age(self.x), self.dx)
+        # The inverse, x as a function of the log of the age, starts from
+        # linear interpolation and is polished with Newton iterations.
+        log_ages = np.log(self.ages)
+        self.log_age = np.linspace(log_ages[-1], log_ages[0], n_bins + 1)
+        self.dlog_age = self.log_age[1] - self.log_age[0]
+        x = np.interp(self.log_age, log_ages[::-1], self.x[::-1])
+        for i in range(20):
+            age = self.age(np.expm1(x))
+            dx = (np.log(age) - self.log_age) * \
+              expansion_factor(np.expm1(x)) * age
+            x = x + dx
+            if np.all(np.abs(dx) < 1e-14): break
+        self.inverse_spline = self._hermite_spline(
+            x, -expansion_factor(np.expm1(x)) * age, self.dlog_age)
+        self.error["age"] = max(self.error["age"], self._relative_error(
+            self.age(np.expm1(xm)), self._integrate(self._age, xm, self.x[1:])
+            + self.ages[1:]))
+
+    def _relative_error(self, approx, exact):
+        scale = np.maximum(np.abs(exact), np.abs(exact).max() *
+                           np.finfo("float64").eps)
+        return (np.abs(approx - exact) / scale).max()
+
+    # The integrands in terms of x = ln(1+z).
+    def _comoving(self, x):
+        return np.exp(x) / self.expansion_factor(np.expm1(x))
+
+    def _age(self, x):
+        return 1.0 / self.expansion_factor(np.expm1(x))
+
+    def _path_length(self, x):
+        return np.exp(3 * x) / self.expansion_factor(np.expm1(x))
+
+    def _age_tail(self, u):
+        return self._age(self.x[-1] - np.log(u) / 1.5) / (1.5 * u)
+
+    def _integrate(self, f, a, b):
+        points, weights = np.polynomial.legendre.leggauss(self._gauss_points)
+        a = np.asarray(a)[..., None]
+        b = np.asarray(b)[..., None]
+        xs = 0.5 * (b - a) * points + 0.5 * (b + a)
+        return 0.5 * (b - a)[..., 0] * (f(xs) * weights).sum(axis=-1)
+
+    def _hermite_spline(self, F, G, h):
+        # The coefficients of the cubic on each interval, as a polynomial in
+        # the fractional position within the interval, from the values F and
+        # derivatives G at the grid points.
+        dF = F[1:] - F[:-1]
+        return np.array([F[:-1], h * G[:-1],
+                         3 * dF - h * (2 * G[:-1] + G[1:]),
+                         h * (G[:-1] + G[1:]) - 2 * dF])
+
+    def _hermite(self, spline, x0, h, x):
+        t = (x - x0) / h
+        i = np.clip(t, 0, spline.shape[1] - 1).astype("intp")
+        s = t - i
+        c0, c1, c2, c3 = spline
+        return c0.take(i) + s * (c1.take(i) + s * (c2.take(i) +
+                                                   s * c3.take(i)))
+
+    def _extrapolate(self, name, x, start, n_sub = 64):
+        # Composite quadrature from the nearest edge of the table.
+        f = self.integrands[name]
+        edge = np.where(x < self.x[0], 0, self.x.size - 1)
+        steps = np.linspace(0.0, 1.0, n_sub + 1)
+        nodes = self.x[edge][:, None] + \
+          (x - self.x[edge])[:, None] * steps
+        return start[edge] + \
+          self._integrate(f, nodes[:, :-1], nodes[:, 1:]).sum(axis=-1)
+
+    def _lookup(self, name, z, spline, values, sign):
+        x = np.log1p(np.asarray(z, dtype="float64"))
+        scalar = x.ndim == 0
+        x = np.atleast_1d(x)
+        v = self._hermite(spline, self.x[0], self.dx, x)
+        outside = (x < self.x[0]) | (x > self.x[-1])
+        if outside.any():
+            v[outside] = sign * self._extrapolate(name, x[outside],
+                                                  sign * values)
+        if scalar:
+            return v[0]
+        return v
+
+    def evaluate(self, name, z):
+        r"""
+        Evaluate the named integral from the start of the table to redshift
+        *z*.  Differences of these give the integral between two redshifts.
+
+        Parameters
+        ----------
+        name : string
+            One of "comoving", the integral of 1 / E(z), "age", the integral
+            of 1 / ((1+z) E(z)), or "path_length", the integral of
+            (1+z)^2 / E(z), where E(z) is the expansion factor.
+        z : float or array
+            Redshift.
+        """
+        return self._lookup(name, z, self.splines[name], self.values[name], 1)
+
+    def age(self, z):
+        r"""
+        The age of the Universe at redshift *z*, in units of 1 / H0.
+        """
+        return self._lookup("age", z, self.age_spline, self.ages, -1)
+
+    def log1pz_from_age(self, t0):
+        r"""
+        ln(1+z) at which the Universe has the age *t0*, in units of 1 / H0,
+        interpolated from the inverse table.  Ages outside of the table are
+        clipped to its edges.
+        """
+        log_t0 = np.clip(np.log(t0), self.log_age[0], self.log_age[-1])
+        return self._hermite(self.inverse_spline, self.log_age[0],
+                             self.dlog_age, log_t0)
+
 def trapzint(f, a, b, bins=10000):
     zbins = np.logspace(np.log10(a + 1), np.log10(b + 1), bins) - 1
     return np.trapz(f(zbins[:-1]), x=zbins[:-1], dx=np.diff(zbins))
@@ -673,7 +673,7 @@ cdef class ParticleContourTree(ContourTree):
             pos0[i] = positions[pind0*3 + i]
             edges[0][i] = pos0[i] - self.linking_length*1.01
             edges[1][i] = pos0[i] + self.linking_length*1.01
-            if edges[0][i] < self.DLE[i] or edges[0][i] > self.DRE[i]:
+            if edges[0][i] < self.DLE[i] or edges[1][i] > self.DRE[i]:
                 # We skip this one, since we're close to the boundary
                 edges[0][i] = -1e30
                 edges[1][i] = 1e30
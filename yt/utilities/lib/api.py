@@ -28,4 +28,5 @@ from .RayIntegrators import *
 from .marching_cubes import *
 from .write_array import *
 from .mesh_utilities import *
+from .mesh_bvh import *
 from .ContourFinding import *
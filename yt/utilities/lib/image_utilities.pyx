@@ -77,3 +77,54 @@ def add_rgba_points_to_image(
         for k in range(4):
             buffer[i, j, k] += rgba[pi, k]
     return
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def bin_points_to_image(
+        np.ndarray[np.float64_t, ndim=2] buffer,
+        np.ndarray[np.float64_t, ndim=1] px,
+        np.ndarray[np.float64_t, ndim=1] py,
+        pv, bounds):
+    """
+    Bin points into the pixels of an image
+
+    Given an image buffer indexed as ``buffer[y, x]`` that covers
+    *bounds* = (x_min, x_max, y_min, y_max), add the value *pv* of each
+    point at (*px*, *py*) to the pixel that contains it.  If *pv* is None,
+    each point adds one, so that the image counts them.  Points outside the
+    bounds are skipped, and those on the right or top edges go into the last
+    pixel.
+    """
+    cdef int i, j
+    cdef np.int64_t pi
+    cdef np.int64_t npart = px.shape[0]
+    cdef int nx = buffer.shape[1]
+    cdef int ny = buffer.shape[0]
+    cdef int use_values = 0
+    cdef np.float64_t x_min, x_max, y_min, y_max, idx, idy
+    cdef np.float64_t x, y, v = 1.0
+    cdef np.ndarray[np.float64_t, ndim=1] values
+    if py.shape[0] != npart:
+        raise RuntimeError("Arrays are not of correct shape.")
+    if pv is not None:
+        values = np.asarray(pv, dtype="float64")
+        if values.shape[0] != npart:
+            raise RuntimeError("Arrays are not of correct shape.")
+        use_values = 1
+    x_min, x_max, y_min, y_max = bounds
+    idx = nx / (x_max - x_min)
+    idy = ny / (y_max - y_min)
+    for pi in range(npart):
+        x = px[pi]
+        y = py[pi]
+        if not (x >= x_min and x <= x_max and y >= y_min and y <= y_max):
+            continue
+        j = <int> ((x - x_min) * idx)
+        i = <int> ((y - y_min) * idy)
+        if j >= nx: j = nx - 1
+        if i >= ny: i = ny - 1
+        if use_values == 1:
+            v = values[pi]
+        buffer[i, j] += v
+    return
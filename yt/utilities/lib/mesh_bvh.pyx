@@ -0,0 +1,309 @@
+"""
+A bounding volume hierarchy over the elements of an unstructured mesh
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+cimport numpy as np
+cimport cython
+from cython.parallel cimport prange
+from yt.geometry.selection_routines cimport SelectorObject
+from yt.utilities.lib.fp_utils cimport fmin, fmax
+from yt.utilities.lib.geometry_utils import get_morton_indices_unravel
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def element_bounding_boxes(np.float64_t[:, :] coords,
+                           np.int64_t[:, :] indices,
+                           int index_offset = 0,
+                           int num_threads = 0):
+    """
+    Return the (n_elements, 3) left and right edges of the axis-aligned
+    bounding box of each element of a mesh.
+    """
+    cdef np.int64_t i, ci
+    cdef int j, k
+    cdef np.float64_t pos
+    cdef int nv = indices.shape[1]
+    cdef np.ndarray[np.float64_t, ndim=2] left_edge, right_edge
+    left_edge = np.empty((indices.shape[0], 3), dtype="float64")
+    right_edge = np.empty((indices.shape[0], 3), dtype="float64")
+    cdef np.float64_t[:, :] le = left_edge
+    cdef np.float64_t[:, :] re = right_edge
+    with nogil:
+        for i in prange(indices.shape[0], schedule = "static",
+                        num_threads = num_threads):
+            for k in range(3):
+                le[i, k] = 1e60
+                re[i, k] = -1e60
+            for j in range(nv):
+                ci = indices[i, j] - index_offset
+                for k in range(3):
+                    pos = coords[ci, k]
+                    le[i, k] = fmin(le[i, k], pos)
+                    re[i, k] = fmax(re[i, k], pos)
+    return left_edge, right_edge
+
+cdef class MeshBVH:
+    """
+    MeshBVH(coords, indices, index_offset = 0, leaf_size = 32,
+            element_order = None, num_threads = 0)
+
+    A bounding volume hierarchy over the bounding boxes of the elements of
+    an unstructured mesh.
+
+    The elements are sorted along a Morton curve through the centers of
+    their bounding boxes, and every *leaf_size* consecutive elements along
+    the curve make a leaf.  Pairs of neighboring nodes are then merged,
+    level by level, up to a single root, so that every node covers a
+    contiguous range of the sorted elements.  Only the sort is expensive;
+    passing in the *element_order* of an earlier hierarchy over the same
+    mesh skips it.
+
+    Node 0 is the root, and the children of leaves are -1.
+    """
+    cdef readonly np.int64_t num_elements
+    cdef readonly np.int64_t num_nodes
+    cdef readonly np.int64_t num_leaves
+    cdef readonly int leaf_size
+    cdef readonly int depth
+    # The element ids, in the order of the leaves.
+    cdef readonly np.ndarray element_order
+    # The element bounding boxes, in the same order as element_order.
+    cdef readonly np.ndarray element_left_edge
+    cdef readonly np.ndarray element_right_edge
+    cdef readonly np.ndarray node_left_edge
+    cdef readonly np.ndarray node_right_edge
+    cdef readonly np.ndarray node_children
+    # The [start, end) range of element_order covered by each node.
+    cdef readonly np.ndarray node_range
+    cdef np.float64_t *ele_le
+    cdef np.float64_t *ele_re
+    cdef np.float64_t *nle
+    cdef np.float64_t *nre
+    cdef np.int64_t *children
+    cdef np.int64_t *nrange
+
+    def __init__(self, coords, indices, int index_offset = 0,
+                 int leaf_size = 32, element_order = None,
+                 int num_threads = 0):
+        cdef np.int64_t n = indices.shape[0]
+        self.num_elements = n
+        self.leaf_size = leaf_size
+        le, re = element_bounding_boxes(
+            np.asarray(coords, dtype="float64"),
+            np.asarray(indices, dtype="int64"),
+            index_offset, num_threads)
+        if element_order is None:
+            element_order = self._morton_order(le, re)
+        element_order = np.ascontiguousarray(element_order, dtype="int64")
+        if element_order.shape[0] != n:
+            raise RuntimeError("element_order does not match the mesh.")
+        self.element_order = element_order
+        self.element_left_edge = np.ascontiguousarray(le[element_order])
+        self.element_right_edge = np.ascontiguousarray(re[element_order])
+        del le, re
+        self._build_nodes()
+        self.ele_le = <np.float64_t *> self.element_left_edge.data
+        self.ele_re = <np.float64_t *> self.element_right_edge.data
+        self.nle = <np.float64_t *> self.node_left_edge.data
+        self.nre = <np.float64_t *> self.node_right_edge.data
+        self.children = <np.int64_t *> self.node_children.data
+        self.nrange = <np.int64_t *> self.node_range.data
+
+    def _morton_order(self, le, re):
+        if le.shape[0] == 0:
+            return np.zeros(0, dtype="int64")
+        centers = 0.5 * (le + re)
+        cle = centers.min(axis=0)
+        width = centers.max(axis=0) - cle
+        width[width == 0.0] = 1.0
+        # 20 bits on each axis, so the interleaved index fits in 64 bits.
+        ii = ((centers - cle) / width * (2**20 - 1)).astype("uint64")
+        morton = get_morton_indices_unravel(
+            ii[:,0].copy(), ii[:,1].copy(), ii[:,2].copy())
+        return np.argsort(morton, kind="mergesort")
+
+    def _build_nodes(self):
+        cdef np.int64_t n = self.num_elements
+        le = self.element_left_edge
+        re = self.element_right_edge
+        starts = np.arange(0, max(n, 1), self.leaf_size, dtype="int64")
+        ends = np.append(starts[1:], n)
+        if n == 0:
+            levels = [(np.zeros((1, 3)) + 1e60, np.zeros((1, 3)) - 1e60,
+                       starts, ends)]
+        else:
+            levels = [(np.minimum.reduceat(le, starts, axis=0),
+                       np.maximum.reduceat(re, starts, axis=0),
+                       starts, ends)]
+        # Merge neighboring pairs of nodes until only the root is left; an
+        # odd node out is carried up to the next level on its own.
+        while levels[-1][0].shape[0] > 1:
+            lle, lre, ls, le_ = levels[-1]
+            left = np.arange(0, lle.shape[0], 2)
+            right = np.minimum(left + 1, lle.shape[0] - 1)
+            levels.append((np.minimum(lle[left], lle[right]),
+                           np.maximum(lre[left], lre[right]),
+                           ls[left], le_[right]))
+        levels.reverse()
+        counts = np.array([lev[0].shape[0] for lev in levels], dtype="int64")
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.depth = len(levels)
+        self.num_nodes = offsets[-1]
+        self.num_leaves = counts[-1]
+        self.node_left_edge = np.concatenate([lev[0] for lev in levels])
+        self.node_right_edge = np.concatenate([lev[1] for lev in levels])
+        self.node_range = np.empty((self.num_nodes, 2), dtype="int64")
+        self.node_range[:,0] = np.concatenate([lev[2] for lev in levels])
+        self.node_range[:,1] = np.concatenate([lev[3] for lev in levels])
+        self.node_children = -np.ones((self.num_nodes, 2), dtype="int64")
+        for i in range(len(levels) - 1):
+            j = np.arange(counts[i])
+            self.node_children[offsets[i]:offsets[i+1], 0] = \
+                offsets[i+1] + 2 * j
+            right = 2 * j + 1
+            self.node_children[offsets[i] + j[right < counts[i+1]], 1] = \
+                offsets[i+1] + right[right < counts[i+1]]
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def fill_cell_mask(self, SelectorObject selector, np.int64_t node = 0,
+                       int num_threads = 0):
+        """
+        Return the mask of the elements under *node* whose bounding boxes
+        are selected by *selector*, in the order of ``element_order``
+        between the bounds given by ``node_range[node]``, or None if no
+        elements are selected.  Only the elements of leaves whose bounding
+        boxes are selected are tested, and those in parallel.
+        """
+        cdef np.int64_t i, p, leaf, start, offset, nl
+        cdef int total = 0
+        cdef np.ndarray[np.int64_t, ndim=1] stack = np.empty(
+            2 * self.depth + 2, dtype="int64")
+        cdef np.ndarray[np.int64_t, ndim=1] leaves = np.empty(
+            self.num_leaves, dtype="int64")
+        cdef np.int64_t *lp = <np.int64_t *> leaves.data
+        offset = self.nrange[2*node]
+        cdef np.ndarray[np.uint8_t, ndim=1] mask = np.zeros(
+            self.nrange[2*node+1] - offset, dtype="uint8")
+        cdef np.uint8_t *mp = <np.uint8_t *> mask.data
+        with nogil:
+            nl = self._selected_leaves(selector, node,
+                                       <np.int64_t *> stack.data, lp)
+            for i in prange(nl, schedule = "dynamic",
+                            num_threads = num_threads):
+                leaf = lp[i]
+                for p in range(self.nrange[2*leaf], self.nrange[2*leaf+1]):
+                    mp[p - offset] = selector.select_bbox(
+                        self.ele_le + 3*p, self.ele_re + 3*p)
+                    total += mp[p - offset]
+        if total == 0: return None
+        return mask.astype("bool")
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef np.int64_t _selected_leaves(self, SelectorObject selector,
+                                     np.int64_t node, np.int64_t *stack,
+                                     np.int64_t *leaves) nogil:
+        cdef np.int64_t n, nl = 0
+        cdef int sp = 1
+        stack[0] = node
+        while sp > 0:
+            sp -= 1
+            n = stack[sp]
+            if selector.select_bbox(self.nle + 3*n, self.nre + 3*n) == 0:
+                continue
+            if self.children[2*n] == -1:
+                leaves[nl] = n
+                nl += 1
+                continue
+            if self.children[2*n+1] != -1:
+                stack[sp] = self.children[2*n+1]
+                sp += 1
+            stack[sp] = self.children[2*n]
+            sp += 1
+        return nl
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def query_leaves(self, left_edge, right_edge, np.int64_t node = 0):
+        """
+        Return the leaves under *node*, in order, whose bounding boxes
+        overlap the box between *left_edge* and *right_edge*.
+        """
+        cdef np.float64_t le[3], re[3]
+        cdef np.int64_t n, nl = 0
+        cdef int i, sp = 1, overlap
+        for i in range(3):
+            le[i] = left_edge[i]
+            re[i] = right_edge[i]
+        cdef np.ndarray[np.int64_t, ndim=1] stack = np.empty(
+            2 * self.depth + 2, dtype="int64")
+        cdef np.ndarray[np.int64_t, ndim=1] leaves = np.empty(
+            self.num_leaves, dtype="int64")
+        stack[0] = node
+        with nogil:
+            while sp > 0:
+                sp -= 1
+                n = stack[sp]
+                overlap = 1
+                for i in range(3):
+                    if self.nre[3*n+i] < le[i] or self.nle[3*n+i] > re[i]:
+                        overlap = 0
+                        break
+                if overlap == 0:
+                    continue
+                if self.children[2*n] == -1:
+                    leaves[nl] = n
+                    nl += 1
+                    continue
+                if self.children[2*n+1] != -1:
+                    stack[sp] = self.children[2*n+1]
+                    sp += 1
+                stack[sp] = self.children[2*n]
+                sp += 1
+        return leaves[:nl].copy()
+
+    def leaf_elements(self, leaves):
+        """
+        Return the ids of the elements in *leaves*, in the order of the
+        leaves.
+        """
+        leaves = np.asarray(leaves, dtype="int64")
+        start = self.node_range[leaves, 0]
+        count = self.node_range[leaves, 1] - start
+        total = count.sum()
+        # The position of each element within element_order: the start of
+        # its leaf plus its place in the leaf.
+        shift = np.repeat(start - np.cumsum(count) + count, count)
+        return self.element_order[shift + np.arange(total, dtype="int64")]
+
+    def block_nodes(self, np.int64_t max_elements):
+        """
+        Return the nodes, in order along the Morton curve, of the largest
+        subtrees with no more than *max_elements* elements each.  Together
+        they cover every element exactly once.
+        """
+        nodes = []
+        stack = [0]
+        while len(stack) > 0:
+            n = stack.pop()
+            start, end = self.node_range[n]
+            if end - start <= max_elements or self.node_children[n,0] == -1:
+                nodes.append(n)
+                continue
+            if self.node_children[n,1] != -1:
+                stack.append(self.node_children[n,1])
+            stack.append(self.node_children[n,0])
+        return np.array(nodes, dtype="int64")
@@ -0,0 +1,40 @@
+"""
+Pixelization routine exports
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+
+cimport numpy as np
+cimport cython
+from yt.utilities.lib.fp_utils cimport fmin, fmax
+
+@cython.cdivision(True)
+cdef inline np.float64_t cell_chord(np.float64_t *ray_pos,
+                                    np.float64_t *ray_dir,
+                                    np.float64_t *cell_pos,
+                                    np.float64_t *cell_hw) nogil:
+    # The length, in units of the ray parameter t in [0, 1), of the part
+    # of the ray inside the cell.
+    cdef int k
+    cdef np.float64_t p, t1, t2, tmin = 0.0, tmax = 1.0
+    for k in range(3):
+        p = ray_pos[k] - cell_pos[k]
+        if ray_dir[k] == 0.0:
+            if p < -cell_hw[k] or p >= cell_hw[k]: return 0.0
+            continue
+        t1 = (-cell_hw[k] - p) / ray_dir[k]
+        t2 = (cell_hw[k] - p) / ray_dir[k]
+        tmin = fmax(tmin, fmin(t1, t2))
+        tmax = fmin(tmax, fmax(t1, t2))
+        if tmax <= tmin: return 0.0
+    return tmax - tmin
@@ -17,7 +17,10 @@ import numpy as np
 cimport numpy as np
 cimport cython
 cimport libc.math as math
-from fp_utils cimport fmin, fmax, i64min, i64max, imin, imax
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+from cython.parallel cimport prange, parallel
+from fp_utils cimport fmin, fmax, fclip, i64min, i64max, imin, imax
 from yt.utilities.exceptions import YTPixelizeError
 cdef extern from "stdlib.h":
     # NOTE that size_t might not be int
@@ -168,6 +171,189 @@ def pixelize_cartesian(np.ndarray[np.float64_t, ndim=1] px,
     return my_array
 
 
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def pixelize_cartesian_multi(np.float64_t[:] px,
+                             np.float64_t[:] py,
+                             np.float64_t[:] pdx,
+                             np.float64_t[:] pdy,
+                             np.float64_t[:, :] data,
+                             int cols, int rows, bounds,
+                             int antialias = 1,
+                             period = None,
+                             int check_period = 1,
+                             int num_threads = 0):
+    r"""Pixelize several fields defined on the same cells at once.
+
+    This deposits each row of *data* exactly as ``_MPL.Pixelize`` would
+    deposit it on its own, but works out the pixels each cell covers, and
+    how much of each it covers, only once for all of the fields.  The image
+    is cut into strips of columns, and each thread fills in whole strips,
+    so no two threads ever write to the same pixel and the cells are added
+    to every pixel in the same order as they would be serially.
+
+    Parameters
+    ----------
+    px, py : array_like
+        The cell centers in the image plane.
+    pdx, pdy : array_like
+        The cell half-widths.
+    data : array_like
+        The (n_fields, n_cells) values to deposit.
+    cols, rows : int
+        The number of pixels in y and x.
+    bounds : sequence of floats
+        The (x_min, x_max, y_min, y_max) extent of the image.
+    antialias : int
+        If 1, cells are weighted by their overlap with each pixel;
+        otherwise, pixels take the value of the last cell covering them.
+    period : sequence of floats, optional
+        The period in x and y, for cells that wrap around the image edges.
+    check_period : int
+        If 1, wrap cells around periodic boundaries.
+    num_threads : int
+        The number of OpenMP threads to use; by default, as many as OpenMP
+        chooses.
+
+    Returns
+    -------
+    An (n_fields, rows, cols) array, where each image is laid out as the
+    result of ``_MPL.Pixelize``.
+    """
+    cdef np.float64_t x_min, x_max, y_min, y_max
+    cdef np.float64_t period_x = 0.0, period_y = 0.0
+    cdef np.float64_t width, height, px_dx, px_dy, ipx_dx, ipx_dy
+    cdef np.float64_t lc, lr, rc, rr
+    cdef np.float64_t lypx, rypx, lxpx, rxpx, overlap1, overlap2, w
+    cdef np.float64_t oxsp, oysp, xsp, ysp, dxsp, dysp
+    cdef np.float64_t xshift, yshift
+    cdef int xper, yper
+    cdef int nf, f, i, j, xi, yi, strip, n_strips, strip_width, j0, j1
+    cdef np.int64_t p, off
+    cdef np.ndarray[np.float64_t, ndim=3] my_array
+    cdef np.ndarray[np.float64_t, ndim=2] cell_data
+    cdef np.float64_t *buff
+    cdef np.float64_t *dsp
+    if period is not None:
+        period_x = period[0]
+        period_y = period[1]
+    x_min, x_max, y_min, y_max = bounds
+    if rows == 0 or cols == 0:
+        raise YTPixelizeError("Cannot scale to zero size")
+    if px.shape[0] != py.shape[0] or \
+       px.shape[0] != pdx.shape[0] or \
+       px.shape[0] != pdy.shape[0] or \
+       px.shape[0] != data.shape[1]:
+        raise YTPixelizeError("Arrays are not of correct shape.")
+    width = x_max - x_min
+    height = y_max - y_min
+    px_dx = width / (<np.float64_t> rows)
+    px_dy = height / (<np.float64_t> cols)
+    ipx_dx = 1.0 / px_dx
+    ipx_dy = 1.0 / px_dy
+    nf = data.shape[0]
+    # The fields are innermost, both in the image and in the data, so that
+    # all of them are deposited into a pixel together.
+    my_array = np.zeros((rows, cols, nf), "float64")
+    cell_data = np.ascontiguousarray(np.asarray(data).T)
+    buff = <np.float64_t *> my_array.data
+    # Every strip looks at every cell, so we use only a few strips per
+    # thread, and just one when running serially.
+    if num_threads == 1:
+        n_strips = 1
+    elif num_threads > 1:
+        n_strips = 4 * num_threads
+    else:
+        n_strips = 32
+    strip_width = (rows + n_strips - 1) / n_strips
+    n_strips = (rows + strip_width - 1) / strip_width
+    with nogil:
+        for strip in prange(n_strips, schedule = "dynamic",
+                            num_threads = num_threads):
+            j0 = strip * strip_width
+            j1 = j0 + strip_width
+            if j1 > rows: j1 = rows
+            for p in range(px.shape[0]):
+                oxsp = px[p]
+                oysp = py[p]
+                dxsp = pdx[p]
+                dysp = pdy[p]
+                dsp = (<np.float64_t *> cell_data.data) + p * nf
+                # Skip the cells that cannot reach this strip, whichever
+                # periodic image of them we take.
+                lxpx = px_dx * j0 + x_min
+                rxpx = px_dx * j1 + x_min
+                if check_period == 0 or period_x == 0.0:
+                    if oxsp + dxsp < lxpx or oxsp - dxsp > rxpx: continue
+                xper = yper = 0
+                xshift = yshift = 0.0
+                if check_period == 1:
+                    if (oxsp - dxsp < x_min):
+                        xper = 1
+                        xshift = period_x
+                    elif (oxsp + dxsp > x_max):
+                        xper = 1
+                        xshift = -period_x
+                    if (oysp - dysp < y_min):
+                        yper = 1
+                        yshift = period_y
+                    elif (oysp + dysp > y_max):
+                        yper = 1
+                        yshift = -period_y
+                overlap1 = overlap2 = 1.0
+                for xi in range(2):
+                    if xi == 1 and xper == 0: continue
+                    xsp = oxsp + xi * xshift
+                    if (xsp + dxsp < x_min) or (xsp - dxsp > x_max): continue
+                    lc = fmax(((xsp - dxsp - x_min) * ipx_dx), 0)
+                    rc = fmin(((xsp + dxsp - x_min) * ipx_dx), rows)
+                    # As in _MPL.Pixelize, the loops start at the truncated
+                    # left edge and run while below the unrounded right edge.
+                    j = <int> lc
+                    if j < j0: j = j0
+                    if j >= j1 or j >= rc: continue
+                    for yi in range(2):
+                        if yi == 1 and yper == 0: continue
+                        ysp = oysp + yi * yshift
+                        if (ysp + dysp < y_min) or (ysp - dysp > y_max):
+                            continue
+                        lr = fmax(((ysp - dysp - y_min) * ipx_dy), 0)
+                        rr = fmin(((ysp + dysp - y_min) * ipx_dy), cols)
+                        i = <int> lr
+                        while i < rr:
+                            lypx = px_dy * i + y_min
+                            rypx = px_dy * (i + 1) + y_min
+                            if antialias == 1:
+                                overlap2 = ((fmin(rypx, ysp + dysp)
+                                           - fmax(lypx, (ysp - dysp)))
+                                           * ipx_dy)
+                            if overlap2 < 0.0:
+                                i = i + 1
+                                continue
+                            j = <int> lc
+                            if j < j0: j = j0
+                            while j < rc and j < j1:
+                                lxpx = px_dx * j + x_min
+                                rxpx = px_dx * (j + 1) + x_min
+                                if antialias == 1:
+                                    overlap1 = ((fmin(rxpx, xsp + dxsp)
+                                               - fmax(lxpx, (xsp - dxsp)))
+                                               * ipx_dx)
+                                off = (<np.int64_t> j * cols + i) * nf
+                                if overlap1 >= 0.0:
+                                    if antialias == 1:
+                                        for f in range(nf):
+                                            buff[off + f] += \
+                                                (dsp[f] * overlap1) * overlap2
+                                    else:
+                                        for f in range(nf):
+                                            buff[off + f] = dsp[f]
+                                j = j + 1
+                            i = i + 1
+    return my_array.transpose((2, 0, 1))
+
+
 @cython.cdivision(True)
 @cython.boundscheck(False)
 @cython.wraparound(False)
@@ -370,7 +556,7 @@ cdef int check_face_dot(int nvertices,
                         np.float64_t point[3],
                         np.float64_t **vertices,
                         np.int8_t *signs,
-                        int match):
+                        int match) nogil:
     # Because of how we are doing this, we do not *care* what the signs are or
     # how the faces are ordered, we only care if they match between the point
     # and the centroid.
@@ -421,13 +607,83 @@ cdef int check_face_dot(int nvertices,
                 return 0
     return 1
 
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void pixelize_element(np.int64_t ci, np.float64_t[:, :] coords,
+                           np.int64_t[:, :] conn, np.float64_t[:] field,
+                           np.float64_t[:, :, :] img,
+                           np.int64_t[:, :, :] owner,
+                           np.float64_t pLE[3], np.float64_t pRE[3],
+                           np.float64_t dds[3], np.float64_t idds[3],
+                           int ax, np.int64_t j0, np.int64_t j1,
+                           int index_offset, np.float64_t **vertices,
+                           np.int8_t *signs) nogil:
+    # Fill in the pixels of element ci, among those between j0 and j1 along
+    # the image axis ax.
+    cdef np.float64_t LE[3], RE[3]
+    cdef np.float64_t ppoint[3], centroid[3]
+    cdef np.int64_t pstart[3], pend[3]
+    cdef np.int64_t n, i, pi, pj, pk, cj
+    cdef int nvertices = conn.shape[1]
+    # Fill the vertices and compute the centroid
+    centroid[0] = centroid[1] = centroid[2] = 0
+    LE[0] = LE[1] = LE[2] = 1e60
+    RE[0] = RE[1] = RE[2] = -1e60
+    for n in range(nvertices): # 8
+        cj = conn[ci, n] - index_offset
+        for i in range(3):
+            vertices[n][i] = coords[cj, i]
+            centroid[i] += coords[cj, i]
+            LE[i] = fmin(LE[i], vertices[n][i])
+            RE[i] = fmax(RE[i], vertices[n][i])
+    centroid[0] /= nvertices
+    centroid[1] /= nvertices
+    centroid[2] /= nvertices
+    for i in range(3):
+        if RE[i] < pLE[i] or LE[i] >= pRE[i]:
+            return
+        pstart[i] = <np.int64_t> ((LE[i] - pLE[i])*idds[i]) - 1
+        if pstart[i] < 0: pstart[i] = 0
+        pend[i] = <np.int64_t> ((RE[i] - pLE[i])*idds[i]) + 1
+        if pend[i] > img.shape[i] - 1: pend[i] = img.shape[i] - 1
+    if pstart[ax] < j0: pstart[ax] = j0
+    if pend[ax] > j1 - 1: pend[ax] = j1 - 1
+    # Now our bounding box intersects, so we get the extents of our pixel
+    # region which overlaps with the bounding box, and we'll check each
+    # pixel in there.
+    # First, we figure out the dot product of the centroid with all the
+    # faces.
+    check_face_dot(nvertices, centroid, vertices, signs, 0)
+    for pi in range(pstart[0], pend[0] + 1):
+        ppoint[0] = (pi + 0.5) * dds[0] + pLE[0]
+        for pj in range(pstart[1], pend[1] + 1):
+            ppoint[1] = (pj + 0.5) * dds[1] + pLE[1]
+            for pk in range(pstart[2], pend[2] + 1):
+                ppoint[2] = (pk + 0.5) * dds[2] + pLE[2]
+                # Now we just need to figure out if our ppoint is within
+                # our set of vertices.
+                if check_face_dot(nvertices, ppoint, vertices, signs, 1) == 0:
+                    continue
+                # Else, we deposit!  Where elements overlap, the pixel takes
+                # the value of the last one, whatever order we visit them in.
+                if ci > owner[pi, pj, pk]:
+                    img[pi, pj, pk] = field[ci]
+                    owner[pi, pj, pk] = ci
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
 def pixelize_element_mesh(np.ndarray[np.float64_t, ndim=2] coords,
                       np.ndarray[np.int64_t, ndim=2] conn,
                       buff_size,
                       np.ndarray[np.float64_t, ndim=1] field,
-                      extents, int index_offset = 0):
+                      extents, int index_offset = 0,
+                      bvh = None, int num_threads = 0):
     cdef np.ndarray[np.float64_t, ndim=3] img
+    cdef np.ndarray[np.int64_t, ndim=3] owner
     img = np.zeros(buff_size, dtype="float64")
+    owner = -np.ones(buff_size, dtype="int64")
     # Two steps:
     #  1. Is image point within the mesh bounding box?
     #  2. Is image point within the mesh element?
@@ -437,16 +693,26 @@ def pixelize_element_mesh(np.ndarray[np.float64_t, ndim=2] coords,
     # compare against the centroid of the (assumed convex) element.
     # Note that we have to have a pseudo-3D pixel buffer.  One dimension will
     # always be 1.
+    # The image is cut into strips along its longest axis, and each thread
+    # fills in whole strips.  With a bounding volume hierarchy over the
+    # elements (a MeshBVH), each strip visits only the elements of the leaves
+    # that overlap it; otherwise, every strip checks every element.
     cdef np.float64_t pLE[3], pRE[3]
-    cdef np.float64_t LE[3], RE[3]
-    cdef int use
+    cdef np.float64_t idds[3], dds[3]
+    cdef int ax, strip, n_strips, strip_width, nf
+    cdef np.int64_t i, e, ne, ci, j0, j1
     cdef np.int8_t *signs
-    cdef np.int64_t n, i, j, k, pi, pj, pk, ci, cj, ck
-    cdef np.int64_t pstart[3], pend[3]
-    cdef np.float64_t ppoint[3], centroid[3], idds[3], dds[3]
     cdef np.float64_t **vertices
+    cdef np.float64_t *vbuff
     cdef int nvertices = conn.shape[1]
-    cdef int nf
+    cdef int use_bvh = bvh is not None
+    cdef np.ndarray[np.int64_t, ndim=1] strip_offsets
+    cdef np.ndarray[np.int64_t, ndim=1] strip_elements
+    cdef np.float64_t[:, :] coords_view = coords
+    cdef np.int64_t[:, :] conn_view = conn
+    cdef np.float64_t[:] field_view = field
+    cdef np.float64_t[:, :, :] img_view = img
+    cdef np.int64_t[:, :, :] owner_view = owner
     # Allocate our signs array
     if nvertices == 4:
         nf = TETRA_NF
@@ -456,10 +722,7 @@ def pixelize_element_mesh(np.ndarray[np.float64_t, ndim=2] coords,
         nf = HEX_NF
     else:
         raise RuntimeError
-    signs = <np.int8_t *> alloca(sizeof(np.int8_t) * nf)
-    vertices = <np.float64_t **> alloca(sizeof(np.float64_t *) * nvertices)
-    for i in range(nvertices):
-        vertices[i] = <np.float64_t *> alloca(sizeof(np.float64_t) * 3)
+    ax = 0
     for i in range(3):
         pLE[i] = extents[i][0]
         pRE[i] = extents[i][1]
@@ -468,46 +731,473 @@ def pixelize_element_mesh(np.ndarray[np.float64_t, ndim=2] coords,
             idds[i] = 0.0
         else:
             idds[i] = 1.0 / dds[i]
-    for ci in range(conn.shape[0]):
-        # Fill the vertices and compute the centroid
-        centroid[0] = centroid[1] = centroid[2] = 0
-        LE[0] = LE[1] = LE[2] = 1e60
-        RE[0] = RE[1] = RE[2] = -1e60
-        for n in range(nvertices): # 8
-            cj = conn[ci, n] - index_offset
-            for i in range(3):
-                vertices[n][i] = coords[cj, i]
-                centroid[i] += coords[cj, i]
-                LE[i] = fmin(LE[i], vertices[n][i])
-                RE[i] = fmax(RE[i], vertices[n][i])
-        centroid[0] /= nvertices
-        centroid[1] /= nvertices
-        centroid[2] /= nvertices
-        use = 1
-        for i in range(3):
-            if RE[i] < pLE[i] or LE[i] >= pRE[i]:
-                use = 0
-                break
-            pstart[i] = i64max(<np.int64_t> ((LE[i] - pLE[i])*idds[i]) - 1, 0)
-            pend[i] = i64min(<np.int64_t> ((RE[i] - pLE[i])*idds[i]) + 1, img.shape[i]-1)
-        if use == 0:
-            continue
-        # Now our bounding box intersects, so we get the extents of our pixel
-        # region which overlaps with the bounding box, and we'll check each
-        # pixel in there.
-        # First, we figure out the dot product of the centroid with all the
-        # faces.
-        check_face_dot(nvertices, centroid, vertices, signs, 0)
-        for pi in range(pstart[0], pend[0] + 1):
-            ppoint[0] = (pi + 0.5) * dds[0] + pLE[0]
-            for pj in range(pstart[1], pend[1] + 1):
-                ppoint[1] = (pj + 0.5) * dds[1] + pLE[1]
-                for pk in range(pstart[2], pend[2] + 1):
-                    ppoint[2] = (pk + 0.5) * dds[2] + pLE[2]
-                    # Now we just need to figure out if our ppoint is within
-                    # our set of vertices.
-                    if check_face_dot(nvertices, ppoint, vertices, signs, 1) == 0:
-                        continue
-                    # Else, we deposit!
-                    img[pi, pj, pk] = field[ci]
+        if img.shape[i] > img.shape[ax]: ax = i
+    if num_threads == 1:
+        n_strips = 1
+    elif num_threads > 1:
+        n_strips = 4 * num_threads
+    else:
+        n_strips = 32
+    strip_width = (img.shape[ax] + n_strips - 1) / n_strips
+    n_strips = (img.shape[ax] + strip_width - 1) / strip_width
+    strip_offsets = np.zeros(n_strips + 1, dtype="int64")
+    if use_bvh == 1:
+        # Elements can reach a pixel beyond their bounding boxes, so we
+        # widen the strips by a pixel when we look for them.
+        pieces = []
+        for strip in range(n_strips):
+            sle = [pLE[i] - dds[i] for i in range(3)]
+            sre = [pRE[i] + dds[i] for i in range(3)]
+            sle[ax] = pLE[ax] + (strip * strip_width - 1) * dds[ax]
+            sre[ax] = pLE[ax] + ((strip + 1) * strip_width + 1) * dds[ax]
+            elements = bvh.leaf_elements(bvh.query_leaves(sle, sre))
+            pieces.append(elements)
+            strip_offsets[strip + 1] = strip_offsets[strip] + elements.size
+        strip_elements = np.concatenate(pieces).astype("int64")
+    else:
+        strip_elements = np.zeros(1, dtype="int64")
+    with nogil, parallel(num_threads = num_threads):
+        signs = <np.int8_t *> malloc(sizeof(np.int8_t) * nf)
+        vbuff = <np.float64_t *> malloc(sizeof(np.float64_t) * nvertices * 3)
+        vertices = <np.float64_t **> malloc(
+            sizeof(np.float64_t *) * nvertices)
+        for i in range(nvertices):
+            vertices[i] = vbuff + 3 * i
+        for strip in prange(n_strips, schedule = "dynamic"):
+            j0 = strip * strip_width
+            j1 = j0 + strip_width
+            if use_bvh == 1:
+                ne = strip_offsets[strip + 1] - strip_offsets[strip]
+            else:
+                ne = conn.shape[0]
+            for e in range(ne):
+                if use_bvh == 1:
+                    ci = strip_elements[strip_offsets[strip] + e]
+                else:
+                    ci = e
+                pixelize_element(ci, coords_view, conn_view, field_view,
+                                 img_view, owner_view, pLE, pRE, dds, idds,
+                                 ax, j0, j1, index_offset, vertices, signs)
+        free(vertices)
+        free(vbuff)
+        free(signs)
     return img
+
+# The cubic spline kernel, with h the radius at which it falls to zero.  The
+# projected kernel is tabulated once, in bins of (b/h)**2 for impact parameter
+# b, so that it can be looked up without integrating along each sightline.
+DEF KERNEL_TABLE_SIZE = 1024
+DEF KERNEL_TABLE_STEPS = 256
+cdef np.float64_t projected_kernel_table[KERNEL_TABLE_SIZE + 1]
+
+@cython.cdivision(True)
+cdef inline np.float64_t sph_kernel_cubic(np.float64_t q) nogil:
+    cdef np.float64_t kernel
+    if q <= 0.5:
+        kernel = 1.0 - 6.0 * q * q * (1.0 - q)
+    elif q <= 1.0:
+        kernel = 2.0 * (1.0 - q) * (1.0 - q) * (1.0 - q)
+    else:
+        kernel = 0.0
+    return kernel * 8.0 / math.M_PI
+
+@cython.cdivision(True)
+cdef void initialize_projected_kernel_table():
+    cdef int i, j
+    cdef np.float64_t q2, zmax, dz, z, total
+    for i in range(KERNEL_TABLE_SIZE + 1):
+        q2 = i / (<np.float64_t> KERNEL_TABLE_SIZE)
+        zmax = math.sqrt(fmax(1.0 - q2, 0.0))
+        dz = zmax / KERNEL_TABLE_STEPS
+        total = 0.0
+        # Midpoint rule over the half-chord, doubled by symmetry.
+        for j in range(KERNEL_TABLE_STEPS):
+            z = (j + 0.5) * dz
+            total += sph_kernel_cubic(math.sqrt(q2 + z * z))
+        projected_kernel_table[i] = 2.0 * total * dz
+
+initialize_projected_kernel_table()
+
+@cython.cdivision(True)
+cdef inline np.float64_t sph_kernel_projected(np.float64_t q2) nogil:
+    cdef int i
+    cdef np.float64_t f
+    if q2 >= 1.0: return 0.0
+    f = q2 * KERNEL_TABLE_SIZE
+    i = <int> f
+    f -= i
+    return projected_kernel_table[i] * (1.0 - f) \
+         + projected_kernel_table[i + 1] * f
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline int sph_kernel_footprint(np.float64_t *local_buff, int nx,
+                                     int x0, int x1, int y0, int y1,
+                                     np.float64_t x_min, np.float64_t y_min,
+                                     np.float64_t dx, np.float64_t dy,
+                                     np.float64_t xsp, np.float64_t ysp,
+                                     np.float64_t h, np.float64_t zsp2,
+                                     np.float64_t w, int slice_kernel) nogil:
+    # Add the kernel of one particle at the centers of the pixels it
+    # covers, and return whether it covered any.
+    cdef int xi, yi, hit = 0
+    cdef np.float64_t xpx, ypx, dxp2, q2, kern, ih2 = 1.0 / (h * h)
+    for xi in range(x0, x1):
+        xpx = x_min + (xi + 0.5) * dx
+        dxp2 = (xpx - xsp) * (xpx - xsp)
+        if dxp2 >= h * h: continue
+        for yi in range(y0, y1):
+            ypx = y_min + (yi + 0.5) * dy
+            q2 = (dxp2 + (ypx - ysp) * (ypx - ysp) + zsp2) * ih2
+            if q2 >= 1.0: continue
+            if slice_kernel == 1:
+                kern = sph_kernel_cubic(math.sqrt(q2))
+            else:
+                kern = sph_kernel_projected(q2)
+            local_buff[yi * nx + xi] += w * kern
+            hit = 1
+    return hit
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int sph_kernel_scatter(np.float64_t[:, :] buff,
+                            np.float64_t[:] px, np.float64_t[:] py,
+                            np.float64_t[:] pz, np.float64_t[:] hsml,
+                            np.float64_t[:] pweight, bounds, period,
+                            int slice_kernel, int num_threads) except -1:
+    # Shared driver for the projection and slice scatters.  Each thread adds
+    # its particles into a private image, and the images are summed at the
+    # end, so that no two threads ever write to the same pixel.
+    cdef np.float64_t x_min, x_max, y_min, y_max, dx, dy, idx, idy
+    cdef np.float64_t period_x = 0.0, period_y = 0.0
+    cdef np.float64_t xsp, ysp, h, ih, ih2, w, zsp2
+    cdef np.float64_t xshift, yshift
+    cdef int nx, ny, xi, yi, i, j, x0, x1, y0, y1, ri, rj, hit
+    cdef np.int64_t p
+    cdef np.float64_t *local_buff
+    # Set, rather than assigned, so that it is shared between the threads.
+    cdef int failed[1]
+    failed[0] = 0
+    x_min, x_max, y_min, y_max = bounds
+    ny = buff.shape[0]
+    nx = buff.shape[1]
+    if nx == 0 or ny == 0:
+        raise YTPixelizeError("Cannot scale to zero size")
+    if period is not None:
+        period_x = period[0]
+        period_y = period[1]
+    dx = (x_max - x_min) / nx
+    dy = (y_max - y_min) / ny
+    idx = 1.0 / dx
+    idy = 1.0 / dy
+    with nogil, parallel(num_threads = num_threads):
+        local_buff = <np.float64_t *> malloc(sizeof(np.float64_t) * nx * ny)
+        if local_buff == NULL:
+            failed[0] = 1
+        else:
+            memset(local_buff, 0, sizeof(np.float64_t) * nx * ny)
+        for p in prange(px.shape[0], schedule = "dynamic", chunksize = 256):
+            if local_buff == NULL: continue
+            h = hsml[p]
+            w = pweight[p]
+            if h <= 0.0 or w == 0.0: continue
+            zsp2 = 0.0
+            if slice_kernel == 1:
+                zsp2 = pz[p] * pz[p]
+                if zsp2 >= h * h: continue
+            # Check for a periodic image that overlaps the other side of the
+            # image; a shift of zero means there is none.
+            xshift = yshift = 0.0
+            if period_x > 0.0:
+                if px[p] - h < x_min:
+                    xshift = period_x
+                elif px[p] + h > x_max:
+                    xshift = -period_x
+            if period_y > 0.0:
+                if py[p] - h < y_min:
+                    yshift = period_y
+                elif py[p] + h > y_max:
+                    yshift = -period_y
+            ih = 1.0 / h
+            ih2 = ih * ih
+            if slice_kernel == 1:
+                w = w * ih2 * ih
+            else:
+                w = w * ih2
+            for i in range(2):
+                if i == 1 and xshift == 0.0: continue
+                xsp = px[p] + i * xshift
+                if xsp + h < x_min or xsp - h > x_max: continue
+                for j in range(2):
+                    if j == 1 and yshift == 0.0: continue
+                    ysp = py[p] + j * yshift
+                    if ysp + h < y_min or ysp - h > y_max: continue
+                    x0 = <int> fmax((xsp - h - x_min) * idx, 0.0)
+                    x1 = <int> fmin((xsp + h - x_min) * idx + 1, nx)
+                    y0 = <int> fmax((ysp - h - y_min) * idy, 0.0)
+                    y1 = <int> fmin((ysp + h - y_min) * idy + 1, ny)
+                    hit = 0
+                    if slice_kernel == 1 or h >= 0.5 * fmin(dx, dy):
+                        hit = sph_kernel_footprint(local_buff, nx, x0, x1,
+                            y0, y1, x_min, y_min, dx, dy, xsp, ysp, h,
+                            zsp2, w, slice_kernel)
+                    if slice_kernel == 0 and hit == 0:
+                        # The kernel is too small to reach any pixel
+                        # center, so the whole particle goes into the pixel
+                        # that contains it.
+                        if xsp < x_min or xsp >= x_max: continue
+                        if ysp < y_min or ysp >= y_max: continue
+                        xi = <int> ((xsp - x_min) * idx)
+                        yi = <int> ((ysp - y_min) * idy)
+                        local_buff[yi * nx + xi] += \
+                            pweight[p] * idx * idy
+        with gil:
+            if local_buff != NULL:
+                for rj in range(ny):
+                    for ri in range(nx):
+                        buff[rj, ri] += local_buff[rj * nx + ri]
+        free(local_buff)
+    if failed[0]:
+        raise MemoryError("Could not allocate an image for each thread.")
+    return 0
+
+def _check_sph_arrays(buff, arrays):
+    if buff.ndim != 2:
+        raise YTPixelizeError("The image buffer must be two-dimensional.")
+    for arr in arrays[1:]:
+        if arr.shape[0] != arrays[0].shape[0]:
+            raise YTPixelizeError("Arrays are not of correct shape.")
+
+def pixelize_sph_kernel_projection(np.float64_t[:, :] buff,
+                                   np.float64_t[:] px,
+                                   np.float64_t[:] py,
+                                   np.float64_t[:] hsml,
+                                   np.float64_t[:] pmass,
+                                   np.float64_t[:] pdens,
+                                   np.float64_t[:] quantity,
+                                   bounds, period = None,
+                                   int num_threads = 0):
+    r"""Add the column of each SPH particle to an image.
+
+    Every particle contributes ``quantity * pmass / pdens`` times its
+    cubic spline kernel integrated along the line of sight, evaluated at the
+    center of each pixel its smoothing length covers.  Particles too small to
+    cover a pixel center are added to the pixel that contains them.  The
+    image is indexed as ``buff[y, x]`` and is added to in place, so that it
+    can be accumulated over several chunks of particles.
+
+    Parameters
+    ----------
+    buff : array_like
+        The (ny, nx) image to add to.
+    px, py : array_like
+        The particle positions in the image plane.
+    hsml : array_like
+        The smoothing lengths, in the same units as the positions.
+    pmass, pdens : array_like
+        The particle masses and densities, used to find each particle's
+        volume in the units of the positions cubed.
+    quantity : array_like
+        The quantity to integrate.
+    bounds : sequence of floats
+        The (x_min, x_max, y_min, y_max) extent of the image.
+    period : sequence of floats, optional
+        If supplied, the period in x and y, for particles that wrap around
+        the image edges.
+    num_threads : int
+        The number of OpenMP threads to use; by default, as many as OpenMP
+        chooses.
+    """
+    cdef np.ndarray[np.float64_t, ndim=1] pweight
+    _check_sph_arrays(np.asarray(buff), [np.asarray(a) for a in
+                      (px, py, hsml, pmass, pdens, quantity)])
+    pweight = np.asarray(quantity) * np.asarray(pmass) / np.asarray(pdens)
+    sph_kernel_scatter(buff, px, py, px, hsml, pweight, bounds, period,
+                       0, num_threads)
+
+def pixelize_sph_kernel_slice(np.float64_t[:, :] buff,
+                              np.float64_t[:] px,
+                              np.float64_t[:] py,
+                              np.float64_t[:] pz,
+                              np.float64_t[:] hsml,
+                              np.float64_t[:] pmass,
+                              np.float64_t[:] pdens,
+                              np.float64_t[:] quantity,
+                              bounds, period = None,
+                              int num_threads = 0):
+    r"""Add the SPH interpolant of each particle to an image of a slice.
+
+    This is the same as :func:`pixelize_sph_kernel_projection`, except that
+    the kernel is evaluated in three dimensions at the center of each pixel,
+    with *pz* giving the distance of each particle from the slice plane.
+    """
+    cdef np.ndarray[np.float64_t, ndim=1] pweight
+    _check_sph_arrays(np.asarray(buff), [np.asarray(a) for a in
+                      (px, py, pz, hsml, pmass, pdens, quantity)])
+    pweight = np.asarray(quantity) * np.asarray(pmass) / np.asarray(pdens)
+    sph_kernel_scatter(buff, px, py, pz, hsml, pweight, bounds, period,
+                       1, num_threads)
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def pixelize_off_axis_projection(np.float64_t[:, :, :] buff,
+                                 np.float64_t[:, :] pos,
+                                 np.float64_t[:, :] dds,
+                                 np.float64_t[:, :] values,
+                                 np.float64_t[:] origin,
+                                 np.float64_t[:, :] unit_vectors,
+                                 np.float64_t[:] width,
+                                 int supersample = 1,
+                                 int num_threads = 0):
+    r"""Add the column of each cell, seen off-axis, to an image.
+
+    Rays start on the plane through *origin* spanned by the first two
+    *unit_vectors* and run along the third for a distance of ``width[2]``,
+    with the pixel centers of ``buff[i, j]`` at ``-width[0]/2 + i *
+    width[0] / (nx - 1)`` and likewise in y, as in the ray caster.  Each
+    cell adds ``values[c, f]`` times the length of every ray through it,
+    as a fraction of ``width[2]``, to ``buff[i, j, f]`` for the pixels its
+    footprint covers.  The image is added to in place, so that it can be
+    accumulated over several chunks of cells.
+
+    With *supersample* greater than one, each pixel is averaged over a
+    square of ``supersample**2`` rays, and a cell whose footprint is smaller
+    than the spacing of those rays is instead added, by volume, to the pixel
+    containing it.
+
+    Parameters
+    ----------
+    buff : array_like
+        The (nx, ny, nf) image to add to.
+    pos, dds : array_like
+        The (N, 3) centers and widths of the cells.
+    values : array_like
+        The (N, nf) values to project.
+    origin : array_like
+        The center of the back of the projected volume.
+    unit_vectors : array_like
+        The (3, 3) east, north and normal vectors of the image.
+    width : array_like
+        The width of the image in x and y and the depth of the projection.
+    supersample : int
+        The number of rays per pixel in each direction.
+    num_threads : int
+        The number of OpenMP threads to use; by default, as many as OpenMP
+        chooses.
+    """
+    cdef int nx, ny, nf, ns, i, j, si, sj, k, f, i0, i1, j0, j1
+    cdef int bi, bj, bf
+    cdef np.int64_t c, ri
+    cdef np.float64_t dpx, dpy, sx, sy, hu, hv, cu, cv, chord, total
+    cdef np.float64_t e[3]
+    cdef np.float64_t n[3]
+    cdef np.float64_t ray_dir[3]
+    cdef int failed[1]
+    cdef np.float64_t *ray_pos
+    cdef np.float64_t *cell_pos
+    cdef np.float64_t *cell_hw
+    cdef np.float64_t *local_buff
+    nx = buff.shape[0]
+    ny = buff.shape[1]
+    nf = buff.shape[2]
+    if nx == 0 or ny == 0:
+        raise YTPixelizeError("Cannot scale to zero size")
+    if pos.shape[0] != dds.shape[0] or pos.shape[0] != values.shape[0] \
+       or values.shape[1] != nf:
+        raise YTPixelizeError("Arrays are not of correct shape.")
+    ns = imax(supersample, 1)
+    dpx = width[0] / imax(nx - 1, 1)
+    dpy = width[1] / imax(ny - 1, 1)
+    for k in range(3):
+        e[k] = unit_vectors[0, k]
+        n[k] = unit_vectors[1, k]
+        ray_dir[k] = unit_vectors[2, k] * width[2]
+    failed[0] = 0
+    with nogil, parallel(num_threads = num_threads):
+        ray_pos = <np.float64_t *> malloc(sizeof(np.float64_t) * 3)
+        cell_pos = <np.float64_t *> malloc(sizeof(np.float64_t) * 3)
+        cell_hw = <np.float64_t *> malloc(sizeof(np.float64_t) * 3)
+        local_buff = <np.float64_t *> malloc(
+            sizeof(np.float64_t) * nx * ny * nf)
+        if ray_pos == NULL or cell_pos == NULL or cell_hw == NULL or \
+           local_buff == NULL:
+            failed[0] = 1
+        else:
+            memset(local_buff, 0, sizeof(np.float64_t) * nx * ny * nf)
+        for c in prange(pos.shape[0], schedule = "dynamic", chunksize = 256):
+            if ray_pos == NULL or cell_pos == NULL or cell_hw == NULL or \
+               local_buff == NULL:
+                continue
+            cu = cv = hu = hv = 0.0
+            for k in range(3):
+                cell_pos[k] = pos[c, k]
+                cell_hw[k] = 0.5 * dds[c, k]
+                cu = cu + (cell_pos[k] - origin[k]) * e[k]
+                cv = cv + (cell_pos[k] - origin[k]) * n[k]
+                hu = hu + cell_hw[k] * math.fabs(e[k])
+                hv = hv + cell_hw[k] * math.fabs(n[k])
+            if ns > 1 and 2.0 * hu * ns < dpx and 2.0 * hv * ns < dpy:
+                # The cell could fall between the rays, so the whole of it
+                # goes into the pixel that contains its center.
+                sx = math.floor((cu + 0.5 * width[0]) / dpx + 0.5)
+                sy = math.floor((cv + 0.5 * width[1]) / dpy + 0.5)
+                if sx < 0 or sx >= nx or sy < 0 or sy >= ny: continue
+                chord = 0.0
+                for k in range(3):
+                    chord = chord + (cell_pos[k] - origin[k]) * ray_dir[k]
+                chord = chord / (width[2] * width[2])
+                if chord < 0.0 or chord >= 1.0: continue
+                total = 8.0 * cell_hw[0] * cell_hw[1] * cell_hw[2] \
+                      / (width[2] * dpx * dpy)
+                ri = ((<int> sx) * ny + (<int> sy)) * nf
+                for f in range(nf):
+                    local_buff[ri + f] += values[c, f] * total
+                continue
+            # The pixels whose area, not just whose center, the cell's
+            # footprint might reach.
+            i0 = <int> fclip(math.ceil((cu - hu + 0.5 * width[0]) / dpx
+                                       - 0.5), 0.0, nx)
+            i1 = <int> fclip(math.floor((cu + hu + 0.5 * width[0]) / dpx
+                                        + 0.5), -1.0, nx - 1)
+            j0 = <int> fclip(math.ceil((cv - hv + 0.5 * width[1]) / dpy
+                                       - 0.5), 0.0, ny)
+            j1 = <int> fclip(math.floor((cv + hv + 0.5 * width[1]) / dpy
+                                        + 0.5), -1.0, ny - 1)
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    total = 0.0
+                    for si in range(ns):
+                        sx = i * dpx - 0.5 * width[0]
+                        if ns > 1:
+                            sx = sx + ((si + 0.5) / ns - 0.5) * dpx
+                        for sj in range(ns):
+                            sy = j * dpy - 0.5 * width[1]
+                            if ns > 1:
+                                sy = sy + ((sj + 0.5) / ns - 0.5) * dpy
+                            for k in range(3):
+                                ray_pos[k] = origin[k] + sx * e[k] \
+                                           + sy * n[k]
+                            chord = cell_chord(ray_pos, ray_dir, cell_pos,
+                                               cell_hw)
+                            total = total + chord
+                    if total == 0.0: continue
+                    total = total / (ns * ns)
+                    ri = (i * ny + j) * nf
+                    for f in range(nf):
+                        local_buff[ri + f] += values[c, f] * total
+        with gil:
+            if local_buff != NULL:
+                for bi in range(nx):
+                    for bj in range(ny):
+                        for bf in range(nf):
+                            buff[bi, bj, bf] += \
+                                local_buff[(bi * ny + bj) * nf + bf]
+        free(local_buff)
+        free(cell_hw)
+        free(cell_pos)
+        free(ray_pos)
+    if failed[0]:
+        raise MemoryError()
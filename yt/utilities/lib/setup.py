@@ -96,6 +96,14 @@ def configuration(parent_package='',top_path=None):
                          "yt/utilities/lib/fixed_interpolator.pxd",
                          "yt/utilities/lib/FixedInterpolator.h",
                 ])
+    config.add_extension("mesh_bvh",
+                ["yt/utilities/lib/mesh_bvh.pyx"],
+                include_dirs=["yt/utilities/lib/", "yt/geometry/"],
+                extra_compile_args=omp_args,
+                extra_link_args=omp_args,
+                libraries=["m"],
+                depends=["yt/utilities/lib/fp_utils.pxd",
+                         "yt/geometry/selection_routines.pxd"])
     config.add_extension("misc_utilities", 
                 ["yt/utilities/lib/misc_utilities.pyx"],
                 libraries=["m"], depends=["yt/utilities/lib/fp_utils.pxd"])
@@ -103,7 +111,10 @@ def configuration(parent_package='',top_path=None):
                 ["yt/utilities/lib/pixelization_routines.pyx",
                  "yt/utilities/lib/pixelization_constants.c"],
                include_dirs=["yt/utilities/lib/"],
+               extra_compile_args=omp_args,
+               extra_link_args=omp_args,
                 libraries=["m"], depends=["yt/utilities/lib/fp_utils.pxd",
+                                  "yt/utilities/lib/pixelization_routines.pxd",
                                   "yt/utilities/lib/pixelization_constants.h"])
     config.add_extension("Octree", 
                 ["yt/utilities/lib/Octree.pyx"],
@@ -0,0 +1,22 @@
+from yt.testing import *
+from yt.utilities.lib.image_utilities import bin_points_to_image
+
+def test_bin_points_to_image():
+    np.random.seed(0x4d3d3d3)
+    bounds = (-1.0, 1.0, 0.0, 4.0)
+    nx, ny = 16, 24
+    px = np.random.uniform(-1.5, 1.5, size=10000)
+    py = np.random.uniform(-0.5, 4.5, size=10000)
+    pv = np.random.random(10000)
+    for values in (None, pv):
+        buff = np.zeros((ny, nx), dtype="float64")
+        bin_points_to_image(buff, px, py, values, bounds)
+        ans, xe, ye = np.histogram2d(py, px, bins=(ny, nx),
+                                     range=(bounds[2:], bounds[:2]),
+                                     weights=values)
+        yield assert_rel_equal, buff, ans, 10
+    # Points on the upper edges land in the last pixel.
+    buff = np.zeros((ny, nx), dtype="float64")
+    bin_points_to_image(buff, np.array([1.0]), np.array([4.0]), None, bounds)
+    yield assert_equal, buff[-1, -1], 1.0
+    yield assert_equal, buff.sum(), 1.0
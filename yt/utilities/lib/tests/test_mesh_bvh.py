@@ -0,0 +1,53 @@
+from yt.testing import *
+from yt.frontends.stream.data_structures import hexahedral_connectivity
+from yt.utilities.lib.mesh_bvh import MeshBVH
+from yt.utilities.lib.pixelization_routines import pixelize_element_mesh
+
+def _random_mesh(n):
+    np.random.seed(0x4d3d3d3)
+    coords, conn = hexahedral_connectivity(
+        np.linspace(0.0, 1.0, n + 1),
+        np.sort(np.random.random(n + 1)),
+        np.linspace(0.0, 1.0, n + 1)**2)
+    coords = coords + np.random.uniform(-1e-3, 1e-3, coords.shape)
+    return coords, conn.astype("int64")
+
+def test_mesh_bvh_nodes():
+    coords, conn = _random_mesh(20)
+    bvh = MeshBVH(coords, conn, leaf_size=16)
+    yield assert_equal, np.sort(bvh.element_order), np.arange(conn.shape[0])
+    # Every node bounds the elements it covers.
+    contained = True
+    for node in range(bvh.num_nodes):
+        start, end = bvh.node_range[node]
+        le = bvh.element_left_edge[start:end]
+        re = bvh.element_right_edge[start:end]
+        contained &= (le >= bvh.node_left_edge[node]).all()
+        contained &= (re <= bvh.node_right_edge[node]).all()
+    yield assert_equal, contained, True
+    blocks = bvh.block_nodes(1000)
+    ranges = bvh.node_range[blocks]
+    yield assert_equal, ranges[1:,0], ranges[:-1,1]
+    yield assert_equal, (ranges[:,1] - ranges[:,0]).max() <= 1000, True
+    # Querying finds every element that overlaps the box.
+    le = np.array([0.3, 0.3, 0.3])
+    re = np.array([0.5, 0.45, 0.7])
+    found = bvh.leaf_elements(bvh.query_leaves(le, re))
+    overlap = np.all((bvh.element_right_edge >= le) &
+                     (bvh.element_left_edge <= re), axis=1)
+    missing = np.setdiff1d(bvh.element_order[overlap], found)
+    yield assert_equal, missing.size, 0
+
+def test_pixelize_element_mesh_bvh():
+    coords, conn = _random_mesh(20)
+    field = np.random.random(conn.shape[0])
+    bvh = MeshBVH(coords, conn)
+    for size, extents in [((1, 80, 60), [(0.37, 0.37), (0, 1), (0, 1)]),
+                          ((50, 1, 40), [(0.1, 0.8), (0.5, 0.5), (0.2, 0.6)]),
+                          ((64, 64, 1), [(0, 1), (0, 1), (0.33, 0.33)])]:
+        ref = pixelize_element_mesh(coords, conn, size, field, extents,
+                                    num_threads=1)
+        for num_threads in (1, 4):
+            img = pixelize_element_mesh(coords, conn, size, field, extents,
+                                        bvh=bvh, num_threads=num_threads)
+            yield assert_equal, img, ref
@@ -0,0 +1,31 @@
+from yt.testing import *
+from yt.utilities.lib.pixelization_routines import \
+    pixelize_cartesian_multi
+import yt.visualization._MPL as _MPL
+
+def _amr_cells(n):
+    # Cells of several levels at random places, which overlap one another
+    # and the edges of the images below.
+    np.random.seed(0x4d3d3d3)
+    dx = 1.0 / 32 / 2**np.random.randint(0, 5, n)
+    px = (np.floor(np.random.random(n) / (2 * dx)) + 0.5) * 2 * dx
+    py = (np.floor(np.random.random(n) / (2 * dx)) + 0.5) * 2 * dx
+    return px, py, dx, dx
+
+def test_pixelize_cartesian_multi():
+    px, py, pdx, pdy = _amr_cells(20000)
+    data = np.random.random((3, px.size))
+    for bounds, size in [((0.0, 1.0, 0.0, 1.0), (128, 96)),
+                         ((0.1, 0.73, -0.2, 0.55), (77, 151))]:
+        for antialias in [1, 0]:
+            for periodic in [1, 0]:
+                ref = [_MPL.Pixelize(px, py, pdx, pdy, d, size[0], size[1],
+                                     bounds, antialias, (1.0, 1.0),
+                                     periodic) for d in data]
+                for num_threads in [1, 4]:
+                    buffs = pixelize_cartesian_multi(px, py, pdx, pdy, data,
+                        size[0], size[1], bounds, antialias, (1.0, 1.0),
+                        periodic, num_threads)
+                    yield assert_equal, len(buffs), data.shape[0]
+                    for buff, r in zip(buffs, ref):
+                        yield assert_equal, buff, r
@@ -0,0 +1,80 @@
+"""
+Tests for scattering SPH particles into images
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+from yt.testing import *
+from yt.utilities.lib.pixelization_routines import \
+    pixelize_sph_kernel_projection, \
+    pixelize_sph_kernel_slice
+
+def _particle(x, y, h):
+    return [np.array([x]), np.array([y]), np.array([h]),
+            np.array([2.0]), np.array([0.5]), np.array([3.0])]
+
+def test_sph_kernel_projection():
+    # The image of a single particle integrates to its mass / density times
+    # the quantity, whether it covers many pixels, wraps around a periodic
+    # boundary or falls inside a single pixel.
+    bounds = (0.0, 1.0, 0.0, 1.0)
+    for x, y, h, period in [(0.5, 0.5, 0.2, None),
+                            (0.05, 0.98, 0.2, (1.0, 1.0)),
+                            (0.52, 0.31, 0.001, None)]:
+        buff = np.zeros((200, 100), dtype="float64")
+        pixelize_sph_kernel_projection(buff, *_particle(x, y, h),
+                                       bounds=bounds, period=period)
+        yield assert_rel_equal, buff.sum() / buff.size, 12.0, 4
+    # Small particles land in the pixel that contains them.
+    buff = np.zeros((200, 100), dtype="float64")
+    pixelize_sph_kernel_projection(buff, *_particle(0.52, 0.31, 0.001),
+                                   bounds=bounds)
+    yield assert_equal, np.argwhere(buff).tolist(), [[62, 52]]
+    # So do particles that cover part of a pixel but reach no pixel center.
+    buff = np.zeros((200, 100), dtype="float64")
+    pixelize_sph_kernel_projection(buff, *_particle(0.52, 0.31, 0.003),
+                                   bounds=bounds)
+    yield assert_equal, np.argwhere(buff).tolist(), [[62, 52]]
+    yield assert_rel_equal, buff.sum() / buff.size, 12.0, 10
+    # Accumulating in two halves is the same as all at once.
+    np.random.seed(0x4d3d3d3)
+    n = 1000
+    args = [np.random.random(n), np.random.random(n),
+            np.random.random(n) * 0.1 + 0.01, np.ones(n),
+            np.ones(n), np.random.random(n)]
+    buff1 = np.zeros((64, 64), dtype="float64")
+    pixelize_sph_kernel_projection(buff1, *args, bounds=bounds)
+    buff2 = np.zeros((64, 64), dtype="float64")
+    for s in [slice(0, n // 2), slice(n // 2, n)]:
+        pixelize_sph_kernel_projection(buff2, *[a[s] for a in args],
+                                       bounds=bounds)
+    yield assert_rel_equal, buff1, buff2, 12
+
+def test_sph_kernel_slice():
+    # Summing slices through a particle recovers its volume integral.
+    h = 0.2
+    zs = np.linspace(-h, h, 201)
+    total = 0.0
+    for z in zs:
+        x, y, hsml, mass, dens, quantity = _particle(0.5, 0.5, h)
+        buff = np.zeros((100, 100), dtype="float64")
+        pixelize_sph_kernel_slice(buff, x, y, np.array([z]), hsml, mass,
+                                  dens, quantity, (0.0, 1.0, 0.0, 1.0))
+        total += buff.sum() * 1e-4 * (zs[1] - zs[0])
+    yield assert_rel_equal, total, 12.0, 4
+    # Particles further from the plane than their smoothing length don't
+    # contribute.
+    buff = np.zeros((100, 100), dtype="float64")
+    x, y, hsml, mass, dens, quantity = _particle(0.5, 0.5, h)
+    pixelize_sph_kernel_slice(buff, x, y, np.array([1.1 * h]), hsml, mass,
+                              dens, quantity, (0.0, 1.0, 0.0, 1.0))
+    yield assert_equal, buff.sum(), 0.0
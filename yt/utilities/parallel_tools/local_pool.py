@@ -0,0 +1,178 @@
+"""
+A local, fork-based process pool for parallel iteration without MPI
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import multiprocessing
+import os
+import sys
+import traceback
+from yt.extern.six.moves import queue
+
+from yt.utilities.logger import ytLogger as mylog
+
+# This is set in the worker processes, so that nested parallel iteration
+# inside a worker runs serially rather than forking again.
+in_local_worker = False
+
+def get_local_workers(max_workers = None):
+    if max_workers is None or max_workers <= 0:
+        max_workers = multiprocessing.cpu_count()
+    return max_workers
+
+def _serial_objects(getter, nobjs, storage):
+    from .parallel_analysis_interface import ResultsStorage
+    to_share = {}
+    for obj_id in range(nobjs):
+        obj = getter(obj_id)
+        if storage is not None:
+            rstore = ResultsStorage()
+            rstore.result_id = obj_id
+            yield rstore, obj
+            to_share[rstore.result_id] = rstore.result
+        else:
+            yield obj
+    if storage is not None:
+        storage.update(to_share)
+
+def local_parallel_objects(objects, max_workers = None, storage = None):
+    r"""Iterate over *objects* using a pool of forked worker processes.
+
+    Each worker runs the body of the loop for the objects it is handed, and
+    objects are handed out one at a time from a shared counter, so that a
+    worker that finishes early simply takes the next one.  When a worker
+    runs out of objects it sends back its results and exits; the loop body
+    never runs in the calling process, which instead waits for all of the
+    workers and then fills *storage* with their results, exactly as
+    :func:`~yt.utilities.parallel_tools.parallel_analysis_interface.parallel_objects`
+    does under MPI.
+
+    As with MPI, anything the loop body does to objects in memory, other
+    than setting the *result* of its storage, is not seen by the caller.
+    If the loop body raises an exception or breaks out of the loop, the
+    worker stops and a RuntimeError is raised once the others are done.
+
+    Parameters
+    ----------
+    objects : iterable
+        The objects to iterate over.  If this supports ``len`` and indexing,
+        as :class:`~yt.data_objects.time_series.DatasetSeries` does, each
+        object is only created by the worker that handles it.
+    max_workers : int
+        The largest number of worker processes to start.  By default, one
+        for each available core.
+    storage : dict
+        If supplied, this is filled with the results assigned during the
+        iteration, keyed by the index of each object.
+    """
+    if hasattr(objects, "__len__") and hasattr(objects, "__getitem__"):
+        getter = objects.__getitem__
+    else:
+        objects = list(objects)
+        getter = objects.__getitem__
+    nobjs = len(objects)
+    nworkers = min(get_local_workers(max_workers), nobjs)
+    if in_local_worker or nworkers <= 1 or not hasattr(os, "fork"):
+        for my_obj in _serial_objects(getter, nobjs, storage):
+            yield my_obj
+        return
+    mylog.info("Dispatching %s objects to %s local workers",
+               nobjs, nworkers)
+    counter = multiprocessing.Value("l", 0)
+    results = multiprocessing.Queue()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pids = []
+    for worker_id in range(nworkers):
+        pid = os.fork()
+        if pid == 0:
+            for my_obj in _worker_objects(getter, nobjs, storage,
+                                          counter, results):
+                yield my_obj
+            # _worker_objects always exits the process.
+        pids.append(pid)
+    to_share = _collect_results(pids, results)
+    if storage is not None:
+        storage.update(to_share)
+
+def _worker_objects(getter, nobjs, storage, counter, results):
+    global in_local_worker
+    from .parallel_analysis_interface import ResultsStorage
+    in_local_worker = True
+    status = 0
+    obj_id = None
+    to_share = {}
+    try:
+        while True:
+            with counter.get_lock():
+                obj_id = counter.value
+                counter.value += 1
+            if obj_id >= nobjs: break
+            obj = getter(obj_id)
+            if storage is not None:
+                rstore = ResultsStorage()
+                rstore.result_id = obj_id
+                yield rstore, obj
+                to_share[rstore.result_id] = rstore.result
+            else:
+                yield obj
+    except GeneratorExit:
+        # The generator is closed when the loop body raises an exception or
+        # breaks out of the loop.  We can't tell which, and either way the
+        # objects this worker was handed are not finished.
+        mylog.error("Local worker %s stopped during object %s.",
+                    os.getpid(), obj_id)
+        status = 1
+    except:
+        traceback.print_exc()
+        status = 1
+    finally:
+        try:
+            results.put((os.getpid(), status, to_share))
+            results.close()
+            results.join_thread()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+
+def _collect_results(pids, results):
+    to_share = {}
+    waiting = set(pids)
+    reaped = set()
+    failed = []
+    while len(waiting) > 0:
+        try:
+            pid, status, worker_results = results.get(timeout = 1.0)
+        except queue.Empty:
+            # Check for workers that died without reporting back.  A worker
+            # that has exited gets one more timeout for its results to come
+            # through the queue before we give up on it.
+            for pid in list(waiting):
+                if pid in reaped:
+                    waiting.discard(pid)
+                    failed.append(pid)
+                    continue
+                done, _ = os.waitpid(pid, os.WNOHANG)
+                if done != 0: reaped.add(pid)
+            continue
+        waiting.discard(pid)
+        to_share.update(worker_results)
+        if status != 0: failed.append(pid)
+    for pid in pids:
+        if pid in reaped: continue
+        os.waitpid(pid, 0)
+    if len(failed) > 0:
+        mylog.error("%s of %s local workers failed.", len(failed), len(pids))
+        raise RuntimeError("Local workers %s failed." % failed)
+    return to_share
@@ -40,6 +40,9 @@ from yt.utilities.logger import ytLogger as mylog
 # will be changed.
 MPI = None
 parallel_capable = False
+# The number of local worker processes used by parallel_objects when MPI is
+# not available; None disables the local pool.
+local_parallel_workers = None
 
 dtype_names = dict(
         float32 = "MPI.FLOAT",
@@ -164,6 +167,29 @@ def enable_parallelism(suppress_logging=False, communicator=None):
             mylog.addFilter(FilterAllMessages())
     return True
 
+def enable_local_parallelism(max_workers=None):
+    """
+    This method is used inside a script to set the size of the pool of
+    forked worker processes used by parallel_objects and DatasetSeries.piter
+    loops that ask for it with ``max_workers=0``, when yt is not running
+    under MPI.  Only loops that are known to send all of their results back
+    through *storage* ask for the pool this way; all other loops, such as
+    those that fill projections, profiles or lists as they go, still run in
+    the calling process unless they are given *max_workers* directly.
+
+    Parameters
+    ----------
+    max_workers : int
+        The largest number of worker processes to start for each loop.  By
+        default, one for each available core.
+    """
+    global local_parallel_workers
+    from .local_pool import get_local_workers
+    local_parallel_workers = get_local_workers(max_workers)
+    mylog.info("Local parallel computation enabled with %s workers",
+               local_parallel_workers)
+    return True
+
 # Because the dtypes will == correctly but do not hash the same, we need this
 # function for dictionary access.
 def get_mpi_type(dtype):
@@ -413,7 +439,7 @@ class ResultsStorage(object):
     result_id = None
 
 def parallel_objects(objects, njobs = 0, storage = None, barrier = True,
-                     dynamic = False):
+                     dynamic = False, max_workers = None):
     r"""This function dispatches components of an iterable to different
     processors.
 
@@ -450,6 +476,15 @@ def parallel_objects(objects, njobs = 0, storage = None, barrier = True,
         This requires one dedicated processor; if this is enabled with a set of
         128 processors available, only 127 will be available to iterate over
         objects as one will be load balancing the rest.
+    max_workers : int
+        If yt is not running under MPI, iterate using a pool of at most this
+        many forked worker processes on the local machine.  If this is 0,
+        the number given to :func:`enable_local_parallelism` is used, and
+        the loop runs serially if that has not been called.  By default, or
+        if this is 1, the loop runs serially.  As under MPI, the body of the
+        loop runs in the workers, so only results assigned to *storage* are
+        seen after the loop.  Breaking out of a loop run by the pool is not
+        supported, and raises a RuntimeError.
 
 
     Examples
@@ -475,7 +510,21 @@ def parallel_objects(objects, njobs = 0, storage = None, barrier = True,
     ...
 
     """
-    if dynamic:
+    if not parallel_capable and njobs != 1:
+        # Loops may work by side effect, which would be lost in the
+        # workers, so they only use the pool when they ask for it.
+        if max_workers == 0:
+            max_workers = local_parallel_workers
+        if max_workers is not None and max_workers != 1:
+            from .local_pool import local_parallel_objects
+            if njobs > 0:
+                max_workers = min(max_workers, njobs)
+            for my_obj in local_parallel_objects(objects, max_workers,
+                                                 storage=storage):
+                yield my_obj
+            return
+
+    if dynamic and parallel_capable:
         from .task_queue import dynamic_parallel_objects
         for my_obj in dynamic_parallel_objects(objects, njobs=njobs,
                                                storage=storage):
@@ -117,11 +117,20 @@ class TaskQueueRoot(TaskQueueNonRoot):
         if self._notified >= self.njobs:
             raise StopIteration
 
+def _local_task_objects(tasks, njobs, storage):
+    # Without MPI, the local pool already hands out tasks one at a time.
+    from .parallel_analysis_interface import parallel_objects
+    max_workers = 0
+    if njobs > 0: max_workers = njobs
+    return parallel_objects(tasks, storage=storage, max_workers=max_workers)
+
 def task_queue(func, tasks, njobs=0):
-    comm = _get_comm(())
     if not parallel_capable:
-        mylog.error("Cannot create task queue for serial process.")
-        raise RuntimeError
+        results = {}
+        for sto, task in _local_task_objects(tasks, njobs, results):
+            sto.result = func(task)
+        return results
+    comm = _get_comm(())
     my_size = comm.comm.size
     if njobs <= 0:
         njobs = my_size - 1
@@ -146,10 +155,11 @@ def task_queue(func, tasks, njobs=0):
     return my_q.run(func)
 
 def dynamic_parallel_objects(tasks, njobs=0, storage=None, broadcast=True):
-    comm = _get_comm(())
     if not parallel_capable:
-        mylog.error("Cannot create task queue for serial process.")
-        raise RuntimeError
+        for my_obj in _local_task_objects(tasks, njobs, storage):
+            yield my_obj
+        return
+    comm = _get_comm(())
     my_size = comm.comm.size
     if njobs <= 0:
         njobs = my_size - 1
@@ -16,7 +16,8 @@ Test cosmology calculator.
 
 from yt.testing import *
 from yt.utilities.cosmology import \
-     Cosmology
+     Cosmology, \
+     trapzint
 
 def test_hubble_time():
     """
@@ -43,3 +44,43 @@ def test_z_t_conversion():
         t = co.t_from_z(z1)
         z2 = co.z_from_t(t)
         yield assert_rel_equal, z1, z2, 10
+
+def test_cosmology_table():
+    """
+    Make sure the tabulated integrals agree with direct integration and
+    that arrays give the same answers as scalars.
+
+    """
+
+    for omega_matter, omega_lambda, omega_curvature in \
+      [(0.27, 0.73, 0.0), (0.3, 0.0, 0.7), (0.3, 0.6, 0.1)]:
+        co = Cosmology(omega_matter=omega_matter, omega_lambda=omega_lambda,
+                       omega_curvature=omega_curvature)
+        z = np.array([0.0, 0.5, 3.0, 20.0, 1100.0, 2e6])
+        d = co.comoving_radial_distance(0.0, z)
+        for i in range(1, z.size):
+            d_i = co.hubble_distance() * \
+              trapzint(co.inverse_expansion_factor, 0.0, z[i], bins=100000)
+            yield assert_rel_equal, d[i], d_i, 4
+            yield assert_rel_equal, d[i], \
+              co.comoving_radial_distance(0.0, z[i]), 12
+        t = co.t_from_z(z)
+        yield assert_rel_equal, co.z_from_t(t)[1:-1], z[1:-1], 10
+        yield assert_rel_equal, t, co.hubble_time(z, z_inf=1e12), 5
+
+def test_closed_cosmology_table():
+    """
+    Make sure the table of a closed cosmology, whose expansion factor is
+    imaginary at low redshift, has no NaNs at the redshifts it reaches.
+
+    """
+
+    co = Cosmology(omega_matter=1.5, omega_lambda=0.0, omega_curvature=-0.5)
+    z = np.array([0.0, 0.5, 3.0, 20.0])
+    d = co.comoving_radial_distance(0.0, z)
+    yield assert_equal, np.isnan(d).any(), False
+    for i in range(1, z.size):
+        d_i = co.hubble_distance() * \
+          trapzint(co.inverse_expansion_factor, 0.0, z[i], bins=100000)
+        yield assert_rel_equal, d[i], d_i, 4
+    yield assert_equal, np.isnan(co.t_from_z(z)).any(), False
@@ -0,0 +1,94 @@
+"""
+Tests for the local process-pool backend of parallel_objects
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2015, yt Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import os
+
+from yt.testing import assert_equal, assert_raises, fake_random_ds
+from yt.data_objects.profiles import create_profile
+from yt.utilities.parallel_tools import parallel_analysis_interface
+from yt.utilities.parallel_tools.parallel_analysis_interface import \
+    parallel_objects, enable_local_parallelism
+from yt.utilities.parallel_tools.task_queue import task_queue
+
+def test_local_parallel_objects():
+    for max_workers in [1, 2, 4]:
+        storage = {}
+        for sto, i in parallel_objects(range(20), storage=storage,
+                                       max_workers=max_workers):
+            sto.result = i**2
+        yield assert_equal, storage, dict((i, i**2) for i in range(20))
+
+def _fail_on_three():
+    for sto, i in parallel_objects(range(8), storage={}, max_workers=2):
+        if i == 3:
+            raise RuntimeError
+        sto.result = i
+
+def test_local_parallel_objects_failure():
+    assert_raises(RuntimeError, _fail_on_three)
+
+def _square(i):
+    return i**2
+
+def test_local_task_queue():
+    results = task_queue(_square, list(range(10)), njobs=2)
+    yield assert_equal, results, dict((i, i**2) for i in range(10))
+    storage = {}
+    for sto, i in parallel_objects(range(10), storage=storage, dynamic=True):
+        sto.result = i**2
+    yield assert_equal, storage, dict((i, i**2) for i in range(10))
+
+def _side_effect_results(ds):
+    dd = ds.all_data()
+    prj = ds.proj("density", 2, weight_field="density")
+    prof = create_profile(dd, "density", "cell_mass", n_bins=16)
+    return (prj["density"], prof["cell_mass"],
+            dd.quantities.total_quantity("cell_mass"))
+
+def test_local_parallelism_side_effects():
+    # Loops that fill their results as they go, rather than through
+    # storage, must not be handed to the local workers.
+    ds = fake_random_ds(16, nprocs=8)
+    serial = _side_effect_results(ds)
+    enable_local_parallelism(2)
+    try:
+        local = _side_effect_results(ds)
+    finally:
+        parallel_analysis_interface.local_parallel_workers = None
+    for a, b in zip(local, serial):
+        yield assert_equal, a, b
+
+def _loop_pids(**kwargs):
+    storage = {}
+    for sto, i in parallel_objects(range(8), storage=storage, **kwargs):
+        sto.result = os.getpid()
+    return set(storage.values())
+
+def test_local_parallelism_opt_in():
+    # Only loops that ask for the pool with max_workers=0 are handed to
+    # it, even when they collect their results in storage.
+    assert_equal(_loop_pids(max_workers=0), set([os.getpid()]))
+    enable_local_parallelism(2)
+    try:
+        yield assert_equal, _loop_pids(), set([os.getpid()])
+        pids = _loop_pids(max_workers=0)
+        yield assert_equal, os.getpid() in pids, False
+        side = []
+        for sto, i in parallel_objects(range(8), storage={}):
+            side.append(i)
+            sto.result = i
+        yield assert_equal, side, list(range(8))
+    finally:
+        parallel_analysis_interface.local_parallel_workers = None
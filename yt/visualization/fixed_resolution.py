@@ -20,7 +20,7 @@ from .fixed_resolution_filters import apply_filter, filter_registry
 from yt.data_objects.image_array import ImageArray
 from yt.utilities.lib.pixelization_routines import \
     pixelize_cylinder
-from yt.utilities.lib.api import add_points_to_greyscale_image
+from yt.utilities.lib.image_utilities import bin_points_to_image
 from yt.frontends.stream.api import load_uniform_grid
 
 from . import _MPL
@@ -88,6 +88,9 @@ class FixedResolutionBuffer(object):
                        ('index', 'r'), ('index', 'dr'),
                        ('index', 'phi'), ('index', 'dphi'),
                        ('index', 'theta'), ('index', 'dtheta'))
+    # Subclasses that make their images some other way than through the
+    # coordinate handler's pixelizers make them one at a time.
+    _pixelize_together = True
     def __init__(self, data_source, bounds, buff_size, antialias = True,
                  periodic = False):
         self.data_source = data_source
@@ -125,37 +128,59 @@ class FixedResolutionBuffer(object):
 
     def __getitem__(self, item):
         if item in self.data: return self.data[item]
+        self._pixelize_fields([item])
+        return self.data[item]
+
+    def __setitem__(self, item, val):
+        self.data[item] = val
+
+    def _pixelize_fields(self, fields):
+        # All of the fields are handed to the pixelizer together, so that
+        # it can deposit them in a single pass over the data source.
+        fields = [f for f in fields if f not in self.data]
+        if len(fields) == 0: return
         mylog.info("Making a fixed resolution buffer of (%s) %d by %d" % \
-            (item, self.buff_size[0], self.buff_size[1]))
+            (", ".join(str(f) for f in fields),
+             self.buff_size[0], self.buff_size[1]))
         bounds = []
         for b in self.bounds:
             if hasattr(b, "in_units"):
                 b = float(b.in_units("code_length"))
             bounds.append(b)
-        buff = self.ds.coordinates.pixelize(self.data_source.axis,
-            self.data_source, item, bounds, self.buff_size,
+        buffs = self.ds.coordinates.pixelize_many(self.data_source.axis,
+            self.data_source, fields, bounds, self.buff_size,
             int(self.antialias))
-
-        for name, (args, kwargs) in self._filters:
-            buff = filter_registry[name](*args[1:], **kwargs).apply(buff)
-
-        # Need to add _period and self.periodic
-        # self._period, int(self.periodic)
-        ia = ImageArray(buff, input_units=self.data_source[item].units,
-                        info=self._get_info(item))
-        self.data[item] = ia
-        return self.data[item]
-
-    def __setitem__(self, item, val):
-        self.data[item] = val
+        for item, buff in zip(fields, buffs):
+            # Images made straight from particles come back with their
+            # units, since the data source may not have the field at all.
+            if hasattr(buff, "units"):
+                units = buff.units
+            else:
+                units = self.data_source[item].units
+
+            for name, (args, kwargs) in self._filters:
+                buff = filter_registry[name](*args[1:], **kwargs).apply(buff)
+
+            # Need to add _period and self.periodic
+            # self._period, int(self.periodic)
+            ia = ImageArray(buff, input_units=units,
+                            info=self._get_info(item))
+            self.data[item] = ia
+
+    def _get_fields(self, fields):
+        r"""Make the images of several fields, pixelizing all of those that
+        have not been made yet together."""
+        if self._pixelize_together:
+            self._pixelize_fields(fields)
+        for f in fields:
+            self[f]
 
     def _get_data_source_fields(self):
         exclude = self.data_source._key_fields + list(self._exclude_fields)
         fields = getattr(self.data_source, "fields", [])
         fields += getattr(self.data_source, "field_data", {}).keys()
-        for f in fields:
-            if f not in exclude and f[0] not in self.data_source.ds.particle_types:
-                self[f]
+        self._get_fields([f for f in fields if f not in exclude and
+                          f[0] not in self.data_source.ds.particle_types])
 
     def _is_ion( self, fname ):
         p = re.compile("_p[0-9]+_")
@@ -407,6 +432,7 @@ class CylindricalFixedResolutionBuffer(FixedResolutionBuffer):
     :class:`yt.visualization.fixed_resolution.FixedResolutionBuffer`
     that supports non-aligned input data objects, primarily cutting planes.
     """
+    _pixelize_together = False
     def __init__(self, data_source, radius, buff_size, antialias = True) :
 
         self.data_source = data_source
@@ -435,14 +461,23 @@ class ObliqueFixedResolutionBuffer(FixedResolutionBuffer):
     :class:`yt.visualization.fixed_resolution.FixedResolutionBuffer`
     that supports non-aligned input data objects, primarily cutting planes.
     """
+    _pixelize_together = False
     def __getitem__(self, item):
         if item in self.data: return self.data[item]
-        indices = np.argsort(self.data_source['dx'])[::-1]
         bounds = []
         for b in self.bounds:
             if hasattr(b, "in_units"):
                 b = float(b.in_units("code_length"))
             bounds.append(b)
+        if self.ds.coordinates.sph_pixelize_field(
+                self.data_source, item) is not None:
+            buff = self.ds.coordinates.sph_pixelize(self.data_source, item,
+                bounds, self.buff_size)
+            ia = ImageArray(buff, input_units=buff.units,
+                            info=self._get_info(item))
+            self[item] = ia
+            return ia
+        indices = np.argsort(self.data_source['dx'])[::-1]
         buff = _MPL.CPixelize( self.data_source['x'],   self.data_source['y'],   self.data_source['z'],
                                self.data_source['px'],  self.data_source['py'],
                                self.data_source['pdx'], self.data_source['pdy'], self.data_source['pdz'],
@@ -462,6 +497,7 @@ class OffAxisProjectionFixedResolutionBuffer(FixedResolutionBuffer):
     :class:`yt.visualization.fixed_resolution.FixedResolutionBuffer`
     that supports off axis projections.  This calls the volume renderer.
     """
+    _pixelize_together = False
     def __init__(self, data_source, bounds, buff_size, antialias = True,
                  periodic = False):
         self.data = {}
@@ -475,11 +511,24 @@ class OffAxisProjectionFixedResolutionBuffer(FixedResolutionBuffer):
         width = self.ds.arr((self.bounds[1] - self.bounds[0],
                              self.bounds[3] - self.bounds[2],
                              self.bounds[5] - self.bounds[4]))
+        if self.ds.coordinates.sph_pixelize_field(dd, item) is not None:
+            if width.units.is_dimensionless:
+                w = width.d
+            else:
+                w = width.in_units("code_length").d
+            bounds = (-w[0] / 2.0, w[0] / 2.0, -w[1] / 2.0, w[1] / 2.0)
+            buff = self.ds.coordinates.sph_pixelize(dd, item, bounds,
+                self.buff_size, depth = w[2])
+            ia = ImageArray(buff, input_units=buff.units,
+                            info=self._get_info(item))
+            self[item] = ia
+            return ia
         buff = off_axis_projection(dd.ds, dd.center, dd.normal_vector,
                                    width, dd.resolution, item,
                                    weight=dd.weight_field, volume=dd.volume,
                                    no_ghost=dd.no_ghost, interpolated=dd.interpolated,
-                                   north_vector=dd.north_vector, method=dd.method)
+                                   north_vector=dd.north_vector, method=dd.method,
+                                   splat=dd.splat, antialias=self.antialias)
         units = Unit(dd.ds.field_info[item].units, registry=dd.ds.unit_registry)
         if dd.weight_field is None and dd.method == "integrate":
             units *= Unit('cm', registry=dd.ds.unit_registry)
@@ -497,6 +546,7 @@ class ParticleImageBuffer(FixedResolutionBuffer):
     buffer.
 
     """
+    _pixelize_together = False
     def __init__(self, data_source, bounds, buff_size, antialias=True,
                  periodic=False):
         self.data = {}
@@ -524,41 +574,31 @@ class ParticleImageBuffer(FixedResolutionBuffer):
                 b = float(b.in_units("code_length"))
             bounds.append(b)
 
-        x_data = self.data_source.dd[self.x_field]
-        y_data = self.data_source.dd[self.y_field]
+        px = np.asarray(self.data_source.dd[self.x_field].in_units(
+            "code_length"), dtype="float64")
+        py = np.asarray(self.data_source.dd[self.y_field].in_units(
+            "code_length"), dtype="float64")
         data = self.data_source.dd[item]
 
-        # convert to pixels
-        px = (x_data - self.bounds[0]) / (self.bounds[1] - self.bounds[0])
-        py = (y_data - self.bounds[2]) / (self.bounds[3] - self.bounds[2])
-
-        # select only the particles that will actually show up in the image
-        mask = np.logical_and(np.logical_and(px >= 0.0, px <= 1.0),
-                              np.logical_and(py >= 0.0, py <= 1.0))
-
         weight_field = self.data_source.weight_field
         if weight_field is None:
-            weight_data = np.ones_like(data.v)
+            splat_vals = data
         else:
             weight_data = self.data_source.dd[weight_field]
-        splat_vals = weight_data[mask]*data[mask]
-
-        # splat particles
-        buff = np.zeros(self.buff_size)
-        add_points_to_greyscale_image(buff,
-                                      px[mask],
-                                      py[mask],
-                                      splat_vals)
+            splat_vals = weight_data*data
+
+        # splat particles, skipping those that don't show up in the image
+        buff_shape = (self.buff_size[1], self.buff_size[0])
+        buff = np.zeros(buff_shape, dtype="float64")
+        bin_points_to_image(buff, px, py, np.asarray(splat_vals), bounds)
         ia = ImageArray(buff, input_units=data.units,
                         info=self._get_info(item))
 
         # divide by the weight_field, if needed
         if weight_field is not None:
-            weight_buff = np.zeros(self.buff_size)
-            add_points_to_greyscale_image(weight_buff,
-                                          px[mask],
-                                          py[mask],
-                                          weight_data[mask])
+            weight_buff = np.zeros(buff_shape, dtype="float64")
+            bin_points_to_image(weight_buff, px, py,
+                                np.asarray(weight_data), bounds)
             weight_array = ImageArray(weight_buff,
                                       input_units=weight_data.units,
                                       info=self._get_info(item))
@@ -35,6 +35,7 @@ from yt.utilities.physical_constants import \
 from yt.units.yt_array import YTQuantity, YTArray
 from yt.visualization.image_writer import apply_colormap
 from yt.utilities.lib.geometry_utils import triangle_plane_intersect
+from yt.utilities.lib.image_utilities import bin_points_to_image
 from yt.analysis_modules.cosmological_observation.light_ray.light_ray \
      import periodic_ray
 import warnings
@@ -564,80 +565,114 @@ class GridBoundaryCallback(PlotCallback):
         ax = plot.data.axis
         px_index = plot.data.ds.coordinates.x_axis[ax]
         py_index = plot.data.ds.coordinates.y_axis[ax]
-        DW = plot.data.ds.domain_width
+        DW = plot.data.ds.domain_width.in_units("code_length").d
+        x0, y0 = [np.float64(v.in_units("code_length"))
+                  if hasattr(v, "in_units") else np.float64(v)
+                  for v in (x0, y0)]
         if self.periodic:
             pxs, pys = np.mgrid[-1:1:3j,-1:1:3j]
         else:
             pxs, pys = np.mgrid[0:0:1j,0:0:1j]
-        GLE, GRE, levels = [], [], []
-        for block, mask in plot.data.blocks:
-            GLE.append(block.LeftEdge.in_units("code_length"))
-            GRE.append(block.RightEdge.in_units("code_length"))
-            levels.append(block.Level)
-        if len(GLE) == 0: return
-        # Retain both units and registry
-        GLE = YTArray(GLE, input_units = GLE[0].units)
-        GRE = YTArray(GRE, input_units = GRE[0].units)
-        levels = np.array(levels)
+        GLE, GRE, levels, ids = self._get_grid_bounds(plot.data)
+        if len(levels) == 0: return
         min_level = self.min_level or 0
         max_level = self.max_level or levels.max()
+        in_levels = (levels >= min_level) & (levels <= max_level)
+
+        # Grids can either be set by edgecolors OR a colormap.
+        draw_levels = np.unique(levels[in_levels])
+        if self.edgecolors is not None:
+            edgecolors = [colorConverter.to_rgba(
+                self.edgecolors, alpha=self.alpha)] * draw_levels.size
+        elif self.cmap is not None:
+            # use colormap if not explicity overridden by edgecolors
+            color_bounds = [0,plot.data.ds.index.max_level]
+            edgecolors = apply_colormap(
+                draw_levels*1.0, color_bounds=color_bounds,
+                cmap_name=self.cmap)[0,:,:]*1.0/255.
+            edgecolors[:,3] = self.alpha
+        else:
+            edgecolors = [(0.0,0.0,0.0,self.alpha)] * draw_levels.size
 
-        # sorts the three arrays in order of ascending level - this makes images look nicer
-        new_indices = np.argsort(levels)
-        levels = levels[new_indices]
-        GLE = GLE[new_indices]
-        GRE = GRE[new_indices]
-
+        segments = dict((level, []) for level in draw_levels)
+        labels = []
         for px_off, py_off in zip(pxs.ravel(), pys.ravel()):
             pxo = px_off * DW[px_index]
             pyo = py_off * DW[py_index]
-            left_edge_x = np.array((GLE[:,px_index]+pxo-x0)*dx) + xx0
-            left_edge_y = np.array((GLE[:,py_index]+pyo-y0)*dy) + yy0
-            right_edge_x = np.array((GRE[:,px_index]+pxo-x0)*dx) + xx0
-            right_edge_y = np.array((GRE[:,py_index]+pyo-y0)*dy) + yy0
+            left_edge_x = (GLE[:,px_index]+pxo-x0)*dx + xx0
+            left_edge_y = (GLE[:,py_index]+pyo-y0)*dy + yy0
+            right_edge_x = (GRE[:,px_index]+pxo-x0)*dx + xx0
+            right_edge_y = (GRE[:,py_index]+pyo-y0)*dy + yy0
             xwidth = xpix * (right_edge_x - left_edge_x) / (xx1 - xx0)
             ywidth = ypix * (right_edge_y - left_edge_y) / (yy1 - yy0)
-            visible = np.logical_and(
-                np.logical_and(xwidth > self.min_pix, ywidth > self.min_pix),
-                np.logical_and(levels >= min_level, levels <= max_level))
-
-            # Grids can either be set by edgecolors OR a colormap.
-            if self.edgecolors is not None:
-                edgecolors = colorConverter.to_rgba(
-                    self.edgecolors, alpha=self.alpha)
-            else:  # use colormap if not explicity overridden by edgecolors
-                if self.cmap is not None:
-                    color_bounds = [0,plot.data.ds.index.max_level]
-                    edgecolors = apply_colormap(
-                        levels[visible]*1.0, color_bounds=color_bounds,
-                        cmap_name=self.cmap)[0,:,:]*1.0/255.
-                    edgecolors[:,3] = self.alpha
-                else:
-                    edgecolors = (0.0,0.0,0.0,self.alpha)
-
-            if visible.nonzero()[0].size == 0: continue
-            verts = np.array(
-                [(left_edge_x, left_edge_x, right_edge_x, right_edge_x),
-                 (left_edge_y, right_edge_y, right_edge_y, left_edge_y)])
-            verts=verts.transpose()[visible,:,:]
-            grid_collection = matplotlib.collections.PolyCollection(
-                verts, facecolors="none", edgecolors=edgecolors,
-                linewidth=self.linewidth)
-            plot._axes.hold(True)
-            plot._axes.add_collection(grid_collection)
+            on_plot = ((right_edge_x >= min(xx0, xx1)) &
+                       (left_edge_x <= max(xx0, xx1)) &
+                       (right_edge_y >= min(yy0, yy1)) &
+                       (left_edge_y <= max(yy0, yy1)) & in_levels)
+            visible = on_plot & (xwidth > self.min_pix) & \
+                                (ywidth > self.min_pix)
+            if not visible.any(): continue
+            # Each grid becomes its four edges, as (start, end) pairs.
+            lx, ly = left_edge_x[visible], left_edge_y[visible]
+            rx, ry = right_edge_x[visible], right_edge_y[visible]
+            corners = np.array([(lx, ly), (lx, ry), (rx, ry), (rx, ly)])
+            corners = corners.transpose((2, 0, 1))
+            edges = np.concatenate(
+                [corners[:,:,None,:], np.roll(corners, -1, axis=1)[:,:,None,:]],
+                axis=2)
+            vlevels = levels[visible]
+            for level in np.unique(vlevels):
+                segments[level].append(edges[vlevels == level].reshape(-1, 2, 2))
 
             if self.draw_ids:
-                visible_ids = np.logical_and(
-                    np.logical_and(xwidth > self.min_pix_ids,
-                                   ywidth > self.min_pix_ids),
-                    np.logical_and(levels >= min_level, levels <= max_level))
-                active_ids = np.unique(plot.data['grid_indices'])
+                visible_ids = on_plot & (xwidth > self.min_pix_ids) & \
+                                        (ywidth > self.min_pix_ids)
                 for i in np.where(visible_ids)[0]:
-                    plot._axes.text(
-                        left_edge_x[i] + (2 * (xx1 - xx0) / xpix),
-                        left_edge_y[i] + (2 * (yy1 - yy0) / ypix),
-                        "%d" % active_ids[i], clip_on=True)
-            plot._axes.hold(False)
+                    labels.append((left_edge_x[i] + (2 * (xx1 - xx0) / xpix),
+                                   left_edge_y[i] + (2 * (yy1 - yy0) / ypix),
+                                   ids[i]))
+
+        plot._axes.hold(True)
+        # Ascending levels, so that finer grids are drawn on top.
+        for level, color in zip(draw_levels, edgecolors):
+            if len(segments[level]) == 0: continue
+            grid_collection = matplotlib.collections.LineCollection(
+                np.concatenate(segments[level]), colors=[color],
+                linewidth=self.linewidth)
+            plot._axes.add_collection(grid_collection)
+        for x, y, grid_id in labels:
+            plot._axes.text(x, y, "%d" % grid_id, clip_on=True)
+        plot._axes.hold(False)
+
+    def _get_grid_bounds(self, data):
+        # Returns the edges (in code_length, without units), levels and
+        # indices of the grids the plotted data touches.
+        index = data.ds.index
+        if not hasattr(index, "grid_left_edge"):
+            # Octree and particle indices have no grid arrays, so we get
+            # the block edges from the data itself.
+            GLE, GRE, levels = [], [], []
+            for block, mask in data.blocks:
+                GLE.append(block.LeftEdge.in_units("code_length").d)
+                GRE.append(block.RightEdge.in_units("code_length").d)
+                levels.append(block.Level)
+            ids = np.arange(len(levels))
+            GLE = np.array(GLE).reshape((-1, 3))
+            GRE = np.array(GRE).reshape((-1, 3))
+            return GLE, GRE, np.array(levels, dtype="int64"), ids
+        GLE = index.grid_left_edge
+        GRE = index.grid_right_edge
+        levels = index.grid_levels
+        ids = np.arange(index.num_grids)
+        # Projections select through their data source; their own selector
+        # property raises rather than returning None.
+        source = getattr(data, "data_source", data)
+        selector = getattr(source, "selector", None)
+        if selector is not None:
+            ids = ids[selector.select_grids(GLE, GRE, levels)]
+        GLE = GLE[ids].in_units("code_length").d
+        GRE = GRE[ids].in_units("code_length").d
+        return GLE, GRE, levels[ids, 0].astype("int64"), ids
 
 class StreamlineCallback(PlotCallback):
     """
@@ -1415,7 +1450,8 @@ class HaloCatalogCallback(PlotCallback):
 class ParticleCallback(PlotCallback):
     """
     annotate_particles(width, p_size=1.0, col='k', marker='o', stride=1.0,
-                       ptype=None, minimum_mass=None, alpha=1.0)
+                       ptype=None, minimum_mass=None, alpha=1.0,
+                       raster=None)
 
     Adds particle positions, based on a thick slab along *axis* with a
     *width* along the line of sight.  *p_size* controls the number of
@@ -1424,12 +1460,22 @@ class ParticleCallback(PlotCallback):
     Particles with masses below *minimum_mass* will not be plotted.
     *alpha* determines the opacity of the marker symbol used in the scatter
     plot.
+
+    With many particles, drawing a marker for each is slow and makes very
+    large vector images.  If *raster* is set, the particles are instead
+    binned into the pixels of the plot and drawn as an image in *col* on
+    top of it; *p_size* and *marker* are then ignored.  *raster* may be
+    "alpha", where each particle covers its pixel with opacity *alpha*, so
+    that crowded pixels become more opaque; "count", where the opacity of
+    each pixel scales with the logarithm of the number of particles in it;
+    or "mass", where it scales with the logarithm of their total mass.
     """
     _type_name = "particles"
     region = None
     _descriptor = None
+    _raster_modes = ("alpha", "count", "mass")
     def __init__(self, width, p_size=1.0, col='k', marker='o', stride=1.0,
-                 ptype='all', minimum_mass=None, alpha=1.0):
+                 ptype='all', minimum_mass=None, alpha=1.0, raster=None):
         PlotCallback.__init__(self)
         self.width = width
         self.p_size = p_size
@@ -1439,6 +1485,10 @@ class ParticleCallback(PlotCallback):
         self.ptype = ptype
         self.minimum_mass = minimum_mass
         self.alpha = alpha
+        if raster is not None and raster not in self._raster_modes:
+            raise SyntaxError("raster must be one of %s, or None." %
+                              ", ".join(self._raster_modes))
+        self.raster = raster
 
     def __call__(self, plot):
         data = plot.data
@@ -1466,15 +1516,51 @@ class ParticleCallback(PlotCallback):
             gg &= (reg[pt, "particle_mass"] >= self.minimum_mass)
             if gg.sum() == 0: return
         plot._axes.hold(True)
-        px, py = self.convert_to_plot(plot,
-                    [np.array(reg[pt, field_x][gg][::self.stride]),
-                     np.array(reg[pt, field_y][gg][::self.stride])])
-        plot._axes.scatter(px, py, edgecolors='None', marker=self.marker,
-                           s=self.p_size, c=self.color,alpha=self.alpha)
+        if self.raster is not None:
+            self._draw_raster(plot, reg, gg, field_x, field_y)
+        else:
+            px, py = self.convert_to_plot(plot,
+                        [np.array(reg[pt, field_x][gg][::self.stride]),
+                         np.array(reg[pt, field_y][gg][::self.stride])])
+            plot._axes.scatter(px, py, edgecolors='None', marker=self.marker,
+                               s=self.p_size, c=self.color,alpha=self.alpha)
         plot._axes.set_xlim(xx0,xx1)
         plot._axes.set_ylim(yy0,yy1)
         plot._axes.hold(False)
 
+    def _draw_raster(self, plot, reg, gg, field_x, field_y):
+        pt = self.ptype
+        ny, nx = plot.image._A.shape[:2]
+        bounds = [float(b.in_units("code_length")) if hasattr(b, "in_units")
+                  else float(b) for b in plot.xlim + plot.ylim]
+        px = np.array(reg[pt, field_x][gg][::self.stride].in_units(
+            "code_length"), dtype="float64")
+        py = np.array(reg[pt, field_y][gg][::self.stride].in_units(
+            "code_length"), dtype="float64")
+        weights = None
+        if self.raster == "mass":
+            weights = np.array(reg[pt, "particle_mass"][gg][::self.stride],
+                               dtype="float64")
+        buff = np.zeros((ny, nx), dtype="float64")
+        bin_points_to_image(buff, px, py, weights, bounds)
+        filled = buff > 0
+        if not filled.any(): return
+        if self.raster == "alpha":
+            # Laying n markers of opacity alpha over one another.
+            opacity = 1.0 - (1.0 - self.alpha)**buff
+        else:
+            low = buff[filled].min()
+            opacity = np.zeros_like(buff)
+            opacity[filled] = np.log10(buff[filled] / low) + 1.0
+            opacity *= self.alpha / opacity.max()
+        image = np.zeros((ny, nx, 4), dtype="float64")
+        image[:,:,:3] = colorConverter.to_rgb(self.color)
+        image[:,:,3] = opacity
+        xx0, xx1 = plot._axes.get_xlim()
+        yy0, yy1 = plot._axes.get_ylim()
+        plot._axes.imshow(image, origin='lower', interpolation='nearest',
+                          extent=[xx0, xx1, yy0, yy1], aspect='auto')
+
 
     def _get_region(self, xlim, ylim, axis, data):
         LE, RE = [None]*3, [None]*3
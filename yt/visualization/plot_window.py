@@ -309,13 +309,12 @@ class PlotWindow(ImagePlotContainer):
             self._frb._get_data_source_fields()
         else:
             # Restore the old fields
+            self._frb._get_fields(old_fields)
             for key, unit in zip(old_fields, old_units):
-                self._frb[key]
                 self._frb[key].convert_to_units(unit)
 
         # Restore the override fields
-        for key in self.override_fields:
-            self._frb[key]
+        self._frb._get_fields(self.override_fields)
 
     @property
     def width(self):
@@ -737,7 +736,9 @@ class PWViewerMPL(PlotWindow):
             self._recreate_frb()
             self._data_valid = True
         self._colorbar_valid = True
-        for f in list(set(self.data_source._determine_fields(self.fields))):
+        fields = list(set(self.data_source._determine_fields(self.fields)))
+        self.frb._get_fields(fields)
+        for f in fields:
             axis_index = self.data_source.axis
 
             xc, yc = self._setup_origin()
@@ -1534,7 +1535,7 @@ class OffAxisProjectionDummyDataSource(object):
     def __init__(self, center, ds, normal_vector, width, fields,
                  interpolated, resolution = (800,800), weight=None,
                  volume=None, no_ghost=False, le=None, re=None,
-                 north_vector=None, method="integrate"):
+                 north_vector=None, method="integrate", splat=False):
         self.center = center
         self.ds = ds
         self.axis = 4 # always true for oblique data objects
@@ -1552,6 +1553,7 @@ class OffAxisProjectionDummyDataSource(object):
         self.re = re
         self.north_vector = north_vector
         self.method = method
+        self.splat = splat
         self.orienter = Orientation(normal_vector, north_vector=north_vector)
 
     def _determine_fields(self, *args):
@@ -1639,6 +1641,10 @@ class OffAxisProjectionPlot(PWViewerMPL):
          just a straight summation of the field along the given axis. WARNING:
          This should only be used for uniform resolution grid datasets, as other
          datasets may result in unphysical images.
+    splat : boolean
+         If True, project by adding the footprint of each cell to the image
+         rather than by ray casting, antialiased if the plot is.  This needs
+         no ghost zones and works for any index.
     """
     _plot_type = 'OffAxisProjection'
     _frb_generator = OffAxisProjectionFixedResolutionBuffer
@@ -1646,7 +1652,8 @@ class OffAxisProjectionPlot(PWViewerMPL):
     def __init__(self, ds, normal, fields, center='c', width=None,
                  depth=(1, '1'), axes_unit=None, weight_field=None,
                  max_level=None, north_vector=None, volume=None, no_ghost=False,
-                 le=None, re=None, interpolated=False, fontsize=18, method="integrate"):
+                 le=None, re=None, interpolated=False, fontsize=18, method="integrate",
+                 splat=False):
         (bounds, center_rot) = \
           get_oblique_window_parameters(normal,center,width,ds,depth=depth)
         fields = ensure_list(fields)[:]
@@ -1656,7 +1663,8 @@ class OffAxisProjectionPlot(PWViewerMPL):
         OffAxisProj = OffAxisProjectionDummyDataSource(
             center_rot, ds, normal, oap_width, fields, interpolated,
             weight=weight_field,  volume=volume, no_ghost=no_ghost,
-            le=le, re=re, north_vector=north_vector, method=method)
+            le=le, re=re, north_vector=north_vector, method=method,
+            splat=splat)
         # If a non-weighted, integral projection, assure field-label reflects that
         if weight_field is None and OffAxisProj.method == "integrate":
             self.projected = True
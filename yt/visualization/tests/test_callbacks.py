@@ -14,12 +14,16 @@ from __future__ import absolute_import
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 import os, tempfile, shutil
+import numpy as np
 from yt.testing import \
-    fake_amr_ds
+    fake_amr_ds, fake_random_ds, assert_equal, assert_almost_equal, \
+    assert_raises
 import yt.units as u
 from .test_plotwindow import assert_fname
 from yt.visualization.api import \
     SlicePlot, ProjectionPlot, OffAxisSlicePlot
+from yt.visualization.plot_modifications import \
+    GridBoundaryCallback, ParticleCallback
 import contextlib
 
 # These are a very simple set of tests that verify that each callback is or is
@@ -45,7 +49,7 @@ import contextlib
 #    hop_particles
 #    coord_axes
 #  X text
-#    particles
+#  X particles
 #    title
 #    flash_ray_data
 #  X timestamp
@@ -326,3 +330,79 @@ def test_grids_callback():
             max_level=3, cmap="gist_stern")
         p.save(prefix)
 
+def test_grids_callback_bounds():
+    ds = fake_amr_ds(fields = ("density",))
+    callback = GridBoundaryCallback()
+    for data in [ds.slice(0, 0.31), ds.proj("density", 1)]:
+        GLE, GRE, levels, ids = callback._get_grid_bounds(data)
+        block_ids = sorted(set(block.id - block._id_offset
+                               for block, mask in data.blocks))
+        yield assert_equal, sorted(ids), block_ids
+        yield assert_equal, GLE, \
+            ds.index.grid_left_edge[ids].in_units("code_length").d
+
+def test_particles_callback():
+    with _cleanup_fname() as prefix:
+        ds = fake_random_ds(16, particles=1000)
+        for ax in 'xyz':
+            p = ProjectionPlot(ds, ax, "density")
+            p.annotate_particles(1.0)
+            yield assert_fname, p.save(prefix)[0]
+            p = SlicePlot(ds, ax, "density")
+            p.annotate_particles(1.0)
+            yield assert_fname, p.save(prefix)[0]
+        # Now we'll check a few additional minor things
+        p = SlicePlot(ds, "x", "density")
+        p.annotate_particles(1.0, p_size=2.0, col='r', marker='*',
+                             ptype='io', minimum_mass=0.5, alpha=0.5)
+        p.save(prefix)
+
+def _particle_image(ds, ax, shape, weighted=False):
+    # The particles binned into the pixels of a plot of the whole domain.
+    coords = ds.coordinates
+    axis = coords.axis_id[ax]
+    dd = ds.all_data()
+    px = dd["all", "particle_position_%s" %
+            coords.axis_name[coords.x_axis[axis]]].in_units("code_length").d
+    py = dd["all", "particle_position_%s" %
+            coords.axis_name[coords.y_axis[axis]]].in_units("code_length").d
+    weights = None
+    if weighted:
+        weights = dd["all", "particle_mass"].d
+    image, _, _ = np.histogram2d(py, px, bins=shape,
+                                 range=[[0.0, 1.0], [0.0, 1.0]],
+                                 weights=weights)
+    return image
+
+def test_particles_callback_raster():
+    with _cleanup_fname() as prefix:
+        ds = fake_random_ds(16, particles=1000)
+        alpha = 0.5
+        for ax in 'xyz':
+            for raster in ["alpha", "count", "mass"]:
+                p = SlicePlot(ds, ax, "density")
+                p.annotate_particles(1.0, col='r', alpha=alpha,
+                                     raster=raster)
+                yield assert_fname, p.save(prefix)[0]
+                plot = p.plots["density"]
+                image = plot.axes.images[-1]
+                # The particles are drawn over the whole of the plot.
+                yield assert_equal, list(image.get_extent()), \
+                    list(plot.axes.get_xlim() + plot.axes.get_ylim())
+                rgba = np.asarray(image.get_array())
+                shape = plot.image.get_array().shape[:2]
+                yield assert_equal, rgba.shape, shape + (4,)
+                yield assert_equal, rgba[:,:,:3], \
+                    np.ones(shape + (3,)) * [1.0, 0.0, 0.0]
+                binned = _particle_image(ds, ax, shape,
+                                         weighted=(raster == "mass"))
+                filled = binned > 0
+                if raster == "alpha":
+                    opacity = 1.0 - (1.0 - alpha)**binned
+                else:
+                    opacity = np.zeros(shape)
+                    opacity[filled] = \
+                        np.log10(binned[filled] / binned[filled].min()) + 1.0
+                    opacity *= alpha / opacity.max()
+                yield assert_almost_equal, rgba[:,:,3], opacity, 10
+        assert_raises(SyntaxError, ParticleCallback, 1.0, raster="density")
@@ -17,7 +17,7 @@ import os.path
 import tempfile
 import shutil
 from yt.testing import \
-    fake_random_ds, assert_equal, expand_keywords
+    fake_random_ds, assert_equal, assert_rel_equal, expand_keywords
 from yt.mods import \
     off_axis_projection, write_projection
 
@@ -80,3 +80,25 @@ def test_write_projection():
     os.chdir(curdir)
     # clean up
     shutil.rmtree(tmpdir)
+
+
+def test_splat_projection():
+    """Tests that splatting matches ray casting off_axis_projection."""
+    test_ds = fake_random_ds(32, nprocs=8)
+    c = [0.5, 0.5, 0.5]
+    norm = [0.3, 0.2, 0.9]
+    W = [0.5, 0.5, 1.0]
+    N = 32
+    for weight in (None, 'cell_mass'):
+        ray = off_axis_projection(test_ds, c, norm, W, N, "density",
+                                  weight=weight)
+        for num_threads in (1, 2):
+            image = off_axis_projection(test_ds, c, norm, W, N, "density",
+                                        weight=weight, splat=True,
+                                        num_threads=num_threads)
+            yield assert_equal, image.units, ray.units
+            yield assert_rel_equal, image, ray, 10
+        image = off_axis_projection(test_ds, c, norm, W, N, "density",
+                                    weight=weight, splat=True,
+                                    antialias=True)
+        yield assert_equal, image.shape, ray.shape
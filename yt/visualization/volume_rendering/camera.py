@@ -13,8 +13,11 @@ Import the components of the volume rendering extension
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
-from yt.extern.six.moves import builtins
+from yt.extern.six import reraise
+from yt.extern.six.moves import builtins, queue
 import numpy as np
+import sys
+import threading
 
 from yt.funcs import *
 from yt.utilities.math_utils import *
@@ -33,6 +36,8 @@ from yt.utilities.lib.grid_traversal import \
     pixelize_healpix, arr_fisheye_vectors
 from yt.utilities.lib.misc_utilities import \
     lines, rotate_vectors
+from yt.utilities.lib.pixelization_routines import \
+    pixelize_off_axis_projection
 
 from yt.utilities.math_utils import get_rotation_matrix
 from yt.utilities.orientation import Orientation
@@ -154,6 +159,7 @@ class Camera(ParallelAnalysisInterface):
     _pylab = None
     _tf_figure = None
     _render_figure = None
+    _batch_frames = True
     def __init__(self, center, normal_vector, width,
                  resolution, transfer_function = None,
                  north_vector = None, steady_north=False,
@@ -616,10 +622,7 @@ class Camera(ParallelAnalysisInterface):
         pbar = get_pbar("Ray casting", ncells)
         total_cells = 0
         if double_check:
-            for brick in self.volume.bricks:
-                for data in brick.my_data:
-                    if np.any(np.isnan(data)):
-                        raise RuntimeError
+            self._check_bricks()
 
         view_pos = self.front_center + self.orienter.unit_vectors[2] * 1.0e6 * self.width[2]
         for brick in self.volume.traverse(view_pos):
@@ -632,6 +635,38 @@ class Camera(ParallelAnalysisInterface):
         image = self.finalize_image(image)
         return image
 
+    def _check_bricks(self):
+        for brick in self.volume.bricks:
+            for data in brick.my_data:
+                if np.any(np.isnan(data)):
+                    raise RuntimeError
+
+    def _setup_frame(self, view):
+        # Everything the ray caster needs to know about a view is held by
+        # the sampler, so once this has been called the camera can be moved
+        # on to the next view while this one is being rendered.
+        if view is not None:
+            self.switch_view(**view)
+        image = self.new_image()
+        sampler = self.get_sampler(self.get_sampler_args(image))
+        view_pos = self.front_center + \
+            self.orienter.unit_vectors[2] * 1.0e6 * self.width[2]
+        return sampler, view_pos, deepcopy(self.get_information())
+
+    def _cast_frame(self, frame, num_threads):
+        sampler, view_pos, info = frame
+        for brick in self.volume.traverse(view_pos):
+            sampler(brick, num_threads=num_threads)
+        return sampler.aimage
+
+    def _finish_frame(self, frame, image, fn, clip_ratio, transparent):
+        image = ImageArray(self.finalize_image(image), info=frame[2])
+        # flip it up/down to handle how the png orientation is done
+        image = image[:,::-1,:]
+        self.save_image(image, fn=fn, clip_ratio=clip_ratio,
+                        transparent=transparent)
+        return image
+
     def show_tf(self):
         if self._pylab is None: 
             import pylab
@@ -837,7 +872,7 @@ class Camera(ParallelAnalysisInterface):
         self.width /= factor
         self._setup_box_properties(self.width, self.center, self.orienter.unit_vectors)
 
-    def zoomin(self, final, n_steps, clip_ratio = None):
+    def zoomin(self, final, n_steps, clip_ratio = None, batch_size = 1):
         r"""Loop over a zoomin and return snapshots along the way.
 
         This will yield `n_steps` snapshots until the current view has been
@@ -853,6 +888,9 @@ class Camera(ParallelAnalysisInterface):
         clip_ratio : float, optional
             If supplied, the 'max_val' argument to write_bitmap will be handed
             clip_ratio * image.std()
+        batch_size : int, optional
+            The number of snapshots to render at once; see
+            :meth:`render_frames`.  Default: 1
 
 
         Examples
@@ -862,11 +900,16 @@ class Camera(ParallelAnalysisInterface):
         ...     iw.write_bitmap(snapshot, "zoom_%04i.png" % i)
         """
         f = final**(1.0/n_steps)
-        for i in range(n_steps):
-            self.zoom(f)
-            yield self.snapshot(clip_ratio = clip_ratio)
-
-    def move_to(self, final, n_steps, final_width=None, exponential=False, clip_ratio = None):
+        def views():
+            for i in range(n_steps):
+                self.zoom(f)
+                yield None
+        for image in self.render_frames(views(), clip_ratio = clip_ratio,
+                                        batch_size = batch_size):
+            yield image
+
+    def move_to(self, final, n_steps, final_width=None, exponential=False, clip_ratio = None,
+                batch_size = 1):
         r"""Loop over a look_at
 
         This will yield `n_steps` snapshots until the current view has been
@@ -887,6 +930,9 @@ class Camera(ParallelAnalysisInterface):
         clip_ratio : float, optional
             If supplied, the 'max_val' argument to write_bitmap will be handed
             clip_ratio * image.std()
+        batch_size : int, optional
+            The number of snapshots to render at once; see
+            :meth:`render_frames`.  Default: 1
             
         Examples
         --------
@@ -924,12 +970,15 @@ class Camera(ParallelAnalysisInterface):
             else:
                 dW = self.ds.arr([0.0,0.0,0.0], "code_length")
             dx = (final-self.center)*1.0/n_steps
-        for i in range(n_steps):
-            if exponential:
-                self.switch_view(center=self.center*dx, width=self.width*dW)
-            else:
-                self.switch_view(center=self.center+dx, width=self.width+dW)
-            yield self.snapshot(clip_ratio = clip_ratio)
+        def views():
+            for i in range(n_steps):
+                if exponential:
+                    yield dict(center=self.center*dx, width=self.width*dW)
+                else:
+                    yield dict(center=self.center+dx, width=self.width+dW)
+        for image in self.render_frames(views(), clip_ratio = clip_ratio,
+                                        batch_size = batch_size):
+            yield image
 
     def rotate(self, theta, rot_vector=None):
         r"""Rotate by a given angle
@@ -1039,7 +1088,8 @@ class Camera(ParallelAnalysisInterface):
         if self.orienter.steady_north:
             self.orienter.north_vector = np.dot(R, self.orienter.north_vector)
 
-    def rotation(self, theta, n_steps, rot_vector=None, clip_ratio = None):
+    def rotation(self, theta, n_steps, rot_vector=None, clip_ratio = None,
+                 batch_size = 1):
         r"""Loop over rotate, creating a rotation
 
         This will yield `n_steps` snapshots until the current view has been
@@ -1058,6 +1108,9 @@ class Camera(ParallelAnalysisInterface):
         clip_ratio : float, optional
             If supplied, the 'max_val' argument to write_bitmap will be handed
             clip_ratio * image.std()
+        batch_size : int, optional
+            The number of snapshots to render at once; see
+            :meth:`render_frames`.  Default: 1
 
         Examples
         --------
@@ -1067,14 +1120,149 @@ class Camera(ParallelAnalysisInterface):
         """
 
         dtheta = (1.0*theta)/n_steps
-        for i in range(n_steps):
-            self.rotate(dtheta, rot_vector=rot_vector)
-            yield self.snapshot(clip_ratio = clip_ratio)
+        def views():
+            for i in range(n_steps):
+                self.rotate(dtheta, rot_vector=rot_vector)
+                yield None
+        for image in self.render_frames(views(), clip_ratio = clip_ratio,
+                                        batch_size = batch_size):
+            yield image
+
+    def render_frames(self, views, fn = None, clip_ratio = None,
+                      double_check = False, num_threads = 0,
+                      batch_size = 1, transparent = False):
+        r"""Ray-cast a sequence of views, yielding the images in order.
+
+        The volume is set up once for the whole sequence, rather than once
+        per :meth:`snapshot`, and with *batch_size* greater than one several
+        views are ray-cast at the same time, each in its own thread.  Each
+        image is written out as soon as it has been rendered.
+
+        Parameters
+        ----------
+        views : iterable
+            The views to render.  Each item is either a dict of keyword
+            arguments for :meth:`switch_view` or None, in which case the
+            camera is rendered as it is when the item is taken from
+            *views*.  Items may be taken before the earlier images have
+            been yielded, so *views* may move the camera itself.
+        fn : string, optional
+            If supplied, each image is saved to ``fn % i``, where i is its
+            position in the sequence, e.g. "frame_%04i.png".
+        clip_ratio : float, optional
+            If supplied, the 'max_val' argument to write_bitmap will be handed
+            clip_ratio * image.std()
+        double_check : bool, optional
+            Optionally makes sure that the data contains only valid entries.
+            Used for debugging.
+        num_threads : int, optional
+            The number of OpenMP threads used to ray-cast each view.
+            Defaults to 0, which uses the environment variable
+            OMP_NUM_THREADS, or 1 if views are rendered in batches.
+        batch_size : int, optional
+            The number of views to ray-cast at once.  Batches are not used
+            in parallel runs, nor by cameras that render more than a plain
+            view of the volume; these render one view after another.
+            Default: 1
+        transparent: bool, optional
+            Optionally saves out the 4-channel rgba image, which can appear 
+            empty if the alpha channel is low everywhere. Default: False
+
+        Examples
+        --------
+
+        >>> views = [dict(width=w) for w in np.linspace(1.0, 0.1, 100)]
+        >>> for image in cam.render_frames(views, fn="zoom_%04i.png",
+        ...                                batch_size=4):
+        ...     pass
+        """
+        if not self._batch_frames:
+            for i, view in enumerate(views):
+                if view is not None:
+                    self.switch_view(**view)
+                if fn is not None:
+                    yield self.snapshot(fn % i, clip_ratio = clip_ratio)
+                else:
+                    yield self.snapshot(clip_ratio = clip_ratio)
+            return
+        if batch_size is None or batch_size < 1 or self.comm.size > 1:
+            # Images are reduced across processors using the camera's current
+            # view, so the camera cannot run ahead of the frames.
+            batch_size = 1
+        if num_threads is None:
+            num_threads = get_num_threads()
+        if batch_size > 1 and num_threads == 0:
+            num_threads = 1
+        self.initialize_source()
+        if double_check:
+            self._check_bricks()
+        frames = enumerate(self._setup_frame(view) for view in views)
+        def _frame_fn(i):
+            if fn is None: return None
+            return fn % i
+        if batch_size == 1:
+            for i, frame in frames:
+                image = self._cast_frame(frame, num_threads)
+                yield self._finish_frame(frame, image, _frame_fn(i),
+                                         clip_ratio, transparent)
+            return
+        jobs = queue.Queue()
+        done = queue.Queue()
+        def _cast_frames():
+            while True:
+                job = jobs.get()
+                if job is None: return
+                i, frame = job
+                try:
+                    done.put((i, self._cast_frame(frame, num_threads), None))
+                except:
+                    done.put((i, None, sys.exc_info()))
+        workers = [threading.Thread(target = _cast_frames)
+                   for i in range(batch_size)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        # Frames are written out as soon as they have been cast, but yielded
+        # in order; only so many are set up ahead of the one to be yielded.
+        pending = {}
+        finished = {}
+        next_frame = 0
+        try:
+            while True:
+                while len(pending) + len(finished) < 2 * batch_size:
+                    try:
+                        i, frame = next(frames)
+                    except StopIteration:
+                        break
+                    pending[i] = frame
+                    jobs.put((i, frame))
+                if next_frame in finished:
+                    yield finished.pop(next_frame)
+                    next_frame += 1
+                    continue
+                if len(pending) == 0:
+                    break
+                i, image, exc_info = done.get()
+                if exc_info is not None:
+                    reraise(*exc_info)
+                finished[i] = self._finish_frame(pending.pop(i), image,
+                    _frame_fn(i), clip_ratio, transparent)
+        finally:
+            while True:
+                try:
+                    jobs.get_nowait()
+                except queue.Empty:
+                    break
+            for worker in workers:
+                jobs.put(None)
+            for worker in workers:
+                worker.join()
 
 data_object_registry["camera"] = Camera
 
 class InteractiveCamera(Camera):
     frames = []
+    _batch_frames = False
 
     def snapshot(self, fn = None, clip_ratio = None):
         import matplotlib.pylab as pylab
@@ -1189,6 +1377,7 @@ class PerspectiveCamera(Camera):
         casting. By default this will get set to ds.all_data().
 
     """
+    _batch_frames = False
     def __init__(self, *args, **kwargs):
         Camera.__init__(self, *args, **kwargs)
 
@@ -1345,6 +1534,7 @@ def corners(left_edge, right_edge):
 class HEALpixCamera(Camera):
 
     _sampler_object = None 
+    _batch_frames = False
     
     def __init__(self, center, radius, nside,
                  transfer_function = None, fields = None,
@@ -1493,6 +1683,7 @@ class HEALpixCamera(Camera):
                                 cmin = cmin, cmax = cmax)
 
 class AdaptiveHEALpixCamera(Camera):
+    _batch_frames = False
     def __init__(self, center, radius, nside,
                  transfer_function = None, fields = None,
                  sub_samples = 5, log_fields = None, volume = None,
@@ -1575,6 +1766,7 @@ class StereoPairCamera(Camera):
         return (left_camera, right_camera)
 
 class FisheyeCamera(Camera):
+    _batch_frames = False
     def __init__(self, center, radius, fov, resolution,
                  transfer_function = None, fields = None,
                  sub_samples = 5, log_fields = None, volume = None,
@@ -1656,6 +1848,7 @@ class FisheyeCamera(Camera):
         return image
 
 class MosaicCamera(Camera):
+    _batch_frames = False
     def __init__(self, center, normal_vector, width,
                  resolution, transfer_function = None,
                  north_vector = None, steady_north=False,
@@ -1916,6 +2109,7 @@ class MosaicFisheyeCamera(Camera):
     >>> cam.save_image('fisheye_mosaic.png')
 
     """
+    _batch_frames = False
     def __init__(self, center, radius, fov, resolution, focal_center=None,
                  transfer_function=None, fields=None,
                  sub_samples=5, log_fields=None, volume=None,
@@ -2323,6 +2517,7 @@ def plot_allsky_healpix(image, nside, fn, label = "", rotation = None,
     return img, count
 
 class ProjectionCamera(Camera):
+    _batch_frames = False
     def __init__(self, center, normal_vector, width, resolution,
             field, weight=None, volume=None, no_ghost = False, 
             north_vector=None, ds=None, interpolated=False,
@@ -2423,12 +2618,29 @@ class ProjectionCamera(Camera):
         if self.interpolated:
             return Camera._render(self, double_check, num_threads, image,
                     sampler)
+        fields = self.fields
+        data_source = self._bounding_region()
+
+        for i, (grid, mask) in enumerate(data_source.blocks):
+            data = [(grid[field] * mask).astype("float64") for field in fields]
+            pg = PartitionedGrid(
+                grid.id, data,
+                mask.astype('uint8'),
+                grid.LeftEdge, grid.RightEdge, grid.ActiveDimensions.astype("int64"))
+            grid.clear_data()
+            sampler(pg, num_threads = num_threads)
+
+        image = self.finalize_image(sampler.aimage)
+        return image
+
+    def _bounding_region(self):
+        # Calculate the eight corners of the box and return the region
+        # bounding them.
         ds = self.ds
         width = self.width[2]
         north_vector = self.orienter.unit_vectors[0]
         east_vector = self.orienter.unit_vectors[1]
         normal_vector = self.orienter.unit_vectors[2]
-        fields = self.fields
 
         mi = ds.domain_right_edge.copy()
         ma = ds.domain_left_edge.copy()
@@ -2440,20 +2652,58 @@ class ProjectionCamera(Camera):
                                          + width/2. * off3 * normal_vector)
                     np.minimum(mi, this_point, mi)
                     np.maximum(ma, this_point, ma)
-        # Now we have a bounding box.
-        data_source = ds.region(self.center, mi, ma)
+        return ds.region(self.center, mi, ma)
 
-        for i, (grid, mask) in enumerate(data_source.blocks):
-            data = [(grid[field] * mask).astype("float64") for field in fields]
-            pg = PartitionedGrid(
-                grid.id, data,
-                mask.astype('uint8'),
-                grid.LeftEdge, grid.RightEdge, grid.ActiveDimensions.astype("int64"))
-            grid.clear_data()
-            sampler(pg, num_threads = num_threads)
+    def splat(self, antialias=False, num_threads=0):
+        r"""Project by adding each cell's column to the pixels it covers.
 
-        image = self.finalize_image(sampler.aimage)
-        return image
+        Rather than casting rays through bricks, the cells of the bounding
+        region are read chunk by chunk and the footprint of each, as seen
+        along the normal vector, is added to the image.  No kd-tree or
+        ghost zones are needed, so this works for any index, and chunks
+        are spread across processors and summed at the end.  Without
+        antialiasing, the image is the same as that of the (non-
+        interpolated) ray caster.
+
+        Parameters
+        ----------
+        antialias : bool, optional
+            If True, each pixel is averaged over a 4x4 square of rays,
+            and cells smaller than that spacing are added by volume.
+            Default: False
+        num_threads : int, optional
+            The number of OpenMP threads to use; 0 uses the default.
+
+        Returns
+        -------
+        image : `~yt.data_objects.image_array.ImageArray`
+            The projected image, as from :meth:`snapshot`.
+        """
+        uv = np.array(self.orienter.unit_vectors, dtype="float64")
+        width = np.array(self.width.in_units("code_length"), dtype="float64")
+        back_center = np.array(self.back_center.in_units("code_length"),
+                               dtype="float64")
+        image = np.zeros((self.resolution[0], self.resolution[1],
+                          len(self.fields)), dtype="float64")
+        supersample = 4 if antialias else 1
+        data_source = self._bounding_region()
+        # Chunks add into the image in place, so they are only split over
+        # MPI tasks, never handed to the local process pool.
+        for chunk in parallel_objects(data_source.chunks([], "io",
+                                                         local_only=True),
+                                      max_workers=1):
+            pos = np.asarray(chunk.fcoords.in_units("code_length"),
+                             dtype="float64")
+            if pos.shape[0] == 0: continue
+            dds = np.asarray(chunk.fwidth.in_units("code_length"),
+                             dtype="float64")
+            values = np.column_stack([np.asarray(chunk[field], dtype="float64")
+                                      for field in self.fields])
+            pixelize_off_axis_projection(image, pos, dds, values,
+                back_center, uv, width, supersample, num_threads)
+        image = self.comm.mpi_allreduce(image, op="sum")
+        image = self.finalize_image(image)
+        return ImageArray(image, info=self.get_information())
 
     def save_image(self, image, fn=None, clip_ratio=None):
         dd = self.ds.all_data()
@@ -2498,6 +2748,7 @@ class ProjectionCamera(Camera):
 data_object_registry["projection_camera"] = ProjectionCamera
 
 class SphericalCamera(Camera):
+    _batch_frames = False
     def __init__(self, *args, **kwargs):
         Camera.__init__(self, *args, **kwargs)
         if(self.resolution[0]/self.resolution[1] != 2):
@@ -2566,6 +2817,7 @@ class SphericalCamera(Camera):
 data_object_registry["spherical_camera"] = SphericalCamera
 
 class StereoSphericalCamera(Camera):
+    _batch_frames = False
     def __init__(self, *args, **kwargs):
         self.disparity = kwargs.pop('disparity', 0.)
         Camera.__init__(self, *args, **kwargs)
@@ -2673,7 +2925,8 @@ data_object_registry["stereospherical_camera"] = StereoSphericalCamera
 def off_axis_projection(ds, center, normal_vector, width, resolution,
                         field, weight = None, 
                         volume = None, no_ghost = False, interpolated = False,
-                        north_vector = None, method = "integrate"):
+                        north_vector = None, method = "integrate",
+                        splat = False, antialias = False, num_threads = 0):
     r"""Project through a dataset, off-axis, and return the image plane.
 
     This function will accept the necessary items to integrate through a volume
@@ -2731,6 +2984,16 @@ def off_axis_projection(ds, center, normal_vector, width, resolution,
          just a straight summation of the field along the given axis. WARNING:
          This should only be used for uniform resolution grid datasets, as other
          datasets may result in unphysical images.
+    splat : optional, default False
+        If True, rather than ray casting, the footprint of each cell is
+        added to the image directly from chunked cell data.  This needs
+        neither a kd-tree nor ghost zones, works for any index, and
+        ignores *volume*, *no_ghost* and *interpolated*.
+    antialias : optional, default False
+        If True and *splat* is set, each pixel is averaged over a 4x4
+        square of rays rather than sampled at its center.
+    num_threads : optional, default 0
+        The number of OpenMP threads to splat with; 0 uses the default.
 
     Returns
     -------
@@ -2745,10 +3008,15 @@ def off_axis_projection(ds, center, normal_vector, width, resolution,
     >>> write_image(np.log10(image), "offaxis.png")
 
     """
+    if splat:
+        interpolated = False
     projcam = ProjectionCamera(center, normal_vector, width, resolution,
                                field, weight=weight, ds=ds, volume=volume,
                                no_ghost=no_ghost, interpolated=interpolated, 
                                north_vector=north_vector, method=method)
-    image = projcam.snapshot()
+    if splat:
+        image = projcam.splat(antialias=antialias, num_threads=num_threads)
+    else:
+        image = projcam.snapshot()
     return image[:,:]
 
@@ -161,3 +161,23 @@ class CameraTest(TestCase):
             snap
         cam.snapshot('final.png')
         assert_fname('final.png')
+
+    def test_camera_frames(self):
+        ds = self.ds
+        tf = self.setup_transfer_function('camera')
+
+        images = {}
+        for batch_size in [1, 3]:
+            cam = ds.camera(self.c, self.L, self.W, self.N,
+                            transfer_function=tf, log_fields=[False],
+                            north_vector=[0., 0., 1.0])
+            views = [dict(width=w*self.W) for w in [1.0, 0.8, 0.6, 0.4]]
+            images[batch_size] = \
+                list(cam.render_frames(views, fn='frame_%i.png',
+                                       batch_size=batch_size)) + \
+                list(cam.rotation(np.pi, 3, batch_size=batch_size))
+        for fn in ['frame_%i.png' % i for i in range(4)]:
+            assert_fname(fn)
+        assert len(images[1]) == len(images[3]) == 7
+        for im1, im3 in zip(images[1], images[3]):
+            np.testing.assert_equal(im1, im3)